@@ -15,8 +15,11 @@ from app.bemestingen.routes import bemestingen_bp
 from app.bemestingen.werkingscoefficienten import werkingscoefficienten_bp
 from app.dashboard.routes import dashboard_bp
 from app.rapportage.routes import rapportage_bp
+from app.tiles.routes import tiles_bp
+from app.jobs.routes import jobs_bp
 
 import app.models.database_beheer as db
+import app.services.jobs as jobs
 
 
 def create_app():
@@ -32,6 +35,11 @@ def create_app():
     # DB init
     db.init_db()
 
+    # Vangnet: verbindingen die een route niet sloot terug naar de pool
+    @app.teardown_appcontext
+    def release_db_connections(exc):
+        db.release_request_connections()
+
     # API KEY beschikbaar maken in Jinja templates
     @app.context_processor
     def inject_google_maps_key():
@@ -49,6 +57,13 @@ def create_app():
     app.register_blueprint(werkingscoefficienten_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(rapportage_bp)
+    app.register_blueprint(tiles_bp)
+    app.register_blueprint(jobs_bp)
+
+    # Jobs draaien in `python -m app.worker`; werkerthreads in het web-proces
+    # alleen als JOBS_WERKERS expliciet is gezet (default 0). Wel de app
+    # doorgeven, zodat handlers in het werkerproces een app-context hebben.
+    jobs.start_werkers(flask_app=app)
 
     return app
 
@@ -3,6 +3,7 @@ import uuid
 import app.models.database_beheer as db
 import pandas as pd
 from app.gebruikers.auth_utils import login_required, effective_user_id
+from app.services.response_cache import registreer_invalidatie
 
 bedrijven_bp = Blueprint(
     'bedrijven',
@@ -12,6 +13,9 @@ bedrijven_bp = Blueprint(
     url_prefix='/bedrijven'
 )
 
+# Schrijfacties maken de dashboard/kaart response-cache van de gebruiker ongeldig
+registreer_invalidatie(bedrijven_bp)
+
 @bedrijven_bp.route('/', methods=['GET', 'POST'])
 @login_required
 def bedrijven():
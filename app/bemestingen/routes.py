@@ -3,7 +3,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 
 import uuid
 import app.models.database_beheer as db
+from app.models.bemesting_samenvatting import ververs_samenvatting
+from app.models.referentie_cache import get_meststoffen, get_werkingscoefficienten
 from app.gebruikers.auth_utils import login_required
+from app.services.response_cache import registreer_invalidatie
 import logging
 from datetime import datetime
 
@@ -15,6 +18,9 @@ bemestingen_bp = Blueprint(
     url_prefix='/bemestingen'
 )
 
+# Schrijfacties maken de dashboard/kaart response-cache van de gebruiker ongeldig
+registreer_invalidatie(bemestingen_bp)
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
@@ -62,14 +68,8 @@ def _load_werkingscoefficienten():
     - toepassing
     - werking  (of pas dit aan naar jouw echte kolomnaam)
     """
-    conn = db.get_connection()
-    c = conn.cursor()
     try:
-        c.execute('''
-            SELECT jaar, meststof, toepassing, werking
-            FROM stikstof_werkingscoefficient_dierlijk
-        ''')
-        rows = c.fetchall()
+        rows = get_werkingscoefficienten()
 
         data = [{
             "jaar": r[0],
@@ -83,8 +83,6 @@ def _load_werkingscoefficienten():
     except Exception as e:
         logger.error(f"Fout bij ophalen werkingscoëfficiënten: {e}")
         return []
-    finally:
-        conn.close()
 
     
 
@@ -145,9 +143,8 @@ def bemestingen():
 
         bemestingen_rows = c.fetchall()
 
-        # Meststoffen (mag voor iedereen hetzelfde zijn)
-        c.execute('SELECT id, meststof, n, p2o5, k2o, toepassing, leverancier FROM universal_fertilizers ORDER BY meststof')
-        meststoffen_rows = c.fetchall()
+        # Meststoffen (mag voor iedereen hetzelfde zijn) -> referentie-cache
+        meststoffen_rows = get_meststoffen(c)
 
     except Exception as e:
         logger.error(f"Fout bij ophalen bemestingen: {e}")
@@ -198,8 +195,7 @@ def bemestingen_nieuw():
         ''', (user_id,))
         percelen = c.fetchall()
 
-        c.execute('SELECT id, meststof, n, p2o5, k2o, toepassing, leverancier FROM universal_fertilizers ORDER BY meststof')
-        meststoffen = c.fetchall()
+        meststoffen = get_meststoffen(c)
         
         logger.info(f"Data geladen voor user {user_id} - Gebruiksnormen: {len(gebruiksnormen)}, Bedrijven: {len(bedrijven)}, Percelen: {len(percelen)}, Meststoffen: {len(meststoffen)}")
         
@@ -283,6 +279,7 @@ def bemesting_toevoegen():
 
         # Insert bemesting voor elk geselecteerd perceel
         succesvol_toegevoegd = 0
+        toegevoegde_norm_ids = []
         for gebruiksnorm_id in gebruiksnorm_ids:
             try:
                 # Haal perceel_id op uit gebruiksnorm
@@ -315,12 +312,14 @@ def bemesting_toevoegen():
                 ))
                 
                 succesvol_toegevoegd += 1
+                toegevoegde_norm_ids.append(gebruiksnorm_id)
                 logger.info(f"Bemesting toegevoegd voor perceel {perceel_id}")
                 
             except Exception as e:
                 logger.error(f"Fout bij toevoegen bemesting: {e}")
                 continue
 
+        ververs_samenvatting(c, toegevoegde_norm_ids)
         conn.commit()
         conn.close()
         
@@ -345,9 +344,8 @@ def bewerken_bemesting(id):
     c = conn.cursor()
     
     try:
-        # Haal meststoffen op
-        c.execute('SELECT id, meststof, n, p2o5, k2o, toepassing, leverancier FROM universal_fertilizers ORDER BY meststof')
-        meststoffen = c.fetchall()
+        # Haal meststoffen op (referentie-cache)
+        meststoffen = get_meststoffen(c)
         
         # Haal bemesting op
         c.execute('SELECT * FROM bemestingen WHERE id=%s', (id,))
@@ -356,9 +354,8 @@ def bewerken_bemesting(id):
         toepassing = None
         if bemesting:
             meststof_id = bemesting[5]  # Aanpassen volgens kolom index
-            c.execute('SELECT toepassing FROM universal_fertilizers WHERE id=%s', (meststof_id,))
-            row = c.fetchone()
-            toepassing = row[0] if row else None
+            row = next((m for m in meststoffen if m[0] == meststof_id), None)
+            toepassing = row[5] if row else None
             
     except Exception as e:
         logger.error(f"Fout bij laden bemesting {id}: {e}")
@@ -418,7 +415,7 @@ def bemesting_bewerken(id):
         eff_uid = get_effective_user_id()
 
         c.execute('''
-            SELECT b.id, b.meststof_id, b.hoeveelheid_kg_ha
+            SELECT b.id, b.meststof_id, b.hoeveelheid_kg_ha, b.gebruiksnorm_id
             FROM bemestingen b
             JOIN bedrijven bed ON b.bedrijf_id = bed.id
             WHERE b.id = %s AND bed.user_id = %s
@@ -484,6 +481,7 @@ def bemesting_bewerken(id):
         if c.rowcount == 0:
             flash("Geen wijzigingen doorgevoerd.", "warning")
         else:
+            ververs_samenvatting(c, [ownership_check[3]])
             conn.commit()
             flash("Bemesting succesvol bijgewerkt.", "success")
             logger.info(f"Bemesting {id} succesvol bijgewerkt. Nieuwe meststof: {meststof_check[1]}, Hoeveelheid: {hoeveelheid}")
@@ -509,7 +507,7 @@ def bemesting_verwijderen(id):
         # Check of bemesting bestaat
         eff_uid = get_effective_user_id()
         c.execute('''
-            SELECT b.id
+            SELECT b.id, b.gebruiksnorm_id
             FROM bemestingen b
             JOIN bedrijven bed ON b.bedrijf_id = bed.id
             WHERE b.id = %s AND bed.user_id = %s
@@ -520,6 +518,7 @@ def bemesting_verwijderen(id):
             flash("Bemesting niet gevonden of geen toegang.", "danger")
         else:
             c.execute('DELETE FROM bemestingen WHERE id = %s', (id,))
+            ververs_samenvatting(c, [existing[1]])
             conn.commit()
             flash("Bemesting verwijderd.", "success")
 
@@ -629,9 +628,6 @@ def api_init_bemestingen():
             })
 
         # Meststoffen
-        c.execute(
-            'SELECT id, meststof, n, p2o5, k2o, toepassing, leverancier FROM universal_fertilizers ORDER BY meststof'
-        )
         meststoffen = [
             {
                 "id": str(r[0]),
@@ -642,7 +638,7 @@ def api_init_bemestingen():
                 "toepassing": r[5] or "",
                 "leverancier": r[6] or ""
             }
-            for r in c.fetchall()
+            for r in get_meststoffen(c)
         ]
 
         # ➜ Gebruiksnormen (voor jaarfilter + mapping perceel → gebruiksnorm)
@@ -1,6 +1,6 @@
 # app/routes/werkingscoefficienten.py
 from flask import Blueprint, jsonify
-from app.models.database_beheer import get_connection
+from app.models.referentie_cache import get_werkingscoefficienten as _cached_werkingscoefficienten
 import logging
 
 werkingscoefficienten_bp = Blueprint('werkingscoefficienten_bp', __name__)
@@ -8,16 +8,8 @@ logger = logging.getLogger(__name__)
 
 @werkingscoefficienten_bp.route('/api/werkingscoefficienten')
 def get_werkingscoefficienten():
-    conn = None
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT jaar, meststof, toepassing, werking
-            FROM stikstof_werkingscoefficient_dierlijk
-        """)
-        rows = cur.fetchall()
+        rows = _cached_werkingscoefficienten()
 
         data = [
             {
@@ -33,7 +25,3 @@ def get_werkingscoefficienten():
     except Exception as e:
         logger.error(f"Fout in get_werkingscoefficienten: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
-
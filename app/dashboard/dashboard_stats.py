@@ -1,261 +1,324 @@
 # app/dashboard/dashboard_stats.py (of waar deze functie ook staat)
+import base64
+import json
+from datetime import date
 
-def bereken_dashboard_stats(conn, user_id, jaar):
+# ---------------------------------------------------------------------------
+# SQL-geaggregeerde variant
+# ---------------------------------------------------------------------------
+#
+# REAL-kolommen gaan via ::text::float8 zodat SQL met exact dezelfde waarden
+# rekent als Python na psycopg2 (die de kortste tekstweergave van de float4
+# inleest). Een directe ::float8 cast zou 0.1 als 0.10000000149 meenemen.
+
+def _real(expr, default="0"):
+    return f"COALESCE({expr}, {default})::text::float8"
+
+
+# float(calculated_area or oppervlakte or 1.0): 0 en NULL tellen als "leeg"
+_BEMESTING_OPP = "COALESCE(NULLIF(p.calculated_area, 0), NULLIF(p.oppervlakte, 0), 1)::text::float8"
+
+# Bemestingen die bij een geselecteerde gebruiksnorm horen: dezelfde joins als
+# de normen- en bemestingen-query van de Python-variant, zonder IN-lijst.
+_BEMESTINGEN_JOINS = """
+    FROM bemestingen b
+    JOIN gebruiksnormen gn    ON gn.id = b.gebruiksnorm_id
+    JOIN percelen np          ON np.id = gn.perceel_id
+    JOIN bedrijven nb         ON nb.id = gn.bedrijf_id
+    JOIN percelen p           ON p.id = b.perceel_id
+    JOIN bedrijven bedrijf    ON bedrijf.id = b.bedrijf_id
+"""
+_BEMESTINGEN_WHERE = "WHERE nb.user_id = %s AND gn.jaar = %s"
+
+
+
+def _leeg_werkelijk():
+    return {
+        "stikstof_total": 0.0,
+        "stikstof_dierlijk_total": 0.0,
+        "fosfaat_total": 0.0,
+        "kalium_total": 0.0,
+        "bemestingen_count": 0,
+    }
+
+
+_DETAIL_KOLOMMEN = f"""
+            b.id,
+            b.datum,
+            bedrijf.naam AS bedrijf_naam,
+            p.perceelnaam,
+            sgn.gewas AS gewas_naam,
+            uf.meststof AS meststof_naam,
+            uf.toepassing AS meststof_toepassing,
+            {_BEMESTING_OPP} AS opp,
+            {_real("b.werkzame_n_kg_ha")} AS werkzame_n_kg_ha,
+            {_real("b.n_dierlijk_kg_ha")} AS n_dierlijk_kg_ha,
+            {_real("b.werkzame_p2o5_kg_ha")} AS werkzame_p2o5_kg_ha,
+            {_real("b.k2o_kg_ha")} AS k2o_kg_ha,
+            {_real("b.n_kg_ha")} AS n_kg_ha,
+            {_real("b.p2o5_kg_ha")} AS p2o5_kg_ha
+"""
+_DETAIL_JOINS = _BEMESTINGEN_JOINS + """
+    LEFT JOIN universal_fertilizers uf ON uf.id = b.meststof_id
+    LEFT JOIN stikstof_gewassen_normen sgn ON sgn.id = gn.gewas_id
+"""
+
+
+def _detail_dict(row):
+    (bem_id, datum, bedrijf_naam, perceelnaam, gewas_naam, meststof_naam, toepassing,
+     opp, werkzame_n, n_dier, werkzame_p2o5, k2o, n_kg_ha, p2o5_kg_ha) = row
+    return {
+        "datum": datum,
+        "bedrijf": bedrijf_naam,
+        "perceel": perceelnaam,
+        "gewas": gewas_naam,
+        "meststof": meststof_naam,
+        "oppervlakte": opp,
+        "toepassing": toepassing,
+        "werkzame_n": werkzame_n * opp,
+        "werkzame_n_dierlijk": n_dier * opp,
+        "werkzame_p2o5": werkzame_p2o5 * opp,
+        "k2o_kg_ha": k2o,
+        "k2o_total": k2o * opp,
+        "n_kg_ha": n_kg_ha,
+        "p2o5_kg_ha": p2o5_kg_ha,
+    }
+
+
+def _query_bemestingen_details(cur, user_id, jaar):
+    cur.execute(
+        f"""
+        SELECT {_DETAIL_KOLOMMEN}
+        {_DETAIL_JOINS}
+        {_BEMESTINGEN_WHERE}
+        ORDER BY bedrijf.naam, b.datum DESC
+        """,
+        (user_id, jaar),
+    )
+    return [_detail_dict(r) for r in cur.fetchall()]
+
+
+def _encode_cursor(datum, bem_id):
+    raw = json.dumps({"d": datum.isoformat(), "id": bem_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return date.fromisoformat(data["d"]), str(data["id"])
+    except Exception:
+        raise ValueError("Ongeldige cursor")
+
+
+def bemestingen_details_pagina(conn, user_id, jaar, bedrijf_id=None, perceel_id=None,
+                               meststof_id=None, sort="desc", limit=50, cursor=None):
     """
-    Bereken dashboard statistieken voor alle bedrijven van een gebruiker in een specifiek jaar.
-    Groepeer bemestingen op het bedrijf van de GEBRUIKSNORM (gn.bedrijf_id) zodat
-    bemestingen bij het juiste bedrijf in de linkerkolom worden opgeteld.
-    Werkt nu met PostgreSQL (psycopg2): gebruikt cursor + %s placeholders.
+    Eén pagina bemestingen_details, keyset-gepagineerd op (datum, id).
+    Filters op bedrijf (van de gebruiksnorm), perceel en meststof gebeuren in SQL.
+    Geeft {"items": [...], "next_cursor": str|None, "has_more": bool} terug;
+    next_cursor gaat ongewijzigd mee als ?cursor= voor de volgende pagina.
     """
+    desc = (sort or "desc").lower() != "asc"
+    limit = max(1, min(int(limit or 50), 500))
 
-    def fetchall_dicts(cur):
-        """Zet cursor-resultaat om naar lijst met dicts (kolomnamen als keys)."""
-        rows = cur.fetchall()
-        cols = [desc[0] for desc in cur.description]
-        return [dict(zip(cols, r)) for r in rows]
+    where = [_BEMESTINGEN_WHERE]
+    params = [user_id, jaar]
+    if bedrijf_id:
+        where.append("AND gn.bedrijf_id = %s")
+        params.append(bedrijf_id)
+    if perceel_id:
+        where.append("AND b.perceel_id = %s")
+        params.append(perceel_id)
+    if meststof_id:
+        where.append("AND b.meststof_id = %s")
+        params.append(meststof_id)
+    if cursor:
+        c_datum, c_id = _decode_cursor(cursor)
+        where.append("AND (b.datum, b.id) < (%s, %s)" if desc else "AND (b.datum, b.id) > (%s, %s)")
+        params.extend([c_datum, c_id])
 
+    richting = "DESC" if desc else "ASC"
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT {_DETAIL_KOLOMMEN}
+        {_DETAIL_JOINS}
+        {" ".join(where)}
+        ORDER BY b.datum {richting}, b.id {richting}
+        LIMIT %s
+        """,
+        (*params, limit + 1),
+    )
+    rows = cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for r in rows:
+        item = _detail_dict(r)
+        item["id"] = r[0]
+        items.append(item)
+
+    return {
+        "items": items,
+        "next_cursor": _encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None,
+        "has_more": has_more,
+    }
+
+
+def bereken_dashboard_stats(conn, user_id, jaar, met_details=True):
+    """
+    Dashboard statistieken voor alle bedrijven van een gebruiker in één jaar.
+    Normen en werkelijke totalen per bedrijf komen uit twee GROUP BY-queries
+    (normen, en de bemestingen gekoppeld via gebruiksnorm_id, gegroepeerd op
+    gn.bedrijf_id); er gaan geen losse norm- of bemestingsrijen meer naar
+    Python voor de totalen.
+    met_details=False slaat de (lange) bemestingen_details-lijst over.
+    """
     cur = conn.cursor()
 
-    # Bedrijvenlijst voor deze gebruiker
     cur.execute(
         "SELECT id, naam FROM bedrijven WHERE user_id = %s ORDER BY naam",
         (user_id,)
     )
-    bedrijven = fetchall_dicts(cur)
+    bedrijven = [{"id": r[0], "naam": r[1]} for r in cur.fetchall()]
 
-    # Beschikbare jaren uit gebruiksnormen
     cur.execute(
         """
-        SELECT DISTINCT gn.jaar 
+        SELECT DISTINCT gn.jaar
         FROM gebruiksnormen gn
         JOIN bedrijven b ON b.id = gn.bedrijf_id
-        WHERE b.user_id = %s AND gn.jaar IS NOT NULL 
+        WHERE b.user_id = %s AND gn.jaar IS NOT NULL
         ORDER BY gn.jaar DESC
         """,
         (user_id,)
     )
-    jaren = [row["jaar"] for row in fetchall_dicts(cur)]
-
-    def _empty():
-        return {
-            "bedrijven": bedrijven,
-            "jaren": jaren,
-            "totaal_stats": {
-                "stikstof_norm": 0,
-                "stikstof_dierlijk_norm": 0,
-                "fosfaat_norm": 0,
-                "stikstof_total": 0,
-                "stikstof_dierlijk_total": 0,
-                "fosfaat_total": 0,
-                "kalium_total": 0,
-            },
-            "bedrijf_stats": [],
-            "bemestingen_details": [],
-        }
+    jaren = [r[0] for r in cur.fetchall()]
 
+    totaal_stats = {
+        "stikstof_norm": 0.0,
+        "stikstof_dierlijk_norm": 0.0,
+        "fosfaat_norm": 0.0,
+        "stikstof_total": 0.0,
+        "stikstof_dierlijk_total": 0.0,
+        "fosfaat_total": 0.0,
+        "kalium_total": 0.0,
+    }
+    resultaat = {
+        "bedrijven": bedrijven,
+        "jaren": jaren,
+        "totaal_stats": totaal_stats,
+        "bedrijf_stats": [],
+        "bemestingen_details": [],
+        "percelen_bemest_count": 0,
+    }
     if not jaar or not bedrijven:
-        return _empty()
+        return resultaat
 
-    # Normen (perceel x bedrijf) voor gekozen jaar
+    # Normen per bedrijf
     cur.execute(
-        """
-        SELECT 
-            gn.*,
-            p.perceelnaam,
-            p.oppervlakte,
-            b.naam AS bedrijf_naam,
-            sgn.gewas AS gewas_naam
+        f"""
+        SELECT
+            gn.bedrijf_id,
+            MIN(b.naam) AS bedrijf_naam,
+            COUNT(*) AS percelen_count,
+            SUM({_real("p.oppervlakte")}) AS oppervlakte_totaal,
+            SUM({_real("gn.stikstof_norm_kg_ha")}     * {_real("p.oppervlakte")}) AS stikstof_norm,
+            SUM({_real("gn.stikstof_dierlijk_kg_ha")} * {_real("p.oppervlakte")}) AS stikstof_dierlijk_norm,
+            SUM({_real("gn.fosfaat_norm_kg_ha")}      * {_real("p.oppervlakte")}) AS fosfaat_norm
         FROM gebruiksnormen gn
-        JOIN percelen p ON p.id = gn.perceel_id
+        JOIN percelen p  ON p.id = gn.perceel_id
         JOIN bedrijven b ON b.id = gn.bedrijf_id
-        LEFT JOIN stikstof_gewassen_normen sgn ON sgn.id = gn.gewas_id
         WHERE b.user_id = %s AND gn.jaar = %s
-        ORDER BY b.naam, p.perceelnaam
+        GROUP BY gn.bedrijf_id
+        ORDER BY MIN(b.naam), gn.bedrijf_id
         """,
         (user_id, jaar),
     )
-    normen = fetchall_dicts(cur)
-
+    normen = cur.fetchall()
     if not normen:
-        return _empty()
-
-    # Totaal normen per bedrijf
-    bedrijf_normen = {}
-    for norm in normen:
-        bedrijf_id = norm["bedrijf_id"]
-        d = bedrijf_normen.setdefault(
-            bedrijf_id,
-            {
-                "bedrijf_naam": norm["bedrijf_naam"],
-                "stikstof_norm": 0.0,
-                "stikstof_dierlijk_norm": 0.0,
-                "fosfaat_norm": 0.0,
-                "percelen_count": 0,
-                "oppervlakte_totaal": 0.0,
-            },
-        )
-        opp = float(norm["oppervlakte"] or 0.0)
-        d["stikstof_norm"]          += float(norm["stikstof_norm_kg_ha"] or 0.0) * opp
-        d["stikstof_dierlijk_norm"] += float(norm["stikstof_dierlijk_kg_ha"] or 0.0) * opp
-        d["fosfaat_norm"]           += float(norm["fosfaat_norm_kg_ha"] or 0.0) * opp
-        d["percelen_count"]         += 1
-        d["oppervlakte_totaal"]     += opp
-
-    # Alle bemestingen gekoppeld aan de geselecteerde gebruiksnormen
-    norm_ids = [str(n["id"]) for n in normen]
-    if not norm_ids:
-        return _empty()
-
-    placeholders = ",".join(["%s"] * len(norm_ids))
-
-    bemestingen_query = f"""
-        SELECT 
-            b.*,
-            gn.bedrijf_id AS norm_bedrijf_id,
+        return resultaat
 
-            p.perceelnaam,
-            p.oppervlakte,
-            p.calculated_area,
-            p.grondsoort,
+    # Werkelijk per bedrijf (van de gebruiksnorm). Niet via bemesting_samenvatting:
+    # die rekent met het perceel van de norm, het dashboard met de oppervlakte
+    # van b.perceel_id, en een bemesting zonder bestaand perceel of bedrijf
+    # telt hier (inner joins) niet mee.
+    cur.execute(
+        f"""
+        SELECT
+            gn.bedrijf_id,
+            COUNT(*) AS bemestingen_count,
+            SUM({_real("b.werkzame_n_kg_ha")}    * {_BEMESTING_OPP}) AS stikstof_total,
+            SUM({_real("b.n_dierlijk_kg_ha")}    * {_BEMESTING_OPP}) AS stikstof_dierlijk_total,
+            SUM({_real("b.werkzame_p2o5_kg_ha")} * {_BEMESTING_OPP}) AS fosfaat_total,
+            SUM({_real("b.k2o_kg_ha")}           * {_BEMESTING_OPP}) AS kalium_total
+        {_BEMESTINGEN_JOINS}
+        {_BEMESTINGEN_WHERE}
+        GROUP BY gn.bedrijf_id
+        """,
+        (user_id, jaar),
+    )
+    werkelijk = {
+        r[0]: {
+            "bemestingen_count": int(r[1]),
+            "stikstof_total": float(r[2] or 0.0),
+            "stikstof_dierlijk_total": float(r[3] or 0.0),
+            "fosfaat_total": float(r[4] or 0.0),
+            "kalium_total": float(r[5] or 0.0),
+        }
+        for r in cur.fetchall()
+    }
 
-            bedrijf.naam AS bedrijf_naam,
-            uf.meststof AS meststof_naam,
-            uf.toepassing AS meststof_toepassing,
-            sgn.gewas AS gewas_naam,
+    # Aantal (unieke perceelnamen) met minstens één bemesting; het dashboard
+    # telde dit voorheen uit de volledige details-lijst.
+    cur.execute(
+        f"""
+        SELECT COUNT(DISTINCT p.perceelnaam)
+        {_BEMESTINGEN_JOINS}
+        {_BEMESTINGEN_WHERE}
+        """,
+        (user_id, jaar),
+    )
+    resultaat["percelen_bemest_count"] = int((cur.fetchone() or [0])[0] or 0)
 
-            gn.stikstof_norm_kg_ha,
-            gn.stikstof_dierlijk_kg_ha,
-            gn.fosfaat_norm_kg_ha
-        FROM bemestingen b
-        JOIN percelen p           ON p.id = b.perceel_id
-        JOIN gebruiksnormen gn    ON gn.id = b.gebruiksnorm_id
-        JOIN bedrijven bedrijf    ON bedrijf.id = b.bedrijf_id
-        LEFT JOIN universal_fertilizers uf ON uf.id = b.meststof_id
-        LEFT JOIN stikstof_gewassen_normen sgn ON sgn.id = gn.gewas_id
-        WHERE b.gebruiksnorm_id IN ({placeholders})
-        ORDER BY bedrijf.naam, b.datum DESC
-    """
-    cur.execute(bemestingen_query, norm_ids)
-    bemestingen = fetchall_dicts(cur)
-
-    # Werkelijke totalen per bedrijf, gegroepeerd op gn.bedrijf_id
-    bedrijf_werkelijk = {}
-    bemestingen_details = []
-
-    for bem in bemestingen:
-        bedrijf_id = bem.get("norm_bedrijf_id") or bem.get("bedrijf_id")
-        d = bedrijf_werkelijk.setdefault(
-            bedrijf_id,
-            {
-                "stikstof_total": 0.0,
-                "stikstof_dierlijk_total": 0.0,
-                "fosfaat_total": 0.0,
-                "kalium_total": 0.0,
-                "bemestingen_count": 0,
-            },
-        )
-
-        opp = float(bem.get("calculated_area") or bem.get("oppervlakte") or 1.0)
-
-        werkzame_n      = float(bem.get("werkzame_n_kg_ha") or 0.0) * opp
-        werkzame_n_dier = float(bem.get("n_dierlijk_kg_ha") or 0.0) * opp
-        werkzame_p2o5   = float(bem.get("werkzame_p2o5_kg_ha") or 0.0) * opp
-        k2o_total       = float(bem.get("k2o_kg_ha") or 0.0) * opp
-
-        d["stikstof_total"]          += werkzame_n
-        d["stikstof_dierlijk_total"] += werkzame_n_dier
-        d["fosfaat_total"]           += werkzame_p2o5
-        d["kalium_total"]            += k2o_total
-        d["bemestingen_count"]       += 1
-
-        bemestingen_details.append({
-            "datum": bem.get("datum"),
-            "bedrijf": bem.get("bedrijf_naam"),
-            "perceel": bem.get("perceelnaam"),
-            "gewas": bem.get("gewas_naam"),
-            "meststof": bem.get("meststof_naam"),
-            "oppervlakte": opp,
-            "toepassing": bem.get("meststof_toepassing", ""),
-            "werkzame_n": werkzame_n,
-            "werkzame_n_dierlijk": werkzame_n_dier,
-            "werkzame_p2o5": werkzame_p2o5,
-            "k2o_kg_ha": float(bem.get("k2o_kg_ha") or 0.0),
-            "k2o_total": k2o_total,
-            "n_kg_ha": float(bem.get("n_kg_ha") or 0.0),
-            "p2o5_kg_ha": float(bem.get("p2o5_kg_ha") or 0.0),
-        })
+    def _pct(waarde, norm):
+        return (waarde / norm * 100.0) if norm > 0 else 0.0
 
-    # Combineer normen en werkelijk per bedrijf
-    bedrijf_stats = []
-    totaal_stats = {
-        "stikstof_norm": 0.0,
-        "stikstof_dierlijk_norm": 0.0,
-        "fosfaat_norm": 0.0,
-        "stikstof_total": 0.0,
-        "stikstof_dierlijk_total": 0.0,
-        "fosfaat_total": 0.0,
-        "kalium_total": 0.0,
-    }
+    for (bedrijf_id, bedrijf_naam, percelen_count, opp_totaal,
+         stikstof_norm, stikstof_dierlijk_norm, fosfaat_norm) in normen:
+        stikstof_norm = float(stikstof_norm or 0.0)
+        stikstof_dierlijk_norm = float(stikstof_dierlijk_norm or 0.0)
+        fosfaat_norm = float(fosfaat_norm or 0.0)
+        w = werkelijk.get(bedrijf_id, _leeg_werkelijk())
 
-    for bedrijf_id, ndata in bedrijf_normen.items():
-        wdata = bedrijf_werkelijk.get(
-            bedrijf_id,
-            {
-                "stikstof_total": 0.0,
-                "stikstof_dierlijk_total": 0.0,
-                "fosfaat_total": 0.0,
-                "kalium_total": 0.0,
-                "bemestingen_count": 0,
-            },
-        )
-
-        stikstof_pct = (
-            (wdata["stikstof_total"] / ndata["stikstof_norm"] * 100.0)
-            if ndata["stikstof_norm"] > 0
-            else 0.0
-        )
-        stikstof_dierlijk_pct = (
-            (wdata["stikstof_dierlijk_total"] / ndata["stikstof_dierlijk_norm"] * 100.0)
-            if ndata["stikstof_dierlijk_norm"] > 0
-            else 0.0
-        )
-        fosfaat_pct = (
-            (wdata["fosfaat_total"] / ndata["fosfaat_norm"] * 100.0)
-            if ndata["fosfaat_norm"] > 0
-            else 0.0
-        )
-
-        bedrijf_stats.append({
+        resultaat["bedrijf_stats"].append({
             "bedrijf_id": bedrijf_id,
-            "bedrijf_naam": ndata["bedrijf_naam"],
-            "percelen_count": ndata["percelen_count"],
-            "oppervlakte_totaal": ndata["oppervlakte_totaal"],
-            "stikstof_norm": ndata["stikstof_norm"],
-            "stikstof_dierlijk_norm": ndata["stikstof_dierlijk_norm"],
-            "fosfaat_norm": ndata["fosfaat_norm"],
-            "stikstof_total": wdata["stikstof_total"],
-            "stikstof_dierlijk_total": wdata["stikstof_dierlijk_total"],
-            "fosfaat_total": wdata["fosfaat_total"],
-            "kalium_total": wdata["kalium_total"],
-            "stikstof_percentage": stikstof_pct,
-            "stikstof_dierlijk_percentage": stikstof_dierlijk_pct,
-            "fosfaat_percentage": fosfaat_pct,
-            "bemestingen_count": wdata["bemestingen_count"],
+            "bedrijf_naam": bedrijf_naam,
+            "percelen_count": int(percelen_count),
+            "oppervlakte_totaal": float(opp_totaal or 0.0),
+            "stikstof_norm": stikstof_norm,
+            "stikstof_dierlijk_norm": stikstof_dierlijk_norm,
+            "fosfaat_norm": fosfaat_norm,
+            "stikstof_total": w["stikstof_total"],
+            "stikstof_dierlijk_total": w["stikstof_dierlijk_total"],
+            "fosfaat_total": w["fosfaat_total"],
+            "kalium_total": w["kalium_total"],
+            "stikstof_percentage": _pct(w["stikstof_total"], stikstof_norm),
+            "stikstof_dierlijk_percentage": _pct(w["stikstof_dierlijk_total"], stikstof_dierlijk_norm),
+            "fosfaat_percentage": _pct(w["fosfaat_total"], fosfaat_norm),
+            "bemestingen_count": w["bemestingen_count"],
         })
 
-        # Totalen
-        totaal_stats["stikstof_norm"]           += ndata["stikstof_norm"]
-        totaal_stats["stikstof_dierlijk_norm"]  += ndata["stikstof_dierlijk_norm"]
-        totaal_stats["fosfaat_norm"]            += ndata["fosfaat_norm"]
-        totaal_stats["stikstof_total"]          += wdata["stikstof_total"]
-        totaal_stats["stikstof_dierlijk_total"] += wdata["stikstof_dierlijk_total"]
-        totaal_stats["fosfaat_total"]           += wdata["fosfaat_total"]
-        totaal_stats["kalium_total"]            += wdata["kalium_total"]
+        totaal_stats["stikstof_norm"]           += stikstof_norm
+        totaal_stats["stikstof_dierlijk_norm"]  += stikstof_dierlijk_norm
+        totaal_stats["fosfaat_norm"]            += fosfaat_norm
+        totaal_stats["stikstof_total"]          += w["stikstof_total"]
+        totaal_stats["stikstof_dierlijk_total"] += w["stikstof_dierlijk_total"]
+        totaal_stats["fosfaat_total"]           += w["fosfaat_total"]
+        totaal_stats["kalium_total"]            += w["kalium_total"]
 
-    return {
-        "bedrijven": bedrijven,
-        "jaren": jaren,
-        "totaal_stats": totaal_stats,
-        "bedrijf_stats": bedrijf_stats,
-        "bemestingen_details": bemestingen_details,
-    }
+    if met_details:
+        resultaat["bemestingen_details"] = _query_bemestingen_details(cur, user_id, jaar)
+
+    return resultaat
@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, request, session, jsonify
 from app.models.database_beheer import get_connection
-from app.dashboard.dashboard_stats import bereken_dashboard_stats
+from app.dashboard.dashboard_stats import bereken_dashboard_stats, bemestingen_details_pagina
 from app.gebruikers.auth_utils import login_required, effective_user_id
+from app.services.response_cache import cached_response
+from app.services.geometrie_encoding import encoding_uit_request
 import logging, traceback
 import os
 import json
@@ -127,6 +129,7 @@ def get_dashboard_initial_data():
 
 @dashboard_bp.route('/api/dashboard/stats')
 @login_required
+@cached_response('dashboard_stats')
 def get_dashboard_stats():
     """Haal dashboard statistieken op voor gebruiker en jaar (alle bedrijven)"""
     try:
@@ -168,11 +171,14 @@ def get_dashboard_stats():
                 },
                 "bedrijf_stats": [],
                 "bemestingen_details": [],
+                "percelen_bemest_count": 0,
                 "message": "Geen gebruiksnormen gevonden voor dit jaar"
             })
 
-        # bereken_dashboard_stats gebruikt zelf de cursor/conn
-        stats = bereken_dashboard_stats(conn, user_id, jaar_int)
+        # Alleen totalen; de details komen gepagineerd uit /api/dashboard/bemestingen.
+        # ?details=1 geeft de volledige lijst nog mee (oude clients).
+        met_details = request.args.get('details') == '1'
+        stats = bereken_dashboard_stats(conn, user_id, jaar_int, met_details=met_details)
         conn.close()
         return jsonify(stats)
 
@@ -182,6 +188,56 @@ def get_dashboard_stats():
         return jsonify({"error": f"Fout bij ophalen dashboard gegevens: {e}"}), 500
 
 
+@dashboard_bp.route('/api/dashboard/bemestingen')
+@login_required
+def get_dashboard_bemestingen():
+    """
+    Gepagineerde bemestingen_details voor het dashboard.
+    Query: jaar (verplicht), bedrijf_id, perceel_id, meststof_id,
+    sort=desc|asc (op datum, id), limit (max 500), cursor (next_cursor van vorige pagina).
+    """
+    try:
+        user_id = effective_user_id()
+        jaar = request.args.get('jaar')
+        if not jaar or not user_id:
+            return jsonify({"error": "Jaar en login zijn vereist"}), 400
+        try:
+            jaar_int = int(jaar)
+            limit = int(request.args.get('limit', 50))
+        except ValueError:
+            return jsonify({"error": "Jaar en limit moeten een nummer zijn"}), 400
+
+        sort = request.args.get('sort', 'desc')
+        if sort not in ('asc', 'desc'):
+            return jsonify({"error": "sort moet 'asc' of 'desc' zijn"}), 400
+
+        conn = get_connection()
+        try:
+            pagina = bemestingen_details_pagina(
+                conn, user_id, jaar_int,
+                bedrijf_id=request.args.get('bedrijf_id') or None,
+                perceel_id=request.args.get('perceel_id') or None,
+                meststof_id=request.args.get('meststof_id') or None,
+                sort=sort,
+                limit=limit,
+                cursor=request.args.get('cursor') or None,
+            )
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+        finally:
+            conn.close()
+
+        for item in pagina["items"]:
+            if item.get("datum") is not None:
+                item["datum"] = item["datum"].isoformat()
+        return jsonify(pagina)
+
+    except Exception as e:
+        logger.error(f"Error in get_dashboard_bemestingen: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({"error": f"Fout bij ophalen bemestingen: {e}"}), 500
+
+
 @dashboard_bp.route('/api/dashboard/debug')
 @login_required
 def debug_dashboard():
@@ -241,12 +297,16 @@ def debug_dashboard():
 
 @dashboard_bp.route('/api/map/percelen')
 @login_required
+@cached_response('map_percelen')
 def api_map_percelen():
     """
     Kaartdata gefilterd op JAAR VAN GEBRUIKSNORMEN.
     1) Haal alle gebruiksnormen (user+jaar) met perceel+bedrijf+polygon.
-    2) Haal ALLE bemestingen voor deze gebruiksnorm_ids op (join op b.gebruiksnorm_id).
+    2) Haal de totalen per gebruiksnorm uit bemesting_samenvatting en alleen de
+       5 meest recente bemestingen per norm (preview).
     3) Bouw GeoJSON features per perceel/norm met werkzame totalen & percentages.
+    Optioneel ?zoom= / ?tolerantie= / ?precisie=: vereenvoudigde en afgeronde
+    polygonen (zie geometrie_encoding).
     """
     try:
         jaar = request.args.get('jaar')
@@ -303,34 +363,52 @@ def api_map_percelen():
 
             norm_ids = [r['gebruiksnorm_id'] for r in normen_rows]
 
-            # 2) Alle bemestingen voor deze norm_ids
-            placeholders = ",".join(["%s"] * len(norm_ids))
-            c.execute(f"""
+            # 2a) Totalen per norm uit de gematerialiseerde samenvatting (alle bemestingsjaren)
+            c.execute("""
                 SELECT
-                    b.id,
-                    b.gebruiksnorm_id,
-                    b.datum,
-                    COALESCE(b.werkzame_n_kg_ha, 0)    AS werkzame_n_kg_ha,
-                    COALESCE(b.werkzame_p2o5_kg_ha, 0) AS werkzame_p2o5_kg_ha,
-                    COALESCE(b.n_dierlijk_kg_ha, 0)    AS n_dierlijk_kg_ha,
-                    COALESCE(b.k2o_kg_ha, 0)           AS k2o_kg_ha,
-                    COALESCE(b.hoeveelheid_kg_ha, 0)   AS hoeveelheid_kg_ha,
-                    b.eigen_bedrijf,
-                    uf.meststof,
-                    uf.toepassing
-                FROM bemestingen b
-                LEFT JOIN universal_fertilizers uf ON uf.id = b.meststof_id
-                WHERE b.gebruiksnorm_id IN ({placeholders})
-                ORDER BY b.datum DESC
-            """, norm_ids)
-            bem_rows = _rows_to_dicts(c)
-
-            # index: gebruiksnorm_id -> lijst bemestingen
-            bem_index = {}
-            for br in bem_rows:
-                bem_index.setdefault(br['gebruiksnorm_id'], []).append(br)
+                    gebruiksnorm_id,
+                    SUM(aantal)              AS aantal,
+                    SUM(werkzame_n_kg_ha)    AS werkzame_n_kg_ha,
+                    SUM(n_dierlijk_kg_ha)    AS n_dierlijk_kg_ha,
+                    SUM(werkzame_p2o5_kg_ha) AS werkzame_p2o5_kg_ha,
+                    SUM(k2o_kg_ha)           AS k2o_kg_ha,
+                    MAX(laatste_datum)       AS laatste_datum
+                FROM bemesting_samenvatting
+                WHERE gebruiksnorm_id = ANY(%s)
+                GROUP BY gebruiksnorm_id
+            """, (norm_ids,))
+            totalen_index = {r['gebruiksnorm_id']: r for r in _rows_to_dicts(c)}
+
+            # 2b) Alleen de 5 meest recente bemestingen per norm voor de preview
+            c.execute("""
+                SELECT * FROM (
+                    SELECT
+                        b.gebruiksnorm_id,
+                        b.datum,
+                        COALESCE(b.werkzame_n_kg_ha, 0)    AS werkzame_n_kg_ha,
+                        COALESCE(b.werkzame_p2o5_kg_ha, 0) AS werkzame_p2o5_kg_ha,
+                        COALESCE(b.n_dierlijk_kg_ha, 0)    AS n_dierlijk_kg_ha,
+                        COALESCE(b.k2o_kg_ha, 0)           AS k2o_kg_ha,
+                        COALESCE(b.hoeveelheid_kg_ha, 0)   AS hoeveelheid_kg_ha,
+                        b.eigen_bedrijf,
+                        uf.meststof,
+                        uf.toepassing,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY b.gebruiksnorm_id ORDER BY b.datum DESC, b.id DESC
+                        ) AS rn
+                    FROM bemestingen b
+                    LEFT JOIN universal_fertilizers uf ON uf.id = b.meststof_id
+                    WHERE b.gebruiksnorm_id = ANY(%s)
+                ) x
+                WHERE x.rn <= 5
+                ORDER BY x.gebruiksnorm_id, x.rn
+            """, (norm_ids,))
+            preview_index = {}
+            for br in _rows_to_dicts(c):
+                preview_index.setdefault(br['gebruiksnorm_id'], []).append(br)
 
             features = []
+            enc = encoding_uit_request(request.args)
 
             # 3) Bouw per norm/perceel één feature
             for row in normen_rows:
@@ -345,41 +423,34 @@ def api_map_percelen():
                 norm_fosfaat_totaal   = float(row['fosfaat_norm_kg_ha'] or 0)        * oppervlakte
 
                 # Werkelijke totalen op basis van WERKZAME/registratiewaardes
-                eff_n_total      = 0.0
-                eff_n_dier_total = 0.0
-                eff_p2o5_total   = 0.0
-                eff_k2o_total    = 0.0
-                preview          = []
-
-                bem_for_norm = bem_index.get(gn_id, [])
-
-                for idx, bem in enumerate(bem_for_norm):
+                totalen = totalen_index.get(gn_id) or {}
+                eff_n_total      = float(totalen.get('werkzame_n_kg_ha') or 0)    * oppervlakte
+                eff_n_dier_total = float(totalen.get('n_dierlijk_kg_ha') or 0)    * oppervlakte
+                eff_p2o5_total   = float(totalen.get('werkzame_p2o5_kg_ha') or 0) * oppervlakte
+                eff_k2o_total    = float(totalen.get('k2o_kg_ha') or 0)           * oppervlakte
+                bemestingen_count = int(totalen.get('aantal') or 0)
+
+                preview = []
+                for bem in preview_index.get(gn_id, []):
                     n_tot   = float(bem['werkzame_n_kg_ha'])    * oppervlakte
                     n_d_tot = float(bem['n_dierlijk_kg_ha'])    * oppervlakte
                     p_tot   = float(bem['werkzame_p2o5_kg_ha']) * oppervlakte
                     k_tot   = float(bem['k2o_kg_ha'])           * oppervlakte
-
-                    eff_n_total      += n_tot
-                    eff_n_dier_total += n_d_tot
-                    eff_p2o5_total   += p_tot
-                    eff_k2o_total    += k_tot
-
-                    if idx < 5:
-                        preview.append({
-                            'datum': bem['datum'],
-                            'meststof': bem['meststof'] or '-',
-                            'toepassing': bem['toepassing'] or '-',
-                            'hoeveelheid_kg_ha': round(float(bem['hoeveelheid_kg_ha'] or 0), 1),
-                            'werkzame_n_kg_ha': round(float(bem['werkzame_n_kg_ha'] or 0), 1),
-                            'werkzame_p2o5_kg_ha': round(float(bem['werkzame_p2o5_kg_ha'] or 0), 1),
-                            'n_dierlijk_kg_ha': round(float(bem['n_dierlijk_kg_ha'] or 0), 1),
-                            'k2o_kg_ha': round(float(bem['k2o_kg_ha'] or 0), 1),
-                            'werkzame_n_totaal': round(n_tot, 1),
-                            'werkzame_n_dier_totaal': round(n_d_tot, 1),
-                            'werkzame_p2o5_totaal': round(p_tot, 1),
-                            'k2o_totaal': round(k_tot, 1),
-                            'eigen_bedrijf': bem['eigen_bedrijf'],
-                        })
+                    preview.append({
+                        'datum': bem['datum'],
+                        'meststof': bem['meststof'] or '-',
+                        'toepassing': bem['toepassing'] or '-',
+                        'hoeveelheid_kg_ha': round(float(bem['hoeveelheid_kg_ha'] or 0), 1),
+                        'werkzame_n_kg_ha': round(float(bem['werkzame_n_kg_ha'] or 0), 1),
+                        'werkzame_p2o5_kg_ha': round(float(bem['werkzame_p2o5_kg_ha'] or 0), 1),
+                        'n_dierlijk_kg_ha': round(float(bem['n_dierlijk_kg_ha'] or 0), 1),
+                        'k2o_kg_ha': round(float(bem['k2o_kg_ha'] or 0), 1),
+                        'werkzame_n_totaal': round(n_tot, 1),
+                        'werkzame_n_dier_totaal': round(n_d_tot, 1),
+                        'werkzame_p2o5_totaal': round(p_tot, 1),
+                        'k2o_totaal': round(k_tot, 1),
+                        'eigen_bedrijf': bem['eigen_bedrijf'],
+                    })
 
                 # percentages voor kleur/labels (K₂O heeft geen norm)
                 usage_n_percent      = (eff_n_total      / norm_stikstof_totaal * 100) if norm_stikstof_totaal  > 0 else 0
@@ -387,7 +458,7 @@ def api_map_percelen():
                 usage_p_percent      = (eff_p2o5_total   / norm_fosfaat_totaal  * 100) if norm_fosfaat_totaal  > 0 else 0
 
                 # laatste datum
-                last_date_formatted = bem_for_norm[0]['datum'] if bem_for_norm else '-'
+                last_date_formatted = totalen.get('laatste_datum') or '-'
 
                 # Polygon -> GeoJSON
                 geometry = None
@@ -404,7 +475,7 @@ def api_map_percelen():
                         if len(coordinates) >= 3:
                             if coordinates[0] != coordinates[-1]:
                                 coordinates.append(coordinates[0])
-                            geometry = {'type': 'Polygon', 'coordinates': [coordinates]}
+                            geometry = enc.geometrie({'type': 'Polygon', 'coordinates': [coordinates]})
                 except Exception as e:
                     logger.warning(f"Polygon parse failed voor {perceelnaam}: {e}")
 
@@ -441,7 +512,7 @@ def api_map_percelen():
                         'usage_p_percent': round(usage_p_percent, 1),
 
                         # Bemestingsstatistieken
-                        'bemestingen_count': len(bem_for_norm),
+                        'bemestingen_count': bemestingen_count,
                         'bemestingen_last_date': last_date_formatted,
                         'preview_bemestingen': preview
                     }
@@ -2,11 +2,13 @@ from flask import Blueprint, render_template, request, redirect, flash, session,
 import uuid
 
 import app.models.database_beheer as db
+from app.services.response_cache import response_cache
 from app.gebruikers.auth_utils import (
     hash_password,
     login_user,
     register_user,
     login_required,
+    admin_required,
     get_user_by_email,           # NEW
     create_reset_token,          # NEW
     verify_reset_token,          # NEW
@@ -348,6 +350,72 @@ def list_json():
     return jsonify(data)
 
 
+@gebruikers_bp.route('/admin/db_pool', methods=['GET'])
+@login_required
+@admin_required
+def admin_db_pool():
+    """Statistieken van de databaseverbinding-pool van dit worker-proces."""
+    return jsonify(db.pool_stats())
+
+
+@gebruikers_bp.route('/admin/response_cache', methods=['GET'])
+@login_required
+@admin_required
+def admin_response_cache():
+    """Hits/misses/304's en vulling van de response-, tile- en PDOK-cache van dit worker-proces."""
+    from app.tiles.routes import tile_cache
+    from app.services.pdok_gewaspercelen import cache_stats as pdok_cache_stats
+
+    stats = response_cache.stats()
+    stats["tiles"] = tile_cache.stats()
+    stats["pdok_brp"] = pdok_cache_stats()
+    return jsonify(stats)
+
+
+@gebruikers_bp.route('/admin/bodemkaart_cache', methods=['GET'])
+@login_required
+@admin_required
+def admin_bodemkaart_cache():
+    """Hit-ratio (dit worker-proces) en vulling van de persistente Bodemkaart-cache."""
+    from app.services.bodemkaart_cache import bodemkaart_cache
+
+    if bodemkaart_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(bodemkaart_cache.stats(), enabled=True))
+
+
+@gebruikers_bp.route('/admin/rvo_cache', methods=['GET'])
+@login_required
+@admin_required
+def admin_rvo_cache():
+    """Hit-ratio (dit worker-proces) en vulling van de gedeelde RVO-cache."""
+    from app.services.rvo_cache import rvo_cache
+
+    if rvo_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(rvo_cache.stats(), enabled=True))
+
+
+@gebruikers_bp.route('/admin/geodata', methods=['GET'])
+@login_required
+@admin_required
+def admin_geodata():
+    """Circuit breakers van de externe geodata-diensten (dit worker-proces): staat, fouten en trips."""
+    from app.services.weerbaarheid import breaker_stats
+
+    return jsonify(breaker_stats())
+
+
+@gebruikers_bp.route('/admin/jobs', methods=['GET'])
+@login_required
+@admin_required
+def admin_jobs():
+    """Jobqueue: aantallen per soort en status, werkers in dit proces."""
+    from app.services.jobs import wachtrij_stats
+
+    return jsonify(wachtrij_stats())
+
+
 # ---------------------------
 # Wachtwoord vergeten
 # ---------------------------
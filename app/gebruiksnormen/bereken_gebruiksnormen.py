@@ -1,185 +1,195 @@
-import app.models.database_beheer as db
-
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
 
-def get_best_year(c, table: str, jaar: int):
+import app.models.database_beheer as db
+from app.gebruiksnormen.fosfaat_index import get_fosfaat_index
+from app.models.referentie_cache import get_normtabellen
+
+
+def _beste_jaar(jaren: Sequence[int], jaar: int):
+    """Hoogste jaar <= gegeven jaar uit een gesorteerde lijst (SQL: MAX(jaar) WHERE jaar <= %s)."""
+    i = bisect_right(jaren, jaar)
+    return jaren[i - 1] if i else None
+
+
+@dataclass
+class NormAanvraag:
+    perceel_id: str
+    gewas_id: str
+    jaar: Optional[int] = None
+    derogatie: int = 0
+
+
+@dataclass
+class NormResultaat:
+    perceel_id: str
+    gewas_id: str
+    jaar: Optional[int]
+    derogatie: int
+    perceel_gevonden: bool = False
+    gewas_gevonden: bool = False
+    type_land: Optional[str] = None
+    p_al: Optional[float] = None
+    p_cacl2: Optional[float] = None
+    stikstof_norm: Optional[float] = None
+    fosfaat_norm: Optional[float] = None
+    stikstof_dierlijk: Optional[float] = None
+    fosfaatnorm_id: Optional[str] = None
+    derogatienorm_id: Optional[str] = None
+
+
+def _to_float_or_none(value):
+    if value is None:
+        return None
+    return float(str(value).replace(',', '.'))
+
+
+def _kies_stikstof_kolom(norm_row: Tuple, grondsoort: str):
+    # norm_row: (n_klei, n_noordwestcentraal_zand, n_zuid_zand, n_loss, n_veen)
+    if 'klei' in grondsoort:
+        return norm_row[0]
+    if 'noord' in grondsoort or 'west' in grondsoort or 'centraal' in grondsoort:
+        return norm_row[1]
+    if 'zuid' in grondsoort:
+        return norm_row[2]
+    if 'löss' in grondsoort:
+        return norm_row[3]
+    if 'veen' in grondsoort:
+        return norm_row[4]
+    return None
+
+
+def bereken_normen(c, aanvragen: Sequence[NormAanvraag]) -> List[NormResultaat]:
     """
-    Zoek het hoogste jaar <= gegeven jaar in de opgegeven tabel.
-    Let op: 'table' komt alleen uit vaste waardes in de code (geen user-input).
+    Bereken stikstofnorm, fosfaatnorm en dierlijke stikstofnorm (plus
+    fosfaatnorm_id / derogatienorm_id) voor één of meer aanvragen, met één
+    cursor: alleen de percelen worden opgevraagd, de normtabellen komen uit de
+    referentie-cache (app.models.referentie_cache).
+    Resultaten komen terug in dezelfde volgorde als de aanvragen.
     """
-    q = f"SELECT MAX(jaar) FROM {table} WHERE jaar <= %s"
-    c.execute(q, (jaar,))
-    row = c.fetchone()
-    return row[0] if row else None
-
-
-def bereken_fosfaatnorm(perceel_id, gewas_id, jaar=None):
-    conn = db.get_connection()
-    c = conn.cursor()
-    try:
-        # Perceel ophalen
-        c.execute(
-            'SELECT grondsoort, p_al, p_cacl2 FROM percelen WHERE id=%s',
-            (perceel_id,)
-        )
-        perceel = c.fetchone()
-        if not perceel:
-            return None
-
-        # p_al en p_cacl2 altijd als float
-        try:
-            p_al = float(str(perceel[1]).replace(',', '.')) if perceel[1] is not None else None
-            p_cacl2 = float(str(perceel[2]).replace(',', '.')) if perceel[2] is not None else None
-        except ValueError:
-            return None
-
-        if p_al is None or p_cacl2 is None:
-            return None
-
-        # Gewas ophalen
-        c.execute(
-            'SELECT gewas, jaar FROM stikstof_gewassen_normen WHERE id=%s',
-            (gewas_id,)
-        )
-        gewas_row = c.fetchone()
-        if not gewas_row:
-            return None
-
-        gewas_naam, gewas_jaar = gewas_row[0].lower(), gewas_row[1]
-        lookup_jaar = jaar if jaar is not None else gewas_jaar
-
-        # Beste jaar (hoogste jaar <= gekozen jaar)
-        best_year = get_best_year(c, 'fosfaat_normen', lookup_jaar)
-        if best_year is None:
-            return None
-
-        type_land = 'grasland' if 'gras' in gewas_naam else 'bouwland'
-
-        # Zoek rij waarbij perceelwaarden TUSSEN van/tot liggen
-        c.execute(
-            '''
-            SELECT norm_kg
-            FROM fosfaat_normen
-            WHERE jaar = %s
-              AND LOWER(type_land) = LOWER(%s)
-              AND %s BETWEEN LEAST(p_cacl2_van, p_cacl2_tot) 
-                        AND GREATEST(p_cacl2_van, p_cacl2_tot)
-              AND %s BETWEEN LEAST(p_al_van, p_al_tot)
-                        AND GREATEST(p_al_van, p_al_tot)      
-            ORDER BY p_cacl2_van, p_al_van
-            LIMIT 1
-            ''',
-            (best_year, type_land, p_cacl2, p_al)
+    resultaten = [
+        NormResultaat(
+            perceel_id=a.perceel_id,
+            gewas_id=a.gewas_id,
+            jaar=a.jaar,
+            derogatie=int(a.derogatie or 0),
         )
-        norm_row = c.fetchone()
-        return float(norm_row[0]) if norm_row else None
-
-    finally:
-        conn.close()
-
-
-def bereken_stikstofnorm(gewas_id, perceel_id, jaar=None):
+        for a in aanvragen
+    ]
+    if not resultaten:
+        return resultaten
+
+    perceel_ids = sorted({str(a.perceel_id) for a in aanvragen})
+
+    # Percelen: de enige query; normtabellen komen uit de referentie-cache
+    c.execute(
+        'SELECT id, grondsoort, p_al, p_cacl2, nv_gebied FROM percelen WHERE id = ANY(%s)',
+        (perceel_ids,)
+    )
+    percelen = {str(r[0]): r[1:] for r in c.fetchall()}
+
+    normen = get_normtabellen(c=c)
+    if any(str(a.gewas_id) not in normen["gewassen"] for a in aanvragen):
+        # Mogelijk net toegevoegd door een ander proces: versies direct controleren
+        normen = get_normtabellen(force_check=True, c=c)
+    gewassen = normen["gewassen"]
+    stikstof_rows = normen["stikstof"]
+    derogatie_rows = normen["derogatie"]
+
+    best_years: Dict[int, Tuple] = {}
+    for a in aanvragen:
+        gewas = gewassen.get(str(a.gewas_id))
+        if gewas:
+            jaar = int(a.jaar if a.jaar is not None else gewas[0])
+            if jaar not in best_years:
+                best_years[jaar] = (
+                    _beste_jaar(normen["stikstof_jaren"], jaar),
+                    _beste_jaar(normen["fosfaat_jaren"], jaar),
+                    _beste_jaar(normen["derogatie_jaren"], jaar),
+                )
+
+    fosfaat_vragen: Dict[Tuple[int, str], List[NormResultaat]] = {}
+    for res in resultaten:
+        perceel = percelen.get(str(res.perceel_id))
+        gewas = gewassen.get(str(res.gewas_id))
+        res.perceel_gevonden = perceel is not None
+        res.gewas_gevonden = gewas is not None
+        if not gewas:
+            continue
+
+        grondsoort = (perceel[0] or '').lower() if perceel else ''
+        nv_gebied = perceel[3] if perceel else 0
+        gewas_jaar, gewas_naam = gewas[0], gewas[1]
+        is_gras = 'gras' in gewas_naam.lower()
+        res.type_land = 'grasland' if is_gras else 'bouwland'
+
+        lookup_jaar = res.jaar if res.jaar is not None else gewas_jaar
+        best_stikstof, best_fosfaat, best_derogatie = best_years.get(int(lookup_jaar), (None, None, None))
+
+        # Stikstof
+        norm_row = stikstof_rows.get((best_stikstof, gewas_naam)) if best_stikstof is not None else None
+        if norm_row:
+            norm = _kies_stikstof_kolom(norm_row, grondsoort)
+            if norm is not None and nv_gebied == 1:
+                norm = norm * 0.8
+            res.stikstof_norm = round(norm, 2) if norm is not None else None
+
+        # Fosfaat
+        if perceel and best_fosfaat is not None:
+            try:
+                res.p_al = _to_float_or_none(perceel[1])
+                res.p_cacl2 = _to_float_or_none(perceel[2])
+            except ValueError:
+                res.p_al = res.p_cacl2 = None
+            if res.p_al is not None and res.p_cacl2 is not None:
+                fosfaat_vragen.setdefault((best_fosfaat, res.type_land), []).append(res)
+
+        # Dierlijke stikstof (derogatie)
+        # nv_gebied NULL (bv. verrijking nog bezig) matcht geen derogatieregel,
+        # zoals `nv_gebied = %s` in SQL
+        if best_derogatie is not None and nv_gebied is not None:
+            derogatie_keuze = 1 if is_gras and res.derogatie else 0
+            match = derogatie_rows.get((best_derogatie, nv_gebied, derogatie_keuze))
+            if match:
+                res.derogatienorm_id = match[0]
+                res.stikstof_dierlijk = float(match[1])
+
+    # Fosfaat: per (jaar, type_land) één vectorised opzoeking in de interval-index
+    if fosfaat_vragen:
+        index = get_fosfaat_index(c)
+        for (jaar, type_land), groep in fosfaat_vragen.items():
+            matches = index.zoek_many(
+                jaar, type_land, [r.p_cacl2 for r in groep], [r.p_al for r in groep]
+            )
+            for res, match in zip(groep, matches):
+                if match:
+                    res.fosfaatnorm_id = match[0]
+                    res.fosfaat_norm = float(match[7])
+
+    return resultaten
+
+
+def bereken_norm(c, perceel_id, gewas_id, jaar=None, derogatie=0) -> NormResultaat:
+    """Eén aanvraag; zie bereken_normen()."""
+    return bereken_normen(c, [NormAanvraag(perceel_id, gewas_id, jaar, derogatie)])[0]
+
+
+def _bereken_los(perceel_id, gewas_id, jaar=None, derogatie=0) -> NormResultaat:
     conn = db.get_connection()
-    c = conn.cursor()
     try:
-        # Perceel
-        c.execute(
-            'SELECT grondsoort, nv_gebied FROM percelen WHERE id=%s',
-            (perceel_id,)
-        )
-        perceel = c.fetchone()
-        grondsoort = perceel[0].lower() if perceel and perceel[0] else ''
-        nv_gebied = perceel[1] if perceel else 0
-
-        # Gewas
-        c.execute(
-            'SELECT * FROM stikstof_gewassen_normen WHERE id=%s',
-            (gewas_id,)
-        )
-        gewas = c.fetchone()
-        if not gewas:
-            return None
-
-        gewas_jaar = gewas[1]
-        lookup_jaar = jaar if jaar is not None else gewas_jaar
-
-        best_year = get_best_year(c, 'stikstof_gewassen_normen', lookup_jaar)
-        if best_year is None:
-            return None
-
-        c.execute(
-            'SELECT * FROM stikstof_gewassen_normen WHERE jaar=%s AND gewas=%s',
-            (best_year, gewas[2])
-        )
-        norm_row = c.fetchone()
-        if not norm_row:
-            return None
-
-        # Kolommen: [0]=id, [1]=jaar, [2]=gewas,
-        # [3]=klei, [4]=noord/west/centraal zand, [5]=zuid zand,
-        # [6]=löss, [7]=veen  (zelfde als je oude code)
-        if 'klei' in grondsoort:
-            norm = norm_row[3]
-        elif 'noord' in grondsoort or 'west' in grondsoort or 'centraal' in grondsoort:
-            norm = norm_row[4]
-        elif 'zuid' in grondsoort:
-            norm = norm_row[5]
-        elif 'löss' in grondsoort:
-            norm = norm_row[6]
-        elif 'veen' in grondsoort:
-            norm = norm_row[7]
-        else:
-            norm = None
-
-        if norm is not None and nv_gebied == 1:
-            norm = norm * 0.8
-
-        return round(norm, 2) if norm is not None else None
-
+        return bereken_norm(conn.cursor(), perceel_id, gewas_id, jaar, derogatie)
     finally:
         conn.close()
 
 
-def bereken_stikstof_dierlijk_kg_ha(bedrijf_id, perceel_id, gewas_id, derogatie, jaar=None):
-    conn = db.get_connection()
-    c = conn.cursor()
-    try:
-        # NV-gebied
-        c.execute(
-            'SELECT nv_gebied FROM percelen WHERE id=%s',
-            (perceel_id,)
-        )
-        perceel = c.fetchone()
-        nv_gebied = perceel[0] if perceel else 0
-
-        # Gewas
-        c.execute(
-            'SELECT jaar, gewas FROM stikstof_gewassen_normen WHERE id=%s',
-            (gewas_id,)
-        )
-        gewas = c.fetchone()
-        if not gewas:
-            return None
+def bereken_fosfaatnorm(perceel_id, gewas_id, jaar=None):
+    return _bereken_los(perceel_id, gewas_id, jaar).fosfaat_norm
 
-        gewas_jaar, gewas_naam = gewas[0], gewas[1].lower()
-        lookup_jaar = jaar if jaar is not None else gewas_jaar
 
-        best_year = get_best_year(c, 'derogatie_normen', lookup_jaar)
-        if best_year is None:
-            return None
+def bereken_stikstofnorm(gewas_id, perceel_id, jaar=None):
+    return _bereken_los(perceel_id, gewas_id, jaar).stikstof_norm
 
-        is_gras = 'gras' in gewas_naam
-        derogatie_keuze = 1 if is_gras and derogatie else 0
 
-        c.execute(
-            '''
-            SELECT stikstof_norm_kg_ha FROM derogatie_normen
-            WHERE jaar=%s AND nv_gebied=%s AND derogatie=%s
-            LIMIT 1
-            ''',
-            (best_year, nv_gebied, derogatie_keuze)
-        )
-        norm_row = c.fetchone()
-        return float(norm_row[0]) if norm_row else None
-
-    finally:
-        conn.close()
+def bereken_stikstof_dierlijk_kg_ha(bedrijf_id, perceel_id, gewas_id, derogatie, jaar=None):
+    return _bereken_los(perceel_id, gewas_id, jaar, derogatie).stikstof_dierlijk
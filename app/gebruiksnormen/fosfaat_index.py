@@ -0,0 +1,145 @@
+import struct
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.referentie_cache import ref_cache
+
+"""
+In-memory interval-index voor fosfaat_normen.
+
+Per (jaar, type_land) worden de p_cacl2- en p_al-grenzen van alle klassen
+opgedeeld in elementaire cellen (elke grenswaarde is een eigen cel, plus de
+open stukken ertussen). Voor iedere (p_cacl2-cel, p_al-cel) wordt vooraf de
+rij bepaald die de SQL-query zou teruggeven:
+
+    WHERE jaar = %s AND LOWER(type_land) = %s
+      AND p_cacl2 BETWEEN LEAST(p_cacl2_van, p_cacl2_tot) AND GREATEST(...)
+      AND p_al    BETWEEN LEAST(p_al_van, p_al_tot)       AND GREATEST(...)
+    ORDER BY p_cacl2_van, p_al_van LIMIT 1
+
+Een opzoeking is daarmee twee binary searches (O(log n)); zoek_many() doet
+hetzelfde met numpy.searchsorted voor hele arrays percelen tegelijk.
+p_cacl2 is een REAL-kolom: grenzen worden als float4 -> float8 vergeleken,
+net als in PostgreSQL.
+"""
+
+# (id, jaar, type_land, p_cacl2_van, p_cacl2_tot, p_al_van, p_al_tot, norm_kg)
+FosfaatRij = Tuple
+
+
+def _as_real(value):
+    return struct.unpack('f', struct.pack('f', float(value)))[0]
+
+
+def _cel_index(grenzen: Sequence[float], x: float) -> int:
+    """Cel 2i+1 = precies grens i, cel 2i = open stuk vóór grens i."""
+    i = bisect_left(grenzen, x)
+    if i < len(grenzen) and grenzen[i] == x:
+        return 2 * i + 1
+    return 2 * i
+
+
+def _cel_index_many(grenzen: np.ndarray, x: np.ndarray) -> np.ndarray:
+    i = np.searchsorted(grenzen, x, side='left')
+    gelijk = np.zeros(x.shape, dtype=bool)
+    binnen = i < len(grenzen)
+    gelijk[binnen] = grenzen[i[binnen]] == x[binnen]
+    return 2 * i + gelijk
+
+
+class FosfaatKlasseIndex:
+    """Index voor één (jaar, type_land)."""
+
+    def __init__(self, rows: Sequence[FosfaatRij]):
+        self.rows = list(rows)
+        c_lo, c_hi, a_lo, a_hi = [], [], [], []
+        for r in self.rows:
+            c_van, c_tot = _as_real(r[3]), _as_real(r[4])
+            a_van, a_tot = float(r[5]), float(r[6])
+            c_lo.append(min(c_van, c_tot))
+            c_hi.append(max(c_van, c_tot))
+            a_lo.append(min(a_van, a_tot))
+            a_hi.append(max(a_van, a_tot))
+
+        self.c_grenzen = np.array(sorted(set(c_lo) | set(c_hi)), dtype=np.float64)
+        self.a_grenzen = np.array(sorted(set(a_lo) | set(a_hi)), dtype=np.float64)
+        # Dezelfde grenzen als lijst voor zoek(): bisect op een lijst, geen conversie per opzoeking
+        self._c_list, self._a_list = c_list, a_list = self.c_grenzen.tolist(), self.a_grenzen.tolist()
+
+        # -1 = geen klasse; cel 0 en de laatste cel liggen buiten alle grenzen
+        self.grid = np.full((2 * len(c_list) + 1, 2 * len(a_list) + 1), -1, dtype=np.int32)
+
+        # ORDER BY p_cacl2_van, p_al_van; bij gelijke sleutel wint de eerste rij.
+        volgorde = sorted(
+            range(len(self.rows)),
+            key=lambda i: (_as_real(self.rows[i][3]), self.rows[i][5]),
+        )
+        for i in volgorde:
+            c0, c1 = _cel_index(c_list, c_lo[i]), _cel_index(c_list, c_hi[i])
+            a0, a1 = _cel_index(a_list, a_lo[i]), _cel_index(a_list, a_hi[i])
+            blok = self.grid[c0:c1 + 1, a0:a1 + 1]
+            blok[blok == -1] = i
+
+    def zoek(self, p_cacl2: float, p_al: float) -> Optional[FosfaatRij]:
+        ci = _cel_index(self._c_list, p_cacl2)
+        ai = _cel_index(self._a_list, p_al)
+        idx = int(self.grid[ci, ai])
+        return self.rows[idx] if idx >= 0 else None
+
+    def zoek_many(self, p_cacl2: Iterable[float], p_al: Iterable[float]) -> np.ndarray:
+        """
+        Vectorised: geeft per punt de index in self.rows terug (-1 = geen klasse).
+        NaN-waarden vallen nergens binnen en leveren -1 op.
+        """
+        c = np.asarray(p_cacl2, dtype=np.float64)
+        a = np.asarray(p_al, dtype=np.float64)
+        if len(self.rows) == 0 or c.size == 0:
+            return np.full(c.shape, -1, dtype=np.int32)
+        ci = _cel_index_many(self.c_grenzen, c)
+        ai = _cel_index_many(self.a_grenzen, a)
+        res = self.grid[ci, ai]
+        res[np.isnan(c) | np.isnan(a)] = -1
+        return res
+
+
+class FosfaatIndex:
+    """Alle fosfaat_normen, per (jaar, lower(type_land))."""
+
+    def __init__(self, rows: Iterable[FosfaatRij]):
+        groepen: Dict[Tuple[int, str], List[FosfaatRij]] = {}
+        for r in rows:
+            groepen.setdefault((r[1], (r[2] or '').lower()), []).append(tuple(r))
+        self.groepen = {k: FosfaatKlasseIndex(v) for k, v in groepen.items()}
+
+    def zoek(self, jaar: int, type_land: str, p_cacl2: float, p_al: float) -> Optional[FosfaatRij]:
+        groep = self.groepen.get((jaar, type_land))
+        if groep is None:
+            return None
+        return groep.zoek(p_cacl2, p_al)
+
+    def zoek_many(self, jaar: int, type_land: str,
+                  p_cacl2: Sequence[float], p_al: Sequence[float]) -> List[Optional[FosfaatRij]]:
+        """Vectorised opzoeking voor één (jaar, type_land); rijen of None, in invoervolgorde."""
+        groep = self.groepen.get((jaar, type_land))
+        if groep is None:
+            return [None] * len(p_cacl2)
+        return [groep.rows[i] if i >= 0 else None for i in groep.zoek_many(p_cacl2, p_al).tolist()]
+
+
+def _laad_fosfaat_index(c):
+    c.execute(
+        """
+        SELECT id, jaar, type_land, p_cacl2_van, p_cacl2_tot, p_al_van, p_al_tot, norm_kg
+        FROM fosfaat_normen
+        """
+    )
+    return FosfaatIndex(c.fetchall())
+
+
+ref_cache.register("fosfaat_index", ("fosfaat_normen",), _laad_fosfaat_index)
+
+
+def get_fosfaat_index(c=None) -> FosfaatIndex:
+    return ref_cache.get("fosfaat_index", c=c)
@@ -0,0 +1,297 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+import app.models.database_beheer as db
+from app.gebruiksnormen.fosfaat_index import get_fosfaat_index
+from app.models.referentie_cache import get_normtabellen
+from app.services.response_cache import invalideer_alle
+
+"""
+Bulk-herberekening van alle opgeslagen gebruiksnormen.
+
+Na een import van een nieuw normjaar of een wijziging in fosfaat_normen /
+derogatie_normen staan de opgeslagen stikstof_norm_kg_ha, fosfaat_norm_kg_ha
+en stikstof_dierlijk_kg_ha in `gebruiksnormen` niet meer gelijk aan wat
+bereken_normen() zou geven. Deze module rekent ze in één keer opnieuw uit:
+
+- één query: gebruiksnormen JOIN percelen (optioneel gefilterd op jaren);
+- de berekening zelf gebeurt kolomsgewijs met pandas/NumPy tegen de
+  referentie-cache en de fosfaat interval-index (zelfde regels als
+  bereken_normen);
+- alleen gewijzigde rijen worden teruggeschreven, met één
+  UPDATE ... FROM (VALUES ...) per chunk.
+
+Gebruik:
+    resultaat = herbereken_gebruiksnormen(jaren=[2025])
+    python -m app.gebruiksnormen.herberekening [jaar ...]
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+RESULTAAT_KOLOMMEN = [
+    "fosfaatnorm_id", "derogatienorm_id",
+    "stikstof_norm_kg_ha", "stikstof_dierlijk_kg_ha", "fosfaat_norm_kg_ha",
+]
+
+
+@dataclass
+class HerberekenResultaat:
+    totaal: int = 0
+    gewijzigd: int = 0
+    overgeslagen: int = 0           # gewas niet (meer) gevonden: niet aangeraakt
+    chunks: int = 0
+    duur_sec: float = 0.0
+    dry_run: bool = False
+    jaren: Optional[List[int]] = None
+
+    def samenvatting(self) -> str:
+        actie = "zouden wijzigen" if self.dry_run else "gewijzigd"
+        return (
+            f"{self.gewijzigd} van {self.totaal} gebruiksnormen {actie} "
+            f"({self.overgeslagen} overgeslagen) in {self.duur_sec:.2f}s"
+        )
+
+
+def _laad_gebruiksnormen(c, jaren: Optional[Sequence[int]]) -> pd.DataFrame:
+    sql = """
+        SELECT g.id, g.jaar, g.gewas_id, g.derogatie,
+               g.fosfaatnorm_id, g.derogatienorm_id,
+               g.stikstof_norm_kg_ha, g.stikstof_dierlijk_kg_ha, g.fosfaat_norm_kg_ha,
+               p.grondsoort, p.p_al, p.p_cacl2, p.nv_gebied
+        FROM gebruiksnormen g
+        JOIN percelen p ON p.id = g.perceel_id
+    """
+    params = ()
+    if jaren:
+        sql += " WHERE g.jaar = ANY(%s)"
+        params = (list(jaren),)
+    c.execute(sql, params)
+    kolommen = [d[0] for d in c.description]
+    return pd.DataFrame(c.fetchall(), columns=kolommen)
+
+
+def _beste_jaar_kolom(jaren: Sequence[int], waarden: np.ndarray) -> pd.Series:
+    """Vectorised _beste_jaar: hoogste jaar <= waarde, anders NaN."""
+    if not jaren:
+        return pd.Series(np.nan, index=range(len(waarden)))
+    arr = np.asarray(jaren, dtype=np.float64)
+    i = np.searchsorted(arr, waarden, side="right") - 1
+    uit = np.where(i >= 0, arr[np.clip(i, 0, None)], np.nan)
+    return pd.Series(uit)
+
+
+def _naar_float(kolom: pd.Series) -> pd.Series:
+    return pd.to_numeric(kolom.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+
+def bereken_normen_df(df: pd.DataFrame, normen=None, index=None, c=None) -> pd.DataFrame:
+    """
+    Kolomsgewijze variant van bereken_normen() voor een DataFrame met
+    jaar, gewas_id, derogatie, grondsoort, p_al, p_cacl2, nv_gebied.
+    Voegt gewas_gevonden en de nieuwe waarden (prefix 'nieuw_') toe.
+    Met `c` komen normtabellen en fosfaatindex via die verbinding.
+    """
+    normen = normen or get_normtabellen(c=c)
+    index = index or get_fosfaat_index(c)
+    df = df.reset_index(drop=True).copy()
+    n = len(df)
+
+    gewassen = normen["gewassen"]
+    gewas_info = df["gewas_id"].astype(str).map(gewassen)
+    df["gewas_gevonden"] = gewas_info.notna()
+    df["gewas_naam"] = gewas_info.map(lambda g: g[1] if isinstance(g, tuple) else None)
+    df["is_gras"] = df["gewas_naam"].fillna("").str.lower().str.contains("gras", regex=False)
+    df["type_land"] = np.where(df["is_gras"], "grasland", "bouwland")
+
+    jaar = df["jaar"].astype(np.float64).to_numpy()
+    df["best_stikstof"] = _beste_jaar_kolom(normen["stikstof_jaren"], jaar)
+    df["best_fosfaat"] = _beste_jaar_kolom(normen["fosfaat_jaren"], jaar)
+    df["best_derogatie"] = _beste_jaar_kolom(normen["derogatie_jaren"], jaar)
+
+    # ---- Stikstof ----
+    stikstof = pd.DataFrame(
+        [(k[0], k[1]) + tuple(v) for k, v in normen["stikstof"].items()],
+        columns=["best_stikstof", "gewas_naam", "n0", "n1", "n2", "n3", "n4"],
+    )
+    stikstof["best_stikstof"] = stikstof["best_stikstof"].astype(np.float64)
+    m = df[["best_stikstof", "gewas_naam"]].merge(
+        stikstof, on=["best_stikstof", "gewas_naam"], how="left"
+    )
+    grond = df["grondsoort"].fillna("").astype(str).str.lower()
+    keuzes = [
+        grond.str.contains("klei", regex=False),
+        grond.str.contains("noord", regex=False)
+        | grond.str.contains("west", regex=False)
+        | grond.str.contains("centraal", regex=False),
+        grond.str.contains("zuid", regex=False),
+        grond.str.contains("löss", regex=False),
+        grond.str.contains("veen", regex=False),
+    ]
+    waarden = [pd.to_numeric(m[k], errors="coerce").to_numpy() for k in ("n0", "n1", "n2", "n3", "n4")]
+    norm = np.select(keuzes, waarden, default=np.nan)
+    nv = pd.to_numeric(df["nv_gebied"], errors="coerce").to_numpy()
+    norm = np.where(nv == 1, norm * 0.8, norm)
+    # Python round() zoals bereken_normen, zodat grenswaarden gelijk afronden
+    df["nieuw_stikstof_norm_kg_ha"] = [None if np.isnan(v) else round(float(v), 2) for v in norm]
+
+    # ---- Fosfaat ----
+    df["nieuw_fosfaatnorm_id"] = None
+    df["nieuw_fosfaat_norm_kg_ha"] = None
+    p_al = _naar_float(df["p_al"])
+    p_cacl2 = _naar_float(df["p_cacl2"])
+    geldig = df["gewas_gevonden"] & df["best_fosfaat"].notna() & p_al.notna() & p_cacl2.notna()
+    for (bj, type_land), groep in df[geldig].groupby(["best_fosfaat", "type_land"]):
+        klasse = index.groepen.get((int(bj), type_land))
+        if klasse is None:
+            continue
+        idx = klasse.zoek_many(p_cacl2[groep.index].to_numpy(), p_al[groep.index].to_numpy())
+        gevonden = idx >= 0
+        rijen = groep.index[gevonden]
+        df.loc[rijen, "nieuw_fosfaatnorm_id"] = [klasse.rows[i][0] for i in idx[gevonden]]
+        df.loc[rijen, "nieuw_fosfaat_norm_kg_ha"] = [float(klasse.rows[i][7]) for i in idx[gevonden]]
+
+    # ---- Dierlijke stikstof (derogatie) ----
+    derogatie = pd.DataFrame(
+        [(k[0], k[1], k[2], v[0], v[1]) for k, v in normen["derogatie"].items()],
+        columns=["best_derogatie", "nv_key", "derogatie_keuze", "d_id", "d_norm"],
+    )
+    derogatie["best_derogatie"] = derogatie["best_derogatie"].astype(np.float64)
+    derogatie["nv_key"] = pd.to_numeric(derogatie["nv_key"], errors="coerce").fillna(-1).astype(np.int64)
+    derogatie["derogatie_keuze"] = pd.to_numeric(derogatie["derogatie_keuze"], errors="coerce").fillna(-1).astype(np.int64)
+    keuze = (df["is_gras"] & (pd.to_numeric(df["derogatie"], errors="coerce").fillna(0) != 0)).astype(np.int64)
+    sleutel = pd.DataFrame({
+        "best_derogatie": df["best_derogatie"],
+        # NULL nv_gebied matcht niets (SQL: nv_gebied = NULL), ook geen NULL in de normtabel
+        "nv_key": pd.Series(nv).fillna(-2).astype(np.int64),
+        "derogatie_keuze": keuze,
+    })
+    md = sleutel.merge(derogatie, on=["best_derogatie", "nv_key", "derogatie_keuze"], how="left")
+    df["nieuw_derogatienorm_id"] = [None if pd.isna(v) else v for v in md["d_id"].to_numpy()]
+    df["nieuw_stikstof_dierlijk_kg_ha"] = [
+        None if pd.isna(v) else float(v) for v in md["d_norm"].to_numpy()
+    ]
+
+    # Zonder gewas doet bereken_normen niets; die rijen laten we ongemoeid
+    for k in RESULTAAT_KOLOMMEN:
+        df.loc[~df["gewas_gevonden"], "nieuw_" + k] = None
+    assert len(df) == n
+    return df
+
+
+def _real_gelijk(oud: pd.Series, nieuw: pd.Series) -> np.ndarray:
+    """Vergelijk zoals de REAL-kolom het opslaat (float4); NULL == NULL."""
+    a = pd.to_numeric(oud, errors="coerce").to_numpy(dtype=np.float64).astype(np.float32)
+    b = pd.to_numeric(nieuw, errors="coerce").to_numpy(dtype=np.float64).astype(np.float32)
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+def _tekst_gelijk(oud: pd.Series, nieuw: pd.Series) -> np.ndarray:
+    a = [None if pd.isna(x) else x for x in oud.to_numpy()]
+    b = [None if pd.isna(x) else x for x in nieuw.to_numpy()]
+    return np.array([x == y for x, y in zip(a, b)], dtype=bool)
+
+
+def gewijzigde_rijen(df: pd.DataFrame) -> pd.DataFrame:
+    gelijk = (
+        _tekst_gelijk(df["fosfaatnorm_id"], df["nieuw_fosfaatnorm_id"])
+        & _tekst_gelijk(df["derogatienorm_id"], df["nieuw_derogatienorm_id"])
+        & _real_gelijk(df["stikstof_norm_kg_ha"], df["nieuw_stikstof_norm_kg_ha"])
+        & _real_gelijk(df["stikstof_dierlijk_kg_ha"], df["nieuw_stikstof_dierlijk_kg_ha"])
+        & _real_gelijk(df["fosfaat_norm_kg_ha"], df["nieuw_fosfaat_norm_kg_ha"])
+    )
+    return df[df["gewas_gevonden"] & ~gelijk]
+
+
+def _schrijf_chunk(c, rows) -> None:
+    execute_values(
+        c,
+        """
+        UPDATE gebruiksnormen AS g SET
+            fosfaatnorm_id          = v.fosfaatnorm_id,
+            derogatienorm_id        = v.derogatienorm_id,
+            stikstof_norm_kg_ha     = v.stikstof_norm_kg_ha,
+            stikstof_dierlijk_kg_ha = v.stikstof_dierlijk_kg_ha,
+            fosfaat_norm_kg_ha      = v.fosfaat_norm_kg_ha
+        FROM (VALUES %s) AS v(
+            id, fosfaatnorm_id, derogatienorm_id,
+            stikstof_norm_kg_ha, stikstof_dierlijk_kg_ha, fosfaat_norm_kg_ha
+        )
+        WHERE g.id = v.id
+        """,
+        rows,
+        template="(%s, %s, %s, %s::real, %s::real, %s::real)",
+        page_size=len(rows),
+    )
+
+
+def herbereken_gebruiksnormen(jaren: Optional[Sequence[int]] = None,
+                              chunk_size: int = 5000,
+                              dry_run: bool = False) -> HerberekenResultaat:
+    """
+    Reken alle (of de opgegeven jaren van de) gebruiksnormen opnieuw uit en
+    schrijf de gewijzigde rijen terug. Alle chunks vallen in één transactie:
+    bij een fout wordt niets weggeschreven.
+    """
+    start = time.perf_counter()
+    resultaat = HerberekenResultaat(dry_run=dry_run, jaren=list(jaren) if jaren else None)
+
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        df = _laad_gebruiksnormen(c, jaren)
+        resultaat.totaal = len(df)
+        if df.empty:
+            conn.rollback()
+            resultaat.duur_sec = time.perf_counter() - start
+            return resultaat
+
+        berekend = bereken_normen_df(df, c=c)
+        resultaat.overgeslagen = int((~berekend["gewas_gevonden"]).sum())
+        gewijzigd = gewijzigde_rijen(berekend)
+        resultaat.gewijzigd = len(gewijzigd)
+
+        if dry_run or gewijzigd.empty:
+            conn.rollback()
+        else:
+            rows = list(zip(
+                gewijzigd["id"],
+                gewijzigd["nieuw_fosfaatnorm_id"],
+                gewijzigd["nieuw_derogatienorm_id"],
+                gewijzigd["nieuw_stikstof_norm_kg_ha"],
+                gewijzigd["nieuw_stikstof_dierlijk_kg_ha"],
+                gewijzigd["nieuw_fosfaat_norm_kg_ha"],
+            ))
+            for i in range(0, len(rows), chunk_size):
+                _schrijf_chunk(c, rows[i:i + chunk_size])
+                resultaat.chunks += 1
+            # normen van (mogelijk) alle gebruikers gewijzigd
+            invalideer_alle(conn)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        logger.exception("Herberekening gebruiksnormen mislukt")
+        raise
+    finally:
+        conn.close()
+
+    resultaat.duur_sec = time.perf_counter() - start
+    logger.info("Herberekening gebruiksnormen: %s", resultaat.samenvatting())
+    return resultaat
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = [a for a in sys.argv[1:] if a != "--dry-run"]
+    res = herbereken_gebruiksnormen(
+        jaren=[int(a) for a in args] or None,
+        dry_run="--dry-run" in sys.argv[1:],
+    )
+    print(res.samenvatting())
@@ -3,12 +3,11 @@ import uuid
 import pandas as pd
 
 import app.models.database_beheer as db
-from app.gebruiksnormen.bereken_gebruiksnormen import (
-    bereken_fosfaatnorm,
-    bereken_stikstofnorm,
-    bereken_stikstof_dierlijk_kg_ha,
-)
+from app.models.referentie_cache import get_gewassen
+from app.gebruiksnormen.bereken_gebruiksnormen import bereken_norm
 from app.gebruikers.auth_utils import login_required, effective_user_id
+from app.services.response_cache import registreer_invalidatie
+from app.services.perceel_verrijking import PENDING as VERRIJKING_PENDING
 
 gebruiksnormen_bp = Blueprint(
     'gebruiksnormen',
@@ -18,6 +17,9 @@ gebruiksnormen_bp = Blueprint(
     url_prefix='/gebruiksnormen'
 )
 
+# Schrijfacties maken de dashboard/kaart response-cache van de gebruiker ongeldig
+registreer_invalidatie(gebruiksnormen_bp)
+
 # ----------------- Helpers -----------------
 def ensure_indexes(conn):
     """Zachte migratie: maak unieke index als deze nog niet bestaat."""
@@ -29,32 +31,12 @@ def ensure_indexes(conn):
     conn.commit()
 
 
-def get_fosfaatnorm_id(c, jaar, type_land, p_cacl2, p_al):
-    c.execute(
-        """
-        SELECT id FROM fosfaat_normen
-        WHERE jaar=%s AND type_land=%s
-          AND %s >= p_cacl2_van AND %s <= p_cacl2_tot
-          AND %s >= p_al_van   AND %s <= p_al_tot
-        LIMIT 1
-        """,
-        (jaar, type_land, p_cacl2, p_cacl2, p_al, p_al),
-    )
-    row = c.fetchone()
-    return row[0] if row else None
-
-
-def get_derogatienorm_id(c, jaar, nv_gebied, derogatie):
-    c.execute(
-        """
-        SELECT id FROM derogatie_normen
-        WHERE jaar=%s AND nv_gebied=%s AND derogatie=%s
-        LIMIT 1
-        """,
-        (jaar, nv_gebied, derogatie),
-    )
-    row = c.fetchone()
-    return row[0] if row else None
+def _grondsoort_nog_bezig():
+    """409 voor een perceel waarvan grondsoort/NV-gebied nog op de achtergrond worden bepaald."""
+    return jsonify({
+        "success": False,
+        "message": "De grondsoort van dit perceel wordt nog bepaald; probeer het over enkele ogenblikken opnieuw.",
+    }), 409
 
 
 # ----------------- Routes -----------------
@@ -87,10 +69,9 @@ def gebruiksnormen():
         for r in c.fetchall()
     ]
 
-    c.execute('SELECT id, jaar, gewas FROM stikstof_gewassen_normen')
     gewassen = [
         {"id": str(r[0]), "naam": f"{r[2]} ({r[1]})", "jaar": r[1]}
-        for r in c.fetchall()
+        for r in get_gewassen(c)
     ]
 
     c.execute(
@@ -117,13 +98,15 @@ def gebruiksnormen():
             own_bedrijf = c.fetchone()
 
             c.execute(
-                'SELECT 1 FROM percelen WHERE id=%s AND user_id=%s',
+                'SELECT verrijking FROM percelen WHERE id=%s AND user_id=%s',
                 (perceel_id, eff_uid)
             )
             own_perceel = c.fetchone()
 
             if not own_bedrijf or not own_perceel:
                 return jsonify({"success": False, "message": "Geen toegang tot dit bedrijf/perceel"}), 403
+            if own_perceel[0] == VERRIJKING_PENDING:
+                return _grondsoort_nog_bezig()
 
             # Voorkom dubbele norm (zelfde user/perceel/jaar)
             c.execute(
@@ -134,47 +117,27 @@ def gebruiksnormen():
             if dup:
                 return jsonify({"success": False, "message": "Er bestaat al een norm voor dit perceel en jaar"}), 409
 
-            # Perceel + gewas ophalen
-            c.execute(
-                'SELECT grondsoort, p_al, p_cacl2, nv_gebied FROM percelen WHERE id=%s',
-                (perceel_id,)
-            )
-            perceel = c.fetchone()
-            if not perceel:
+            # Alle normen + norm-IDs in één keer (één verbinding, vast aantal queries)
+            normen_res = bereken_norm(c, perceel_id, gewas_id, jaar, derogatie)
+            if not normen_res.perceel_gevonden:
                 return jsonify({"success": False, "message": "Perceel niet gevonden"}), 400
 
-            grondsoort, p_al, p_cacl2, nv_gebied = perceel
+            fosfaatnorm_id = normen_res.fosfaatnorm_id
+            derogatienorm_id = normen_res.derogatienorm_id
+            stikstof_norm = normen_res.stikstof_norm
+            fosfaat_norm = normen_res.fosfaat_norm
+            stikstof_dierlijk = normen_res.stikstof_dierlijk
 
-            c.execute(
-                'SELECT gewas FROM stikstof_gewassen_normen WHERE id=%s',
-                (gewas_id,)
-            )
-            gewas_row = c.fetchone()
-            gewas_naam = (gewas_row[0] if gewas_row else '').lower()
-            type_land = 'grasland' if 'gras' in gewas_naam else 'bouwland'
-
-            # Norm-IDs
-            fosfaatnorm_id = get_fosfaatnorm_id(c, jaar, type_land, p_cacl2, p_al)
-            derogatienorm_id = get_derogatienorm_id(c, jaar, nv_gebied, derogatie)
-
-            # Waarden berekenen
-            stikstof_norm = bereken_stikstofnorm(gewas_id, perceel_id, jaar)
-            fosfaat_norm = bereken_fosfaatnorm(perceel_id, gewas_id, jaar)
-            stikstof_dierlijk = bereken_stikstof_dierlijk_kg_ha(
-                bedrijf_id, perceel_id, gewas_id, derogatie, jaar
-            )
             if stikstof_norm is None:
                 raise Exception(
                     f"Stikstofnorm niet gevonden (jaar={jaar}, gewas_id={gewas_id}, perceel_id={perceel_id})"
                 )
             if fosfaat_norm is None:
                 raise Exception(
-                    f"Fosfaatnorm niet gevonden (jaar={jaar}, type_land={type_land}, p_cacl2={p_cacl2}, p_al={p_al})"
+                    f"Fosfaatnorm niet gevonden (jaar={jaar}, type_land={normen_res.type_land}, "
+                    f"p_cacl2={normen_res.p_cacl2}, p_al={normen_res.p_al})"
                 )
 
-            if stikstof_norm is None or fosfaat_norm is None:
-                raise Exception("Stikstof- of fosfaatnorm niet gevonden voor gekozen perceel/jaar/soort.")
-
             # Insert
             c.execute(
                 '''
@@ -246,38 +209,23 @@ def gebruiksnormen_edit(norm_id):
         own_bedrijf = c.fetchone()
 
         c.execute(
-            'SELECT 1 FROM percelen WHERE id=%s AND user_id=%s',
+            'SELECT verrijking FROM percelen WHERE id=%s AND user_id=%s',
             (perceel_id, eff_uid)
         )
         own_perceel = c.fetchone()
 
         if not own_bedrijf or not own_perceel:
             return jsonify({"success": False, "message": "Geen toegang tot dit bedrijf/perceel"}), 403
+        if own_perceel[0] == VERRIJKING_PENDING:
+            return _grondsoort_nog_bezig()
 
-        # Perceel + gewas ophalen
-        c.execute(
-            'SELECT grondsoort, p_al, p_cacl2, nv_gebied FROM percelen WHERE id=%s',
-            (perceel_id,)
-        )
-        perceel = c.fetchone()
-        grondsoort, p_al, p_cacl2, nv_gebied = perceel if perceel else ('', 0, 0, 0)
-
-        c.execute(
-            'SELECT gewas FROM stikstof_gewassen_normen WHERE id=%s',
-            (gewas_id,)
-        )
-        gewas_row = c.fetchone()
-        gewas_naam = (gewas_row[0] if gewas_row else '').lower()
-        type_land = 'grasland' if 'gras' in gewas_naam else 'bouwland'
-
-        # Norm-IDs + waarden
-        fosfaatnorm_id = get_fosfaatnorm_id(c, jaar, type_land, p_cacl2, p_al)
-        derogatienorm_id = get_derogatienorm_id(c, jaar, nv_gebied, derogatie)
-        stikstof_norm = bereken_stikstofnorm(gewas_id, perceel_id, jaar)
-        fosfaat_norm = bereken_fosfaatnorm(perceel_id, gewas_id, jaar)
-        stikstof_dierlijk = bereken_stikstof_dierlijk_kg_ha(
-            bedrijf_id, perceel_id, gewas_id, derogatie, jaar
-        )
+        # Norm-IDs + waarden (één verbinding, vast aantal queries)
+        normen_res = bereken_norm(c, perceel_id, gewas_id, jaar, derogatie)
+        fosfaatnorm_id = normen_res.fosfaatnorm_id
+        derogatienorm_id = normen_res.derogatienorm_id
+        stikstof_norm = normen_res.stikstof_norm
+        fosfaat_norm = normen_res.fosfaat_norm
+        stikstof_dierlijk = normen_res.stikstof_dierlijk
 
         c.execute(
             '''
@@ -373,12 +321,9 @@ def api_init_gebruiksnormen():
                 "calculated_area": r[11]
             })
 
-        c.execute(
-            'SELECT id, jaar, gewas FROM stikstof_gewassen_normen ORDER BY jaar DESC, gewas'
-        )
         gewassen = [
             {"id": str(r[0]), "naam": f"{r[2]} ({r[1]})", "jaar": r[1]}
-            for r in c.fetchall()
+            for r in get_gewassen(c)
         ]
 
         c.execute(
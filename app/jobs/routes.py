@@ -0,0 +1,50 @@
+# app/jobs/routes.py
+from __future__ import annotations
+
+from io import BytesIO
+
+from flask import Blueprint, abort, jsonify, send_file, url_for
+
+from app.gebruikers.auth_utils import login_required, effective_user_id, is_admin
+from app.services.jobs import job_bestand, job_status
+
+"""
+Status en resultaat van achtergrondjobs (services/jobs.py).
+
+    GET /jobs/<id>             {"status", "fase", "verwerkt", "totaal",
+                                "resultaat", "fout", "resultaat_url"?}
+    GET /jobs/<id>/resultaat   download van het resultaatbestand (bv. PDF)
+
+Een gebruiker ziet alleen zijn eigen jobs; een admin ziet alle jobs.
+"""
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+def _eigenaar():
+    return None if is_admin() else effective_user_id()
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@login_required
+def status(job_id):
+    st = job_status(job_id, _eigenaar())
+    if st is None:
+        return jsonify({"error": "Onbekende job"}), 404
+    if st.pop("heeft_bestand", False):
+        st["resultaat_url"] = url_for('jobs.resultaat', job_id=job_id)
+    return jsonify(st)
+
+
+@jobs_bp.route('/<int:job_id>/resultaat', methods=['GET'])
+@login_required
+def resultaat(job_id):
+    bestand = job_bestand(job_id, _eigenaar())
+    if bestand is None:
+        abort(404)
+    return send_file(
+        BytesIO(bestand.data),
+        as_attachment=True,
+        download_name=bestand.naam,
+        mimetype=bestand.mime,
+    )
@@ -0,0 +1,205 @@
+# app/models/bemesting_samenvatting.py
+from __future__ import annotations
+
+import logging
+import math
+from typing import Iterable, List, Optional, Tuple
+
+import app.models.database_beheer as db
+
+"""
+Gematerialiseerde bemestingstotalen per gebruiksnorm.
+
+Kaart (api_map_percelen) en rapportage (_query_bemesting) telden bij elke
+request alle bemestingen opnieuw op. (Het dashboard niet: dat rekent per
+bemesting met de oppervlakte van b.perceel_id, zie dashboard_stats.) De
+tabel `bemesting_samenvatting` houdt per (gebruiksnorm_id, jaar van de
+bemestingsdatum) de lopende sommen van de kg/ha-waarden bij, plus aantal en
+laatste datum. Leespaden hoeven dan alleen O(#normen) rijen te lezen en
+vermenigvuldigen zelf met de oppervlakte van het perceel van de norm.
+
+Onderhoud:
+- bemesting_toevoegen / _bewerken / _verwijderen roepen
+  ververs_samenvatting(c, gebruiksnorm_ids) aan vóór hun commit; de rijen van
+  die normen worden in dezelfde transactie opnieuw uit bemestingen
+  opgebouwd (klein: alleen de bemestingen van die normen, via de index op
+  gebruiksnorm_id). Zo blijven ook laatste_datum en een gewijzigd jaar exact.
+- herbouw_samenvatting() bouwt alles opnieuw op;
+  controleer_samenvatting() meldt afwijkingen t.o.v. de bemestingen-tabel.
+    python -m app.models.bemesting_samenvatting [herbouw|controleer]
+
+Jaar = EXTRACT(YEAR FROM datum): de rapportage filtert op het jaar van de
+bemesting, dashboard en kaart tellen alle jaren van een norm op.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+TOTAAL_KOLOMMEN = (
+    "werkzame_n_kg_ha",
+    "n_dierlijk_kg_ha",
+    "werkzame_p2o5_kg_ha",
+    "k2o_kg_ha",
+    "n_overig_kg_ha",        # SUM(GREATEST(werkzame_n - n_dierlijk, 0))
+    "p2o5_dierlijk_kg_ha",   # werkzame_p2o5 van bemestingen met n_dierlijk > 0
+    "p2o5_overig_kg_ha",     # werkzame_p2o5 van de overige bemestingen
+)
+
+CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS bemesting_samenvatting (
+        gebruiksnorm_id TEXT NOT NULL,
+        jaar INTEGER NOT NULL,                      -- jaar van de bemestingsdatum
+        aantal INTEGER NOT NULL DEFAULT 0,
+        werkzame_n_kg_ha DOUBLE PRECISION NOT NULL DEFAULT 0,
+        n_dierlijk_kg_ha DOUBLE PRECISION NOT NULL DEFAULT 0,
+        werkzame_p2o5_kg_ha DOUBLE PRECISION NOT NULL DEFAULT 0,
+        k2o_kg_ha DOUBLE PRECISION NOT NULL DEFAULT 0,
+        n_overig_kg_ha DOUBLE PRECISION NOT NULL DEFAULT 0,
+        p2o5_dierlijk_kg_ha DOUBLE PRECISION NOT NULL DEFAULT 0,
+        p2o5_overig_kg_ha DOUBLE PRECISION NOT NULL DEFAULT 0,
+        laatste_datum DATE,
+        PRIMARY KEY (gebruiksnorm_id, jaar)
+    )
+"""
+
+# REAL -> float8 via de tekstweergave, zodat de sommen overeenkomen met wat
+# Python na psycopg2 zou optellen (zie dashboard_stats._real).
+_AGGREGAAT_SQL = """
+    SELECT
+        b.gebruiksnorm_id,
+        EXTRACT(YEAR FROM b.datum)::int AS jaar,
+        COUNT(*) AS aantal,
+        COALESCE(SUM(b.werkzame_n_kg_ha::text::float8), 0),
+        COALESCE(SUM(b.n_dierlijk_kg_ha::text::float8), 0),
+        COALESCE(SUM(b.werkzame_p2o5_kg_ha::text::float8), 0),
+        COALESCE(SUM(b.k2o_kg_ha::text::float8), 0),
+        COALESCE(SUM(GREATEST((b.werkzame_n_kg_ha - b.n_dierlijk_kg_ha)::text::float8, 0)), 0),
+        COALESCE(SUM(CASE WHEN b.n_dierlijk_kg_ha > 0
+                          THEN b.werkzame_p2o5_kg_ha::text::float8 ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN b.n_dierlijk_kg_ha > 0
+                          THEN 0 ELSE b.werkzame_p2o5_kg_ha::text::float8 END), 0),
+        MAX(b.datum) AS laatste_datum
+    FROM bemestingen b
+    {where}
+    GROUP BY b.gebruiksnorm_id, EXTRACT(YEAR FROM b.datum)::int
+"""
+
+_INSERT_SQL = f"""
+    INSERT INTO bemesting_samenvatting (
+        gebruiksnorm_id, jaar, aantal, {", ".join(TOTAAL_KOLOMMEN)}, laatste_datum
+    )
+    {{select}}
+"""
+
+
+def maak_tabel(c) -> None:
+    c.execute(CREATE_SQL)
+
+
+def ververs_samenvatting(c, gebruiksnorm_ids: Iterable[str]) -> None:
+    """
+    Bouw de samenvatting van de opgegeven gebruiksnormen opnieuw op uit
+    bemestingen, binnen de lopende transactie van cursor `c` (dus vóór commit
+    aanroepen). Een advisory lock per norm voorkomt dat twee gelijktijdige
+    schrijvers elkaars rijen overschrijven.
+    """
+    ids = sorted({str(i) for i in gebruiksnorm_ids if i})
+    if not ids:
+        return
+    for norm_id in ids:
+        c.execute(
+            "SELECT pg_advisory_xact_lock(hashtext('bemesting_samenvatting'), hashtext(%s))",
+            (norm_id,)
+        )
+    c.execute("DELETE FROM bemesting_samenvatting WHERE gebruiksnorm_id = ANY(%s)", (ids,))
+    c.execute(
+        _INSERT_SQL.format(select=_AGGREGAAT_SQL.format(where="WHERE b.gebruiksnorm_id = ANY(%s)")),
+        (ids,)
+    )
+
+
+def herbouw_samenvatting(conn=None) -> int:
+    """Bouw de hele tabel opnieuw op (in één transactie). Geeft het aantal rijen terug."""
+    eigen = conn is None
+    conn = conn or db.get_connection()
+    try:
+        c = conn.cursor()
+        maak_tabel(c)
+        c.execute("LOCK TABLE bemesting_samenvatting IN EXCLUSIVE MODE")
+        c.execute("DELETE FROM bemesting_samenvatting")
+        c.execute(_INSERT_SQL.format(select=_AGGREGAAT_SQL.format(where="")))
+        aantal = c.rowcount
+        conn.commit()
+        logger.info("bemesting_samenvatting herbouwd: %s rijen", aantal)
+        return aantal
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if eigen:
+            conn.close()
+
+
+def herbouw_als_leeg(c) -> None:
+    """Eerste keer (nieuwe tabel, bestaande bemestingen): direct vullen."""
+    c.execute(
+        _INSERT_SQL.format(select=_AGGREGAAT_SQL.format(
+            where="WHERE NOT EXISTS (SELECT 1 FROM bemesting_samenvatting)"
+        ))
+    )
+
+
+def controleer_samenvatting(c, gebruiksnorm_ids: Optional[List[str]] = None,
+                            rel_tol: float = 1e-9) -> List[Tuple]:
+    """
+    Vergelijk de samenvatting met een verse aggregatie over bemestingen.
+    Geeft (gebruiksnorm_id, jaar, kolom, opgeslagen, werkelijk) per afwijking;
+    een ontbrekende of overtollige rij geeft kolom 'rij'. Leeg = consistent.
+    """
+    b_where, s_where, params = "", "", ()
+    if gebruiksnorm_ids:
+        ids = [str(i) for i in gebruiksnorm_ids]
+        b_where, s_where, params = "WHERE b.gebruiksnorm_id = ANY(%s)", "WHERE gebruiksnorm_id = ANY(%s)", (ids,)
+
+    c.execute(_AGGREGAAT_SQL.format(where=b_where), params)
+    werkelijk = {(r[0], r[1]): r[2:] for r in c.fetchall()}
+
+    kolommen = ("aantal",) + TOTAAL_KOLOMMEN + ("laatste_datum",)
+    c.execute(
+        f"SELECT gebruiksnorm_id, jaar, {', '.join(kolommen)} FROM bemesting_samenvatting {s_where}",
+        params
+    )
+    opgeslagen = {(r[0], r[1]): r[2:] for r in c.fetchall()}
+
+    afwijkingen = []
+    for key in sorted(set(werkelijk) | set(opgeslagen), key=str):
+        w, o = werkelijk.get(key), opgeslagen.get(key)
+        if w is None or o is None:
+            afwijkingen.append((key[0], key[1], "rij", o is not None, w is not None))
+            continue
+        for kolom, ov, wv in zip(kolommen, o, w):
+            if isinstance(ov, float) or isinstance(wv, float):
+                gelijk = math.isclose(float(ov or 0), float(wv or 0), rel_tol=rel_tol, abs_tol=1e-9)
+            else:
+                gelijk = ov == wv
+            if not gelijk:
+                afwijkingen.append((key[0], key[1], kolom, ov, wv))
+    return afwijkingen
+
+
+if __name__ == "__main__":
+    import sys
+
+    actie = sys.argv[1] if len(sys.argv) > 1 else "controleer"
+    if actie == "herbouw":
+        print(f"{herbouw_samenvatting()} rijen in bemesting_samenvatting")
+    else:
+        conn = db.get_connection()
+        try:
+            afwijkingen = controleer_samenvatting(conn.cursor())
+        finally:
+            conn.close()
+        for a in afwijkingen:
+            print("Afwijking:", a)
+        print(f"{len(afwijkingen)} afwijking(en)")
+        raise SystemExit(1 if afwijkingen else 0)
@@ -0,0 +1,424 @@
+# app/models/connection_pool.py
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+import psycopg2
+from psycopg2 import extensions as pg_ext
+
+"""
+Thread-safe PostgreSQL connection pool.
+
+Elke helper in database_beheer (get_connection, get_dict_cursor, ...) haalt
+zijn verbinding hier vandaan in plaats van telkens psycopg2.connect() te doen.
+Een nieuwe TLS-verbinding naar de gehoste database kost 30-80 ms; een
+verbinding uit de pool vrijwel niets.
+
+- De pool geeft `PooledConnection`-objecten uit. Die gedragen zich als een
+  gewone psycopg2-connection, alleen geeft `close()` de verbinding terug aan
+  de pool in plaats van hem echt te sluiten. Bestaande code
+  (`conn = db.get_connection() ... conn.close()`) blijft dus werken.
+- Health check: een verbinding die langer dan DB_POOL_HEALTHCHECK_SECS idle
+  was, wordt bij uitgifte eerst met `SELECT 1` getest.
+- Max lifetime: verbindingen ouder dan DB_POOL_MAX_LIFETIME_SECS worden bij
+  teruggave gesloten en later vers opgebouwd.
+- Fork-safe: na een fork (gunicorn --preload) begint het child met een lege pool.
+
+Configuratie via environment:
+  DB_POOL_MIN                 (default 1)   verbindingen die idle open blijven
+  DB_POOL_MAX                 (default 5)   max. gelijktijdig uitgegeven
+  DB_POOL_TIMEOUT_SECS        (default 10)  max. wachttijd op een vrije verbinding
+  DB_POOL_MAX_LIFETIME_SECS   (default 1800)
+  DB_POOL_HEALTHCHECK_SECS    (default 30)
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeoutError(PoolError):
+    pass
+
+
+class _PoolSlot:
+    """Echte psycopg2-verbinding + administratie voor lifetime/health."""
+
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+
+class PooledConnection:
+    """
+    Proxy rond een psycopg2-connection uit de pool.
+    Alles wordt doorgegeven aan de echte verbinding, behalve `close()`:
+    die geeft de verbinding terug aan de pool.
+    """
+
+    def __init__(self, pool: "ConnectionPool", slot: _PoolSlot):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_slot", slot)
+
+    @property
+    def closed(self) -> int:
+        slot = self._slot
+        return 1 if slot is None else slot.raw.closed
+
+    def close(self) -> None:
+        slot = self._slot
+        if slot is None:
+            return
+        object.__setattr__(self, "_slot", None)
+        self._pool._release(self, slot)
+
+    def __getattr__(self, name: str) -> Any:
+        slot = object.__getattribute__(self, "_slot")
+        if slot is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(slot.raw, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        slot = self._slot
+        if slot is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        setattr(slot.raw, name, value)
+
+    # `with conn:` -> zelfde transactiesemantiek als psycopg2 (commit/rollback),
+    # de verbinding blijft uitgegeven tot close().
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._slot is None:
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 5,
+        timeout: float = 10.0,
+        max_lifetime: float = 1800.0,
+        health_check_after: float = 30.0,
+        **connect_kwargs: Any,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size moet minimaal 1 zijn")
+        self.dsn = dsn
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self._pid = os.getpid()
+        self._idle: List[_PoolSlot] = []
+        self._checked_out = 0
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "recycled_lifetime": 0,
+            "reclaimed_leaks": 0,
+        }
+
+    # -------------------- Intern --------------------
+
+    def _check_fork(self) -> None:
+        # Verbindingen van de parent niet sluiten: de socket is gedeeld.
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._local = threading.local()
+                    self._reset_state()
+
+    def _connect(self) -> _PoolSlot:
+        raw = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._stats["connections_created"] += 1
+        return _PoolSlot(raw)
+
+    def _discard(self, slot: _PoolSlot) -> None:
+        try:
+            slot.raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["connections_closed"] += 1
+
+    def _is_expired(self, slot: _PoolSlot, now: float) -> bool:
+        return self.max_lifetime > 0 and (now - slot.created_at) > self.max_lifetime
+
+    def _is_healthy(self, slot: _PoolSlot, now: float) -> bool:
+        if slot.raw.closed:
+            return False
+        if now - slot.last_used < self.health_check_after:
+            return True
+        try:
+            with slot.raw.cursor() as c:
+                c.execute("SELECT 1")
+            slot.raw.rollback()
+            return True
+        except Exception as e:
+            logger.warning("Pool health check faalde, verbinding wordt vervangen: %s", e)
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def _held(self) -> List[PooledConnection]:
+        held = getattr(self._local, "held", None)
+        if held is None:
+            held = []
+            self._local.held = held
+        return held
+
+    # -------------------- Publieke API --------------------
+
+    def getconn(self) -> PooledConnection:
+        """Haal een verbinding uit de pool (wacht max. `timeout` seconden)."""
+        self._check_fork()
+        deadline = 0.0
+        waited_since = None
+        slot = None
+
+        with self._cond:
+            while not self._idle and self._checked_out >= self.max_size:
+                now = time.monotonic()
+                if waited_since is None:
+                    waited_since = now
+                    deadline = now + self.timeout
+                    self._stats["waits"] += 1
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    self._record_wait(waited_since)
+                    raise PoolTimeoutError(
+                        f"Geen vrije databaseverbinding binnen {self.timeout:.1f}s "
+                        f"(max {self.max_size} in gebruik)"
+                    )
+                self._cond.wait(remaining)
+
+            if waited_since is not None:
+                self._record_wait(waited_since)
+
+            if self._idle:
+                slot = self._idle.pop()
+            self._checked_out += 1
+
+        try:
+            if slot is not None:
+                now = time.monotonic()
+                if self._is_expired(slot, now):
+                    with self._cond:
+                        self._stats["recycled_lifetime"] += 1
+                    self._discard(slot)
+                    slot = None
+                elif not self._is_healthy(slot, now):
+                    self._discard(slot)
+                    slot = None
+            if slot is None:
+                slot = self._connect()
+        except Exception:
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats["checkouts"] += 1
+        conn = PooledConnection(self, slot)
+        self._held().append(conn)
+        return conn
+
+    def _record_wait(self, since: float) -> None:
+        # Aanroepen met self._cond vast.
+        waited = time.monotonic() - since
+        self._stats["wait_time_total"] += waited
+        if waited > self._stats["wait_time_max"]:
+            self._stats["wait_time_max"] = waited
+
+    def _release(self, conn: PooledConnection, slot: _PoolSlot) -> None:
+        held = self._held()
+        try:
+            held.remove(conn)
+        except ValueError:
+            pass  # vrijgegeven vanuit een andere thread
+
+        if self._pid != os.getpid():
+            return
+
+        keep = not slot.raw.closed
+        if keep:
+            try:
+                status = slot.raw.get_transaction_status()
+                if status == pg_ext.TRANSACTION_STATUS_UNKNOWN:
+                    keep = False
+                elif status != pg_ext.TRANSACTION_STATUS_IDLE:
+                    slot.raw.rollback()
+                if keep and slot.raw.autocommit:
+                    slot.raw.autocommit = False
+            except Exception:
+                keep = False
+
+        now = time.monotonic()
+        if keep and self._is_expired(slot, now):
+            with self._cond:
+                self._stats["recycled_lifetime"] += 1
+            keep = False
+
+        if not keep:
+            self._discard(slot)
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+            return
+
+        slot.last_used = now
+        with self._cond:
+            self._checked_out -= 1
+            self._idle.append(slot)
+            self._cond.notify()
+
+    def release_thread_connections(self) -> int:
+        """
+        Geef alle verbindingen terug die deze thread nog vasthoudt.
+        Vangnet voor routes die bij een vroege return/exception `conn.close()`
+        overslaan; wordt na elk request aangeroepen (teardown_appcontext).
+        """
+        self._check_fork()
+        held = getattr(self._local, "held", None)
+        if not held:
+            return 0
+        leaked = [conn for conn in held if conn._slot is not None]
+        held.clear()
+        for conn in leaked:
+            conn.close()
+        with self._cond:
+            self._stats["reclaimed_leaks"] += len(leaked)
+        return len(leaked)
+
+    @contextmanager
+    def connection(self):
+        """
+        with pool.connection() as conn:
+            ...
+        Commit bij succes, rollback bij een exception, daarna terug in de pool.
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+            if not conn.autocommit:
+                conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def warm_up(self) -> None:
+        """Open alvast `min_size` verbindingen."""
+        self._check_fork()
+        with self._cond:
+            missing = self.min_size - (len(self._idle) + self._checked_out)
+        for _ in range(max(0, missing)):
+            slot = self._connect()
+            with self._cond:
+                self._idle.append(slot)
+                self._cond.notify()
+
+    def trim(self) -> None:
+        """Sluit idle verbindingen boven `min_size` en verlopen verbindingen."""
+        now = time.monotonic()
+        drop: List[_PoolSlot] = []
+        with self._cond:
+            keep: List[_PoolSlot] = []
+            for slot in self._idle:
+                if self._is_expired(slot, now) or len(keep) >= self.min_size:
+                    drop.append(slot)
+                else:
+                    keep.append(slot)
+            self._idle = keep
+        for slot in drop:
+            self._discard(slot)
+
+    def closeall(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for slot in idle:
+            self._discard(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            s = dict(self._stats)
+            s.update(
+                {
+                    "pid": self._pid,
+                    "min_size": self.min_size,
+                    "max_size": self.max_size,
+                    "checked_out": self._checked_out,
+                    "idle": len(self._idle),
+                    "open": self._checked_out + len(self._idle),
+                }
+            )
+        s["wait_time_total"] = round(s["wait_time_total"], 4)
+        s["wait_time_max"] = round(s["wait_time_max"], 4)
+        s["wait_time_avg"] = round(s["wait_time_total"] / s["waits"], 4) if s["waits"] else 0.0
+        return s
+
+
+def pool_from_env(dsn: str) -> ConnectionPool:
+    return ConnectionPool(
+        dsn,
+        min_size=_env_int("DB_POOL_MIN", 1),
+        max_size=_env_int("DB_POOL_MAX", 5),
+        timeout=_env_float("DB_POOL_TIMEOUT_SECS", 10.0),
+        max_lifetime=_env_float("DB_POOL_MAX_LIFETIME_SECS", 1800.0),
+        health_check_after=_env_float("DB_POOL_HEALTHCHECK_SECS", 30.0),
+    )
@@ -0,0 +1,205 @@
+# app/models/nv_classificatie.py
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import app.models.database_beheer as db
+from app.services.jobs import Job, enqueue, job_status, laatste_job, taak
+
+"""
+NV-gebied-classificatie in batch.
+
+is_in_nv_gebied deed per punt een eigen verbinding en ST_Intersects-query.
+nv_voor_punten() classificeert een hele lijst punten in één query (unnest
+van lat/lng-arrays, per punt een EXISTS via de GiST-index op nv_gebieden);
+nv_voor_geometrieen() doet hetzelfde voor GeoJSON-vlakken via
+ST_PointOnSurface, zodat het criterium gelijk blijft aan dat van percelen
+(één punt per perceel, zie perceel_geometrie.py).
+
+Na het herladen van de NV-laag zet herclassificeer_percelen() nv_gebied van
+alle bestaande percelen opnieuw, in batches op id (keyset) met een commit
+per batch. start_herclassificatie() zet dat als job 'nv_herclassificatie' in
+de jobqueue (services/jobs.py), zodat het in het werkerproces draait, hooguit
+één tegelijk, en een onderbroken run opnieuw wordt opgepakt; de voortgang
+staat in de jobs-tabel (herclassificatie_status(), /jobs/<id>).
+    python -m app.models.nv_classificatie
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Perceelpunt: opgeslagen lat/lng, anders een punt op het vlak (alias p)
+PERCEEL_PUNT_SQL = """
+    COALESCE(
+        ST_Transform(ST_SetSRID(ST_Point(p.longitude, p.latitude), 4326), 28992),
+        ST_PointOnSurface(p.geom)
+    )
+"""
+
+NV_VOOR_PERCEEL_SQL = f"""
+    CASE WHEN EXISTS (
+        SELECT 1 FROM nv_gebieden n WHERE ST_Intersects(n.geom, {PERCEEL_PUNT_SQL})
+    ) THEN 1 ELSE 0 END
+"""
+
+_PUNTEN_SQL = """
+    WITH pt AS (
+        SELECT i, ST_Transform(ST_SetSRID(ST_Point(lng, lat), 4326), 28992) AS geom
+        FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS u(lat, lng, i)
+    )
+    SELECT pt.i, EXISTS (SELECT 1 FROM nv_gebieden n WHERE ST_Intersects(n.geom, pt.geom))
+    FROM pt
+    ORDER BY pt.i
+"""
+
+_GEOMETRIEEN_SQL = """
+    WITH g AS (
+        SELECT i, ST_PointOnSurface(ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON(gj), 4326), 28992)) AS geom
+        FROM unnest(%s::text[]) WITH ORDINALITY AS u(gj, i)
+    )
+    SELECT g.i, EXISTS (SELECT 1 FROM nv_gebieden n WHERE ST_Intersects(n.geom, g.geom))
+    FROM g
+    ORDER BY g.i
+"""
+
+
+def maak_index(c) -> None:
+    """GiST-index op nv_gebieden.geom (de tabel wordt buiten de app geladen)."""
+    c.execute("SELECT to_regclass('nv_gebieden') IS NOT NULL")
+    if c.fetchone()[0]:
+        c.execute("CREATE INDEX IF NOT EXISTS idx_nv_gebieden_geom ON nv_gebieden USING GIST (geom)")
+
+
+def _uitvoeren(sql: str, params: Tuple, conn=None) -> Dict[int, bool]:
+    eigen = conn is None
+    conn = conn or db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+        if eigen:
+            conn.rollback()
+    finally:
+        if eigen:
+            conn.close()
+    return {int(i): bool(v) for i, v in rows}
+
+
+def nv_voor_punten(punten: Sequence[Tuple[Optional[float], Optional[float]]], conn=None) -> List[bool]:
+    """
+    (lat, lng)-punten -> [True/False, ...] in invoervolgorde, in één query.
+    Punten zonder geldige coördinaten zijn False.
+    """
+    geldig = []
+    for idx, (lat, lng) in enumerate(punten or []):
+        try:
+            geldig.append((idx, float(lat), float(lng)))
+        except (TypeError, ValueError):
+            continue
+    uit = [False] * len(punten or [])
+    if not geldig:
+        return uit
+    res = _uitvoeren(_PUNTEN_SQL, ([g[1] for g in geldig], [g[2] for g in geldig]), conn)
+    for volgnr, (idx, _, _) in enumerate(geldig, start=1):
+        uit[idx] = res.get(volgnr, False)
+    return uit
+
+
+def nv_voor_geometrieen(geojsons: Sequence[Optional[str]], conn=None) -> List[bool]:
+    """GeoJSON-teksten (WGS84) -> [True/False, ...]; None telt als False."""
+    geldig = [(idx, g) for idx, g in enumerate(geojsons or []) if g]
+    uit = [False] * len(geojsons or [])
+    if not geldig:
+        return uit
+    res = _uitvoeren(_GEOMETRIEEN_SQL, ([g for _, g in geldig],), conn)
+    for volgnr, (idx, _) in enumerate(geldig, start=1):
+        uit[idx] = res.get(volgnr, False)
+    return uit
+
+
+# ---------------------------- Herclassificatie ----------------------------
+
+SOORT = "nv_herclassificatie"
+
+
+def herclassificeer_percelen(batch_size: int = 2000, job: Optional[Job] = None) -> Tuple[int, int]:
+    """
+    Zet nv_gebied van alle percelen opnieuw tegen de huidige nv_gebieden.
+    Alleen rijen die echt veranderen worden geschreven. Geeft (totaal, gewijzigd).
+    """
+    from app.services.response_cache import invalideer_alle
+
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM percelen")
+        totaal = int(c.fetchone()[0])
+    if job is not None:
+        job.voortgang(0, totaal, "herclassificeren", direct=True)
+
+    laatste_id = ""
+    verwerkt = gewijzigd_totaal = 0
+    while True:
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute(
+                f"""
+                WITH batch AS (
+                    SELECT id FROM percelen WHERE id > %s ORDER BY id LIMIT %s
+                ),
+                nieuw AS (
+                    SELECT p.id, {NV_VOOR_PERCEEL_SQL} AS nv
+                    FROM percelen p JOIN batch ON batch.id = p.id
+                ),
+                upd AS (
+                    UPDATE percelen p SET nv_gebied = nieuw.nv
+                    FROM nieuw
+                    WHERE p.id = nieuw.id AND p.nv_gebied IS DISTINCT FROM nieuw.nv
+                    RETURNING p.id
+                )
+                SELECT (SELECT MAX(id) FROM batch), (SELECT COUNT(*) FROM batch), (SELECT COUNT(*) FROM upd)
+                """,
+                (laatste_id, batch_size)
+            )
+            max_id, aantal, gewijzigd = c.fetchone()
+            if gewijzigd:
+                invalideer_alle(conn)
+        if not aantal:
+            break
+        laatste_id = max_id
+        verwerkt += int(aantal)
+        gewijzigd_totaal += int(gewijzigd)
+        if job is not None:
+            job.voortgang(verwerkt, totaal)
+        logger.info("NV-herclassificatie: %s/%s verwerkt, %s gewijzigd",
+                    verwerkt, totaal, gewijzigd_totaal)
+    return verwerkt, gewijzigd_totaal
+
+
+@taak(SOORT, max_pogingen=3)
+def _herclassificatie_taak(job: Job) -> Dict[str, Any]:
+    # Een nieuwe poging begint opnieuw; al gezette percelen veranderen niet meer
+    totaal, gewijzigd = herclassificeer_percelen(int(job.payload.get("batch_size") or 2000), job)
+    return {"totaal": totaal, "gewijzigd": gewijzigd,
+            "melding": f"NV-herclassificatie klaar: {totaal} percelen, {gewijzigd} gewijzigd."}
+
+
+def start_herclassificatie(batch_size: int = 2000) -> Optional[int]:
+    """
+    Zet de herclassificatie in de jobqueue; geeft het job-id, of None als er
+    al één in de wachtrij staat of loopt (ongeacht welke admin hem startte).
+    """
+    return enqueue(SOORT, {"batch_size": batch_size}, user_id=None, uniek=True)
+
+
+def herclassificatie_status() -> Dict[str, Any]:
+    """Status van de nieuwste herclassificatie-job ({"status": "idle"} als er geen is)."""
+    job_id = laatste_job(SOORT)
+    st = job_status(job_id) if job_id is not None else None
+    return st or {"status": "idle"}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    totaal, gewijzigd = herclassificeer_percelen()
+    print(f"{totaal} percelen geclassificeerd, {gewijzigd} gewijzigd")
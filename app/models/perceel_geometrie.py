@@ -0,0 +1,251 @@
+# app/models/perceel_geometrie.py
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+import app.models.database_beheer as db
+from app.models.nv_classificatie import NV_VOOR_PERCEEL_SQL
+
+"""
+PostGIS-geometrie van percelen.
+
+`percelen.geom` is een MultiPolygon in EPSG:28992 (RD New, meters) met een
+GiST-index. Bron blijft de JSON die we al hadden: geometry_geojson (PDOK,
+CRS84) of anders de [{lat,lng},...]-lijst uit polygon_coordinates. De JSON
+wordt in Python tot GeoJSON-tekst teruggebracht; PostGIS doet de rest
+(ST_GeomFromGeoJSON -> 4326 -> 28992, ST_MakeValid).
+
+Afgeleide velden worden set-wise in de database bepaald
+(werk_geometrie_velden_bij):
+- calculated_area = ST_Area(geom) / 10000 (ha; RD is vlakgetrouw genoeg
+  voor perceelsoppervlaktes, vervangt het shapely/pyproj-pad);
+- latitude/longitude, als die nog leeg zijn: ST_PointOnSurface(geom);
+- nv_gebied: ST_Intersects van het perceelpunt met nv_gebieden (zelfde
+  puntcriterium als nv_classificatie.nv_voor_punten, voor alle percelen in
+  één query). nv_gebieden wordt buiten de app geladen: ontbreekt de tabel of
+  faalt de NV-query, dan valt alleen dat deel terug op 0 (een bestaande
+  waarde blijft staan) en gaat het opslaan van het perceel gewoon door.
+
+Bestaande percelen vullen:
+    python -m app.models.perceel_geometrie [backfill|oppervlakte]
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SRID = 28992
+
+# GeoJSON-tekst (WGS84/CRS84) -> geldige MultiPolygon in RD
+GEOM_UIT_GEOJSON = (
+    "ST_Multi(ST_CollectionExtract(ST_MakeValid("
+    "ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON({param}), 4326), 28992)), 3))"
+)
+
+_VELDEN_SQL = """
+    UPDATE percelen p
+    SET calculated_area = COALESCE(
+            ROUND((NULLIF(ST_Area(p.geom), 0) / 10000.0)::numeric, 4)::real,
+            p.calculated_area),
+        latitude  = COALESCE(p.latitude,  ST_Y(ST_Transform(ST_PointOnSurface(p.geom), 4326))::real),
+        longitude = COALESCE(p.longitude, ST_X(ST_Transform(ST_PointOnSurface(p.geom), 4326))::real),
+        nv_gebied = {nv}
+    WHERE p.id = ANY(%s)
+"""
+_VELDEN_MET_NV_SQL = _VELDEN_SQL.format(nv=NV_VOOR_PERCEEL_SQL)
+_VELDEN_ZONDER_NV_SQL = _VELDEN_SQL.format(nv="COALESCE(p.nv_gebied, 0)")
+
+
+def maak_kolom(c) -> None:
+    c.execute(f"ALTER TABLE percelen ADD COLUMN IF NOT EXISTS geom geometry(MultiPolygon, {SRID})")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_percelen_geom ON percelen USING GIST (geom)")
+
+
+def perceel_geojson(geometry_geojson: Any, polygon_coordinates: Any) -> Optional[str]:
+    """
+    GeoJSON-tekst (Polygon/MultiPolygon, lon/lat) voor één perceel, of None.
+    Voorkeur voor geometry_geojson; anders een gesloten ring uit de
+    [{lat,lng},...]-lijst van polygon_coordinates.
+    """
+    def _laad(x):
+        if x is None or x == "":
+            return None
+        if isinstance(x, (bytes, memoryview)):
+            x = bytes(x).decode("utf-8", errors="ignore")
+        if isinstance(x, str):
+            try:
+                return json.loads(x)
+            except ValueError:
+                return None
+        return x
+
+    geom = _laad(geometry_geojson)
+    if isinstance(geom, dict) and geom.get("type") == "Feature":
+        geom = geom.get("geometry")
+    if isinstance(geom, dict) and geom.get("type") in ("Polygon", "MultiPolygon") and geom.get("coordinates"):
+        return json.dumps({"type": geom["type"], "coordinates": geom["coordinates"]}, separators=(",", ":"))
+
+    punten = _laad(polygon_coordinates)
+    if not isinstance(punten, list):
+        return None
+    ring = []
+    for p in punten:
+        try:
+            ring.append([float(p["lng"]), float(p["lat"])])
+        except (KeyError, TypeError, ValueError):
+            return None
+    if len(ring) < 3:
+        return None
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+    if len(ring) < 4:
+        return None
+    return json.dumps({"type": "Polygon", "coordinates": [ring]}, separators=(",", ":"))
+
+
+def zet_geometrie(c, items: Sequence[Tuple[str, Optional[str]]]) -> None:
+    """
+    Zet geom voor (perceel_id, geojson_tekst)-paren in één statement;
+    geojson None maakt geom leeg. Binnen de transactie van `c`.
+    """
+    if not items:
+        return
+    execute_values(
+        c,
+        f"""
+        UPDATE percelen p
+        SET geom = CASE WHEN v.geojson IS NULL THEN NULL
+                        ELSE {GEOM_UIT_GEOJSON.format(param="v.geojson")} END
+        FROM (VALUES %s) AS v(id, geojson)
+        WHERE p.id = v.id
+        """,
+        [(str(i), g) for i, g in items],
+        template="(%s, %s::text)",
+    )
+
+
+def werk_geometrie_velden_bij(c, perceel_ids: Iterable[str]) -> None:
+    """
+    Oppervlakte, ontbrekende lat/lng en nv_gebied set-wise uit geom afleiden.
+    Binnen de transactie van `c`; een NV-fout wordt in een savepoint
+    opgevangen (nv_gebied dan 0), zodat de transactie bruikbaar blijft.
+    """
+    ids = sorted({str(i) for i in perceel_ids if i})
+    if not ids:
+        return
+    c.execute("SELECT to_regclass('nv_gebieden') IS NOT NULL")
+    if c.fetchone()[0]:
+        savepoint = not getattr(c.connection, "autocommit", False)
+        if savepoint:
+            c.execute("SAVEPOINT nv_velden")
+        try:
+            c.execute(_VELDEN_MET_NV_SQL, (ids,))
+            if savepoint:
+                c.execute("RELEASE SAVEPOINT nv_velden")
+            return
+        except Exception as e:
+            if savepoint:
+                c.execute("ROLLBACK TO SAVEPOINT nv_velden")
+            logger.warning("NV-gebied bepalen mislukt, nv_gebied = 0: %s", e)
+    else:
+        logger.warning("Tabel nv_gebieden ontbreekt; nv_gebied = 0")
+    c.execute(_VELDEN_ZONDER_NV_SQL, (ids,))
+
+
+def backfill_geometrie(conn=None, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Vul geom voor percelen waar die nog leeg is (idempotent).
+    Oppervlakte/nv_gebied blijven ongemoeid; zie herbereken_oppervlakte().
+    Geeft (gevuld, zonder_bruikbare_geometrie) terug.
+    """
+    eigen = conn is None
+    conn = conn or db.get_connection()
+    gevuld = overgeslagen = 0
+    try:
+        c = conn.cursor()
+        c.execute(
+            """
+            SELECT id, geometry_geojson, polygon_coordinates
+            FROM percelen
+            WHERE geom IS NULL
+              AND (geometry_geojson IS NOT NULL OR polygon_coordinates IS NOT NULL)
+            """
+        )
+        rows = c.fetchall()
+        items: List[Tuple[str, str]] = []
+        for perceel_id, geojson, coords in rows:
+            tekst = perceel_geojson(geojson, coords)
+            if tekst is None:
+                overgeslagen += 1
+            else:
+                items.append((perceel_id, tekst))
+
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+            try:
+                zet_geometrie(c, chunk)
+                if not conn.autocommit:
+                    conn.commit()
+                gevuld += len(chunk)
+            except Exception as e:
+                # Eén onbruikbare geometrie mag de rest niet tegenhouden
+                if not conn.autocommit:
+                    conn.rollback()
+                logger.warning("Backfill geom: batch mislukt (%s); per perceel verder", e)
+                for item in chunk:
+                    try:
+                        zet_geometrie(c, [item])
+                        if not conn.autocommit:
+                            conn.commit()
+                        gevuld += 1
+                    except Exception as e2:
+                        if not conn.autocommit:
+                            conn.rollback()
+                        overgeslagen += 1
+                        logger.warning("Backfill geom: perceel %s overgeslagen: %s", item[0], e2)
+        if gevuld or overgeslagen:
+            logger.info("Backfill geom: %s gevuld, %s zonder bruikbare geometrie", gevuld, overgeslagen)
+        return gevuld, overgeslagen
+    finally:
+        if eigen:
+            conn.close()
+
+
+def herbereken_oppervlakte(conn=None) -> int:
+    """
+    Zet calculated_area/lat/lng/nv_gebied van alle percelen met geom opnieuw
+    via werk_geometrie_velden_bij (bewust een losse stap: het wijzigt
+    opgeslagen oppervlaktes en dus dashboardtotalen).
+    """
+    from app.services.response_cache import invalideer_alle
+
+    eigen = conn is None
+    conn = conn or db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute("SELECT id FROM percelen WHERE geom IS NOT NULL")
+        ids = [r[0] for r in c.fetchall()]
+        werk_geometrie_velden_bij(c, ids)
+        invalideer_alle(conn)
+        conn.commit()
+        return len(ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if eigen:
+            conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    actie = sys.argv[1] if len(sys.argv) > 1 else "backfill"
+    if actie == "oppervlakte":
+        print(f"{herbereken_oppervlakte()} percelen bijgewerkt")
+    else:
+        gevuld, overgeslagen = backfill_geometrie()
+        print(f"{gevuld} percelen gevuld, {overgeslagen} zonder bruikbare geometrie")
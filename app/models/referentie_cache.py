@@ -0,0 +1,264 @@
+# app/models/referentie_cache.py
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+import app.models.database_beheer as db
+
+"""
+Proces-lokale cache voor referentietabellen (normen, werkingscoëfficiënten,
+meststoffen). Deze tabellen veranderen alleen als een admin ze bewerkt in
+universele_data, maar werden op bijna elke pagina opnieuw opgevraagd.
+
+Invalidatie via versienummers in de tabel `referentie_versies`:
+- Elke admin-schrijfroute roept `bump_versie(conn, '<tabel>')` aan vóór de
+  commit; het versienummer gaat dan in dezelfde transactie omhoog.
+- Elk (gunicorn-)proces leest hooguit eens per REF_CACHE_CHECK_SECS
+  (default 5) alle versies in één kleine query. Wijkt een versie af van de
+  versie waarmee een entry geladen is, dan wordt die entry opnieuw geladen.
+
+Gebruik:
+    rows = ref_cache.get('meststoffen')
+    rows = ref_cache.get('meststoffen', c=c)   # binnen een open verbinding
+
+Wie al een verbinding uit de pool heeft (bv. bereken_normen(c, ...)), geeft
+zijn cursor mee: versiecontrole en loader draaien dan op die verbinding en
+get() neemt geen tweede verbinding uit de pool.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+class ReferentieCache:
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaders: Dict[str, Tuple[Tuple[str, ...], Callable[[Any], Any]]] = {}
+        self._entries: Dict[str, Tuple[Tuple[int, ...], Any]] = {}
+        self._versies: Dict[str, int] = {}
+        self._last_check = 0.0
+        self._stats = {"hits": 0, "loads": 0, "version_checks": 0, "invalidations": 0}
+
+    def register(self, naam: str, tabellen: Iterable[str], loader: Callable[[Any], Any]) -> None:
+        """
+        Registreer een cache-entry.
+        loader(c) krijgt een gewone (tuple-)cursor en geeft de te cachen waarde terug.
+        """
+        with self._lock:
+            self._loaders[naam] = (tuple(tabellen), loader)
+            self._entries.pop(naam, None)
+
+    # -------------------- Versies --------------------
+
+    def _check_versies(self, c) -> None:
+        c.execute("SELECT tabel, versie FROM referentie_versies")
+        nieuw = {r[0]: int(r[1]) for r in c.fetchall()}
+        with self._lock:
+            self._stats["version_checks"] += 1
+            self._versies = nieuw
+            self._last_check = time.monotonic()
+
+    def _versie_van(self, tabellen: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._versies.get(t, 0) for t in tabellen)
+
+    def bump_versie(self, conn, *tabellen: str) -> None:
+        """
+        Hoog de versie van de opgegeven tabellen op (binnen de transactie van `conn`)
+        en gooi de lokale entries direct weg.
+        """
+        with conn.cursor() as c:
+            for tabel in tabellen:
+                c.execute(
+                    """
+                    INSERT INTO referentie_versies (tabel, versie)
+                    VALUES (%s, 1)
+                    ON CONFLICT (tabel) DO UPDATE
+                        SET versie = referentie_versies.versie + 1
+                    """,
+                    (tabel,)
+                )
+        self.invalidate(*tabellen)
+
+    def invalidate(self, *tabellen: str) -> None:
+        """Gooi lokale entries weg die van (één van) deze tabellen afhangen; zonder argumenten: alles."""
+        with self._lock:
+            for naam, (deps, _) in self._loaders.items():
+                if not tabellen or set(deps) & set(tabellen):
+                    if self._entries.pop(naam, None) is not None:
+                        self._stats["invalidations"] += 1
+            # volgende get() leest de versies opnieuw
+            self._last_check = 0.0
+
+    # -------------------- Ophalen --------------------
+
+    def get(self, naam: str, force_check: bool = False, c=None) -> Any:
+        """
+        Waarde van een entry; laadt (opnieuw) bij een andere versie. Met `c`
+        gebeurt dat op de verbinding van de aanroeper (binnen diens transactie),
+        anders op een eigen verbinding uit de pool.
+        """
+        with self._lock:
+            if naam not in self._loaders:
+                raise KeyError(f"Onbekende referentie-cache entry: {naam}")
+            tabellen, loader = self._loaders[naam]
+            need_check = force_check or (time.monotonic() - self._last_check) >= self.check_interval
+            if not need_check:
+                entry = self._entries.get(naam)
+                if entry is not None and entry[0] == self._versie_van(tabellen):
+                    self._stats["hits"] += 1
+                    return entry[1]
+
+        if c is not None:
+            # Eigen (tuple-)cursor op de verbinding van de aanroeper; geen
+            # rollback/commit, de transactie is van de aanroeper.
+            with c.connection.cursor() as cur:
+                return self._laad(naam, tabellen, loader, need_check, cur)
+
+        conn = db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                value = self._laad(naam, tabellen, loader, need_check, cur)
+            conn.rollback()
+            return value
+        finally:
+            conn.close()
+
+    def _laad(self, naam: str, tabellen: Tuple[str, ...], loader: Callable[[Any], Any],
+              need_check: bool, c) -> Any:
+        if need_check:
+            self._check_versies(c)
+
+        with self._lock:
+            versie = self._versie_van(tabellen)
+            entry = self._entries.get(naam)
+            if entry is not None and entry[0] == versie:
+                self._stats["hits"] += 1
+                return entry[1]
+
+        # Versie vóór het laden vastleggen: een bump tijdens het laden
+        # leidt bij de volgende check tot een herlaadactie.
+        value = loader(c)
+
+        with self._lock:
+            self._entries[naam] = (versie, value)
+            self._stats["loads"] += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            s["entries"] = sorted(self._entries.keys())
+            s["versies"] = dict(self._versies)
+        return s
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+ref_cache = ReferentieCache(check_interval=_env_float("REF_CACHE_CHECK_SECS", 5.0))
+
+
+def bump_versie(conn, *tabellen: str) -> None:
+    ref_cache.bump_versie(conn, *tabellen)
+
+
+# -------------------- Standaard entries --------------------
+
+def _laad_meststoffen(c):
+    c.execute(
+        'SELECT id, meststof, n, p2o5, k2o, toepassing, leverancier '
+        'FROM universal_fertilizers ORDER BY meststof'
+    )
+    return tuple(c.fetchall())
+
+
+def _laad_werkingscoefficienten(c):
+    c.execute(
+        'SELECT jaar, meststof, toepassing, werking FROM stikstof_werkingscoefficient_dierlijk'
+    )
+    return tuple(c.fetchall())
+
+
+def _laad_gewassen(c):
+    c.execute(
+        'SELECT id, jaar, gewas FROM stikstof_gewassen_normen ORDER BY jaar DESC, gewas'
+    )
+    return tuple(c.fetchall())
+
+
+def _laad_normtabellen(c):
+    """
+    Alle normtabellen die de gebruiksnormen-berekening nodig heeft, voorbewerkt:
+    - gewassen:    id -> (jaar, gewas)
+    - stikstof:    (jaar, gewas) -> (n_klei, n_noordwestcentraal_zand, n_zuid_zand, n_loss, n_veen)
+    - derogatie:   (jaar, nv_gebied, derogatie) -> (id, stikstof_norm_kg_ha)
+    - *_jaren:     gesorteerde lijst van aanwezige jaren per tabel (voor "beste jaar")
+    De fosfaatklassen zelf staan in de interval-index (app.gebruiksnormen.fosfaat_index).
+    """
+    c.execute(
+        """
+        SELECT id, jaar, gewas, n_klei, n_noordwestcentraal_zand, n_zuid_zand, n_loss, n_veen
+        FROM stikstof_gewassen_normen
+        """
+    )
+    gewassen, stikstof = {}, {}
+    for r in c.fetchall():
+        gewassen[str(r[0])] = (r[1], r[2])
+        stikstof.setdefault((r[1], r[2]), tuple(r[3:]))
+
+    c.execute('SELECT DISTINCT jaar FROM fosfaat_normen')
+    fosfaat_jaren = sorted(r[0] for r in c.fetchall() if r[0] is not None)
+
+    c.execute('SELECT id, jaar, nv_gebied, derogatie, stikstof_norm_kg_ha FROM derogatie_normen')
+    derogatie = {}
+    for r in c.fetchall():
+        derogatie.setdefault((r[1], r[2], r[3]), (r[0], r[4]))
+
+    return {
+        "gewassen": gewassen,
+        "stikstof": stikstof,
+        "derogatie": derogatie,
+        "stikstof_jaren": sorted({k[0] for k in stikstof if k[0] is not None}),
+        "fosfaat_jaren": fosfaat_jaren,
+        "derogatie_jaren": sorted({k[0] for k in derogatie if k[0] is not None}),
+    }
+
+
+ref_cache.register("meststoffen", ("universal_fertilizers",), _laad_meststoffen)
+ref_cache.register(
+    "werkingscoefficienten", ("stikstof_werkingscoefficient_dierlijk",), _laad_werkingscoefficienten
+)
+ref_cache.register("gewassen", ("stikstof_gewassen_normen",), _laad_gewassen)
+ref_cache.register(
+    "normtabellen",
+    ("stikstof_gewassen_normen", "fosfaat_normen", "derogatie_normen"),
+    _laad_normtabellen,
+)
+
+
+def get_meststoffen(c=None):
+    """(id, meststof, n, p2o5, k2o, toepassing, leverancier), gesorteerd op meststof."""
+    return ref_cache.get("meststoffen", c=c)
+
+
+def get_werkingscoefficienten(c=None):
+    """(jaar, meststof, toepassing, werking)"""
+    return ref_cache.get("werkingscoefficienten", c=c)
+
+
+def get_gewassen(c=None):
+    """(id, jaar, gewas), gesorteerd op jaar DESC, gewas."""
+    return ref_cache.get("gewassen", c=c)
+
+
+def get_normtabellen(force_check: bool = False, c=None):
+    """Voorbewerkte normtabellen; zie _laad_normtabellen()."""
+    return ref_cache.get("normtabellen", force_check=force_check, c=c)
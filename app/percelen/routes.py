@@ -1,6 +1,9 @@
 # app/percelen/percelen.py
 from __future__ import annotations
-from flask import Blueprint, render_template, request, redirect, session, url_for, flash, jsonify, current_app, send_from_directory
+from flask import (
+    Blueprint, Response, render_template, request, redirect, session, url_for, flash, jsonify,
+    current_app, send_from_directory, stream_with_context
+)
 import uuid
 import pandas as pd
 import json
@@ -15,19 +18,22 @@ from app.services.rvo_grondsoorten import rvo_grondsoort_at_point
 
 # PDOK client
 from app.services.pdok_gewaspercelen import (
-    fetch_brp_items, parse_brp_features, geojson_polygon_to_points
+    stream_brp_features
+)
+from app.services.bodemkaart_wms import query_soil_at_point, pick_bodem_layer_name, BodemkaartWMSError
+from app.services.weerbaarheid import (
+    CircuitOpen, DeadlineVerstreken, met_deadline
+)
+from app.services.response_cache import registreer_invalidatie
+from app.services.geometrie_encoding import encoding_uit_request
+from app.services.pdok_import import (
+    soil_text_naar_categorie, start_import, job_status
 )
-from app.services.bodemkaart_wms import query_soil_at_point, pick_bodem_layer_name
-
-# Nauwkeurige oppervlakte in ha
-try:
-    import shapely.geometry as sh_geom
-    from shapely.ops import transform as sh_transform
-    import pyproj
-except Exception:
-    sh_geom = None
-    sh_transform = None
-    pyproj = None
+from app.models.perceel_geometrie import (
+    perceel_geojson, zet_geometrie, werk_geometrie_velden_bij
+)
+from app.services.jobs import wek as wek_jobwerkers
+from app.services.perceel_verrijking import PENDING, plan_verrijking, verrijking_status
 
 percelen_bp = Blueprint(
     'percelen',
@@ -37,6 +43,9 @@ percelen_bp = Blueprint(
     url_prefix='/percelen'
 )
 
+# Schrijfacties maken de dashboard/kaart response-cache van de gebruiker ongeldig
+registreer_invalidatie(percelen_bp)
+
 # Toegestane app-categorieën (zelfde labels als je <select>)
 ALLOWED_GRONDSOORTEN = {
     "Klei",
@@ -63,32 +72,6 @@ def get_nv_geojson():
     return _NV_GEOJSON_CACHE
 
 
-def is_in_nv_gebied(lat, lng):
-    """
-    Returns True/False op basis van punt ↔ nv_gebieden (PostGIS).
-    lng = X (lon), lat = Y (lat) in WGS84
-    """
-    conn = db.get_connection()
-    c = conn.cursor()
-    try:
-        c.execute("""
-            SELECT 1
-            FROM nv_gebieden
-            WHERE ST_Intersects(
-                geom,
-                ST_Transform(
-                    ST_SetSRID(ST_Point(%s, %s), 4326),
-                    28992
-                )
-            )
-            LIMIT 1;
-        """, (lng, lat))
-
-        return c.fetchone() is not None
-
-    finally:
-        conn.close()
-
 def safe_float(value):
     """Safely convert value to float, return None if not possible."""
     if value is None or value == '':
@@ -115,78 +98,6 @@ def _parse_coords_or_none(raw: str):
     return None
 
 
-def _calc_area_ha_geojson(geom: dict):
-    """Oppervlakte (ha) van GeoJSON polygon/multipolygon (EPSG:4326/CRS84) met shapely+pyproj als beschikbaar."""
-    if not geom or not sh_geom or not pyproj or not sh_transform:
-        return None
-    try:
-        poly = sh_geom.shape(geom)
-        centroid = poly.centroid
-        proj = pyproj.Proj(
-            proj='aea',
-            lat_1=centroid.y - 2,
-            lat_2=centroid.y + 2,
-            lat_0=centroid.y,
-            lon_0=centroid.x
-        )
-        wgs84 = pyproj.Proj('epsg:4326')
-        project = pyproj.Transformer.from_proj(wgs84, proj, always_xy=True).transform
-        area_m2 = sh_transform(project, poly).area
-        return round(area_m2 / 10000.0, 4)
-    except Exception:
-        return None
-
-
-def _auto_determine_grondsoort(lat: float, lng: float) -> str:
-    """
-    Voorkeur: RVO (indien zinvol resultaat).
-    Fallback: PDOK WMS -> tekst -> app-categorie.
-    """
-    # 1) Probeer RVO, maar alleen gebruiken als het resultaat betekenisvol is
-    try:
-        r = rvo_grondsoort_at_point(lat, lng) or {}
-        r_raw = (r.get("raw") or {})
-        r_cat = r.get("category")
-        r_meaningful = bool(
-            r_cat and (
-                r_raw.get("hoofdg") or
-                r_raw.get("in_zuidelijk") or
-                r_raw.get("in_loess")
-            )
-        )
-        if r_meaningful:
-            return r_cat
-    except Exception as e:
-        print(f"RVO grondsoort fout: {e}")
-
-    # 2) Fallback naar PDOK WMS (zoals je al had)
-    try:
-        soil_data = query_soil_at_point(lat, lng)  # {"soil_text": "...", "raw": {...}}
-        soil_text = (soil_data or {}).get("soil_text") or ""
-        mapped = _map_soil_text_to_category(soil_text)
-        return mapped or "Noordelijk, westelijk, centraal zand"
-    except Exception as e:
-        print(f"WMS fallback grondsoort fout: {e}")
-        return "Noordelijk, westelijk, centraal zand"
-
-
-def _map_soil_text_to_category(s: str) -> str:
-    t = (s or "").lower()
-    if not t:
-        return ""
-    if "veen" in t:
-        return "Veen"
-    if "klei" in t or "zavel" in t:
-        return "Klei"
-    # Löss/leem → apart
-    if "löss" in t or "loess" in t or "loss" in t or "leem" in t:
-        return "Löss"
-    # Zand laten we open; RVO bepaalt Noord/W/C vs Zuid
-    if "zand" in t or "podzol" in t:
-        return ""
-    return ""
-
-
 # ------------- Routes -------------
 @percelen_bp.route('/', methods=['GET', 'POST'])
 @login_required
@@ -224,26 +135,13 @@ def percelen():
             except (ValueError, TypeError):
                 flash("Ongeldige coördinaten opgegeven.", "danger")
                 return redirect(url_for('percelen.percelen'))
-                # ... na het bepalen van lat_val, lng_val ...
 
-        # Bepaal nv_gebied automatisch op basis van NV-gebieden kaartlaag
-        if lat_val is not None and lng_val is not None:
-            try:
-                nv_bool = is_in_nv_gebied(lat_val, lng_val)
-                nv_gebied = 1 if nv_bool else 0
-            except Exception as e:
-                print(f"NV-gebied check fout: {e}")
-                nv_gebied = 0
-        else:
-            nv_gebied = 0
-
-        # Auto-determine grondsoort if not provided and coordinates are available
-        if (not grondsoort or grondsoort == '') and lat_val and lng_val:
-            grondsoort = _auto_determine_grondsoort(lat_val, lng_val)
-            flash(f"Grondsoort automatisch bepaald als '{grondsoort}' op basis van bodemkaart.", "info")
+        # Zonder grondsoort maar met coördinaten: op de achtergrond bepalen
+        # (services/perceel_verrijking.py); het perceel staat dan op 'pending'
+        verrijken = (not grondsoort) and bool(lat_val and lng_val)
 
         # Validate required fields
-        if not grondsoort:
+        if not grondsoort and not verrijken:
             flash("Grondsoort is verplicht. Zorg dat er coördinaten zijn voor automatische bepaling.", "danger")
             return redirect(url_for('percelen.percelen'))
 
@@ -264,34 +162,46 @@ def percelen():
             # Insert new perceel
             oppervlakte_value = safe_float(calculated_area) or safe_float(oppervlakte)
             calculated_area_value = safe_float(calculated_area)
+            perceel_id = str(uuid.uuid4())
 
             c.execute(
                 '''
                 INSERT INTO percelen
                 (id, perceelnaam, oppervlakte, grondsoort, p_al, p_cacl2, nv_gebied,
                  latitude, longitude, adres, polygon_coordinates, calculated_area,
-                 pdok_source, user_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                 pdok_source, user_id, verrijking)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 ''',
                 (
-                    str(uuid.uuid4()),
+                    perceel_id,
                     perceelnaam,
                     oppervlakte_value,
-                    grondsoort,
+                    grondsoort or None,
                     safe_float(p_al),
                     safe_float(p_cacl2),
-                    nv_gebied,
+                    None if verrijken else 0,
                     lat_val,
                     lng_val,
                     adres,
                     polygon_json,
                     calculated_area_value,
                     "PDOK_manual_selection",
-                    effective_user_id()
+                    effective_user_id(),
+                    PENDING if verrijken else None
                 )
             )
+            # geom + oppervlakte (ST_Area) en nv_gebied in de database bepalen
+            zet_geometrie(c, [(perceel_id, perceel_geojson(None, polygon_json))])
+            if verrijken:
+                plan_verrijking(c, perceel_id, effective_user_id())
+            else:
+                werk_geometrie_velden_bij(c, [perceel_id])
             conn.commit()
-            flash(f"Perceel '{perceelnaam}' succesvol toegevoegd.", "success")
+            if verrijken:
+                wek_jobwerkers()
+                flash(f"Perceel '{perceelnaam}' toegevoegd. Grondsoort en NV-gebied worden op de achtergrond bepaald.", "success")
+            else:
+                flash(f"Perceel '{perceelnaam}' succesvol toegevoegd.", "success")
         except Exception as e:
             conn.rollback()
             flash(f"Fout bij toevoegen perceel: {e}", "danger")
@@ -333,6 +243,7 @@ def percelen():
 
     def row_to_jsonable(r: dict) -> dict:
         d = dict(r)  # kopie
+        d.pop('geom', None)  # PostGIS-kolom; de pagina werkt met polygon_coordinates
 
         def to_float(x):
             try:
@@ -430,18 +341,7 @@ def percelen_edit(id):
                     flash("Ongeldige coördinaten opgegeven.", "danger")
                     return redirect(url_for('percelen.percelen'))
 
-            # 👉 HIER toevoegen:
-            if lat_val is not None and lng_val is not None:
-                try:
-                    nv_bool = is_in_nv_gebied(lat_val, lng_val)
-                    nv_gebied = 1 if nv_bool else 0
-                except Exception as e:
-                    print(f"NV-gebied check (edit) fout: {e}")
-                    nv_gebied = 0
-            else:
-                nv_gebied = 0
 
-            
             # Check for duplicate names (excluding current perceel)
             c.execute(
                 "SELECT 1 FROM percelen WHERE perceelnaam=%s AND user_id=%s AND id<>%s",
@@ -457,6 +357,13 @@ def percelen_edit(id):
             oppervlakte_value = safe_float(calculated_area) or safe_float(oppervlakte)
             calculated_area_value = safe_float(calculated_area)
 
+            c.execute(
+                "SELECT polygon_coordinates FROM percelen WHERE id=%s AND user_id=%s",
+                (id, effective_user_id())
+            )
+            oud = c.fetchone() or {}
+            oude_polygon = _parse_coords_or_none(oud.get('polygon_coordinates') or '')
+
             c.execute(
                 '''
                 UPDATE percelen
@@ -465,12 +372,12 @@ def percelen_edit(id):
                     grondsoort=%s,
                     p_al=%s,
                     p_cacl2=%s,
-                    nv_gebied=%s,
                     latitude=%s,
                     longitude=%s,
                     adres=%s,
                     polygon_coordinates=%s,
-                    calculated_area=%s
+                    calculated_area=%s,
+                    verrijking=CASE WHEN NULLIF(%s, '') IS NULL THEN verrijking END
                 WHERE id=%s AND user_id=%s
                 ''',
                 (
@@ -479,16 +386,21 @@ def percelen_edit(id):
                     grondsoort,
                     safe_float(p_al),
                     safe_float(p_cacl2),
-                    nv_gebied,
                     lat_val,
                     lng_val,
                     adres,
                     polygon_json,
                     calculated_area_value,
+                    grondsoort,
                     id,
                     effective_user_id()
                 )
             )
+            if c.rowcount:
+                # Ongewijzigde polygon: geom (bij PDOK incl. gaten) blijft staan
+                if polygon_json != oude_polygon:
+                    zet_geometrie(c, [(id, perceel_geojson(None, polygon_json))])
+                werk_geometrie_velden_bij(c, [id])
             conn.commit()
             flash("Perceel bijgewerkt.", "success")
         except Exception as e:
@@ -524,31 +436,55 @@ def pdok_search():
     """
     Search for gewaspercelen in a bounding box.
     Example: /percelen/pdok/search?bbox=4.5,52.1,4.7,52.2&year=2024&limit=300
+    Via de tile-cache (services/pdok_gewaspercelen.py); zonder limit volledig.
+    Optioneel &zoom=<z> voor vereenvoudigde, afgeronde geometrie (alleen voor
+    weergave; de import moet de volledige geometrie meesturen).
+
+    Het antwoord wordt gestreamd: {"features": [...], "count": n,
+    "truncated": bool}, feature voor feature, zodat het geheugen niet met de
+    bbox meegroeit. Een fout halverwege staat als "error" in het antwoord.
     """
     bbox = (request.args.get('bbox') or '').strip()
     year = request.args.get('year', type=int)
-    limit = request.args.get('limit', default=500, type=int)
+    limit = request.args.get('limit', type=int)  # leeg = alle percelen in de bbox
 
     if not bbox or len(bbox.split(',')) != 4:
         return jsonify({"error": "bbox vereist: minx,miny,maxx,maxy"}), 400
 
     try:
-        fc = fetch_brp_items(bbox=bbox, limit=limit)
-        feats = parse_brp_features(fc)
+        stream = stream_brp_features(bbox=bbox, limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        if year:
-            feats = [f for f in feats if str(f.get("jaar") or "") == str(year)]
+    enc = encoding_uit_request(request.args)
 
-        return jsonify({"count": len(feats), "features": feats})
-    except Exception as e:
-        return jsonify({"error": f"PDOK OGC fout: {e}"}), 502
+    def genereer():
+        yield '{"features":['
+        count, fout = 0, None
+        try:
+            for f in stream:
+                if year and str(f.get("jaar") or "") != str(year):
+                    continue
+                if enc.actief:
+                    f = dict(f, geometry=enc.geometrie(f.get("geometry")))
+                yield ("," if count else "") + json.dumps(f, separators=(",", ":"))
+                count += 1
+        except Exception as e:
+            current_app.logger.warning("PDOK-zoeken afgebroken: %s", e)
+            fout = f"PDOK OGC fout: {e}"
+        slot = {"count": count, "truncated": stream.truncated}
+        if fout:
+            slot["error"] = fout
+        yield "]," + json.dumps(slot, separators=(",", ":"))[1:]
+
+    return Response(stream_with_context(genereer()), mimetype="application/json")
 
 
 @percelen_bp.route('/pdok/import', methods=['POST'])
 @login_required
 def pdok_import():
     """
-    Import selected percelen from PDOK.
+    Import selected percelen from PDOK (achtergrondjob, zie services/pdok_import.py).
     Body format:
     {
       "items": [
@@ -561,116 +497,48 @@ def pdok_import():
         ...
       ]
     }
+    Antwoord 202: {"job_id": ..., "status_url": ...}; poll status_url tot
+    status "done" of "failed" (jobqueue, zie services/jobs.py).
     """
     try:
         payload = request.get_json(force=True) or {}
         items = payload.get("items") or []
     except Exception:
-        flash("Ongeldige JSON voor PDOK-import.", "danger")
-        return redirect(url_for('percelen.percelen'))
+        return jsonify({"error": "Ongeldige JSON voor PDOK-import."}), 400
 
     if not items:
-        flash("Geen percelen geselecteerd voor import.", "warning")
-        return redirect(url_for('percelen.percelen'))
-
-    conn = db.get_connection()
-    c = conn.cursor()
-    toegevoegd, overgeslagen = 0, 0
-
-    try:
-        for it in items:
-            geom = it.get("geometry")
-            if not geom:
-                overgeslagen += 1
-                continue
-
-            pdok_id = (it.get("pdok_id") or "").strip()
-            id_short = pdok_id.split("-")[0] if pdok_id else ""
-
-            naam = f"PDOK perceel {id_short}".strip() if id_short else "PDOK perceel"
-
-            if pdok_id:
-                c.execute(
-                    "SELECT 1 FROM percelen WHERE user_id=%s AND pdok_id=%s",
-                    (effective_user_id(), pdok_id)
-                )
-                exists = c.fetchone()
-                if exists:
-                    overgeslagen += 1
-                    continue
-
-            points = geojson_polygon_to_points(geom)
-            polygon_json = json.dumps(points, separators=(',', ':')) if points else None
-
-            area_ha = _calc_area_ha_geojson(geom)
-
-            centroid = it.get("centroid") or {}
-            lat_val = safe_float(centroid.get("lat"))
-            lng_val = safe_float(centroid.get("lng"))
-
-            grondsoort = None
-            nv_gebied = 0
-            if lat_val and lng_val:
-                grondsoort = _auto_determine_grondsoort(lat_val, lng_val)
-                try:
-                    nv_bool = is_in_nv_gebied(lat_val, lng_val)
-                    nv_gebied = 1 if nv_bool else 0
-                except Exception as e:
-                    print(f"NV-gebied check (PDOK import) fout: {e}")
-                    nv_gebied = 0
+        return jsonify({"error": "Geen percelen geselecteerd voor import."}), 400
 
+    job_id = start_import(effective_user_id(), items)
+    if job_id is None:
+        return jsonify({"error": "Er loopt al een PDOK-import."}), 409
 
-            c.execute(
-                '''
-                INSERT INTO percelen
-                (id, perceelnaam, oppervlakte, grondsoort, p_al, p_cacl2, nv_gebied,
-                 latitude, longitude, adres, polygon_coordinates, calculated_area,
-                 pdok_id, pdok_category, pdok_source, geometry_geojson, user_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ''',
-                (
-                    str(uuid.uuid4()),
-                    naam,
-                    area_ha,
-                    grondsoort,
-                    None, None, 0,
-                    nv_gebied,
-                    lat_val, lng_val, '',
-                    polygon_json,
-                    area_ha,
-                    pdok_id or None,
-                    it.get("category"),
-                    "PDOK_BRPGewaspercelen_OGC",
-                    json.dumps(geom, separators=(',', ':')),
-                    effective_user_id()
-                )
-            )
-            toegevoegd += 1
+    return jsonify({
+        "job_id": job_id,
+        "status_url": url_for('percelen.pdok_import_status', job_id=job_id),
+    }), 202
 
 
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        flash(f"Fout bij PDOK-import: {e}", "danger")
-        conn.close()
-        return redirect(url_for('percelen.percelen'))
-    finally:
-        conn.close()
+@percelen_bp.route('/pdok/import/<int:job_id>', methods=['GET'])
+@login_required
+def pdok_import_status(job_id):
+    status = job_status(job_id, effective_user_id())
+    if status is None:
+        return jsonify({"error": "Onbekende import-job"}), 404
+    return jsonify(status)
 
-    if toegevoegd:
-        flash(
-            f"{toegevoegd} perceel{'en' if toegevoegd != 1 else ''} via PDOK geïmporteerd. "
-            f"{overgeslagen} overgeslagen.",
-            "success"
-        )
-    else:
-        flash("Geen percelen geïmporteerd (mogelijk al bestaand of zonder geometrie).", "warning")
 
-    return redirect(url_for('percelen.percelen'))
+@percelen_bp.route('/verrijking', methods=['GET'])
+@login_required
+def verrijking():
+    """Status van de achtergrondverrijking; ?ids=a,b (percelen met verrijking 'pending')."""
+    ids = [i for i in (request.args.get('ids') or '').split(',') if i][:200]
+    return jsonify(verrijking_status(effective_user_id(), ids))
 
 
 @percelen_bp.route('/bodem/soil_at', methods=['GET'])
 @login_required
+@met_deadline()
 def bodem_soil_at():
     lat = request.args.get('lat', type=float)
     lng = request.args.get('lng', type=float)
@@ -678,7 +546,12 @@ def bodem_soil_at():
         return jsonify({"error": "lat & lng vereist"}), 400
     try:
         rvo = rvo_grondsoort_at_point(lat, lng) or {}
-        wms = query_soil_at_point(lat, lng) or {}
+        try:
+            wms = query_soil_at_point(lat, lng) or {}
+        except (CircuitOpen, DeadlineVerstreken, BodemkaartWMSError) as e:
+            # Bodemkaart traag/onbereikbaar: antwoord op basis van RVO alleen
+            current_app.logger.info("Bodemkaart overgeslagen: %s", e)
+            wms = {}
 
         rvo_raw = (rvo.get("raw") or {})
         rvo_cat = rvo.get("category")
@@ -686,7 +559,7 @@ def bodem_soil_at():
             rvo_cat and (rvo_raw.get("hoofdg") or rvo_raw.get("in_zuidelijk") or rvo_raw.get("in_loess"))
         )
         soil_text = (wms or {}).get("soil_text") or ""
-        category = rvo_cat if rvo_meaningful else _map_soil_text_to_category(soil_text)
+        category = rvo_cat if rvo_meaningful else soil_text_naar_categorie(soil_text)
 
         return jsonify({
             "soil_text": soil_text,
@@ -743,11 +616,13 @@ def api_nv_gebieden():
 
         rows = c.fetchall()
 
+        # nv_gebieden staat in RD: tolerantie/precisie in meters
+        enc = encoding_uit_request(request.args, meters=True)
         features = []
         for r in rows:
             features.append({
                 "type": "Feature",
-                "geometry": json.loads(r[2]),
+                "geometry": enc.geometrie(json.loads(r[2])),
                 "properties": {
                     "id": r[0],
                     "naam": r[1],
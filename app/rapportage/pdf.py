@@ -0,0 +1,69 @@
+# app/rapportage/pdf.py
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from flask import render_template
+
+from app.services.jobs import Bestand, Job, enqueue, taak
+
+"""
+PDF-rapport (WeasyPrint) als achtergrondjob.
+
+WeasyPrint doet voor een rapport met veel bedrijven al snel tientallen
+seconden over layout en rendering; inline liep dat tegen de gunicorn-
+timeout aan. De route zet nu een job 'rapportage_pdf' in de jobqueue
+(services/jobs.py) met alleen de filters; de werker haalt de data op,
+rendert rapportage_pdf.html en bewaart de PDF als resultaat van de job.
+De pagina pollt /jobs/<id> en start de download via /jobs/<id>/resultaat.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SOORT = "rapportage_pdf"
+
+
+def start_pdf(user_id: str, jaar: int, bedrijf_ids_filter: Optional[List[str]],
+              geselecteerde_bedrijf_ids: List[str], hoofd_bedrijf_id: Optional[str]) -> int:
+    return enqueue(SOORT, {
+        "jaar": jaar,
+        "bedrijf_ids_filter": bedrijf_ids_filter,
+        "geselecteerde_bedrijf_ids": geselecteerde_bedrijf_ids,
+        "hoofd_bedrijf_id": hoofd_bedrijf_id,
+    }, user_id=user_id)
+
+
+def maak_pdf(user_id: str, jaar: int, bedrijf_ids_filter: Optional[List[str]],
+             geselecteerde_bedrijf_ids: List[str], hoofd_bedrijf_id: Optional[str]) -> bytes:
+    """Rapportdata ophalen en de PDF-template met WeasyPrint renderen (binnen een app-context)."""
+    from weasyprint import HTML
+
+    from app.rapportage.routes import _combine, _get_bedrijven, _query_bemesting, _query_normen
+
+    kunstmest_mode = "hoofd_bedrijf" if hoofd_bedrijf_id else "per_bedrijf"
+    normen = _query_normen(user_id, jaar, bedrijf_ids_filter)
+    bemesting = _query_bemesting(user_id, jaar, bedrijf_ids_filter)
+    rows = _combine(normen, bemesting, jaar, kunstmest_mode, hoofd_bedrijf_id)
+
+    html_string = render_template(
+        "rapportage/rapportage_pdf.html",
+        rows=rows,
+        selected_jaar=jaar,
+        bedrijven=_get_bedrijven(user_id),
+        geselecteerde_bedrijf_ids=geselecteerde_bedrijf_ids,
+        hoofd_bedrijf_id=hoofd_bedrijf_id,
+        kunstmest_mode=kunstmest_mode,
+        pdf_mode=True,
+    )
+    return HTML(string=html_string).write_pdf()
+
+
+@taak(SOORT, max_pogingen=2)
+def _pdf_taak(job: Job) -> Bestand:
+    p: Dict[str, Any] = job.payload
+    job.voortgang(fase="renderen", direct=True)
+    pdf = maak_pdf(job.user_id, p["jaar"], p.get("bedrijf_ids_filter"),
+                   p.get("geselecteerde_bedrijf_ids") or [], p.get("hoofd_bedrijf_id"))
+    return Bestand(f"rapportage {p['jaar']}.pdf", "application/pdf", pdf)
@@ -2,7 +2,7 @@
 from __future__ import annotations
 from flask import (
     Blueprint, render_template, request, redirect,
-    session, url_for, flash, send_file, make_response
+    session, url_for, flash, send_file
 )
 import io
 import xlsxwriter
@@ -11,6 +11,7 @@ from fpdf import FPDF
 
 import app.models.database_beheer as db
 from app.gebruikers.auth_utils import login_required, effective_user_id
+from app.rapportage.pdf import start_pdf
 
 
 rapportage_bp = Blueprint(
@@ -139,6 +140,7 @@ def _query_bemesting(user_id, jaar, bedrijf_ids):
     Belangrijk:
     We groeperen nu op g.bedrijf_id (het bedrijf van de gebruiksnorm / perceel),
     zodat de bemesting terechtkomt bij hetzelfde bedrijf als de normen.
+    De sommen per norm en bemestingsjaar komen uit bemesting_samenvatting.
     """
     conn, cur = db.get_dict_cursor()
     try:
@@ -151,34 +153,19 @@ def _query_bemesting(user_id, jaar, bedrijf_ids):
                 g.bedrijf_id,
                 br_norm.naam AS bedrijf_naam,
 
-                -- N
-                SUM(b.n_dierlijk_kg_ha * COALESCE(p.oppervlakte,0)) AS n_dierlijk_kg,
-                SUM(
-                    GREATEST(b.werkzame_n_kg_ha - b.n_dierlijk_kg_ha, 0)
-                    * COALESCE(p.oppervlakte,0)
-                ) AS n_overige_kg,
+                -- N (sommen per norm uit bemesting_samenvatting x oppervlakte)
+                SUM(s.n_dierlijk_kg_ha * COALESCE(p.oppervlakte,0)) AS n_dierlijk_kg,
+                SUM(s.n_overig_kg_ha   * COALESCE(p.oppervlakte,0)) AS n_overige_kg,
 
                 -- P (fosfaat) op basis van werkzame_p2o5_kg_ha
-                SUM(
-                    CASE
-                        WHEN b.n_dierlijk_kg_ha > 0
-                             THEN b.werkzame_p2o5_kg_ha * COALESCE(p.oppervlakte,0)
-                        ELSE 0
-                    END
-                ) AS p_dierlijk_kg,
-                SUM(
-                    CASE
-                        WHEN b.n_dierlijk_kg_ha > 0
-                             THEN 0
-                        ELSE b.werkzame_p2o5_kg_ha * COALESCE(p.oppervlakte,0)
-                    END
-                ) AS p_overige_kg
-            FROM bemestingen b
-            JOIN gebruiksnormen g ON b.gebruiksnorm_id = g.id
-            JOIN percelen p       ON b.perceel_id = p.id
+                SUM(s.p2o5_dierlijk_kg_ha * COALESCE(p.oppervlakte,0)) AS p_dierlijk_kg,
+                SUM(s.p2o5_overig_kg_ha   * COALESCE(p.oppervlakte,0)) AS p_overige_kg
+            FROM bemesting_samenvatting s
+            JOIN gebruiksnormen g ON s.gebruiksnorm_id = g.id
+            JOIN percelen p       ON g.perceel_id = p.id
             JOIN bedrijven br_norm ON g.bedrijf_id = br_norm.id
             WHERE g.user_id = %s
-              AND EXTRACT(YEAR FROM b.datum)::INT = %s
+              AND s.jaar = %s
               {clause}
             GROUP BY g.bedrijf_id, br_norm.naam
         """, params)
@@ -330,30 +317,21 @@ def _export_excel(rows):
     )
 
 
-def _export_pdf(rows, selected_jaar, bedrijven, geselecteerde_bedrijf_ids,
-                hoofd_bedrijf_id, kunstmest_mode):
+def _export_pdf(user_id, jaar, bedrijf_ids_filter, geselecteerde_bedrijf_ids, hoofd_bedrijf_id):
     """
-    Render de moderne PDF HTML-template naar een echte PDF met WeasyPrint.
+    PDF-rapport als achtergrondjob (zie rapportage/pdf.py): terug naar het
+    rapport met ?pdf_job=<id>; de pagina start de download als de PDF klaar is.
     """
-    # 1. HTML renderen
-    html_string = render_template(
-        "rapportage/pdf_modern.html",
-        rows=rows,
-        selected_jaar=selected_jaar,
-        bedrijven=bedrijven,
-        geselecteerde_bedrijf_ids=geselecteerde_bedrijf_ids,
-        hoofd_bedrijf_id=hoofd_bedrijf_id,
-        kunstmest_mode=kunstmest_mode
-    )
-
-    # 2. PDF genereren
-    pdf_bytes = HTML(string=html_string).write_pdf()
+    if not jaar:
+        flash("Kies eerst een jaar voor het PDF-rapport.", "warning")
+        return redirect(url_for("rapportage.rapportage"))
 
-    # 3. Download-response
-    response = make_response(pdf_bytes)
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = "attachment; filename=rapportage.pdf"
-    return response
+    job_id = start_pdf(user_id, jaar, bedrijf_ids_filter, geselecteerde_bedrijf_ids, hoofd_bedrijf_id)
+    args = request.args.to_dict(flat=False)
+    args["action"] = ["view"]
+    args["pdf_job"] = [str(job_id)]
+    flash("PDF-rapport wordt gemaakt; de download start zodra het klaar is.", "info")
+    return redirect(url_for("rapportage.rapportage", **args))
 
 
 
@@ -409,7 +387,7 @@ def rapportage():
 
     # ---- DATA OPHALEN ----
     rows = []
-    if jaar:
+    if jaar and action != "pdf":
         normen = _query_normen(user_id, jaar, bedrijf_ids_filter)
         bemesting = _query_bemesting(user_id, jaar, bedrijf_ids_filter)
         rows = _combine(normen, bemesting, jaar, kunstmest_mode, hoofd_bedrijf_id)
@@ -417,8 +395,8 @@ def rapportage():
     # ---- EXPORTS ----
     if action == "excel":
         return _export_excel(rows)
-    elif action == "pdf": 
-        return _export_pdf(rows)
+    elif action == "pdf":
+        return _export_pdf(user_id, jaar, bedrijf_ids_filter, geselecteerde_bedrijf_ids, hoofd_bedrijf_id)
 
     # ---- TEMPLATE ----
     return render_template(
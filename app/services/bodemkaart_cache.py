@@ -0,0 +1,261 @@
+# app/services/bodemkaart_cache.py
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import app.models.database_beheer as db
+
+"""
+Persistente cache voor BRO Bodemkaart GetFeatureInfo (PDOK WMS).
+
+De bodemkaart verandert hooguit jaarlijks, dus een antwoord voor een plek is
+lang bruikbaar. Sleutel = (laag, cel_x, cel_y): de Web Mercator-coördinaat
+van het punt gekwantiseerd op BODEMKAART_CACHE_CEL_M meter (default 25 m,
+ruim binnen de 40 m buffer van de GetFeatureInfo-bbox).
+
+- Positief resultaat (properties gevonden): TTL BODEMKAART_CACHE_TTL_DAGEN
+  (default 180).
+- Negatief resultaat (WMS antwoordde, maar geen feature op dit punt): korter,
+  BODEMKAART_CACHE_NEG_TTL_DAGEN (default 7). Netwerk- of serverfouten worden
+  niet gecachet.
+- Metadata (gekozen laag + GetCapabilities-document) in
+  `bodemkaart_wms_meta`, zodat een koude worker geen GetCapabilities hoeft te
+  doen.
+
+Tabellen staan in Postgres en worden dus door alle gunicorn-workers gedeeld.
+Fouten in de cache zelf worden gelogd en nooit doorgegeven: dan volgt
+gewoon een request naar PDOK. Hit-ratio per proces via stats().
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+CEL_M = _env_float("BODEMKAART_CACHE_CEL_M", 25.0)
+TTL_DAGEN = _env_float("BODEMKAART_CACHE_TTL_DAGEN", 180)
+NEG_TTL_DAGEN = _env_float("BODEMKAART_CACHE_NEG_TTL_DAGEN", 7)
+META_TTL_DAGEN = _env_float("BODEMKAART_CACHE_META_TTL_DAGEN", 30)
+CACHE_ENABLED = os.getenv("BODEMKAART_CACHE_ENABLED", "1") != "0"
+
+CREATE_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS bodemkaart_gfi_cache (
+        layer TEXT NOT NULL,
+        cel_x INTEGER NOT NULL,
+        cel_y INTEGER NOT NULL,
+        negatief BOOLEAN NOT NULL DEFAULT FALSE,
+        resultaat TEXT,                          -- JSON: soil_text, properties, ...
+        opgehaald_op TIMESTAMPTZ NOT NULL DEFAULT now(),
+        verloopt_op TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (layer, cel_x, cel_y)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bodemkaart_wms_meta (
+        sleutel TEXT PRIMARY KEY,                -- 'layer', 'capabilities'
+        waarde TEXT,
+        opgehaald_op TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+)
+
+
+def maak_tabellen(c) -> None:
+    for sql in CREATE_SQL:
+        c.execute(sql)
+
+
+def _web_mercator(lon: float, lat: float) -> Tuple[float, float]:
+    lat = max(-85.051128779807, min(85.051128779807, lat))
+    x = lon * 20037508.34 / 180.0
+    y = math.log(math.tan((90.0 + lat) * math.pi / 360.0)) / (math.pi / 180.0)
+    return x, y * 20037508.34 / 180.0
+
+
+def cel_voor_punt(lat: float, lon: float, cel_m: float = CEL_M) -> Tuple[int, int]:
+    x, y = _web_mercator(lon, lat)
+    return int(math.floor(x / cel_m)), int(math.floor(y / cel_m))
+
+
+class BodemkaartCache:
+    def __init__(self, cel_m: float = CEL_M, ttl_dagen: float = TTL_DAGEN,
+                 neg_ttl_dagen: float = NEG_TTL_DAGEN, meta_ttl_dagen: float = META_TTL_DAGEN):
+        self.cel_m = cel_m
+        self.ttl_dagen = ttl_dagen
+        self.neg_ttl_dagen = neg_ttl_dagen
+        self.meta_ttl_dagen = meta_ttl_dagen
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "stored": 0, "errors": 0,
+                       "meta_hits": 0, "meta_misses": 0}
+
+    def _tel(self, naam: str) -> None:
+        with self._lock:
+            self._stats[naam] += 1
+
+    def cel(self, lat: float, lon: float) -> Tuple[int, int]:
+        return cel_voor_punt(lat, lon, self.cel_m)
+
+    # -------- GetFeatureInfo-resultaten --------
+
+    def get(self, layer: str, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """
+        Gecachet resultaat of None (miss). Een negatieve hit geeft
+        {"negatief": True}; anders de opgeslagen dict.
+        """
+        cel_x, cel_y = self.cel(lat, lon)
+        try:
+            conn = db.get_connection()
+            try:
+                c = conn.cursor()
+                c.execute(
+                    """
+                    SELECT negatief, resultaat FROM bodemkaart_gfi_cache
+                    WHERE layer = %s AND cel_x = %s AND cel_y = %s AND verloopt_op > now()
+                    """,
+                    (layer, cel_x, cel_y)
+                )
+                row = c.fetchone()
+                conn.rollback()
+            finally:
+                conn.close()
+        except Exception as e:
+            self._tel("errors")
+            logger.warning("Bodemkaart-cache lezen mislukt: %s", e)
+            return None
+
+        if row is None:
+            self._tel("misses")
+            return None
+        if row[0]:
+            self._tel("negative_hits")
+            return {"negatief": True}
+        self._tel("hits")
+        return json.loads(row[1]) if row[1] else {}
+
+    def set(self, layer: str, lat: float, lon: float, resultaat: Optional[Dict[str, Any]]) -> None:
+        """resultaat None of zonder properties = negatief (kortere TTL)."""
+        negatief = not resultaat or not (resultaat.get("properties_raw") or resultaat.get("properties"))
+        dagen = self.neg_ttl_dagen if negatief else self.ttl_dagen
+        cel_x, cel_y = self.cel(lat, lon)
+        try:
+            with db.connection() as conn:
+                with conn.cursor() as c:
+                    c.execute(
+                        """
+                        INSERT INTO bodemkaart_gfi_cache
+                            (layer, cel_x, cel_y, negatief, resultaat, opgehaald_op, verloopt_op)
+                        VALUES (%s, %s, %s, %s, %s, now(), now() + make_interval(secs => %s))
+                        ON CONFLICT (layer, cel_x, cel_y) DO UPDATE
+                        SET negatief = EXCLUDED.negatief,
+                            resultaat = EXCLUDED.resultaat,
+                            opgehaald_op = EXCLUDED.opgehaald_op,
+                            verloopt_op = EXCLUDED.verloopt_op
+                        """,
+                        (layer, cel_x, cel_y, negatief,
+                         None if negatief else json.dumps(resultaat, default=str),
+                         dagen * 86400.0)
+                    )
+            self._tel("stored")
+        except Exception as e:
+            self._tel("errors")
+            logger.warning("Bodemkaart-cache opslaan mislukt: %s", e)
+
+    # -------- Laag / capabilities --------
+
+    def get_meta(self, sleutel: str) -> Optional[str]:
+        try:
+            conn = db.get_connection()
+            try:
+                c = conn.cursor()
+                c.execute(
+                    """
+                    SELECT waarde FROM bodemkaart_wms_meta
+                    WHERE sleutel = %s AND opgehaald_op > now() - make_interval(secs => %s)
+                    """,
+                    (sleutel, self.meta_ttl_dagen * 86400.0)
+                )
+                row = c.fetchone()
+                conn.rollback()
+            finally:
+                conn.close()
+        except Exception as e:
+            self._tel("errors")
+            logger.warning("Bodemkaart-meta lezen mislukt: %s", e)
+            return None
+        self._tel("meta_hits" if row else "meta_misses")
+        return row[0] if row else None
+
+    def set_meta(self, sleutel: str, waarde: Optional[str]) -> None:
+        try:
+            with db.connection() as conn:
+                with conn.cursor() as c:
+                    c.execute(
+                        """
+                        INSERT INTO bodemkaart_wms_meta (sleutel, waarde, opgehaald_op)
+                        VALUES (%s, %s, now())
+                        ON CONFLICT (sleutel) DO UPDATE
+                        SET waarde = EXCLUDED.waarde, opgehaald_op = EXCLUDED.opgehaald_op
+                        """,
+                        (sleutel, waarde)
+                    )
+        except Exception as e:
+            self._tel("errors")
+            logger.warning("Bodemkaart-meta opslaan mislukt: %s", e)
+
+    # -------- Beheer --------
+
+    def opruimen(self) -> int:
+        """Verlopen rijen verwijderen; geeft het aantal terug."""
+        with db.connection() as conn:
+            with conn.cursor() as c:
+                c.execute("DELETE FROM bodemkaart_gfi_cache WHERE verloopt_op <= now()")
+                return c.rowcount
+
+    def leeg(self) -> None:
+        with db.connection() as conn:
+            with conn.cursor() as c:
+                c.execute("DELETE FROM bodemkaart_gfi_cache")
+                c.execute("DELETE FROM bodemkaart_wms_meta")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        opvragingen = s["hits"] + s["negative_hits"] + s["misses"]
+        s["hit_ratio"] = round((s["hits"] + s["negative_hits"]) / opvragingen, 4) if opvragingen else None
+        s["cel_m"] = self.cel_m
+        s["ttl_dagen"] = self.ttl_dagen
+        s["neg_ttl_dagen"] = self.neg_ttl_dagen
+        try:
+            conn = db.get_connection()
+            try:
+                c = conn.cursor()
+                c.execute(
+                    """
+                    SELECT COUNT(*) FILTER (WHERE verloopt_op > now()),
+                           COUNT(*) FILTER (WHERE verloopt_op > now() AND negatief)
+                    FROM bodemkaart_gfi_cache
+                    """
+                )
+                s["rijen"], s["rijen_negatief"] = c.fetchone()
+                conn.rollback()
+            finally:
+                conn.close()
+        except Exception as e:
+            s["rijen"] = None
+            logger.warning("Bodemkaart-cache telling mislukt: %s", e)
+        return s
+
+
+bodemkaart_cache = BodemkaartCache() if CACHE_ENABLED else None
@@ -1,10 +1,14 @@
 # app/services/bodemkaart_wms.py
 from __future__ import annotations
 
+import contextvars
 import math
+import os
 import re
+import time
 import logging
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from threading import Lock
 from typing import Any, Dict, List, Optional, Tuple
 import xml.etree.ElementTree as ET
@@ -13,16 +17,32 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from app.services.weerbaarheid import (
+    CircuitOpen, DeadlineVerstreken, breaker, is_transportfout, timeout_voor
+)
+
 """
 PDOK BRO Bodemkaart – robuuste WMS GetFeatureInfo client
 
 - Detecteert automatisch de juiste (queryable) bodemlaag via GetCapabilities.
-- Voert GetFeatureInfo uit met voorkeur voor JSON, met HTML/XML fallback.
+- Voert GetFeatureInfo uit met voorkeur voor JSON, met HTML/XML fallback;
+  het INFO_FORMAT dat de server echt beantwoordde wordt onthouden en daarna
+  als eerste geprobeerd.
+- query_multiple_points: begrensde thread-pool (BODEMKAART_MAX_CONCURRENCY,
+  default 4 gelijktijdige requests naar PDOK), punten in dezelfde cel
+  worden één keer opgevraagd; resultaten in invoervolgorde met duration_ms.
 - Extraheert properties en **normaliseert kolomnamen** zodat je in je app
   altijd dezelfde sleutels hebt.
 - Levert `soil_text` op basis van de beste kolom (met prioriteit op de
   PDOK-namen die je screenshot toont).
 
+- Optionele persistente cache (bodemkaart_cache.BodemkaartCache) voor
+  GetFeatureInfo-resultaten per gekwantiseerde cel en voor de gekozen laag /
+  capabilities; de default-client gebruikt die als hij aan staat.
+- Circuit breaker "bodemkaart_wms" en het tijdsbudget van de request
+  (services/weerbaarheid.py); bij een transportfout worden de andere
+  INFO_FORMATs niet meer geprobeerd.
+
 Publieke helpers (backwards compatible):
 - query_soil_at_point(lat, lon) -> {"soil_text": str|None, "raw": {...}}
 - pick_bodem_layer_name() -> str|None
@@ -39,6 +59,17 @@ DEFAULT_TIMEOUT = 15
 MAX_RETRIES = 3
 BACKOFF_FACTOR = 0.4
 
+try:
+    MAX_CONCURRENCY = max(1, int(os.getenv("BODEMKAART_MAX_CONCURRENCY", "4")))
+except ValueError:
+    MAX_CONCURRENCY = 4
+
+# Punten binnen dezelfde cel (Web Mercator-meters) delen één GetFeatureInfo
+DEDUPE_CEL_M = 25.0
+
+# Circuit breaker / tijdsbudget (services/weerbaarheid.py)
+BREAKER = "bodemkaart_wms"
+
 # Niet té strikt houden, maar netjes voor waarschuwingen:
 NL_LAT_MIN, NL_LAT_MAX = 50.0, 54.5
 NL_LON_MIN, NL_LON_MAX = 2.8, 8.1
@@ -116,6 +147,8 @@ class SoilQueryResult:
     properties: Optional[Dict[str, Any]] = None      # genormaliseerde keys
     feature: Optional[Dict[str, Any]] = None
     error_message: Optional[str] = None
+    from_cache: bool = False
+    duration_ms: Optional[float] = None
 
 
 class BodemkaartWMSError(Exception):
@@ -137,15 +170,17 @@ class BodemkaartWMSClient:
     Robuuste PDOK Bodemkaart WMS-client met normalisatie van kolomnamen.
     """
 
-    def __init__(self, timeout: int = DEFAULT_TIMEOUT, buffer_m: float = 40.0):
+    def __init__(self, timeout: int = DEFAULT_TIMEOUT, buffer_m: float = 40.0, cache=None):
         self.timeout = timeout
         self.buffer_m = buffer_m
+        self.cache = cache  # BodemkaartCache of None
         self._layer_cache: Optional[str] = None
+        self._info_format: Optional[str] = None  # laatst beantwoorde INFO_FORMAT
         self._cache_lock = Lock()
         self._session = self._build_session()
 
     @staticmethod
-    def _build_session() -> requests.Session:
+    def _build_session(pool_size: int = MAX_CONCURRENCY) -> requests.Session:
         s = requests.Session()
         retry = Retry(
             total=MAX_RETRIES,
@@ -155,7 +190,7 @@ class BodemkaartWMSClient:
             status_forcelist=[429, 500, 502, 503, 504],
             allowed_methods=["GET"],
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
         s.mount("https://", adapter)
         s.mount("http://", adapter)
         s.headers.update(
@@ -193,14 +228,46 @@ class BodemkaartWMSClient:
             if self._layer_cache:
                 return self._layer_cache
 
+        # Koude worker: laag (of anders het capabilities-document) uit de persistente cache
+        if self.cache is not None:
+            chosen = self.cache.get_meta("layer")
+            if not chosen:
+                capabilities = self.cache.get_meta("capabilities")
+                if capabilities:
+                    try:
+                        chosen = self._choose_layer(ET.fromstring(capabilities.encode("utf-8")))
+                    except Exception as e:
+                        logger.debug("Gecachet capabilities-document onbruikbaar: %s", e)
+            if chosen:
+                with self._cache_lock:
+                    self._layer_cache = chosen
+                return chosen
+
         params = {"service": "WMS", "request": "GetCapabilities", "version": WMS_VERSION}
         try:
-            r = self._session.get(WMS_BASE, params=params, timeout=self.timeout)
-            r.raise_for_status()
+            with breaker(BREAKER).bewaakt():
+                r = self._session.get(WMS_BASE, params=params, timeout=timeout_voor(self.timeout))
+                r.raise_for_status()
             root = ET.fromstring(r.content)
         except Exception as e:
             raise LayerDiscoveryError(f"GetCapabilities mislukte: {e}")
 
+        chosen = self._choose_layer(root)
+
+        with self._cache_lock:
+            self._layer_cache = chosen
+
+        if chosen:
+            logger.info("Gekozen bodemlaag: %s", chosen)
+            if self.cache is not None:
+                self.cache.set_meta("capabilities", r.content.decode("utf-8", errors="replace"))
+                self.cache.set_meta("layer", chosen)
+        else:
+            logger.error("Geen geschikte queryable bodemlaag gevonden.")
+        return chosen
+
+    @staticmethod
+    def _choose_layer(root: ET.Element) -> Optional[str]:
         # Verzamel queryable lagen met bodem/soil/grond in de naam
         candidates: List[str] = []
         for layer in root.findall(".//wms:Layer/wms:Layer", WMS_NS):
@@ -228,14 +295,6 @@ class BodemkaartWMSClient:
                 break
         if not chosen and candidates:
             chosen = candidates[0]
-
-        with self._cache_lock:
-            self._layer_cache = chosen
-
-        if chosen:
-            logger.info("Gekozen bodemlaag: %s", chosen)
-        else:
-            logger.error("Geen geschikte queryable bodemlaag gevonden.")
         return chosen
 
     def get_available_layer(self) -> Optional[str]:
@@ -244,6 +303,7 @@ class BodemkaartWMSClient:
     def clear_cache(self) -> None:
         with self._cache_lock:
             self._layer_cache = None
+            self._info_format = None
 
     # -------------------- GetFeatureInfo --------------------
 
@@ -267,17 +327,29 @@ class BodemkaartWMSClient:
         }
 
     def _try_gfi(self, params: Dict[str, str]) -> Tuple[Optional[str], Optional[Any]]:
-        for fmt in PREFERRED_INFO_FORMATS:
+        with self._cache_lock:
+            bekend = self._info_format
+        formats = PREFERRED_INFO_FORMATS
+        if bekend:
+            formats = [bekend] + [f for f in PREFERRED_INFO_FORMATS if f != bekend]
+        for fmt in formats:
             p = dict(params)
             p["INFO_FORMAT"] = fmt
             try:
-                r = self._session.get(WMS_BASE, params=p, timeout=self.timeout)
-                r.raise_for_status()
-                if fmt == "application/json":
-                    return fmt, r.json()
-                return fmt, r.text
+                with breaker(BREAKER).bewaakt():
+                    r = self._session.get(WMS_BASE, params=p, timeout=timeout_voor(self.timeout))
+                    r.raise_for_status()
+                payload = r.json() if fmt == "application/json" else r.text
+                if fmt != bekend:
+                    with self._cache_lock:
+                        self._info_format = fmt
+                return fmt, payload
+            except (CircuitOpen, DeadlineVerstreken):
+                raise
             except Exception as e:
                 logger.debug("GetFeatureInfo (%s) faalde: %s", fmt, e)
+                if is_transportfout(e):
+                    break  # dienst traag/onbereikbaar: andere formaten helpen niet
                 continue
         return None, None
 
@@ -395,6 +467,33 @@ class BodemkaartWMSClient:
                 error_message="Geen queryable bodemlaag gevonden in WMS capabilities.",
             )
 
+        if self.cache is not None:
+            hit = self.cache.get(layer, lat, lon)
+            if hit is not None:
+                return SoilQueryResult(
+                    success=True,
+                    soil_text=hit.get("soil_text"),
+                    layer_name=layer,
+                    coordinates=(lat, lon),
+                    info_format_used=hit.get("info_format"),
+                    properties_raw=hit.get("properties_raw") or {},
+                    properties=hit.get("properties") or {},
+                    feature=hit.get("feature"),
+                    from_cache=True,
+                )
+
+        res = self._query_remote(layer, lat, lon)
+        if self.cache is not None and res.success:
+            self.cache.set(layer, lat, lon, {
+                "soil_text": res.soil_text,
+                "info_format": res.info_format_used,
+                "properties_raw": res.properties_raw,
+                "properties": res.properties,
+                "feature": res.feature,
+            })
+        return res
+
+    def _query_remote(self, layer: str, lat: float, lon: float) -> SoilQueryResult:
         params = self._build_gfi_params(layer, lat, lon)
         used_fmt, payload = self._try_gfi(params)
         if used_fmt is None or payload is None:
@@ -443,21 +542,79 @@ class BodemkaartWMSClient:
             feature=feature,
         )
 
-    def query_multiple_points(self, coordinates: List[Tuple[float, float]]) -> List[SoilQueryResult]:
-        out: List[SoilQueryResult] = []
-        for (lat, lon) in coordinates or []:
+    def _query_timed(self, lat: float, lon: float) -> SoilQueryResult:
+        t0 = time.perf_counter()
+        try:
+            res = self.query_soil_at_point(lat, lon)
+        except Exception as e:
+            res = SoilQueryResult(
+                success=False,
+                soil_text=None,
+                layer_name=self._layer_cache,
+                coordinates=(lat, lon),
+                error_message=str(e),
+            )
+        res.duration_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+        return res
+
+    def _dedupe_cel(self, lat: float, lon: float) -> Tuple[int, int]:
+        x, y = self._ll_to_web_mercator(lon, lat)
+        return int(math.floor(x / DEDUPE_CEL_M)), int(math.floor(y / DEDUPE_CEL_M))
+
+    def query_multiple_points(
+        self,
+        coordinates: List[Tuple[float, float]],
+        max_workers: int = MAX_CONCURRENCY,
+    ) -> List[SoilQueryResult]:
+        """
+        Bodem voor meerdere punten, in invoervolgorde. Punten in dezelfde
+        DEDUPE_CEL_M-cel delen één opvraging (resultaat met hun eigen
+        coordinates en de duur van die gedeelde opvraging). Maximaal
+        `max_workers` gelijktijdige requests; de laag wordt vooraf één keer
+        bepaald zodat de workers niet allemaal GetCapabilities doen.
+        """
+        punten = list(coordinates or [])
+        if not punten:
+            return []
+
+        # Per cel het eerste punt als representant
+        representant: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        cellen: List[Optional[Tuple[int, int]]] = []
+        for lat, lon in punten:
             try:
-                out.append(self.query_soil_at_point(lat, lon))
-            except Exception as e:
-                out.append(
-                    SoilQueryResult(
-                        success=False,
-                        soil_text=None,
-                        layer_name=self._layer_cache,
-                        coordinates=(lat, lon),
-                        error_message=str(e),
-                    )
-                )
+                cel = self._dedupe_cel(float(lat), float(lon))
+            except (TypeError, ValueError):
+                cel = None  # ongeldig: per punt laten falen in query_soil_at_point
+            cellen.append(cel)
+            if cel is not None and cel not in representant:
+                representant[cel] = (lat, lon)
+
+        try:
+            self._discover_layer()
+        except Exception as e:
+            logger.warning("Laagdetectie vooraf mislukt: %s", e)
+
+        werk = list(representant.items())
+        workers = max(1, min(int(max_workers or 1), len(werk)))
+        if workers == 1:
+            resultaten = [self._query_timed(lat, lon) for _, (lat, lon) in werk]
+        else:
+            # Eigen kopie van de context per taak, zodat een tijdsbudget
+            # (weerbaarheid.deadline) ook in de workers geldt
+            taken = [(contextvars.copy_context(), punt) for _, punt in werk]
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bodemkaart") as pool:
+                resultaten = list(pool.map(lambda t: t[0].run(self._query_timed, *t[1]), taken))
+        per_cel = {cel: res for (cel, _), res in zip(werk, resultaten)}
+
+        out: List[SoilQueryResult] = []
+        gebruikt = set()
+        for (lat, lon), cel in zip(punten, cellen):
+            if cel is None:
+                out.append(self._query_timed(lat, lon))
+                continue
+            res = per_cel[cel]
+            out.append(res if cel not in gebruikt else replace(res, coordinates=(lat, lon)))
+            gebruikt.add(cel)
         return out
 
 
@@ -471,7 +628,12 @@ def _get_client() -> BodemkaartWMSClient:
     global _default_client
     with _client_lock:
         if _default_client is None:
-            _default_client = BodemkaartWMSClient()
+            try:
+                from app.services.bodemkaart_cache import bodemkaart_cache as cache
+            except Exception as e:  # bv. geen DATABASE_URL bij handmatig testen
+                logger.info("Bodemkaart-cache niet beschikbaar: %s", e)
+                cache = None
+            _default_client = BodemkaartWMSClient(cache=cache)
         return _default_client
 
 
@@ -0,0 +1,307 @@
+# app/services/geometrie_encoding.py
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Topologie-behoudende vereenvoudiging via shapely als beschikbaar
+try:
+    import shapely.geometry as sh_geom
+except Exception:
+    sh_geom = None
+
+"""
+Compacte GeoJSON voor kaart-endpoints (dashboard-kaart, NV-gebieden,
+PDOK-proxy).
+
+Zonder parameters blijft de uitvoer ongewijzigd. Met ?zoom=<0..22> (of een
+expliciete ?tolerantie=<coördinaateenheden>, optioneel ?precisie=<decimalen>)
+worden:
+- ringen vereenvoudigd met een tolerantie van een halve kaartpixel op dat
+  zoomniveau (shapely simplify(preserve_topology=True); zonder shapely een
+  Douglas-Peucker per ring die nooit onder 4 punten zakt);
+- coördinaten afgerond op een precisie net fijner dan die tolerantie en
+  opeenvolgende dubbele punten na afronding verwijderd.
+
+Werkt voor WGS84 (graden, default) en RD (meters=True, bv. nv_gebieden).
+
+Benchmark (payloadgrootte per zoomniveau):
+    python -m app.services.geometrie_encoding [aantal_percelen] [--synthetisch]
+"""
+
+MAX_ZOOM = 22
+
+_GRADEN_PER_PIXEL_Z0 = 360.0 / 256
+_METER_PER_PIXEL_Z0 = 2 * 20037508.342789244 / 256 * math.cos(math.radians(52.2))
+
+
+def tolerantie_voor_zoom(zoom: int, meters: bool = False) -> float:
+    """Halve kaartpixel op `zoom`, in graden (WGS84) of meters (RD)."""
+    zoom = max(0, min(int(zoom), MAX_ZOOM))
+    per_pixel = _METER_PER_PIXEL_Z0 if meters else _GRADEN_PER_PIXEL_Z0
+    return per_pixel / 2 ** zoom * 0.5
+
+
+def decimalen_voor_tolerantie(tolerantie: float) -> int:
+    """Aantal decimalen waarbij de afronding ruim onder de tolerantie blijft."""
+    if not tolerantie or tolerantie <= 0:
+        return 7
+    return max(0, min(7, math.ceil(-math.log10(tolerantie)) + 1))
+
+
+# ---------------------------- Vereenvoudiging ----------------------------
+
+def _douglas_peucker(punten: Sequence[Sequence[float]], tol: float) -> List[Sequence[float]]:
+    if len(punten) < 3:
+        return list(punten)
+    keep = [False] * len(punten)
+    keep[0] = keep[-1] = True
+    stapel = [(0, len(punten) - 1)]
+    tol2 = tol * tol
+    while stapel:
+        a, b = stapel.pop()
+        ax, ay = punten[a][0], punten[a][1]
+        bx, by = punten[b][0], punten[b][1]
+        dx, dy = bx - ax, by - ay
+        lengte2 = dx * dx + dy * dy
+        max_d2, max_i = -1.0, -1
+        for i in range(a + 1, b):
+            px, py = punten[i][0], punten[i][1]
+            if lengte2 == 0:
+                d2 = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / lengte2))
+                d2 = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if d2 > max_d2:
+                max_d2, max_i = d2, i
+        if max_d2 > tol2:
+            keep[max_i] = True
+            stapel.append((a, max_i))
+            stapel.append((max_i, b))
+    return [p for p, k in zip(punten, keep) if k]
+
+
+def _vereenvoudig_ring(ring: Sequence[Sequence[float]], tol: float) -> List[Sequence[float]]:
+    if len(ring) <= 4:
+        return list(ring)
+    # Gesloten ring in twee helften splitsen, anders valt begin=eind samen
+    midden = len(ring) // 2
+    nieuw = _douglas_peucker(ring[:midden + 1], tol)[:-1] + _douglas_peucker(ring[midden:], tol)
+    if len(nieuw) >= 4:
+        return nieuw
+    # Kleiner dan de tolerantie: een driehoek houdt het vlak zichtbaar
+    n = len(ring) - 1
+    return [ring[0], ring[n // 3], ring[2 * n // 3], ring[0]]
+
+
+def _vereenvoudig_polygon(rings: Sequence[Sequence[Sequence[float]]], tol: float):
+    return [_vereenvoudig_ring(r, tol) for r in rings]
+
+
+def vereenvoudig(geom: Dict[str, Any], tolerantie: float) -> Dict[str, Any]:
+    """Polygon/MultiPolygon vereenvoudigen; andere types blijven ongemoeid."""
+    if not geom or not tolerantie or geom.get("type") not in ("Polygon", "MultiPolygon"):
+        return geom
+    if sh_geom is not None:
+        try:
+            vorm = sh_geom.shape(geom).simplify(tolerantie, preserve_topology=True)
+            if not vorm.is_empty:
+                return sh_geom.mapping(vorm)
+        except Exception:
+            pass
+    if geom["type"] == "Polygon":
+        return {"type": "Polygon", "coordinates": _vereenvoudig_polygon(geom["coordinates"], tolerantie)}
+    return {
+        "type": "MultiPolygon",
+        "coordinates": [_vereenvoudig_polygon(p, tolerantie) for p in geom["coordinates"]],
+    }
+
+
+# ---------------------------- Quantisatie ----------------------------
+
+def _quantiseer_ring(ring: Iterable[Sequence[float]], decimalen: int) -> List[List[float]]:
+    uit: List[List[float]] = []
+    for p in ring:
+        q = [round(float(p[0]), decimalen), round(float(p[1]), decimalen)]
+        if not uit or q != uit[-1]:
+            uit.append(q)
+    if len(uit) >= 2 and uit[0] != uit[-1]:
+        uit.append(list(uit[0]))
+    return uit
+
+
+def _quantiseer_polygon(rings: Sequence[Sequence[Sequence[float]]], decimalen: int):
+    uit = []
+    for i, ring in enumerate(rings):
+        q = _quantiseer_ring(ring, decimalen)
+        if len(q) >= 4:
+            uit.append(q)
+        elif i == 0:
+            # Exterieur zou na afronding ontaarden: ongerond laten
+            uit.append([list(p) for p in ring])
+        # te kleine gaten vervallen
+    return uit
+
+
+def quantiseer(geom: Dict[str, Any], decimalen: int) -> Dict[str, Any]:
+    """Coördinaten afronden; gaten die daarbij onder 4 punten zakken vervallen."""
+    if not geom or decimalen is None:
+        return geom
+    t = geom.get("type")
+    coords = geom.get("coordinates")
+    if t == "Point":
+        return {"type": t, "coordinates": [round(float(coords[0]), decimalen), round(float(coords[1]), decimalen)]}
+    if t == "Polygon":
+        return {"type": t, "coordinates": _quantiseer_polygon(coords, decimalen)}
+    if t == "MultiPolygon":
+        return {"type": t, "coordinates": [_quantiseer_polygon(p, decimalen) for p in coords]}
+    return geom
+
+
+# ---------------------------- Encoding ----------------------------
+
+@dataclass
+class GeometrieEncoding:
+    tolerantie: Optional[float] = None
+    decimalen: Optional[int] = None
+
+    @property
+    def actief(self) -> bool:
+        return self.tolerantie is not None or self.decimalen is not None
+
+    def geometrie(self, geom: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not geom or not self.actief:
+            return geom
+        if self.tolerantie:
+            geom = vereenvoudig(geom, self.tolerantie)
+        if self.decimalen is not None:
+            geom = quantiseer(geom, self.decimalen)
+        return geom
+
+    def punten(self, punten: Optional[List[Dict[str, float]]]) -> Optional[List[Dict[str, float]]]:
+        """Zelfde bewerking voor de [{lat,lng},...]-lijst van polygon_coordinates."""
+        if not punten or not self.actief:
+            return punten
+        ring = [[float(p["lng"]), float(p["lat"])] for p in punten]
+        if ring[0] != ring[-1]:
+            ring.append(ring[0])
+        geom = self.geometrie({"type": "Polygon", "coordinates": [ring]})
+        return [{"lat": y, "lng": x} for x, y in geom["coordinates"][0]]
+
+
+def encoding_uit_request(args, meters: bool = False) -> GeometrieEncoding:
+    """
+    Leest ?zoom= / ?tolerantie= / ?precisie= uit request.args.
+    Zonder parameters: GeometrieEncoding() (uitvoer ongewijzigd).
+    """
+    tolerantie = None
+    zoom = args.get("zoom", type=float)
+    if zoom is not None:
+        tolerantie = tolerantie_voor_zoom(int(zoom), meters=meters)
+    tol_arg = args.get("tolerantie", type=float)
+    if tol_arg is not None and tol_arg >= 0:
+        tolerantie = tol_arg or None
+
+    decimalen = args.get("precisie", type=int)
+    if decimalen is not None:
+        decimalen = max(0, min(decimalen, 10))
+    elif tolerantie:
+        decimalen = decimalen_voor_tolerantie(tolerantie)
+    return GeometrieEncoding(tolerantie=tolerantie, decimalen=decimalen)
+
+
+# ---------------------------- Benchmark ----------------------------
+
+def _payload_bytes(geometrieen: Iterable[Dict[str, Any]]) -> int:
+    fc = {"type": "FeatureCollection",
+          "features": [{"type": "Feature", "geometry": g, "properties": {}} for g in geometrieen]}
+    return len(json.dumps(fc, separators=(",", ":")).encode("utf-8"))
+
+
+def benchmark(geometrieen: List[Dict[str, Any]], zooms: Sequence[int] = (8, 11, 13, 15, 17)) -> List[Dict[str, Any]]:
+    """
+    Payloadgrootte (compacte JSON) en aantal vertices per zoomniveau t.o.v.
+    de ongewijzigde geometrieën. Geeft een lijst rijen terug.
+    """
+    import time
+
+    def n_vertices(g):
+        t, c = g.get("type"), g.get("coordinates")
+        if t == "Polygon":
+            return sum(len(r) for r in c)
+        if t == "MultiPolygon":
+            return sum(len(r) for p in c for r in p)
+        return 0
+
+    basis = _payload_bytes(geometrieen)
+    basis_v = sum(n_vertices(g) for g in geometrieen)
+    rijen = [{"zoom": "origineel", "bytes": basis, "vertices": basis_v, "reductie_pct": 0.0, "ms": 0.0}]
+    for z in zooms:
+        tol = tolerantie_voor_zoom(z)
+        enc = GeometrieEncoding(tolerantie=tol, decimalen=decimalen_voor_tolerantie(tol))
+        t0 = time.perf_counter()
+        uit = [enc.geometrie(g) for g in geometrieen]
+        ms = (time.perf_counter() - t0) * 1000
+        b = _payload_bytes(uit)
+        rijen.append({
+            "zoom": z,
+            "bytes": b,
+            "vertices": sum(n_vertices(g) for g in uit),
+            "reductie_pct": round(100.0 * (1 - b / basis), 1) if basis else 0.0,
+            "ms": round(ms, 1),
+        })
+    return rijen
+
+
+def synthetische_percelen(aantal: int = 500, punten_per_ring: int = 200, seed: int = 1) -> List[Dict[str, Any]]:
+    """Ruwe perceelvormen (~2-10 ha) rond het midden van Nederland, voor de benchmark zonder database."""
+    import random
+
+    rnd = random.Random(seed)
+    uit = []
+    for _ in range(aantal):
+        cx, cy = 5.0 + rnd.uniform(-1.5, 1.5), 52.2 + rnd.uniform(-0.8, 0.8)
+        rx, ry = rnd.uniform(0.001, 0.003), rnd.uniform(0.0005, 0.0015)
+        ring = []
+        for i in range(punten_per_ring):
+            a = 2 * math.pi * i / punten_per_ring
+            ruis = 1 + rnd.uniform(-0.01, 0.01)
+            ring.append([cx + rx * math.cos(a) * ruis, cy + ry * math.sin(a) * ruis])
+        ring.append(ring[0])
+        uit.append({"type": "Polygon", "coordinates": [ring]})
+    return uit
+
+
+def _percelen_uit_db(aantal: int) -> List[Dict[str, Any]]:
+    import app.models.database_beheer as db
+    from app.models.perceel_geometrie import perceel_geojson
+
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(
+            """
+            SELECT geometry_geojson, polygon_coordinates FROM percelen
+            WHERE geometry_geojson IS NOT NULL OR polygon_coordinates IS NOT NULL
+            LIMIT %s
+            """,
+            (aantal,)
+        )
+        teksten = [perceel_geojson(g, p) for g, p in c.fetchall()]
+    finally:
+        conn.close()
+    return [json.loads(t) for t in teksten if t]
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    aantal = int(args[0]) if args else 500
+    geoms = synthetische_percelen(aantal) if "--synthetisch" in sys.argv else _percelen_uit_db(aantal)
+    print(f"{len(geoms)} geometrieën, shapely: {'ja' if sh_geom is not None else 'nee'}")
+    print(f"{'zoom':>10} {'bytes':>12} {'vertices':>10} {'reductie':>9} {'ms':>8}")
+    for r in benchmark(geoms):
+        print(f"{r['zoom']:>10} {r['bytes']:>12} {r['vertices']:>10} {r['reductie_pct']:>8}% {r['ms']:>8}")
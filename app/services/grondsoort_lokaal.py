@@ -0,0 +1,263 @@
+# app/services/grondsoort_lokaal.py
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+import app.models.database_beheer as db
+
+"""
+Lokale (offline) grondsoort- en regio-opzoeking in PostGIS.
+
+De RVO-grondsoortenkaart en de regio's 'Zuidelijk zand- en lössgebied' en
+(optioneel) 'Lössgebied' worden één keer geïmporteerd in:
+
+    rvo_grondsoorten (hoofdgrondsoort, geom MultiPolygon 28992, GiST)
+    rvo_regios       (regio 'zuidelijk' | 'loess', geom MultiPolygon 28992, GiST)
+
+Daarna beantwoordt lokale_grondsoort() / lokale_grondsoorten() dezelfde vraag
+als rvo_grondsoort_at_point() met één index-query, zonder netwerk. Zo werkt
+ook nv_gebieden al. rvo_grondsoorten.rvo_grondsoort_at_point() gebruikt
+deze opzoeking eerst en valt alleen terug op de ArcGIS FeatureServer als
+er geen lokale data is (of het punt buiten de kaart valt).
+
+Import (GeoJSON; shapefiles eerst omzetten met
+`ogr2ogr -f GeoJSON uit.geojson in.shp`):
+    python -m app.services.grondsoort_lokaal import grondsoorten kaart.geojson [--veld HOOFDGRS] [--srid 28992]
+    python -m app.services.grondsoort_lokaal import zuidelijk regio.geojson [--srid 28992]
+    python -m app.services.grondsoort_lokaal import loess loess.geojson
+    python -m app.services.grondsoort_lokaal test 51.45 5.48
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+GRONDSOORT_VELD = "HOOFDGRS"
+REGIOS = ("zuidelijk", "loess")
+
+_GEOM = "ST_Multi(ST_CollectionExtract(ST_MakeValid(ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON({p}), {srid}), 28992)), 3))"
+
+CREATE_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS rvo_grondsoorten (
+        id SERIAL PRIMARY KEY,
+        hoofdgrondsoort TEXT,
+        geom geometry(MultiPolygon, 28992) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_rvo_grondsoorten_geom ON rvo_grondsoorten USING GIST (geom)",
+    """
+    CREATE TABLE IF NOT EXISTS rvo_regios (
+        id SERIAL PRIMARY KEY,
+        regio TEXT NOT NULL,               -- 'zuidelijk' of 'loess'
+        geom geometry(MultiPolygon, 28992) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_rvo_regios_geom ON rvo_regios USING GIST (geom)",
+)
+
+# Eén rij per invoerpunt (in volgorde): hoofdgrondsoort + regio-vlaggen
+_LOOKUP_SQL = """
+    WITH pt AS (
+        SELECT i, ST_Transform(ST_SetSRID(ST_Point(lng, lat), 4326), 28992) AS geom
+        FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS u(lat, lng, i)
+    )
+    SELECT
+        pt.i,
+        (SELECT g.hoofdgrondsoort FROM rvo_grondsoorten g
+          WHERE ST_Intersects(g.geom, pt.geom) LIMIT 1) AS hoofdg,
+        EXISTS (SELECT 1 FROM rvo_regios r
+                 WHERE r.regio = 'zuidelijk' AND ST_Intersects(r.geom, pt.geom)) AS in_zuidelijk,
+        EXISTS (SELECT 1 FROM rvo_regios r
+                 WHERE r.regio = 'loess' AND ST_Intersects(r.geom, pt.geom)) AS in_loess
+    FROM pt
+    ORDER BY pt.i
+"""
+
+
+def maak_tabellen(c) -> None:
+    for sql in CREATE_SQL:
+        c.execute(sql)
+
+
+# ---------------------------- Beschikbaarheid ----------------------------
+
+_BESCHIKBAAR_TTL = 300.0
+_beschikbaar: Tuple[float, bool] = (0.0, False)
+_lock = threading.Lock()
+
+
+def lokale_data_beschikbaar(force: bool = False) -> bool:
+    """Is er een grondsoortenkaart geïmporteerd? (per proces 5 min gecachet)"""
+    global _beschikbaar
+    with _lock:
+        tijd, waarde = _beschikbaar
+        if not force and time.monotonic() - tijd < _BESCHIKBAAR_TTL:
+            return waarde
+    try:
+        conn = db.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT EXISTS (SELECT 1 FROM rvo_grondsoorten)")
+            waarde = bool(c.fetchone()[0])
+            conn.rollback()
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.debug("Lokale grondsoortenkaart niet beschikbaar: %s", e)
+        waarde = False
+    with _lock:
+        _beschikbaar = (time.monotonic(), waarde)
+    return waarde
+
+
+# ---------------------------- Opzoeken ----------------------------
+
+def lokale_grondsoorten(punten: Sequence[Tuple[float, float]], conn=None) -> List[Dict[str, Any]]:
+    """
+    Ruwe RVO-velden voor een lijst (lat, lng)-punten in één query, in
+    invoervolgorde: [{"hoofdg": str, "in_zuidelijk": bool, "in_loess": bool}, ...].
+    hoofdg is "" als het punt buiten de grondsoortenkaart valt.
+    """
+    if not punten:
+        return []
+    lats = [float(p[0]) for p in punten]
+    lngs = [float(p[1]) for p in punten]
+    eigen = conn is None
+    conn = conn or db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(_LOOKUP_SQL, (lats, lngs))
+        rows = c.fetchall()
+        if eigen:
+            conn.rollback()
+    finally:
+        if eigen:
+            conn.close()
+    return [
+        {"hoofdg": (r[1] or "").strip(), "in_zuidelijk": bool(r[2]), "in_loess": bool(r[3])}
+        for r in rows
+    ]
+
+
+def lokale_grondsoort(lat: float, lng: float) -> Optional[Dict[str, Any]]:
+    """Zelfde velden voor één punt; None als er geen lokale data is."""
+    if not lokale_data_beschikbaar():
+        return None
+    return lokale_grondsoorten([(lat, lng)])[0]
+
+
+# ---------------------------- Import ----------------------------
+
+def _srid_uit_crs(fc: Dict[str, Any]) -> Optional[int]:
+    naam = (((fc.get("crs") or {}).get("properties") or {}).get("name") or "")
+    m = re.search(r"(\d{4,5})\s*$", naam)
+    if m:
+        return int(m.group(1))
+    if "CRS84" in naam:
+        return 4326
+    return None
+
+
+def _features(pad: str) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    with open(pad, encoding="utf-8") as f:
+        fc = json.load(f)
+    if fc.get("type") == "Feature":
+        return [fc], _srid_uit_crs(fc)
+    return list(fc.get("features") or []), _srid_uit_crs(fc)
+
+
+def _importeer(c, tabel: str, kolom: str, rijen: Iterable[Tuple[str, str]], srid: int,
+               batch_size: int) -> int:
+    sql = (
+        f"INSERT INTO {tabel} ({kolom}, geom) "
+        f"SELECT v.waarde, {_GEOM.format(p='v.geojson', srid=int(srid))} "
+        "FROM (VALUES %s) AS v(waarde, geojson)"
+    )
+    batch: List[Tuple[str, str]] = []
+    aantal = 0
+    for rij in rijen:
+        batch.append(rij)
+        if len(batch) >= batch_size:
+            execute_values(c, sql, batch, template="(%s, %s::text)")
+            aantal += len(batch)
+            batch = []
+    if batch:
+        execute_values(c, sql, batch, template="(%s, %s::text)")
+        aantal += len(batch)
+    return aantal
+
+
+def importeer_bestand(soort: str, pad: str, veld: str = GRONDSOORT_VELD,
+                      srid: Optional[int] = None, vervang: bool = True,
+                      batch_size: int = 500) -> int:
+    """
+    Importeer een GeoJSON-bestand als 'grondsoorten' of als regio
+    ('zuidelijk' / 'loess'). Met vervang=True worden de bestaande rijen van
+    die soort in dezelfde transactie vervangen. Geeft het aantal features.
+    """
+    if soort not in ("grondsoorten",) + REGIOS:
+        raise ValueError(f"Onbekende soort '{soort}' (grondsoorten, zuidelijk, loess)")
+
+    features, crs_srid = _features(pad)
+    srid = srid or crs_srid or 4326
+
+    def geojson(feat):
+        g = feat.get("geometry")
+        if not g or g.get("type") not in ("Polygon", "MultiPolygon"):
+            return None
+        return json.dumps({"type": g["type"], "coordinates": g["coordinates"]}, separators=(",", ":"))
+
+    with db.connection() as conn:
+        c = conn.cursor()
+        maak_tabellen(c)
+        if soort == "grondsoorten":
+            if vervang:
+                c.execute("DELETE FROM rvo_grondsoorten")
+            rijen = (
+                (str((f.get("properties") or {}).get(veld) or "").strip(), geojson(f))
+                for f in features if geojson(f)
+            )
+            aantal = _importeer(c, "rvo_grondsoorten", "hoofdgrondsoort", rijen, srid, batch_size)
+        else:
+            if vervang:
+                c.execute("DELETE FROM rvo_regios WHERE regio = %s", (soort,))
+            rijen = ((soort, geojson(f)) for f in features if geojson(f))
+            aantal = _importeer(c, "rvo_regios", "regio", rijen, srid, batch_size)
+        c.execute(f"ANALYZE {'rvo_grondsoorten' if soort == 'grondsoorten' else 'rvo_regios'}")
+
+    lokale_data_beschikbaar(force=True)
+    logger.info("%s: %s features geïmporteerd uit %s (EPSG:%s)", soort, aantal, pad, srid)
+    return aantal
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m app.services.grondsoort_lokaal")
+    sub = parser.add_subparsers(dest="actie", required=True)
+    p_imp = sub.add_parser("import")
+    p_imp.add_argument("soort", choices=("grondsoorten",) + REGIOS)
+    p_imp.add_argument("pad")
+    p_imp.add_argument("--veld", default=GRONDSOORT_VELD)
+    p_imp.add_argument("--srid", type=int, default=None)
+    p_imp.add_argument("--toevoegen", action="store_true", help="bestaande rijen niet eerst verwijderen")
+    p_test = sub.add_parser("test")
+    p_test.add_argument("lat", type=float)
+    p_test.add_argument("lng", type=float)
+    args = parser.parse_args()
+
+    if args.actie == "import":
+        n = importeer_bestand(args.soort, args.pad, veld=args.veld, srid=args.srid, vervang=not args.toevoegen)
+        print(f"{n} features geïmporteerd ({args.soort})")
+    else:
+        t0 = time.perf_counter()
+        res = lokale_grondsoorten([(args.lat, args.lng)])
+        print(res[0] if res else None, f"{(time.perf_counter() - t0) * 1000:.1f} ms")
@@ -0,0 +1,606 @@
+# app/services/jobs.py
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+
+import app.models.database_beheer as db
+
+"""
+Kleine jobqueue op gewone Postgres (geen Redis/broker).
+
+Trage paden (verrijking van nieuwe percelen, PDOK-import, spreadsheet-
+imports in universele_data, het PDF-rapport) zetten een job in de tabel
+`jobs` en geven direct antwoord; werkers pakken de jobs op.
+
+- enqueue(soort, payload, user_id, c=...): met de cursor van de aanroeper
+  komt de job in dezelfde transactie als de rij waar hij bij hoort (geen
+  job zonder perceel, geen perceel zonder job). Na de commit wek() aanroepen.
+  Een geüpload bestand gaat mee als `invoer` (bytea); uniek=True weigert
+  een tweede lopende job van dezelfde soort voor dezelfde gebruiker.
+- claim: `FOR UPDATE SKIP LOCKED`, zodat meerdere werkers (threads of
+  processen) elkaar niet blokkeren en geen job dubbel oppakken. Zolang een
+  job draait ververst een hartslag (en job.voortgang) locked_at; een job
+  zonder hartslag sinds JOBS_LOCK_TIMEOUT_SECS (werker gecrasht) wordt
+  opnieuw geclaimd. Alle updates van een werker gelden alleen zolang zijn
+  claim geldt (locked_by + pogingen), zodat een ingehaalde werker de
+  uitkomst van de nieuwe poging niet overschrijft.
+- Een handler is een functie `handler(job) -> dict | Bestand | None`, geregistreerd
+  met @taak("soort"). Een uitzondering geeft een nieuwe poging na
+  exponentiële backoff (JOBS_BACKOFF_SECS * 2^(poging-1), max
+  JOBS_BACKOFF_MAX_SECS); Herhaal(na=...) vraagt expliciet een latere
+  poging; Mislukt("melding") stopt direct. Na max_pogingen wordt de job
+  'failed' en draait de optionele bij_mislukt(job, fout).
+- Voortgang: job.voortgang(verwerkt, totaal, fase) (hooguit elke
+  JOBS_VOORTGANG_SECS naar de database). Een handler die een Bestand
+  teruggeeft (bv. een PDF) krijgt dat opgeslagen als downloadbaar resultaat;
+  status en download via /jobs/<id> en /jobs/<id>/resultaat.
+- Werkers: het aparte proces `python -m app.worker` (zie Procfile) draait
+  de jobs; het web-proces niet, zodat PDF's en imports geen gunicorn-worker
+  en zijn connecties bezet houden. Alleen zonder werkerproces (bv. lokaal)
+  JOBS_WERKERS=N zetten: dan start create_app N threads in elk web-proces.
+  Werkers pollen elke JOBS_POLL_SECS of worden gewekt, en ruimen eens per
+  uur afgeronde jobs ouder dan JOBS_BEWAAR_DAGEN op.
+
+Statussen: queued | running | done | failed.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+WERKERS = max(0, _env_int("JOBS_WERKERS", 0))   # threads in het web-proces (opt-in)
+POLL_SECS = max(0.2, _env_float("JOBS_POLL_SECS", 2.0))
+LOCK_TIMEOUT_SECS = max(30, _env_int("JOBS_LOCK_TIMEOUT_SECS", 900))
+BACKOFF_SECS = _env_float("JOBS_BACKOFF_SECS", 5.0)
+BACKOFF_MAX_SECS = _env_float("JOBS_BACKOFF_MAX_SECS", 600.0)
+MAX_POGINGEN = max(1, _env_int("JOBS_MAX_POGINGEN", 5))
+BEWAAR_DAGEN = _env_int("JOBS_BEWAAR_DAGEN", 7)
+VOORTGANG_SECS = _env_float("JOBS_VOORTGANG_SECS", 1.0)
+HARTSLAG_SECS = max(1.0, _env_float("JOBS_HARTSLAG_SECS", LOCK_TIMEOUT_SECS / 5))
+
+# Modules met @taak-handlers; worden geïmporteerd voordat een werker claimt
+TAAK_MODULES = (
+    "app.services.perceel_verrijking",
+    "app.services.pdok_import",
+    "app.universele_data.imports",
+    "app.rapportage.pdf",
+    "app.models.nv_classificatie",
+)
+
+CREATE_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id BIGSERIAL PRIMARY KEY,
+        soort TEXT NOT NULL,
+        payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+        user_id TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+        pogingen INTEGER NOT NULL DEFAULT 0,
+        max_pogingen INTEGER NOT NULL DEFAULT 5,
+        run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+        locked_at TIMESTAMPTZ,
+        locked_by TEXT,
+        resultaat JSONB,
+        fout TEXT,
+        aangemaakt TIMESTAMPTZ NOT NULL DEFAULT now(),
+        bijgewerkt TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_jobs_wachtrij ON jobs (run_after, id) WHERE status = 'queued'",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs (locked_at) WHERE status = 'running'",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user_id, aangemaakt DESC)",
+    # Voortgang, invoerbestand en downloadbaar resultaat
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS verwerkt INTEGER",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS totaal INTEGER",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS fase TEXT",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS invoer BYTEA",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS bestand BYTEA",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS bestand_naam TEXT",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS bestand_mime TEXT",
+)
+
+_CLAIM_SQL = """
+    UPDATE jobs j
+    SET status = 'running', pogingen = j.pogingen + 1,
+        locked_at = now(), locked_by = %s, bijgewerkt = now()
+    WHERE j.id = (
+        SELECT id FROM jobs
+        WHERE soort = ANY(%s)
+          AND ((status = 'queued' AND run_after <= now())
+               OR (status = 'running' AND pogingen < max_pogingen
+                   AND locked_at < now() - make_interval(secs => %s)))
+        ORDER BY run_after, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.id, j.soort, j.payload, j.user_id, j.pogingen, j.max_pogingen
+"""
+
+
+def maak_tabellen(c) -> None:
+    for sql in CREATE_SQL:
+        c.execute(sql)
+
+
+# ---------------------------- Registratie ----------------------------
+
+@dataclass
+class Bestand:
+    """Downloadbaar resultaat van een job (bv. een PDF)."""
+    naam: str
+    mime: str
+    data: bytes
+
+
+@dataclass
+class Job:
+    id: int
+    soort: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    user_id: Optional[str] = None
+    poging: int = 1
+    max_pogingen: int = MAX_POGINGEN
+    werker: Optional[str] = None
+    _gemeld: float = field(default=0.0, repr=False)
+
+    @property
+    def laatste_poging(self) -> bool:
+        return self.poging >= self.max_pogingen
+
+    def voortgang(self, verwerkt: Optional[int] = None, totaal: Optional[int] = None,
+                  fase: Optional[str] = None, direct: bool = False) -> None:
+        """Voortgang vastleggen; zonder `direct` hooguit elke VOORTGANG_SECS."""
+        nu = time.monotonic()
+        if not direct and nu - self._gemeld < VOORTGANG_SECS:
+            return
+        self._gemeld = nu
+        try:
+            with db.connection() as conn:
+                c = conn.cursor()
+                c.execute(
+                    """
+                    UPDATE jobs SET verwerkt = COALESCE(%s, verwerkt), totaal = COALESCE(%s, totaal),
+                           fase = COALESCE(%s, fase), locked_at = now(), bijgewerkt = now()
+                    WHERE id = %s AND locked_by IS NOT DISTINCT FROM %s AND pogingen = %s
+                    """,
+                    (verwerkt, totaal, fase, self.id, self.werker, self.poging),
+                )
+        except Exception as e:  # voortgang is informatief; de job zelf gaat door
+            logger.warning("Voortgang job %s niet opgeslagen: %s", self.id, e)
+
+    def invoer(self) -> Optional[bytes]:
+        """Het bij enqueue meegegeven bestand (apart opgehaald, kan groot zijn)."""
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT invoer FROM jobs WHERE id = %s", (self.id,))
+            rij = c.fetchone()
+        return bytes(rij[0]) if rij and rij[0] is not None else None
+
+
+class Herhaal(Exception):
+    """Vraag een nieuwe poging aan, na `na` seconden (anders de gewone backoff)."""
+
+    def __init__(self, bericht: str = "", na: Optional[float] = None):
+        super().__init__(bericht)
+        self.na = na
+
+
+class Mislukt(Exception):
+    """Definitief mislukt (geen nieuwe poging); de melding is voor de gebruiker bedoeld."""
+
+
+@dataclass
+class _Taak:
+    handler: Callable[[Job], Optional[Dict[str, Any]]]
+    max_pogingen: int
+    bij_mislukt: Optional[Callable[[Job, str], None]] = None
+
+
+_taken: Dict[str, _Taak] = {}
+
+
+def taak(soort: str, max_pogingen: int = MAX_POGINGEN,
+         bij_mislukt: Optional[Callable[[Job, str], None]] = None):
+    """Decorator: registreer `handler(job)` voor jobs van deze soort."""
+    def decorator(handler):
+        _taken[soort] = _Taak(handler, max(1, max_pogingen), bij_mislukt)
+        return handler
+    return decorator
+
+
+def _laad_taken() -> None:
+    for naam in TAAK_MODULES:
+        try:
+            importlib.import_module(naam)
+        except Exception as e:
+            logger.error("Takenmodule %s niet te laden: %s", naam, e)
+
+
+# ---------------------------- Enqueue / status ----------------------------
+
+def enqueue(soort: str, payload: Optional[Dict[str, Any]] = None, user_id: Optional[str] = None,
+            c=None, max_pogingen: Optional[int] = None, vertraging_secs: float = 0,
+            invoer: Optional[bytes] = None, uniek: bool = False) -> Optional[int]:
+    """
+    Zet een job in de wachtrij en geef het id terug. Met `c` binnen de
+    transactie van de aanroeper (roep na de commit wek() aan); anders in een
+    eigen transactie. Met uniek=True None als deze gebruiker al een job van
+    deze soort heeft lopen (bv. dubbelklikken op importeren).
+    """
+    if max_pogingen is None:
+        t = _taken.get(soort)
+        max_pogingen = t.max_pogingen if t else MAX_POGINGEN
+
+    def _insert(cur) -> Optional[int]:
+        if uniek:
+            # Serialiseert gelijktijdige enqueues van dezelfde soort/gebruiker
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"jobs:{soort}:{user_id}",))
+            cur.execute(
+                "SELECT 1 FROM jobs WHERE soort = %s AND user_id IS NOT DISTINCT FROM %s "
+                "AND status IN ('queued', 'running') LIMIT 1",
+                (soort, user_id),
+            )
+            if cur.fetchone():
+                return None
+        cur.execute(
+            """
+            INSERT INTO jobs (soort, payload, user_id, max_pogingen, run_after, invoer)
+            VALUES (%s, %s::jsonb, %s, %s, now() + make_interval(secs => %s), %s)
+            RETURNING id
+            """,
+            (soort, json.dumps(payload or {}), user_id, max_pogingen, vertraging_secs,
+             psycopg2.Binary(invoer) if invoer is not None else None),
+        )
+        return _eerste(cur.fetchone())
+
+    if c is not None:
+        return _insert(c)
+    with db.connection() as conn:
+        job_id = _insert(conn.cursor())
+    if job_id is not None:
+        wek()
+    return job_id
+
+
+def _eerste(rij) -> Any:
+    return rij[0] if not isinstance(rij, dict) else next(iter(rij.values()))
+
+
+def job_status(job_id: int, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Status van één job (alleen van `user_id`, als opgegeven), of None."""
+    with db.dict_cursor() as (conn, c):
+        c.execute(
+            """
+            SELECT id, soort, status, pogingen, max_pogingen, resultaat, fout,
+                   verwerkt, totaal, fase, bestand_naam, (bestand IS NOT NULL) AS heeft_bestand,
+                   user_id, aangemaakt, bijgewerkt
+            FROM jobs WHERE id = %s
+            """,
+            (job_id,),
+        )
+        rij = c.fetchone()
+    if not rij or (user_id is not None and rij["user_id"] != user_id):
+        return None
+    uit = dict(rij)
+    uit.pop("user_id", None)
+    for k in ("aangemaakt", "bijgewerkt"):
+        uit[k] = uit[k].isoformat() if uit[k] else None
+    return uit
+
+
+def laatste_job(soort: str, user_id: Optional[str] = None) -> Optional[int]:
+    """Id van de nieuwste job van deze soort (van `user_id`, als opgegeven), of None."""
+    with db.connection() as conn:
+        c = conn.cursor()
+        if user_id is None:
+            c.execute("SELECT max(id) FROM jobs WHERE soort = %s", (soort,))
+        else:
+            c.execute("SELECT max(id) FROM jobs WHERE soort = %s AND user_id = %s", (soort, user_id))
+        rij = c.fetchone()
+    return rij[0] if rij else None
+
+
+def job_bestand(job_id: int, user_id: Optional[str] = None) -> Optional[Bestand]:
+    """Het resultaatbestand van een afgeronde job (alleen van `user_id`, als opgegeven)."""
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT user_id, bestand_naam, bestand_mime, bestand FROM jobs WHERE id = %s AND status = 'done'",
+            (job_id,),
+        )
+        rij = c.fetchone()
+    if not rij or rij[3] is None or (user_id is not None and rij[0] != user_id):
+        return None
+    return Bestand(rij[1] or f"job-{job_id}", rij[2] or "application/octet-stream", bytes(rij[3]))
+
+
+def wachtrij_stats() -> Dict[str, Any]:
+    """Aantallen per soort en status, voor het beheer."""
+    with db.dict_cursor() as (conn, c):
+        c.execute("SELECT soort, status, COUNT(*) AS n FROM jobs GROUP BY soort, status ORDER BY soort, status")
+        rijen = c.fetchall()
+    per_soort: Dict[str, Dict[str, int]] = {}
+    for r in rijen:
+        per_soort.setdefault(r["soort"], {})[r["status"]] = r["n"]
+    return {"soorten": per_soort, "werkers_dit_proces": len(_werkers)}
+
+
+def ruim_op(bewaar_dagen: int = BEWAAR_DAGEN) -> int:
+    """
+    Vastgelopen jobs zonder pogingen over op 'failed' zetten en afgeronde
+    jobs ouder dan `bewaar_dagen` verwijderen (geeft het aantal verwijderd).
+    """
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            UPDATE jobs SET status = 'failed', fout = COALESCE(fout, 'werker gestopt tijdens uitvoering'),
+                   invoer = NULL, locked_at = NULL, bijgewerkt = now()
+            WHERE status = 'running' AND pogingen >= max_pogingen
+              AND locked_at < now() - make_interval(secs => %s)
+            """,
+            (LOCK_TIMEOUT_SECS,),
+        )
+        c.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND bijgewerkt < now() - make_interval(days => %s)",
+            (bewaar_dagen,),
+        )
+        return c.rowcount
+
+
+# ---------------------------- Uitvoeren ----------------------------
+
+def _backoff(poging: int) -> float:
+    return min(BACKOFF_MAX_SECS, BACKOFF_SECS * (2 ** max(0, poging - 1)))
+
+
+def claim(werker_id: str) -> Optional[Job]:
+    """Claim de eerstvolgende uitvoerbare job (of None); de claim is direct gecommit."""
+    soorten = sorted(_taken)
+    if not soorten:
+        return None
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(_CLAIM_SQL, (werker_id, soorten, LOCK_TIMEOUT_SECS))
+        rij = c.fetchone()
+    if not rij:
+        return None
+    job_id, soort, payload, user_id, poging, max_pogingen = rij
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    return Job(job_id, soort, payload or {}, user_id, poging, max_pogingen, werker_id)
+
+
+def _hartslag(job: Job) -> bool:
+    """locked_at verversen zolang deze werker de claim heeft; False als hij is ingehaald."""
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            UPDATE jobs SET locked_at = now()
+            WHERE id = %s AND status = 'running' AND locked_by IS NOT DISTINCT FROM %s AND pogingen = %s
+            """,
+            (job.id, job.werker, job.poging),
+        )
+        return c.rowcount > 0
+
+
+class _Hartslag:
+    """Context manager: ververst locked_at elke HARTSLAG_SECS in een aparte thread."""
+
+    def __init__(self, job: Job):
+        self.job = job
+        self._klaar = threading.Event()
+        self._thread = threading.Thread(target=self._lus, name=f"hartslag-{job.id}", daemon=True)
+
+    def _lus(self) -> None:
+        while not self._klaar.wait(HARTSLAG_SECS):
+            try:
+                if not _hartslag(self.job):
+                    logger.warning("Job %s: claim van %s verlopen", self.job.id, self.job.werker)
+                    return
+            except Exception as e:  # database even weg: volgende slag opnieuw
+                logger.warning("Hartslag job %s mislukt: %s", self.job.id, e)
+
+    def __enter__(self) -> "_Hartslag":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._klaar.set()
+        self._thread.join(5)
+
+
+def _afronden(job: Job, status: str, resultaat: Any = None, fout: Optional[str] = None,
+              opnieuw_na: Optional[float] = None) -> bool:
+    """Uitkomst vastleggen; False als een andere werker de job inmiddels heeft geclaimd."""
+    claim_sql = "id = %s AND locked_by IS NOT DISTINCT FROM %s AND pogingen = %s"
+    claim_args = (job.id, job.werker, job.poging)
+    with db.connection() as conn:
+        c = conn.cursor()
+        if opnieuw_na is not None:
+            c.execute(
+                """
+                UPDATE jobs SET status = 'queued', fout = %s, locked_at = NULL, locked_by = NULL,
+                       run_after = now() + make_interval(secs => %s), bijgewerkt = now()
+                WHERE """ + claim_sql,
+                (fout, opnieuw_na) + claim_args,
+            )
+        elif isinstance(resultaat, Bestand):
+            c.execute(
+                """
+                UPDATE jobs SET status = %s, resultaat = %s::jsonb, fout = NULL, invoer = NULL,
+                       bestand = %s, bestand_naam = %s, bestand_mime = %s,
+                       locked_at = NULL, bijgewerkt = now()
+                WHERE """ + claim_sql,
+                (status, json.dumps({"bestand": resultaat.naam, "grootte": len(resultaat.data)}),
+                 psycopg2.Binary(resultaat.data), resultaat.naam, resultaat.mime) + claim_args,
+            )
+        else:
+            # Afgerond: het invoerbestand is niet meer nodig
+            c.execute(
+                """
+                UPDATE jobs SET status = %s, resultaat = %s::jsonb, fout = %s, invoer = NULL,
+                       locked_at = NULL, bijgewerkt = now()
+                WHERE """ + claim_sql,
+                (status, json.dumps(resultaat) if resultaat is not None else None, fout) + claim_args,
+            )
+        bijgewerkt = c.rowcount > 0
+    if not bijgewerkt:
+        logger.warning("Job %s: uitkomst van %s (poging %s) genegeerd, claim verlopen",
+                       job.id, job.werker, job.poging)
+    return bijgewerkt
+
+
+def voer_uit(job: Job) -> str:
+    """Draai één geclaimde job en leg de uitkomst vast; geeft de nieuwe status terug."""
+    t = _taken.get(job.soort)
+    if t is None:
+        _afronden(job, "failed", fout=f"onbekende jobsoort {job.soort!r}")
+        return "failed"
+    try:
+        with _Hartslag(job):
+            if _flask_app is not None:
+                # render_template/url_for in handlers (bv. het PDF-rapport)
+                with _flask_app.app_context():
+                    resultaat = t.handler(job)
+            else:
+                resultaat = t.handler(job)
+        if resultaat is not None and not isinstance(resultaat, (dict, Bestand)):
+            raise TypeError(f"handler gaf {type(resultaat).__name__}, verwacht dict of Bestand")
+    except Exception as e:
+        fout = str(e) if isinstance(e, Mislukt) else f"{type(e).__name__}: {e}"
+        if not job.laatste_poging and not isinstance(e, Mislukt):
+            na = e.na if isinstance(e, Herhaal) and e.na is not None else _backoff(job.poging)
+            logger.warning("Job %s (%s) poging %s/%s mislukt, opnieuw over %.0fs: %s",
+                           job.id, job.soort, job.poging, job.max_pogingen, na, fout)
+            _afronden(job, "queued", fout=fout, opnieuw_na=na)
+            return "queued"
+        logger.error("Job %s (%s) definitief mislukt: %s", job.id, job.soort, fout)
+        if t.bij_mislukt is not None:
+            try:
+                if _hartslag(job):  # alleen als deze werker de claim nog heeft
+                    t.bij_mislukt(job, fout)
+            except Exception as e2:
+                logger.error("bij_mislukt van job %s faalde: %s", job.id, e2)
+        _afronden(job, "failed", fout=fout)
+        return "failed"
+    _afronden(job, "done", resultaat=resultaat)
+    return "done"
+
+
+def verwerk_een(werker_id: str) -> bool:
+    """Claim en draai hooguit één job; False als er niets klaarstond."""
+    job = claim(werker_id)
+    if job is None:
+        return False
+    voer_uit(job)
+    return True
+
+
+# ---------------------------- Werkers ----------------------------
+
+_flask_app = None
+_wekker = threading.Event()
+_stop = threading.Event()
+_werkers: List[threading.Thread] = []
+_werkers_lock = threading.Lock()
+
+
+def wek() -> None:
+    """Maak wachtende werkers in dit proces direct wakker (bv. na een enqueue)."""
+    _wekker.set()
+
+
+def _werker_id(n: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{n}"
+
+
+_opgeruimd = 0.0
+_opruim_lock = threading.Lock()
+
+
+def _misschien_opruimen() -> None:
+    """Hooguit eens per uur (per proces) ruim_op()."""
+    global _opgeruimd
+    with _opruim_lock:
+        if time.monotonic() - _opgeruimd < 3600 and _opgeruimd:
+            return
+        _opgeruimd = time.monotonic()
+    ruim_op()
+
+
+def _werk_lus(werker_id: str) -> None:
+    while not _stop.is_set():
+        try:
+            _misschien_opruimen()
+            if verwerk_een(werker_id):
+                continue
+        except Exception as e:  # bv. database even weg: niet de thread laten sterven
+            logger.error("Jobwerker %s: %s", werker_id, e)
+            _stop.wait(POLL_SECS)
+        _wekker.wait(POLL_SECS)
+        _wekker.clear()
+
+
+def start_werkers(aantal: int = WERKERS, flask_app=None) -> int:
+    """
+    Start `aantal` werkerthreads in dit proces (idempotent, vult aan tot
+    `aantal`); geeft het aantal actieve werkers. Met `flask_app` draaien
+    handlers in een app-context.
+    """
+    global _flask_app
+    if flask_app is not None:
+        _flask_app = flask_app
+    _laad_taken()
+    with _werkers_lock:
+        _werkers[:] = [t for t in _werkers if t.is_alive()]
+        _stop.clear()
+        for n in range(len(_werkers), aantal):
+            t = threading.Thread(target=_werk_lus, args=(_werker_id(n),),
+                                 name=f"jobwerker-{n}", daemon=True)
+            t.start()
+            _werkers.append(t)
+        return len(_werkers)
+
+
+def stop_werkers(timeout: float = 5.0) -> None:
+    _stop.set()
+    _wekker.set()
+    with _werkers_lock:
+        for t in _werkers:
+            t.join(timeout)
+        _werkers.clear()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "opruimen":
+        print(f"{ruim_op()} jobs verwijderd")
+    else:
+        print(json.dumps(wachtrij_stats(), indent=2))
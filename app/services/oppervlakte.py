@@ -0,0 +1,180 @@
+# app/services/oppervlakte.py
+from __future__ import annotations
+
+import json
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+# numpy/pyproj staan in requirements.txt; zonder blijft oppervlakte None
+# en valt de aanroeper terug op ST_Area in PostGIS.
+try:
+    import numpy as np
+    import pyproj
+except Exception:
+    np = None
+    pyproj = None
+
+"""
+Oppervlakte (ha) van GeoJSON-percelen in WGS84, in bulk.
+
+Het oude _calc_area_ha_geojson bouwde per polygoon een eigen Albers-
+projectie (rond de centroid), een nieuwe Transformer en Proj('epsg:4326'),
+en transformeerde vertex voor vertex via shapely.ops.transform. Hier:
+
+- één gecachete Transformer WGS84 -> RD New (EPSG:28992); RD is voor
+  Nederlandse percelen nauwkeurig genoeg en is ook de SRID van
+  percelen.geom, dus de uitkomst past bij ST_Area;
+- alle ringen van alle polygonen in één coördinatenarray, één
+  transform-aanroep, en de shoelace-formule vectorieel per ring
+  (np.add.reduceat). Buitenring min gaten, per polygoon opgeteld.
+
+Benchmark oud vs. nieuw (verschil en doorvoer):
+    python -m app.services.oppervlakte [aantal_percelen] [--synthetisch]
+"""
+
+RD_SRID = 28992
+
+
+@lru_cache(maxsize=1)
+def rd_transformer():
+    """Gedeelde (thread-safe) Transformer EPSG:4326 -> EPSG:28992, lon/lat-volgorde."""
+    return pyproj.Transformer.from_crs(4326, RD_SRID, always_xy=True)
+
+
+def _polygonen(geom: Any) -> Optional[List[Sequence[Sequence[Sequence[float]]]]]:
+    if isinstance(geom, str):
+        try:
+            geom = json.loads(geom)
+        except ValueError:
+            return None
+    if not isinstance(geom, dict):
+        return None
+    if geom.get("type") == "Feature":
+        geom = geom.get("geometry") or {}
+    t, c = geom.get("type"), geom.get("coordinates")
+    if not c:
+        return None
+    if t == "Polygon":
+        return [c]
+    if t == "MultiPolygon":
+        return list(c)
+    return None
+
+
+def oppervlakten_ha(geometrieen: Sequence[Any], decimalen: int = 4) -> List[Optional[float]]:
+    """
+    Oppervlakte in ha per GeoJSON Polygon/MultiPolygon (dict of tekst), in
+    invoervolgorde. None voor lege/ongeldige geometrie of zonder pyproj.
+    """
+    uit: List[Optional[float]] = [None] * len(geometrieen)
+    if np is None or pyproj is None or not geometrieen:
+        return uit
+
+    coords: List[Sequence[float]] = []
+    starts: List[int] = []      # begin van elke ring in coords
+    ring_geom: List[int] = []   # index van de geometrie per ring
+    ring_teken: List[float] = []  # +1 buitenring, -1 gat
+    for gi, geom in enumerate(geometrieen):
+        polys = _polygonen(geom)
+        if not polys:
+            continue
+        for poly in polys:
+            for ri, ring in enumerate(poly or []):
+                if len(ring) < 3:
+                    continue
+                try:
+                    punten = [(float(p[0]), float(p[1])) for p in ring]
+                except (TypeError, ValueError, IndexError):
+                    continue
+                if punten[0] != punten[-1]:
+                    punten.append(punten[0])
+                starts.append(len(coords))
+                coords.extend(punten)
+                ring_geom.append(gi)
+                ring_teken.append(1.0 if ri == 0 else -1.0)
+
+    if not starts:
+        return uit
+
+    xy = np.asarray(coords, dtype=np.float64)
+    x, y = rd_transformer().transform(xy[:, 0], xy[:, 1])
+    x, y = np.asarray(x), np.asarray(y)
+
+    # Shoelace: som van x_i*y_{i+1} - x_{i+1}*y_i binnen elke ring. De
+    # laatste term van een ring (sluitpunt -> begin volgende ring) valt weg.
+    kruis = np.empty_like(x)
+    kruis[:-1] = x[:-1] * y[1:] - x[1:] * y[:-1]
+    kruis[-1] = 0.0
+    eind = np.asarray(starts[1:] + [len(x)]) - 1
+    kruis[eind] = 0.0
+    ring_opp = np.abs(np.add.reduceat(kruis, np.asarray(starts))) / 2.0
+
+    per_geom = np.zeros(len(geometrieen))
+    np.add.at(per_geom, np.asarray(ring_geom), ring_opp * np.asarray(ring_teken))
+    aanwezig = set(ring_geom)
+    for gi in aanwezig:
+        opp = per_geom[gi]
+        uit[gi] = round(float(opp) / 10000.0, decimalen) if opp > 0 else None
+    return uit
+
+
+def oppervlakte_ha(geom: Any) -> Optional[float]:
+    return oppervlakten_ha([geom])[0]
+
+
+# ---------------------------- Benchmark ----------------------------
+
+def _oppervlakte_oud(geom: Dict[str, Any]) -> Optional[float]:
+    """Oude werkwijze (per polygoon eigen Albers-projectie), alleen voor de benchmark."""
+    import shapely.geometry as sh_geom
+    from shapely.ops import transform as sh_transform
+
+    try:
+        poly = sh_geom.shape(geom)
+        centroid = poly.centroid
+        proj = pyproj.Proj(proj='aea', lat_1=centroid.y - 2, lat_2=centroid.y + 2,
+                           lat_0=centroid.y, lon_0=centroid.x)
+        wgs84 = pyproj.Proj('epsg:4326')
+        project = pyproj.Transformer.from_proj(wgs84, proj, always_xy=True).transform
+        return round(sh_transform(project, poly).area / 10000.0, 4)
+    except Exception:
+        return None
+
+
+def benchmark(geometrieen: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Doorvoer en (relatief) verschil oud vs. nieuw over dezelfde geometrieën."""
+    t0 = time.perf_counter()
+    oud = [_oppervlakte_oud(g) for g in geometrieen]
+    t_oud = time.perf_counter() - t0
+
+    rd_transformer()  # opbouw van de transformer niet meetellen
+    t0 = time.perf_counter()
+    nieuw = oppervlakten_ha(geometrieen)
+    t_nieuw = time.perf_counter() - t0
+
+    rel = [abs(n - o) / o for o, n in zip(oud, nieuw) if o and n is not None]
+    return {
+        "aantal": len(geometrieen),
+        "oud_ms": round(t_oud * 1000, 1),
+        "nieuw_ms": round(t_nieuw * 1000, 1),
+        "oud_per_sec": round(len(geometrieen) / t_oud) if t_oud else None,
+        "nieuw_per_sec": round(len(geometrieen) / t_nieuw) if t_nieuw else None,
+        "versnelling": round(t_oud / t_nieuw, 1) if t_nieuw else None,
+        "verschil_gem_pct": round(100 * sum(rel) / len(rel), 4) if rel else None,
+        "verschil_max_pct": round(100 * max(rel), 4) if rel else None,
+        "totaal_oud_ha": round(sum(o for o in oud if o), 2),
+        "totaal_nieuw_ha": round(sum(n for n in nieuw if n), 2),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app.services.geometrie_encoding import _percelen_uit_db, synthetische_percelen
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    aantal = int(args[0]) if args else 500
+    geoms = synthetische_percelen(aantal) if "--synthetisch" in sys.argv else _percelen_uit_db(aantal)
+    for k, v in benchmark(geoms).items():
+        print(f"{k:>18}: {v}")
@@ -1,12 +1,81 @@
 # app/services/pdok_gewaspercelen.py
 from __future__ import annotations
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import codecs
+import gzip
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.services.weerbaarheid import breaker, timeout_voor
+
+"""
+PDOK OGC API BRP Gewaspercelen: client met tile-cache.
+
+fetch_brp_items() vraagt niet meer per bbox één pagina op, maar:
+- knipt de bbox op in een vast raster van PDOK_TILE_GRAAD graden
+  (default 0.05, ca. 3,4 x 5,5 km), zodat pannen steeds dezelfde tiles
+  raakt;
+- haalt per tile alle pagina's op (links rel="next" volgen, 1000 per
+  pagina); PDOK pagineert met een cursor, dus pagina's binnen een tile
+  gaan na elkaar en tiles parallel (PDOK_MAX_CONCURRENCY, default 4);
+- bewaart elke complete tile als gzip-NDJSON op schijf (PDOK_CACHE_DIR,
+  default <tmp>/landbouwapp_pdok) met TTL PDOK_CACHE_TTL_SECS (default 7
+  dagen), gedeeld door alle workers op de machine;
+- voegt tiles samen, ontdubbelt op feature-id (percelen over een
+  tilegrens) en houdt alleen features die de gevraagde bbox raken.
+Alle requests gaan via één gedeelde requests.Session met connection pool
+en retries.
+
+Geheugen: antwoorden worden niet met r.json() ingelezen. FeatureStreamParser
+haalt de features één voor één uit de binnenkomende bytes, ze worden
+meteen geminimaliseerd (pdok_id, category, jaar, geometry, centroid) en
+regel voor regel naar het cachebestand geschreven. stream_brp_features()
+leest de tiles daarna weer regel voor regel, zodat het piekgeheugen niet
+met de bbox meegroeit.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
 
 # PDOK OGC API (BRP Gewaspercelen)
 PDOK_BASE = "https://api.pdok.nl/rvo/gewaspercelen/ogc/v1"
 COLLECTION = "brpgewas"
 
+PAGE_LIMIT = 1000          # API-limiet per pagina
+MAX_PAGES_PER_TILE = 50    # veiligheidsgrens bij een afwijkende next-link
+DEFAULT_TIMEOUT = 30
+
+TILE_GRAAD = _env_float("PDOK_TILE_GRAAD", 0.05)
+MAX_TILES = _env_int("PDOK_MAX_TILES", 256)
+MAX_CONCURRENCY = max(1, _env_int("PDOK_MAX_CONCURRENCY", 4))
+CACHE_TTL = _env_int("PDOK_CACHE_TTL_SECS", 7 * 86400)
+CACHE_DIR = os.getenv("PDOK_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "landbouwapp_pdok")
+
 
 def _geom_centroid_polygon(coords: List[List[Tuple[float, float]]]) -> Optional[Dict[str, float]]:
     """Centroid van een GeoJSON Polygon (lon,lat). Exterieur ring = coords[0]."""
@@ -68,43 +137,363 @@ def geojson_polygon_to_points(geom: Dict[str, Any]) -> Optional[List[Dict[str, f
         return ring_to_points(exterior)
 
 
-def fetch_brp_items(bbox: str, limit: int = 250) -> Dict[str, Any]:
+# ---------------------------- HTTP ----------------------------
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            retry = Retry(
+                total=3, connect=3, read=3, backoff_factor=0.4,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=MAX_CONCURRENCY,
+                                  pool_maxsize=MAX_CONCURRENCY)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update({"Accept": "application/geo+json"})
+            _session = s
+        return _session
+
+
+# ---------------------------- Streaming parser ----------------------------
+
+class FeatureStreamParser:
+    """
+    Incrementele parser voor een GeoJSON FeatureCollection: feed() tekst,
+    krijg de complete features van het top-level "features"-array terug
+    zodra ze binnen zijn. De rest van het document (type, links, ...) wordt
+    als skelet bewaard; rest() geeft dat als dict, met "features": [].
     """
-    Haal BRP gewaspercelen op binnen een bbox.
-    - bbox: 'minx,miny,maxx,maxy' (lon,lat,lon,lat) in CRS84/WGS84.
-    - limit: max 1000 per verzoek (API-limiet).
-    Returned: GeoJSON FeatureCollection (dict).
-    """
-    url = f"{PDOK_BASE}/collections/{COLLECTION}/items"
-    params = {
-        "bbox": bbox,
-        "limit": min(int(limit), 1000),
-        # Sommige OGC implementaties ondersteunen 'properties=' om te projecteren.
-        # PDOK levert toch alle props; we strippen ze later in parse_brp_features.
-        # "properties": "category",  # ← kun je proberen; is optioneel
-    }
-    headers = {"Accept": "application/geo+json"}
-    r = requests.get(url, params=params, headers=headers, timeout=30)
-    r.raise_for_status()
-    return r.json()
 
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._skelet: List[str] = []
+        self._in_features = False
+        self._klaar_features = False
+        # scanner voor het skelet (alles buiten het features-array)
+        self._diepte = 0
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._laatste_sleutel: Optional[str] = None
+        self._na_dubbelepunt = False
 
-def parse_brp_features(fc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def feed(self, tekst: str) -> List[Dict[str, Any]]:
+        self._buf += tekst
+        uit: List[Dict[str, Any]] = []
+        while self._buf:
+            if self._in_features:
+                if not self._features_uit_buffer(uit):
+                    break
+            else:
+                self._scan_skelet()
+        return uit
+
+    def _scan_skelet(self) -> None:
+        for i, ch in enumerate(self._buf):
+            if self._in_string:
+                self._skelet.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._diepte == 1:
+                        self._laatste_sleutel = "".join(self._string)
+                else:
+                    self._string.append(ch)
+                continue
+            if ch == '"':
+                self._in_string, self._string = True, []
+            elif ch == ":" and self._diepte == 1:
+                self._na_dubbelepunt = True
+                self._skelet.append(ch)
+                continue
+            elif ch == "[" and self._diepte == 1 and self._na_dubbelepunt \
+                    and self._laatste_sleutel == "features" and not self._klaar_features:
+                self._skelet.append("[]")
+                self._in_features, self._na_dubbelepunt = True, False
+                self._buf = self._buf[i + 1:]
+                return
+            elif ch in "{[":
+                self._diepte += 1
+            elif ch in "}]":
+                self._diepte -= 1
+            if not ch.isspace():
+                self._na_dubbelepunt = False
+            self._skelet.append(ch)
+        self._buf = ""
+
+    def _features_uit_buffer(self, uit: List[Dict[str, Any]]) -> bool:
+        """False als er meer tekst nodig is."""
+        buf, pos, n = self._buf, 0, len(self._buf)
+        while True:
+            while pos < n and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos >= n:
+                self._buf = ""
+                return False
+            if buf[pos] == "]":
+                self._in_features, self._klaar_features = False, True
+                self._buf = buf[pos + 1:]
+                return True
+            try:
+                obj, eind = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                self._buf = buf[pos:]  # onvolledig: wachten op meer bytes
+                return False
+            uit.append(obj)
+            pos = eind
+
+    def rest(self) -> Dict[str, Any]:
+        try:
+            return json.loads("".join(self._skelet))
+        except ValueError:
+            return {}
+
+
+def minimaliseer_feature(f: Dict[str, Any]) -> Dict[str, Any]:
     """
     Minimaliseer naar wat de front-end nodig heeft:
     - pdok_id    (optioneel, maar handig als key)
     - category   (voor filteren in de UI)
+    - jaar       (voor ?year=)
     - geometry   (GeoJSON, om te tekenen/klikken)
     - centroid   (lat/lng, voor centreren/adres)
+    Al geminimaliseerde features blijven ongewijzigd.
+    """
+    if "pdok_id" in f and "properties" not in f:
+        return f
+    props = f.get("properties") or {}
+    geom = f.get("geometry") or {}
+    return {
+        "pdok_id": f.get("id") or props.get("id"),
+        "category": props.get("category"),
+        "jaar": props.get("jaar"),
+        "geometry": geom,
+        "centroid": _geom_centroid(geom) if geom else None,
+    }
+
+
+# ---------------------------- Tiles ----------------------------
+
+_stats = {"tile_hits": 0, "tile_misses": 0, "pages": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _tel(naam: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[naam] += n
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        s = dict(_stats)
+    opvragingen = s["tile_hits"] + s["tile_misses"]
+    s["hit_ratio"] = round(s["tile_hits"] / opvragingen, 4) if opvragingen else None
+    s["tile_graad"] = TILE_GRAAD
+    s["cache_dir"] = CACHE_DIR
+    return s
+
+
+def _parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    minx, miny, maxx, maxy = (float(v) for v in bbox.split(","))
+    if minx > maxx or miny > maxy:
+        raise ValueError("bbox: min groter dan max")
+    return minx, miny, maxx, maxy
+
+
+def tiles_voor_bbox(minx: float, miny: float, maxx: float, maxy: float) -> List[Tuple[int, int]]:
+    """Rastertiles die de bbox raken, van het midden naar buiten gesorteerd."""
+    tx0, tx1 = math.floor(minx / TILE_GRAAD), math.floor(maxx / TILE_GRAAD)
+    ty0, ty1 = math.floor(miny / TILE_GRAAD), math.floor(maxy / TILE_GRAAD)
+    tiles = [(tx, ty) for tx in range(tx0, tx1 + 1) for ty in range(ty0, ty1 + 1)]
+    mx, my = (tx0 + tx1) / 2, (ty0 + ty1) / 2
+    return sorted(tiles, key=lambda t: (t[0] - mx) ** 2 + (t[1] - my) ** 2)
+
+
+def _tile_bbox(tx: int, ty: int) -> str:
+    return ",".join(f"{v:.6f}" for v in (tx * TILE_GRAAD, ty * TILE_GRAAD,
+                                          (tx + 1) * TILE_GRAAD, (ty + 1) * TILE_GRAAD))
+
+
+def _cache_pad(tx: int, ty: int) -> str:
+    return os.path.join(CACHE_DIR, f"{COLLECTION}_{TILE_GRAAD:g}_{tx}_{ty}.ndjson.gz")
+
+
+def _cache_geldig(pad: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(pad) <= CACHE_TTL
+    except OSError:
+        return False
+
+
+def _lees_tile(pad: str) -> Iterator[Dict[str, Any]]:
+    with gzip.open(pad, "rt", encoding="utf-8") as f:
+        for regel in f:
+            if regel.strip():
+                yield json.loads(regel)
+
+
+def _haal_tile_remote(tx: int, ty: int) -> Iterator[Dict[str, Any]]:
+    """
+    Geminimaliseerde features van één tile, terwijl de bytes binnenkomen;
+    volgt de next-links tot de laatste pagina.
+    """
+    session = _get_session()
+    url: Optional[str] = f"{PDOK_BASE}/collections/{COLLECTION}/items"
+    params: Optional[Dict[str, Any]] = {"bbox": _tile_bbox(tx, ty), "limit": PAGE_LIMIT}
+    for _ in range(MAX_PAGES_PER_TILE):
+        parser = FeatureStreamParser()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        # Circuit breaker "pdok_gewaspercelen": bij een open breaker faalt een
+        # niet-gecachete tile direct (CircuitOpen); gecachete tiles blijven werken
+        with breaker("pdok_gewaspercelen").bewaakt():
+            r = session.get(url, params=params, timeout=timeout_voor(DEFAULT_TIMEOUT), stream=True)
+            try:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    for f in parser.feed(decoder.decode(chunk)):
+                        yield minimaliseer_feature(f)
+                for f in parser.feed(decoder.decode(b"", final=True)):
+                    yield minimaliseer_feature(f)
+            finally:
+                r.close()
+        _tel("pages")
+        url = next((l.get("href") for l in (parser.rest().get("links") or [])
+                    if l.get("rel") == "next" and l.get("href")), None)
+        params = None  # de next-link bevat alle parameters al
+        if not url:
+            return
+    logger.warning("PDOK tile %s,%s: meer dan %s pagina's, afgekapt", tx, ty, MAX_PAGES_PER_TILE)
+
+
+def _vul_tile(tx: int, ty: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Zorg dat de tile in de cache staat (streamend van PDOK naar schijf).
+    None = staat op schijf; een lijst alleen als schrijven niet lukt.
+    """
+    pad = _cache_pad(tx, ty)
+    if _cache_geldig(pad):
+        _tel("tile_hits")
+        return None
+    _tel("tile_misses")
+    tmp = f"{pad}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        f = gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5)
+    except OSError as e:
+        logger.warning("PDOK tile-cache niet schrijfbaar (%s): %s", CACHE_DIR, e)
+        try:
+            return list(_haal_tile_remote(tx, ty))
+        except Exception:
+            _tel("errors")
+            raise
+    try:
+        with f:
+            for feat in _haal_tile_remote(tx, ty):
+                f.write(json.dumps(feat, separators=(",", ":")))
+                f.write("\n")
+        os.replace(tmp, pad)
+    except Exception:
+        _tel("errors")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return None
+
+
+def _feature_bbox(geom: Dict[str, Any]) -> Optional[Tuple[float, float, float, float]]:
+    def punten(c):
+        if c and isinstance(c[0], (int, float)):
+            yield c
+        else:
+            for sub in c or []:
+                yield from punten(sub)
+    xs, ys = [], []
+    for p in punten((geom or {}).get("coordinates")):
+        xs.append(p[0])
+        ys.append(p[1])
+    return (min(xs), min(ys), max(xs), max(ys)) if xs else None
+
+
+class BrpStream:
     """
-    out: List[Dict[str, Any]] = []
-    for f in (fc.get("features") or []):
-        props = f.get("properties") or {}
-        geom = f.get("geometry") or {}
-        out.append({
-            "pdok_id": f.get("id") or props.get("id"),
-            "category": props.get("category"),
-            "geometry": geom,
-            "centroid": _geom_centroid(geom) if geom else None,
-        })
-    return out
+    Itereerbaar resultaat van stream_brp_features(); na afloop geeft
+    `truncated` aan of de limit is bereikt.
+    """
+
+    def __init__(self, bbox: Tuple[float, float, float, float], tiles: List[Tuple[int, int]],
+                 limit: Optional[int]):
+        self.bbox, self.tiles, self.limit = bbox, tiles, limit
+        self.truncated = False
+        self.count = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        minx, miny, maxx, maxy = self.bbox
+        gezien = set()
+        workers = max(1, min(MAX_CONCURRENCY, len(self.tiles)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdok-brp") as pool:
+            # In golven van `workers` tiles: parallel naar de cache, daarna
+            # regel voor regel lezen. Bij een limit wordt niet onnodig ver
+            # buiten het centrum opgehaald.
+            for start in range(0, len(self.tiles), workers):
+                golf = self.tiles[start:start + workers]
+                for tile, in_geheugen in zip(golf, pool.map(lambda t: _vul_tile(*t), golf)):
+                    bron = in_geheugen if in_geheugen is not None else _lees_tile(_cache_pad(*tile))
+                    for f in bron:
+                        fid = f.get("pdok_id")
+                        if fid is not None and fid in gezien:
+                            continue
+                        fb = _feature_bbox(f.get("geometry"))
+                        if fb is None or fb[0] > maxx or fb[2] < minx or fb[1] > maxy or fb[3] < miny:
+                            continue
+                        if self.limit is not None and self.count >= self.limit:
+                            self.truncated = True
+                            return
+                        if fid is not None:
+                            gezien.add(fid)
+                        self.count += 1
+                        yield f
+
+
+def stream_brp_features(bbox: str, limit: Optional[int] = None) -> BrpStream:
+    """
+    Geminimaliseerde BRP gewaspercelen binnen een bbox (via de tile-cache),
+    één voor één.
+    - bbox: 'minx,miny,maxx,maxy' (lon,lat,lon,lat) in CRS84/WGS84.
+    - limit: optioneel maximum aantal features; None = volledig. Tiles worden
+      vanaf het midden opgehaald, dus bij afkappen blijft het centrum compleet.
+    Een ongeldige of te grote bbox geeft direct ValueError (vóór het streamen).
+    """
+    minx, miny, maxx, maxy = _parse_bbox(bbox)
+    tiles = tiles_voor_bbox(minx, miny, maxx, maxy)
+    if len(tiles) > MAX_TILES:
+        raise ValueError(f"bbox te groot ({len(tiles)} tiles, max {MAX_TILES}); zoom verder in")
+    return BrpStream((minx, miny, maxx, maxy), tiles, limit)
+
+
+def fetch_brp_items(bbox: str, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Als stream_brp_features, maar in één FeatureCollection (dict) met
+    "truncated": bool. De features zijn al geminimaliseerd.
+    """
+    stream = stream_brp_features(bbox, limit)
+    features = list(stream)
+    return {"type": "FeatureCollection", "features": features, "truncated": stream.truncated}
+
+
+def parse_brp_features(fc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Minimaliseer alle features van een FeatureCollection (zie minimaliseer_feature)."""
+    return [minimaliseer_feature(f) for f in (fc.get("features") or [])]
@@ -0,0 +1,347 @@
+# app/services/pdok_import.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+import app.models.database_beheer as db
+from app.models.nv_classificatie import nv_voor_punten
+from app.models.perceel_geometrie import GEOM_UIT_GEOJSON, perceel_geojson, zet_geometrie
+from app.services.jobs import Job, enqueue, job_status as _queue_status, taak
+from app.services.oppervlakte import oppervlakten_ha
+from app.services.pdok_gewaspercelen import geojson_polygon_to_points
+
+"""
+PDOK BRP-import van percelen als pijplijn.
+
+Voorheen deed pdok_import per item een dubbelcheck-query, een
+shapely/pyproj-oppervlakte, de grondsoortketen (RVO -> WMS) en een
+NV-query, en dan een INSERT: 200 percelen duurden minuten en liepen tegen
+de gunicorn-timeout aan. Nu, in fasen:
+
+1. ontdubbelen: alle pdok_ids van de gebruiker in één query (en dubbelen
+   binnen de selectie zelf);
+2. geometrie: oppervlakte in RD voor alle items tegelijk (oppervlakte.py);
+   items zonder centroid krijgen in één query een ST_PointOnSurface;
+3. grondsoort en NV-gebied per batch van PDOK_IMPORT_BATCH items: RVO als
+   één (lokale) batch-query, de WMS-terugval parallel via
+   query_multiple_points, NV via nv_voor_punten; beide tegelijk;
+4. opslaan: één execute_values-INSERT plus zet_geometrie, in één transactie
+   (alles of niets, zoals voorheen).
+
+start_import() zet de import als job 'pdok_import' in de jobqueue
+(services/jobs.py); de route geeft direct een job-id terug en de UI pollt
+job_status(). Een tweede import van dezelfde gebruiker wordt geweigerd
+zolang de eerste loopt. Een nieuwe poging na een fout is veilig: fase 1
+slaat al geïmporteerde pdok_ids over en fase 4 is één transactie.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+IMPORT_BATCH = max(1, _env_int("PDOK_IMPORT_BATCH", 50))
+SOORT = "pdok_import"
+
+PDOK_SOURCE = "PDOK_BRPGewaspercelen_OGC"
+STANDAARD_GRONDSOORT = "Noordelijk, westelijk, centraal zand"
+
+_GEOMETRIE_SQL = f"""
+    WITH g AS (
+        SELECT i, {GEOM_UIT_GEOJSON.format(param="gj")} AS geom
+        FROM unnest(%s::text[]) WITH ORDINALITY AS u(gj, i)
+    )
+    SELECT i,
+           ROUND((NULLIF(ST_Area(geom), 0) / 10000.0)::numeric, 4)::float8,
+           ST_Y(ST_Transform(ST_PointOnSurface(geom), 4326)),
+           ST_X(ST_Transform(ST_PointOnSurface(geom), 4326))
+    FROM g
+    ORDER BY i
+"""
+
+
+# ---------------------------- Grondsoort ----------------------------
+
+def soil_text_naar_categorie(s: str) -> str:
+    """Bodemkaart-omschrijving -> app-categorie ("" = onbepaald, bv. zand)."""
+    t = (s or "").lower()
+    if not t:
+        return ""
+    if "veen" in t:
+        return "Veen"
+    if "klei" in t or "zavel" in t:
+        return "Klei"
+    # Löss/leem → apart
+    if "löss" in t or "loess" in t or "loss" in t or "leem" in t:
+        return "Löss"
+    # Zand laten we open; RVO bepaalt Noord/W/C vs Zuid
+    return ""
+
+
+def _rvo_zinvol(r: Dict[str, Any]) -> bool:
+    raw = r.get("raw") or {}
+    return bool(r.get("category") and (raw.get("hoofdg") or raw.get("in_zuidelijk") or raw.get("in_loess")))
+
+
+def bepaal_grondsoorten(punten: Sequence[Tuple[float, float]]) -> List[str]:
+    """
+    App-grondsoort per (lat, lng), in invoervolgorde. Voorkeur RVO (als het
+    resultaat zinvol is), anders de Bodemkaart-WMS (parallel, per cel
+    ontdubbeld), anders STANDAARD_GRONDSOORT.
+    """
+    from app.services.bodemkaart_wms import _get_client
+    from app.services.rvo_grondsoorten import rvo_grondsoorten_at_points
+
+    punten = list(punten or [])
+    uit: List[Optional[str]] = [None] * len(punten)
+    try:
+        for i, r in enumerate(rvo_grondsoorten_at_points(punten)):
+            if _rvo_zinvol(r or {}):
+                uit[i] = r["category"]
+    except Exception as e:
+        logger.warning("RVO grondsoort (batch) fout: %s", e)
+
+    rest = [i for i, g in enumerate(uit) if g is None]
+    if rest:
+        try:
+            resultaten = _get_client().query_multiple_points([punten[i] for i in rest])
+            for i, res in zip(rest, resultaten):
+                uit[i] = soil_text_naar_categorie(res.soil_text or "") or None
+        except Exception as e:
+            logger.warning("WMS grondsoort (batch) fout: %s", e)
+
+    return [g or STANDAARD_GRONDSOORT for g in uit]
+
+
+# ---------------------------- Job ----------------------------
+
+@dataclass
+class ImportJob:
+    id: str
+    user_id: str
+    status: str = "queued"          # queued | running | done | failed
+    fase: str = ""
+    totaal: int = 0
+    verwerkt: int = 0
+    toegevoegd: int = 0
+    overgeslagen: int = 0
+    fout: Optional[str] = None
+    gestart: float = field(default_factory=time.time)
+    klaar: Optional[float] = None
+    # melder(verwerkt, totaal, fase): voortgang naar de jobqueue
+    melder: Optional[Callable[..., None]] = field(default=None, repr=False)
+
+    def meld(self) -> None:
+        if self.melder is not None:
+            self.melder(self.verwerkt, self.totaal, self.fase)
+
+    def als_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status, "totaal": self.totaal, "verwerkt": self.verwerkt,
+            "toegevoegd": self.toegevoegd, "overgeslagen": self.overgeslagen,
+            "duur_sec": round((self.klaar or time.time()) - self.gestart, 1),
+        }
+
+
+@dataclass
+class _Item:
+    pdok_id: Optional[str]
+    category: Optional[str]
+    geometry: Dict[str, Any]
+    geojson: str
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    oppervlakte: Optional[float] = None
+    grondsoort: Optional[str] = None
+    nv_gebied: int = 0
+
+
+def _float(v) -> Optional[float]:
+    try:
+        return float(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _voorbereiden(job: ImportJob, ruwe_items: Sequence[Dict[str, Any]]) -> List[_Item]:
+    """Fase 1: geometrie controleren en ontdubbelen (selectie + database)."""
+    items: List[_Item] = []
+    gezien = set()
+    for it in ruwe_items:
+        geom = it.get("geometry")
+        geojson = perceel_geojson(geom, None) if geom else None
+        pdok_id = (it.get("pdok_id") or "").strip() or None
+        if not geojson or (pdok_id and pdok_id in gezien):
+            job.overgeslagen += 1
+            continue
+        if pdok_id:
+            gezien.add(pdok_id)
+        centroid = it.get("centroid") or {}
+        items.append(_Item(pdok_id, it.get("category"), geom, geojson,
+                           _float(centroid.get("lat")), _float(centroid.get("lng"))))
+
+    if gezien:
+        conn = db.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute(
+                "SELECT pdok_id FROM percelen WHERE user_id = %s AND pdok_id = ANY(%s)",
+                (job.user_id, sorted(gezien))
+            )
+            bestaand = {r[0] for r in c.fetchall()}
+            conn.rollback()
+        finally:
+            conn.close()
+        if bestaand:
+            job.overgeslagen += sum(1 for i in items if i.pdok_id in bestaand)
+            items = [i for i in items if i.pdok_id not in bestaand]
+    return items
+
+
+def _geometrie(items: List[_Item]) -> None:
+    """
+    Fase 2: oppervlakte vectorieel in Python (services/oppervlakte.py); alleen
+    items zonder oppervlakte of punt gaan in één query naar PostGIS.
+    """
+    for item, opp in zip(items, oppervlakten_ha([i.geometry for i in items])):
+        item.oppervlakte = opp
+    rest = [i for i in items if i.oppervlakte is None or i.lat is None or i.lng is None]
+    if not rest:
+        return
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(_GEOMETRIE_SQL, ([i.geojson for i in rest],))
+        rows = c.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+    for (_, opp, lat, lng), item in zip(rows, rest):
+        if item.oppervlakte is None:
+            item.oppervlakte = opp
+        if item.lat is None or item.lng is None:
+            item.lat, item.lng = lat, lng
+
+
+def _verrijk(job: ImportJob, items: List[_Item]) -> None:
+    """Fase 3: grondsoort en NV-gebied per batch, beide tegelijk."""
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdok-import") as pool:
+        for start in range(0, len(items), IMPORT_BATCH):
+            batch = [i for i in items[start:start + IMPORT_BATCH] if i.lat is not None and i.lng is not None]
+            punten = [(i.lat, i.lng) for i in batch]
+            if punten:
+                grond = pool.submit(bepaal_grondsoorten, punten)
+                nv = pool.submit(nv_voor_punten, punten)
+                for item, g, n in zip(batch, grond.result(), nv.result()):
+                    item.grondsoort, item.nv_gebied = g, int(bool(n))
+            job.verwerkt = job.overgeslagen + min(len(items), start + IMPORT_BATCH)
+            job.meld()
+
+
+def _opslaan(job: ImportJob, items: List[_Item]) -> None:
+    """Fase 4: één INSERT voor alle items, daarna geom set-wise."""
+    from app.services.response_cache import invalideer_gebruiker
+
+    rijen, geometrieen = [], []
+    for item in items:
+        perceel_id = str(uuid.uuid4())
+        id_short = item.pdok_id.split("-")[0] if item.pdok_id else ""
+        points = geojson_polygon_to_points(item.geometry)
+        rijen.append((
+            perceel_id,
+            f"PDOK perceel {id_short}".strip() if id_short else "PDOK perceel",
+            item.oppervlakte, item.grondsoort, None, None, item.nv_gebied,
+            item.lat, item.lng, '',
+            json.dumps(points, separators=(',', ':')) if points else None,
+            item.oppervlakte,
+            item.pdok_id, item.category, PDOK_SOURCE,
+            json.dumps(item.geometry, separators=(',', ':')),
+            job.user_id,
+        ))
+        geometrieen.append((perceel_id, item.geojson))
+
+    with db.connection() as conn:
+        c = conn.cursor()
+        execute_values(
+            c,
+            '''
+            INSERT INTO percelen
+            (id, perceelnaam, oppervlakte, grondsoort, p_al, p_cacl2, nv_gebied,
+             latitude, longitude, adres, polygon_coordinates, calculated_area,
+             pdok_id, pdok_category, pdok_source, geometry_geojson, user_id)
+            VALUES %s
+            ''',
+            rijen,
+            page_size=500,
+        )
+        zet_geometrie(c, geometrieen)
+        invalideer_gebruiker(job.user_id, conn)
+    job.toegevoegd = len(rijen)
+
+
+def importeer(job: ImportJob, ruwe_items: Sequence[Dict[str, Any]]) -> ImportJob:
+    """Voer de pijplijn synchroon uit; voortgang en resultaat staan in `job`."""
+    job.status, job.totaal = "running", len(ruwe_items)
+    job.fase = "ontdubbelen"
+    job.meld()
+    items = _voorbereiden(job, ruwe_items)
+    t0 = time.perf_counter()
+    job.fase = "geometrie"
+    job.meld()
+    _geometrie(items)
+    job.fase = "grondsoort_nv"
+    _verrijk(job, items)
+    job.fase = "opslaan"
+    job.meld()
+    if items:
+        _opslaan(job, items)
+    job.verwerkt = job.totaal
+    job.fase, job.status = "", "done"
+    job.klaar = time.time()
+    logger.info("PDOK-import %s: %s toegevoegd, %s overgeslagen in %.1f s",
+                job.id, job.toegevoegd, job.overgeslagen, time.perf_counter() - t0)
+    return job
+
+
+@taak(SOORT, max_pogingen=3)
+def _import_taak(qjob: Job) -> Dict[str, Any]:
+    job = ImportJob(id=str(qjob.id), user_id=qjob.user_id,
+                    melder=lambda verwerkt, totaal, fase: qjob.voortgang(verwerkt, totaal, fase))
+    importeer(job, qjob.payload.get("items") or [])
+    qjob.voortgang(job.verwerkt, job.totaal, "", direct=True)
+    return job.als_dict()
+
+
+def start_import(user_id: str, ruwe_items: Sequence[Dict[str, Any]]) -> Optional[int]:
+    """
+    Zet een import in de jobqueue en geef het job-id terug. None als deze
+    gebruiker al een import heeft lopen (voorkomt dubbele percelen bij
+    dubbelklikken).
+    """
+    return enqueue(SOORT, {"items": list(ruwe_items)}, user_id=user_id, uniek=True)
+
+
+def job_status(job_id: Any, user_id: str) -> Optional[Dict[str, Any]]:
+    """Status van een PDOK-import van deze gebruiker (zie jobs.job_status), of None."""
+    try:
+        status = _queue_status(int(job_id), user_id)
+    except (TypeError, ValueError):
+        return None
+    if status is None or status["soort"] != SOORT:
+        return None
+    return status
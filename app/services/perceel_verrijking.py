@@ -0,0 +1,113 @@
+# app/services/perceel_verrijking.py
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import app.models.database_beheer as db
+from app.models.perceel_geometrie import werk_geometrie_velden_bij
+from app.services.jobs import Herhaal, Job, enqueue, taak
+from app.services.pdok_import import STANDAARD_GRONDSOORT, bepaal_grondsoorten
+from app.services.response_cache import invalideer_gebruiker
+from app.services.weerbaarheid import breaker
+
+"""
+Grondsoort en NV-gebied van een nieuw perceel op de achtergrond bepalen.
+
+Handmatig toevoegen wachtte op de grondsoortketen (RVO -> Bodemkaart-WMS),
+seconden bij een trage dienst. Nu slaat percelen() het perceel op met
+verrijking = 'pending' en grondsoort NULL, en zet in dezelfde transactie
+een job 'perceel_verrijken' klaar (services/jobs.py). De job:
+
+- bepaalt de grondsoort (bepaal_grondsoorten, zonder request-deadline);
+- werkt oppervlakte/NV-gebied bij uit geom (werk_geometrie_velden_bij);
+- schrijft alleen als het perceel nog 'pending' is, zodat een handmatig
+  gekozen grondsoort niet wordt overschreven;
+- probeert het later opnieuw als de externe diensten afgesloten zijn
+  (circuit breaker open) en er alleen de standaardgrondsoort uitkwam.
+
+Na de laatste mislukte poging krijgt het perceel de standaardgrondsoort
+met verrijking = 'failed'; de gebruiker kan hem dan zelf aanpassen.
+De UI pollt verrijking_status() via /percelen/verrijking.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SOORT = "perceel_verrijken"
+PENDING, MISLUKT = "pending", "failed"
+
+EXTERNE_DIENSTEN = ("rvo_grondsoorten", "bodemkaart_wms")
+
+
+def maak_kolom(c) -> None:
+    c.execute("ALTER TABLE percelen ADD COLUMN IF NOT EXISTS verrijking TEXT")
+
+
+def plan_verrijking(c, perceel_id: str, user_id: str) -> int:
+    """Job voor dit perceel klaarzetten, binnen de transactie van `c`."""
+    return enqueue(SOORT, {"perceel_id": perceel_id}, user_id=user_id, c=c)
+
+
+def _diensten_afgesloten() -> bool:
+    return any(breaker(naam).staat != "closed" for naam in EXTERNE_DIENSTEN)
+
+
+def _markeer_mislukt(job: Job, fout: str) -> None:
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            UPDATE percelen SET grondsoort = COALESCE(NULLIF(grondsoort, ''), %s), verrijking = %s
+            WHERE id = %s AND verrijking = %s
+            """,
+            (STANDAARD_GRONDSOORT, MISLUKT, job.payload.get("perceel_id"), PENDING),
+        )
+    invalideer_gebruiker(job.user_id)
+
+
+@taak(SOORT, max_pogingen=5, bij_mislukt=_markeer_mislukt)
+def verrijk_perceel(job: Job) -> Dict[str, Any]:
+    perceel_id = job.payload.get("perceel_id")
+    with db.dict_cursor() as (conn, c):
+        c.execute("SELECT latitude, longitude, verrijking FROM percelen WHERE id = %s", (perceel_id,))
+        rij = c.fetchone()
+    if not rij or rij["verrijking"] != PENDING:
+        return {"perceel_id": perceel_id, "overgeslagen": True}
+
+    grondsoort: Optional[str] = None
+    if rij["latitude"] is not None and rij["longitude"] is not None:
+        grondsoort = bepaal_grondsoorten([(rij["latitude"], rij["longitude"])])[0]
+        if grondsoort == STANDAARD_GRONDSOORT and _diensten_afgesloten() and not job.laatste_poging:
+            raise Herhaal("externe grondsoortdiensten afgesloten")
+
+    with db.connection() as conn:
+        c = conn.cursor()
+        werk_geometrie_velden_bij(c, [perceel_id])
+        c.execute(
+            """
+            UPDATE percelen SET grondsoort = %s, verrijking = NULL
+            WHERE id = %s AND verrijking = %s
+            RETURNING nv_gebied
+            """,
+            (grondsoort or STANDAARD_GRONDSOORT, perceel_id, PENDING),
+        )
+        nv = c.fetchone()
+    invalideer_gebruiker(job.user_id)
+    return {"perceel_id": perceel_id, "grondsoort": grondsoort or STANDAARD_GRONDSOORT,
+            "nv_gebied": nv[0] if nv else None}
+
+
+def verrijking_status(user_id: str, perceel_ids: List[str]) -> List[Dict[str, Any]]:
+    """Actuele grondsoort/NV/verrijking van deze percelen van de gebruiker."""
+    if not perceel_ids:
+        return []
+    with db.dict_cursor() as (conn, c):
+        c.execute(
+            """
+            SELECT id, grondsoort, nv_gebied, verrijking FROM percelen
+            WHERE user_id = %s AND id = ANY(%s)
+            """,
+            (user_id, list(perceel_ids)),
+        )
+        return [dict(r) for r in c.fetchall()]
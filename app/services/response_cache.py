@@ -0,0 +1,320 @@
+# app/services/response_cache.py
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+from flask import Response, request
+
+import app.models.database_beheer as db
+from app.gebruikers.auth_utils import effective_user_id
+
+"""
+Response-cache voor zware, per-gebruiker leesendpoints (dashboard stats, kaart).
+
+- Sleutel: (endpoint, effective_user_id, jaar, overige query-args, versie).
+- Versie: per gebruiker een teller in `response_cache_versies` (Postgres, dus
+  gedeeld door alle gunicorn-workers) plus een globale teller (user_id '*').
+  Schrijfroutes in bemestingen/percelen/gebruiksnormen/bedrijven hogen de
+  teller van de (effectieve) gebruiker op via een after_request-hook; oude
+  entries worden daarmee onbereikbaar en verdwijnen via LRU/TTL.
+- ETag = hash van de sleutel. Stuurt de browser If-None-Match mee met de
+  actuele ETag, dan volgt direct een 304 zonder de view uit te voeren.
+- Backends: LokaleBackend (in-process LRU op aantal en bytes, default) of
+  RedisBackend (gedeeld) via RESPONSE_CACHE_URL=redis://... (optioneel:
+  vereist `pip install redis`, anders valt het terug op lokaal).
+
+Gebruik:
+    @dashboard_bp.route('/api/dashboard/stats')
+    @login_required
+    @cached_response('dashboard_stats')
+    def get_dashboard_stats(): ...
+
+    registreer_invalidatie(bemestingen_bp)
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+CACHE_TTL = _env_int("RESPONSE_CACHE_TTL_SECS", 3600)
+CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 512)
+CACHE_MAX_BYTES = _env_int("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "").strip()
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+
+GLOBAAL = "*"
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    mimetype: str
+    etag: str
+
+
+# ---------------------------- Backends ----------------------------
+
+class LokaleBackend:
+    """In-process LRU met grens op aantal entries en totaal aantal bytes."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                self._verwijder(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedResponse, ttl: int) -> None:
+        size = len(value.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._verwijder(key)
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oudste = next(iter(self._data))
+                self._verwijder(oudste)
+                self.evictions += 1
+
+    def _verwijder(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self._bytes -= len(value.body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "lokaal",
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class RedisBackend:
+    """Gedeelde backend; Redis regelt TTL en (met maxmemory-policy allkeys-lru) eviction."""
+
+    def __init__(self, url: str, prefix: str = "landbouwapp:resp:"):
+        import redis  # optioneel
+
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw else None
+
+    def set(self, key: str, value: CachedResponse, ttl: int) -> None:
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def clear(self) -> None:
+        for k in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(k)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "prefix": self.prefix}
+
+
+def _maak_backend():
+    if CACHE_URL.startswith("redis://") or CACHE_URL.startswith("rediss://"):
+        try:
+            return RedisBackend(CACHE_URL)
+        except Exception as e:
+            logger.warning("RedisBackend niet beschikbaar (%s); val terug op lokale cache", e)
+    return LokaleBackend()
+
+
+# ---------------------------- Cache ----------------------------
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl: int = CACHE_TTL, enabled: bool = CACHE_ENABLED):
+        self.backend = backend or _maak_backend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "stored": 0}
+
+    def _tel(self, naam: str) -> None:
+        with self._lock:
+            self._stats[naam] += 1
+
+    # -------- versies --------
+
+    @staticmethod
+    def versie(user_id: str) -> Tuple[int, int]:
+        conn = db.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute(
+                """
+                SELECT
+                    COALESCE(MAX(versie) FILTER (WHERE user_id = %s), 0),
+                    COALESCE(MAX(versie) FILTER (WHERE user_id = %s), 0)
+                FROM response_cache_versies
+                WHERE user_id IN (%s, %s)
+                """,
+                (user_id, GLOBAAL, user_id, GLOBAAL)
+            )
+            row = c.fetchone()
+            conn.rollback()
+            return (int(row[0]), int(row[1])) if row else (0, 0)
+        finally:
+            conn.close()
+
+    def invalideer(self, user_id: Optional[str], conn=None) -> None:
+        """
+        Hoog de versie van één gebruiker op (user_id=None of '*': alle gebruikers).
+        Met `conn` gebeurt dat binnen die transactie (commit door de aanroeper).
+        """
+        user_id = user_id or GLOBAAL
+        sql = """
+            INSERT INTO response_cache_versies (user_id, versie)
+            VALUES (%s, 1)
+            ON CONFLICT (user_id) DO UPDATE SET versie = response_cache_versies.versie + 1
+        """
+        if conn is not None:
+            with conn.cursor() as c:
+                c.execute(sql, (user_id,))
+        else:
+            with db.connection() as eigen:
+                with eigen.cursor() as c:
+                    c.execute(sql, (user_id,))
+        self._tel("invalidations")
+
+    # -------- decorator --------
+
+    def cached(self, endpoint: str):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                user_id = effective_user_id()
+                jaar = request.args.get("jaar")
+                if not self.enabled or not user_id or not jaar:
+                    return view(*args, **kwargs)
+
+                try:
+                    versie = self.versie(user_id)
+                except Exception as e:
+                    logger.warning("Response-cache versie ophalen mislukt: %s", e)
+                    return view(*args, **kwargs)
+
+                overige = "&".join(
+                    f"{k}={v}" for k, v in sorted(request.args.items(multi=True)) if k != "jaar"
+                )
+                key = f"{endpoint}|{user_id}|{jaar}|{overige}|{versie[0]}.{versie[1]}"
+                etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+                if etag in request.if_none_match:
+                    self._tel("not_modified")
+                    return self._response(b"", "application/json", etag, status=304)
+
+                hit = self.backend.get(key)
+                if hit is not None:
+                    self._tel("hits")
+                    return self._response(hit.body, hit.mimetype, hit.etag)
+
+                self._tel("misses")
+                resp = view(*args, **kwargs)
+                if isinstance(resp, tuple):
+                    return resp  # (body, status): foutpad, niet cachen
+                if getattr(resp, "status_code", None) == 200 and not resp.direct_passthrough:
+                    body = resp.get_data()
+                    try:
+                        self.backend.set(key, CachedResponse(body, resp.mimetype, etag), self.ttl)
+                        self._tel("stored")
+                    except Exception as e:
+                        logger.warning("Response-cache opslaan mislukt: %s", e)
+                    resp.set_etag(etag)
+                    resp.headers["Cache-Control"] = "private, no-cache"
+                return resp
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _response(body: bytes, mimetype: str, etag: str, status: int = 200) -> Response:
+        resp = Response(body, status=status, mimetype=mimetype)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        s["enabled"] = self.enabled
+        s["ttl"] = self.ttl
+        s.update(self.backend.stats())
+        return s
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(endpoint: str):
+    return response_cache.cached(endpoint)
+
+
+def invalideer_gebruiker(user_id: Optional[str], conn=None) -> None:
+    response_cache.invalideer(user_id, conn)
+
+
+def invalideer_alle(conn=None) -> None:
+    response_cache.invalideer(GLOBAAL, conn)
+
+
+_SCHRIJF_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def registreer_invalidatie(bp) -> None:
+    """
+    Na elke geslaagde schrijf-request (POST/PUT/PATCH/DELETE, status < 400) in
+    deze blueprint wordt de cache van de effectieve gebruiker ongeldig. De
+    route zelf heeft dan al gecommit; een lezer die tussendoor nog de oude
+    versie zag, schrijft hooguit een entry weg onder die oude versie.
+    """
+    @bp.after_request
+    def _invalideer_na_schrijven(response):
+        if request.method in _SCHRIJF_METHODS and response.status_code < 400:
+            user_id = effective_user_id()
+            if user_id:
+                try:
+                    invalideer_gebruiker(user_id)
+                except Exception as e:
+                    logger.warning("Response-cache invalidatie mislukt: %s", e)
+        return response
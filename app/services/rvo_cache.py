@@ -0,0 +1,319 @@
+# app/services/rvo_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import app.models.database_beheer as db
+from app.services.bodemkaart_cache import cel_voor_punt
+
+"""
+Gedeelde cache voor RVO-opzoekingen via de ArcGIS FeatureServer
+(hoofdgrondsoort, 'in zuidelijk zand-/lössgebied', 'in lössgebied').
+
+Voorheen zaten _grondsoort_raw en _point_in_region achter
+functools.lru_cache. Die cache was per proces, had exacte float-sleutels
+(twee klikken een meter uit elkaar misten), verdween bij elke herstart en
+pinde fouten voor altijd vast als {"hoofdg": ""}. Hier:
+
+- sleutel (laag, cel_x, cel_y): het punt gesnapt op RVO_CACHE_CEL_M meter
+  (default 10, Web Mercator, zelfde raster als de Bodemkaart-cache);
+- positief antwoord (feature gevonden): TTL RVO_CACHE_TTL_DAGEN (default
+  90), negatief antwoord (geen feature, wél een geldig antwoord): TTL
+  RVO_CACHE_NEG_TTL_DAGEN (default 7). Netwerk-/serverfouten worden niet
+  gecachet;
+- begrensd op RVO_CACHE_MAX_RIJEN (default 200000): bij het opslaan wordt
+  af en toe opgeruimd (verlopen rijen, daarna de oudste);
+- backend RVO_CACHE_BACKEND=postgres (default, gedeeld door alle workers en
+  machines) of =disk (SQLite-bestand RVO_CACHE_PAD, gedeeld door de
+  workers op één machine). RVO_CACHE_BACKEND=uit zet de cache uit.
+
+Fouten in de cache zelf worden gelogd en nooit doorgegeven.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+CEL_M = _env_float("RVO_CACHE_CEL_M", 10.0)
+TTL_DAGEN = _env_float("RVO_CACHE_TTL_DAGEN", 90)
+NEG_TTL_DAGEN = _env_float("RVO_CACHE_NEG_TTL_DAGEN", 7)
+MAX_RIJEN = int(_env_float("RVO_CACHE_MAX_RIJEN", 200000))
+BACKEND = os.getenv("RVO_CACHE_BACKEND", "postgres").strip().lower()
+CACHE_PAD = os.getenv("RVO_CACHE_PAD") or os.path.join(tempfile.gettempdir(), "landbouwapp_rvo_cache.sqlite")
+
+# Elke zoveelste set() ruimt op
+_OPRUIM_INTERVAL = 500
+
+CREATE_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS rvo_lookup_cache (
+        laag TEXT NOT NULL,                      -- 'grondsoort' of 'regio:<hash van url>'
+        cel_x INTEGER NOT NULL,
+        cel_y INTEGER NOT NULL,
+        negatief BOOLEAN NOT NULL DEFAULT FALSE,
+        resultaat TEXT,                          -- JSON
+        opgehaald_op TIMESTAMPTZ NOT NULL DEFAULT now(),
+        verloopt_op TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (laag, cel_x, cel_y)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_rvo_lookup_cache_opgehaald ON rvo_lookup_cache (opgehaald_op)",
+)
+
+
+def maak_tabellen(c) -> None:
+    for sql in CREATE_SQL:
+        c.execute(sql)
+
+
+def laag_sleutel(naam: str, url: Optional[str] = None) -> str:
+    """Stabiele laagnaam; bij een url een korte hash, zodat een andere laag een andere sleutel krijgt."""
+    if not url:
+        return naam
+    return f"{naam}:{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}"
+
+
+# ---------------------------- Backends ----------------------------
+
+class PostgresBackend:
+    naam = "postgres"
+
+    def get(self, laag: str, cel: Tuple[int, int]) -> Optional[Tuple[bool, Optional[str]]]:
+        conn = db.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute(
+                """
+                SELECT negatief, resultaat FROM rvo_lookup_cache
+                WHERE laag = %s AND cel_x = %s AND cel_y = %s AND verloopt_op > now()
+                """,
+                (laag, cel[0], cel[1])
+            )
+            row = c.fetchone()
+            conn.rollback()
+        finally:
+            conn.close()
+        return (bool(row[0]), row[1]) if row else None
+
+    def set(self, laag: str, cel: Tuple[int, int], negatief: bool, resultaat: Optional[str],
+            ttl_sec: float) -> None:
+        with db.connection() as conn:
+            with conn.cursor() as c:
+                c.execute(
+                    """
+                    INSERT INTO rvo_lookup_cache
+                        (laag, cel_x, cel_y, negatief, resultaat, opgehaald_op, verloopt_op)
+                    VALUES (%s, %s, %s, %s, %s, now(), now() + make_interval(secs => %s))
+                    ON CONFLICT (laag, cel_x, cel_y) DO UPDATE
+                    SET negatief = EXCLUDED.negatief,
+                        resultaat = EXCLUDED.resultaat,
+                        opgehaald_op = EXCLUDED.opgehaald_op,
+                        verloopt_op = EXCLUDED.verloopt_op
+                    """,
+                    (laag, cel[0], cel[1], negatief, resultaat, ttl_sec)
+                )
+
+    def opruimen(self, max_rijen: int) -> int:
+        with db.connection() as conn:
+            with conn.cursor() as c:
+                c.execute("DELETE FROM rvo_lookup_cache WHERE verloopt_op <= now()")
+                weg = c.rowcount
+                c.execute(
+                    """
+                    DELETE FROM rvo_lookup_cache WHERE ctid IN (
+                        SELECT ctid FROM rvo_lookup_cache
+                        ORDER BY opgehaald_op DESC OFFSET %s
+                    )
+                    """,
+                    (max_rijen,)
+                )
+                return weg + c.rowcount
+
+    def tellingen(self) -> Tuple[int, int]:
+        conn = db.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute(
+                """
+                SELECT COUNT(*) FILTER (WHERE verloopt_op > now()),
+                       COUNT(*) FILTER (WHERE verloopt_op > now() AND negatief)
+                FROM rvo_lookup_cache
+                """
+            )
+            rijen, negatief = c.fetchone()
+            conn.rollback()
+        finally:
+            conn.close()
+        return int(rijen), int(negatief)
+
+    def leeg(self) -> None:
+        with db.connection() as conn:
+            with conn.cursor() as c:
+                c.execute("DELETE FROM rvo_lookup_cache")
+
+
+class SqliteBackend:
+    """Eén SQLite-bestand; veilig tussen processen (WAL), één verbinding per thread."""
+    naam = "disk"
+
+    def __init__(self, pad: str = CACHE_PAD):
+        self.pad = pad
+        self._lokaal = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rvo_lookup_cache (
+                    laag TEXT NOT NULL, cel_x INTEGER NOT NULL, cel_y INTEGER NOT NULL,
+                    negatief INTEGER NOT NULL, resultaat TEXT,
+                    opgehaald_op REAL NOT NULL, verloopt_op REAL NOT NULL,
+                    PRIMARY KEY (laag, cel_x, cel_y)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_opgehaald ON rvo_lookup_cache (opgehaald_op)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._lokaal, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.pad, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._lokaal.conn = conn
+        return conn
+
+    def get(self, laag: str, cel: Tuple[int, int]) -> Optional[Tuple[bool, Optional[str]]]:
+        row = self._conn().execute(
+            "SELECT negatief, resultaat FROM rvo_lookup_cache "
+            "WHERE laag = ? AND cel_x = ? AND cel_y = ? AND verloopt_op > ?",
+            (laag, cel[0], cel[1], time.time())
+        ).fetchone()
+        return (bool(row[0]), row[1]) if row else None
+
+    def set(self, laag: str, cel: Tuple[int, int], negatief: bool, resultaat: Optional[str],
+            ttl_sec: float) -> None:
+        nu = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO rvo_lookup_cache "
+                "(laag, cel_x, cel_y, negatief, resultaat, opgehaald_op, verloopt_op) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (laag, cel[0], cel[1], int(negatief), resultaat, nu, nu + ttl_sec)
+            )
+
+    def opruimen(self, max_rijen: int) -> int:
+        with self._conn() as conn:
+            weg = conn.execute("DELETE FROM rvo_lookup_cache WHERE verloopt_op <= ?", (time.time(),)).rowcount
+            weg += conn.execute(
+                "DELETE FROM rvo_lookup_cache WHERE rowid IN ("
+                "SELECT rowid FROM rvo_lookup_cache ORDER BY opgehaald_op DESC LIMIT -1 OFFSET ?)",
+                (max_rijen,)
+            ).rowcount
+        return weg
+
+    def tellingen(self) -> Tuple[int, int]:
+        row = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(negatief), 0) FROM rvo_lookup_cache WHERE verloopt_op > ?",
+            (time.time(),)
+        ).fetchone()
+        return int(row[0]), int(row[1])
+
+    def leeg(self) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM rvo_lookup_cache")
+
+
+# ---------------------------- Cache ----------------------------
+
+class RvoCache:
+    def __init__(self, backend, cel_m: float = CEL_M, ttl_dagen: float = TTL_DAGEN,
+                 neg_ttl_dagen: float = NEG_TTL_DAGEN, max_rijen: int = MAX_RIJEN):
+        self.backend = backend
+        self.cel_m = cel_m
+        self.ttl_dagen = ttl_dagen
+        self.neg_ttl_dagen = neg_ttl_dagen
+        self.max_rijen = max_rijen
+        self._lock = threading.Lock()
+        self._sets = 0
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "stored": 0, "errors": 0}
+
+    def _tel(self, naam: str) -> None:
+        with self._lock:
+            self._stats[naam] += 1
+
+    def get(self, laag: str, lat: float, lng: float) -> Optional[Dict[str, Any]]:
+        """Gecachet resultaat (dict) of None bij een miss."""
+        try:
+            hit = self.backend.get(laag, cel_voor_punt(lat, lng, self.cel_m))
+        except Exception as e:
+            self._tel("errors")
+            logger.warning("RVO-cache lezen mislukt: %s", e)
+            return None
+        if hit is None:
+            self._tel("misses")
+            return None
+        negatief, resultaat = hit
+        self._tel("negative_hits" if negatief else "hits")
+        return json.loads(resultaat) if resultaat else {}
+
+    def set(self, laag: str, lat: float, lng: float, resultaat: Dict[str, Any], negatief: bool) -> None:
+        """Alleen geldige antwoorden opslaan; negatief = geen feature op dit punt (kortere TTL)."""
+        dagen = self.neg_ttl_dagen if negatief else self.ttl_dagen
+        try:
+            self.backend.set(laag, cel_voor_punt(lat, lng, self.cel_m), negatief,
+                             json.dumps(resultaat), dagen * 86400.0)
+            self._tel("stored")
+        except Exception as e:
+            self._tel("errors")
+            logger.warning("RVO-cache opslaan mislukt: %s", e)
+            return
+        with self._lock:
+            self._sets += 1
+            opruimen = self._sets % _OPRUIM_INTERVAL == 0
+        if opruimen:
+            try:
+                self.backend.opruimen(self.max_rijen)
+            except Exception as e:
+                logger.warning("RVO-cache opruimen mislukt: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        opvragingen = s["hits"] + s["negative_hits"] + s["misses"]
+        s["hit_ratio"] = round((s["hits"] + s["negative_hits"]) / opvragingen, 4) if opvragingen else None
+        s.update(backend=self.backend.naam, cel_m=self.cel_m, ttl_dagen=self.ttl_dagen,
+                 neg_ttl_dagen=self.neg_ttl_dagen, max_rijen=self.max_rijen)
+        try:
+            s["rijen"], s["rijen_negatief"] = self.backend.tellingen()
+        except Exception as e:
+            s["rijen"] = None
+            logger.warning("RVO-cache telling mislukt: %s", e)
+        return s
+
+
+def _maak_cache() -> Optional[RvoCache]:
+    if BACKEND in ("uit", "off", "0", "none"):
+        return None
+    if BACKEND == "disk":
+        try:
+            return RvoCache(SqliteBackend())
+        except Exception as e:
+            logger.warning("RVO-cache op schijf niet beschikbaar (%s): %s", CACHE_PAD, e)
+            return None
+    return RvoCache(PostgresBackend())
+
+
+rvo_cache = _maak_cache()
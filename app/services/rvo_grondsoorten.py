@@ -1,8 +1,21 @@
 # app/services/rvo_grondsoorten.py
 from __future__ import annotations
+import logging
+import os
+import threading
 import requests
-from functools import lru_cache
-from typing import Optional, Dict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, List, Sequence, Tuple
+
+from app.services.weerbaarheid import breaker, timeout_voor
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Eerst de lokale PostGIS-kaart (grondsoort_lokaal.py); de ArcGIS-endpoints
+# hieronder zijn alleen nog een fallback. RVO_REMOTE_FALLBACK=0 zet die uit.
+REMOTE_FALLBACK = os.getenv("RVO_REMOTE_FALLBACK", "1") != "0"
 
 # === VUL DEZE 2 CONSTANTEN IN MET JOUW LAYER-ENDPOINTS ===
 # Voorbeeldvorm (LET OP: dit zijn VOORBEELD-paden, zet hier je eigen endpoints):
@@ -16,6 +29,54 @@ RVO_LOESS_GEBIED_FEATURE_URL = None  # bv. ".../FeatureServer/1" als beschikbaar
 # Veel gebruikt: "HOOFDGRS" of "GRONDSOORT". Zet je veldnaam hier.
 GRONDSOORT_VELD = "HOOFDGRS"   # pas aan indien nodig
 
+def _remote_geconfigureerd() -> bool:
+    return REMOTE_FALLBACK and "<org>" not in RVO_GRONDSOORTEN_FEATURE_URL
+
+
+def _lokaal(punten: Sequence[Tuple[float, float]]) -> Optional[List[Dict]]:
+    """Ruwe velden uit de lokale kaart, of None als die er niet is / faalt."""
+    try:
+        from app.services.grondsoort_lokaal import lokale_data_beschikbaar, lokale_grondsoorten
+        if not lokale_data_beschikbaar():
+            return None
+        return lokale_grondsoorten(punten)
+    except Exception as e:
+        logger.warning("Lokale grondsoort-opzoeking mislukt: %s", e)
+        return None
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Gedeelde Session met connection pool; tijdelijke fouten (5xx/429/timeouts) worden herhaald."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            retry = Retry(
+                total=3, connect=3, read=3, backoff_factor=0.4,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=8)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+def _cache():
+    """Gedeelde RVO-cache (services/rvo_cache.py), of None."""
+    try:
+        from app.services.rvo_cache import rvo_cache
+        return rvo_cache
+    except Exception as e:  # bv. geen DATABASE_URL bij handmatig testen
+        logger.info("RVO-cache niet beschikbaar: %s", e)
+        return None
+
+
 # Kleine helper om ArcGIS FeatureServer te bevragen op intersectie met een punt:
 def _arcgis_query_point(layer_url: str, lat: float, lng: float, out_fields="*") -> Dict:
     params = {
@@ -28,34 +89,60 @@ def _arcgis_query_point(layer_url: str, lat: float, lng: float, out_fields="*")
         "returnGeometry": "false",
         "where": "1=1"
     }
-    r = requests.get(layer_url + "/query", params=params, timeout=15)
-    r.raise_for_status()
-    return r.json()
+    # Circuit breaker + tijdsbudget (services/weerbaarheid.py); de aanroepers
+    # vangen CircuitOpen/DeadlineVerstreken af en cachen dan niets
+    with breaker("rvo_grondsoorten").bewaakt():
+        r = _get_session().get(layer_url + "/query", params=params, timeout=timeout_voor(15))
+        r.raise_for_status()
+    data = r.json()
+    if "error" in data:  # ArcGIS geeft fouten met HTTP 200
+        raise RuntimeError(f"ArcGIS-fout: {data['error']}")
+    return data
+
 
-@lru_cache(maxsize=2048)
 def _point_in_region(layer_url: str, lat: float, lng: float) -> bool:
+    from app.services.rvo_cache import laag_sleutel
+
+    cache, laag = _cache(), laag_sleutel("regio", layer_url)
+    if cache is not None:
+        hit = cache.get(laag, lat, lng)
+        if hit is not None:
+            return bool(hit.get("in"))
     try:
         data = _arcgis_query_point(layer_url, lat, lng, out_fields="OBJECTID")
-        return bool(data.get("features"))
-    except Exception:
-        return False
+    except Exception as e:
+        logger.warning("RVO regio-opzoeking mislukt: %s", e)
+        return False  # niet cachen: volgende keer opnieuw proberen
+    binnen = bool(data.get("features"))
+    if cache is not None:
+        cache.set(laag, lat, lng, {"in": binnen}, negatief=not binnen)
+    return binnen
+
 
-@lru_cache(maxsize=2048)
 def _grondsoort_raw(lat: float, lng: float) -> Dict:
     """
     Haalt het ruwe feature-attribuut uit de RVO grondsoortenkaart (punt-intersect).
     Retourneert bijv. {"hoofdg": "ZAND"} of {"hoofdg": "KLEI"} afhankelijk van jouw veldnaam.
     """
+    from app.services.rvo_cache import laag_sleutel
+
+    cache = _cache()
+    laag = laag_sleutel("grondsoort", f"{RVO_GRONDSOORTEN_FEATURE_URL}#{GRONDSOORT_VELD}")
+    if cache is not None:
+        hit = cache.get(laag, lat, lng)
+        if hit is not None:
+            return {"hoofdg": hit.get("hoofdg", "")}
     try:
         data = _arcgis_query_point(RVO_GRONDSOORTEN_FEATURE_URL, lat, lng, out_fields=f"{GRONDSOORT_VELD}")
-        feats = data.get("features") or []
-        if not feats:
-            return {"hoofdg": ""}
-        attrs = (feats[0].get("attributes") or {})
-        val = str(attrs.get(GRONDSOORT_VELD, "") or "").strip()
-        return {"hoofdg": val}
-    except Exception:
-        return {"hoofdg": ""}
+    except Exception as e:
+        logger.warning("RVO grondsoort-opzoeking mislukt: %s", e)
+        return {"hoofdg": ""}  # niet cachen: volgende keer opnieuw proberen
+    feats = data.get("features") or []
+    attrs = (feats[0].get("attributes") or {}) if feats else {}
+    val = str(attrs.get(GRONDSOORT_VELD, "") or "").strip()
+    if cache is not None:
+        cache.set(laag, lat, lng, {"hoofdg": val}, negatief=not val)
+    return {"hoofdg": val}
 
 def _norm(s: str) -> str:
     return (s or "").lower().replace("ö", "o").replace("öss", "oss").strip()
@@ -87,14 +174,43 @@ def _map_rvo_to_app(hoofdg: str, in_zuidelijk: bool, in_loess: bool) -> str:
         return "Zuidelijk zand"
     return "Noordelijk, westelijk, centraal zand"
 
+def _resultaat(raw: Dict, bron: str) -> Dict:
+    in_zuid, in_loess = bool(raw.get("in_zuidelijk")), bool(raw.get("in_loess"))
+    return {
+        "category": _map_rvo_to_app(raw.get("hoofdg", ""), in_zuid, in_loess),
+        "raw": {"hoofdg": raw.get("hoofdg", ""), "in_zuidelijk": in_zuid, "in_loess": in_loess, "bron": bron},
+    }
+
+
 def rvo_grondsoort_at_point(lat: float, lng: float) -> Dict:
     """
     Bepaalt de grondsoort volgens RVO-grondsoortenkaart + beleidregio:
     - Leest hoofdgrondsoort uit de kaart (bv. HOOFDGRS).
     - Checkt of punt in 'Zuidelijk zand- en lössgebied' valt.
     - (Optioneel) Checkt losse 'Lössgebied'-laag; anders herkennen we löss via veldwaarde.
-    Retourneert: {"category": "...", "raw": {"hoofdg": "...", "in_zuidelijk": bool, "in_loess": bool}}
+    Eerst lokaal (PostGIS, geen netwerk); de ArcGIS-FeatureServer alleen als
+    er geen lokale kaart is of het punt daarbuiten valt.
+    Retourneert: {"category": "...", "raw": {"hoofdg": "...", "in_zuidelijk": bool, "in_loess": bool, "bron": ...}}
     """
+    return rvo_grondsoorten_at_points([(lat, lng)])[0]
+
+
+def rvo_grondsoorten_at_points(punten: Sequence[Tuple[float, float]]) -> List[Dict]:
+    """Batchvariant: één lokale query voor alle punten, remote alleen voor de missers."""
+    punten = list(punten or [])
+    lokaal = _lokaal(punten)
+    out: List[Dict] = []
+    for i, (lat, lng) in enumerate(punten):
+        if lokaal is not None and (lokaal[i]["hoofdg"] or not _remote_geconfigureerd()):
+            out.append(_resultaat(lokaal[i], "lokaal"))
+        elif _remote_geconfigureerd():
+            out.append(_rvo_remote(lat, lng))
+        else:
+            out.append(_resultaat({"hoofdg": "", "in_zuidelijk": False, "in_loess": False}, "geen"))
+    return out
+
+
+def _rvo_remote(lat: float, lng: float) -> Dict:
     raw = _grondsoort_raw(lat, lng)
     in_zuid = _point_in_region(RVO_ZUIDELIJK_GEBIED_FEATURE_URL, lat, lng) if RVO_ZUIDELIJK_GEBIED_FEATURE_URL else False
 
@@ -104,8 +220,4 @@ def rvo_grondsoort_at_point(lat: float, lng: float) -> Dict:
         # Zonder losse löss-laag: herkennen we via grondsoortenwaarde zelf
         in_loess = False
 
-    cat = _map_rvo_to_app(raw.get("hoofdg", ""), in_zuid, in_loess)
-    return {
-        "category": cat,
-        "raw": {"hoofdg": raw.get("hoofdg", ""), "in_zuidelijk": in_zuid, "in_loess": in_loess}
-    }
+    return _resultaat({"hoofdg": raw.get("hoofdg", ""), "in_zuidelijk": in_zuid, "in_loess": in_loess}, "remote")
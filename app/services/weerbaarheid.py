@@ -0,0 +1,239 @@
+# app/services/weerbaarheid.py
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+
+"""
+Circuit breakers en een tijdsbudget voor externe geodata-diensten
+(bodemkaart_wms, rvo_grondsoorten, pdok_gewaspercelen).
+
+Circuit breaker per dienst (breaker(naam)):
+- gesloten: aanroepen gaan door; na GEODATA_BREAKER_DREMPEL (default 5)
+  opeenvolgende transportfouten (timeout, verbinding, HTTP 5xx/429) gaat
+  hij open (een "trip");
+- open: aanroepen falen direct met CircuitOpen, zodat de aanroeper meteen
+  zijn standaardpad neemt in plaats van een worker vast te houden;
+- na GEODATA_BREAKER_HERSTEL_SECS (default 30) halfopen: één proefaanroep;
+  slaagt die, dan weer gesloten, anders opnieuw open.
+Breakers zijn per worker-proces.
+
+Tijdsbudget (deadline): met `with deadline(sec):` of @met_deadline(sec)
+krijgt een request een totaalbudget; timeout_voor(standaard) geeft de
+timeout voor de volgende HTTP-aanroep (nooit meer dan wat er over is) en
+geeft DeadlineVerstreken als het budget op is. Zonder deadline gelden de
+gewone timeouts van de diensten.
+
+Status en trips: breaker_stats(), zichtbaar via /gebruikers/admin/geodata.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+DREMPEL = max(1, int(_env_float("GEODATA_BREAKER_DREMPEL", 5)))
+HERSTEL_SECS = _env_float("GEODATA_BREAKER_HERSTEL_SECS", 30.0)
+REQUEST_DEADLINE_SECS = _env_float("GEODATA_DEADLINE_SECS", 8.0)
+
+
+class CircuitOpen(Exception):
+    """De dienst is (tijdelijk) afgesloten; neem het standaardpad."""
+
+
+class DeadlineVerstreken(Exception):
+    """Het tijdsbudget van deze request is op."""
+
+
+def is_transportfout(e: BaseException) -> bool:
+    """Telt mee voor de breaker: de dienst is traag/onbereikbaar, niet 'antwoord onbruikbaar'."""
+    if isinstance(e, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if isinstance(e, requests.HTTPError):
+        status = getattr(e.response, "status_code", None)
+        return status is None or status >= 500 or status == 429
+    return isinstance(e, requests.exceptions.RetryError)
+
+
+# ---------------------------- Circuit breaker ----------------------------
+
+class CircuitBreaker:
+    GESLOTEN, OPEN, HALFOPEN = "closed", "open", "half_open"
+
+    def __init__(self, naam: str, drempel: int = DREMPEL, herstel_secs: float = HERSTEL_SECS):
+        self.naam = naam
+        self.drempel = drempel
+        self.herstel_secs = herstel_secs
+        self._lock = threading.Lock()
+        self._staat = self.GESLOTEN
+        self._fouten_op_rij = 0
+        self._open_sinds = 0.0
+        self._proef_bezig = False
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "rejected": 0, "trips": 0}
+        self._laatste_fout: Optional[str] = None
+        self._laatste_trip: Optional[float] = None
+
+    @property
+    def staat(self) -> str:
+        with self._lock:
+            return self._huidige_staat()
+
+    def _huidige_staat(self) -> str:
+        if self._staat == self.OPEN and time.monotonic() - self._open_sinds >= self.herstel_secs:
+            self._staat = self.HALFOPEN
+            self._proef_bezig = False
+        return self._staat
+
+    def toestaan(self) -> bool:
+        """Mag er nu een aanroep door? In halfopen staat precies één proefaanroep."""
+        with self._lock:
+            staat = self._huidige_staat()
+            if staat == self.GESLOTEN:
+                self._stats["calls"] += 1
+                return True
+            if staat == self.HALFOPEN and not self._proef_bezig:
+                self._proef_bezig = True
+                self._stats["calls"] += 1
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def succes(self) -> None:
+        with self._lock:
+            self._stats["successes"] += 1
+            self._fouten_op_rij = 0
+            if self._staat != self.GESLOTEN:
+                logger.info("Circuit breaker %s weer gesloten", self.naam)
+            self._staat = self.GESLOTEN
+            self._proef_bezig = False
+
+    def fout(self, e: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._stats["failures"] += 1
+            self._fouten_op_rij += 1
+            self._laatste_fout = f"{type(e).__name__}: {e}" if e is not None else None
+            if self._staat == self.HALFOPEN or self._fouten_op_rij >= self.drempel:
+                if self._staat != self.OPEN:
+                    self._stats["trips"] += 1
+                    self._laatste_trip = time.time()
+                    logger.warning("Circuit breaker %s open na %s fouten (%s)",
+                                   self.naam, self._fouten_op_rij, self._laatste_fout)
+                self._staat = self.OPEN
+                self._open_sinds = time.monotonic()
+                self._proef_bezig = False
+
+    @contextmanager
+    def bewaakt(self) -> Iterator[None]:
+        """
+        Bewaakt één aanroep: CircuitOpen als de breaker open is; transportfouten
+        tellen als fout, andere uitzonderingen (bv. onbruikbaar antwoord) niet.
+        """
+        if not self.toestaan():
+            raise CircuitOpen(f"{self.naam}: circuit open")
+        try:
+            yield
+        except BaseException as e:
+            if is_transportfout(e):
+                self.fout(e)
+            else:
+                # Dienst antwoordde wel; proefaanroep niet blokkerend laten
+                with self._lock:
+                    self._proef_bezig = False
+            raise
+        else:
+            self.succes()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._staat, self._fouten_op_rij, self._proef_bezig = self.GESLOTEN, 0, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            s.update(
+                state=self._huidige_staat(),
+                consecutive_failures=self._fouten_op_rij,
+                threshold=self.drempel,
+                recovery_secs=self.herstel_secs,
+                last_failure=self._laatste_fout,
+                last_trip=self._laatste_trip,
+            )
+        return s
+
+
+# Bekende diensten staan altijd in breaker_stats(), ook vóór de eerste aanroep
+DIENSTEN = ("bodemkaart_wms", "rvo_grondsoorten", "pdok_gewaspercelen")
+
+_breakers: Dict[str, CircuitBreaker] = {naam: CircuitBreaker(naam) for naam in DIENSTEN}
+_breakers_lock = threading.Lock()
+
+
+def breaker(naam: str) -> CircuitBreaker:
+    with _breakers_lock:
+        b = _breakers.get(naam)
+        if b is None:
+            b = _breakers[naam] = CircuitBreaker(naam)
+        return b
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        alle = list(_breakers.values())
+    return {b.naam: b.stats() for b in alle}
+
+
+# ---------------------------- Deadline ----------------------------
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("geodata_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconden: float) -> Iterator[None]:
+    """Tijdsbudget voor alles binnen dit blok; een bestaand krapper budget blijft gelden."""
+    eind = time.monotonic() + seconden
+    huidig = _deadline.get()
+    token = _deadline.set(min(eind, huidig) if huidig is not None else eind)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def met_deadline(seconden: float = REQUEST_DEADLINE_SECS):
+    """Decorator voor routes: de hele request krijgt `seconden` voor externe geodata."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with deadline(seconden):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def resterend() -> Optional[float]:
+    eind = _deadline.get()
+    return None if eind is None else eind - time.monotonic()
+
+
+def timeout_voor(standaard: float) -> float:
+    """Timeout voor de volgende aanroep binnen het budget; DeadlineVerstreken als het op is."""
+    rest = resterend()
+    if rest is None:
+        return standaard
+    if rest <= 0.05:
+        raise DeadlineVerstreken("tijdsbudget voor externe geodata verstreken")
+    return min(standaard, rest)
@@ -0,0 +1,69 @@
+/* =========================================================================
+ * JobStatus – volgt een achtergrondjob via /jobs/<id> (services/jobs.py)
+ *
+ *   JobStatus.volg(statusUrl, {
+ *     onVoortgang: (st) => {},   // elke poll zolang queued/running
+ *     onKlaar:     (st) => {},   // status "done" (st.resultaat_url bij een bestand)
+ *     onFout:      (st) => {},   // status "failed" of onbekende job
+ *   });
+ *
+ *   Of declaratief: <div data-job-status="{{ url }}"></div> toont de
+ *   voortgang en de melding uit het resultaat; bij een bestand start de
+ *   download vanzelf.
+ * ========================================================================= */
+(function (global) {
+  const POLL_MS = 1500;
+
+  function volg(statusUrl, { onVoortgang, onKlaar, onFout } = {}) {
+    let gestopt = false;
+    async function poll() {
+      if (gestopt) return;
+      let st = null;
+      try {
+        const r = await fetch(statusUrl, { credentials: 'same-origin' });
+        st = await r.json();
+        if (!r.ok) { onFout?.(st || { fout: 'Onbekende job' }); return; }
+      } catch (e) {
+        setTimeout(poll, POLL_MS * 2);
+        return;
+      }
+      if (st.status === 'done') { onKlaar?.(st); return; }
+      if (st.status === 'failed') { onFout?.(st); return; }
+      onVoortgang?.(st);
+      setTimeout(poll, POLL_MS);
+    }
+    poll();
+    return { stop() { gestopt = true; } };
+  }
+
+  function voortgangTekst(st) {
+    if (st.status === 'queued') return 'In de wachtrij…';
+    const deel = (st.totaal ? ` ${st.verwerkt || 0}/${st.totaal}` : '');
+    return `Bezig${st.fase ? ' (' + st.fase + ')' : ''}…${deel}`;
+  }
+
+  function initDeclaratief(root = document) {
+    root.querySelectorAll('[data-job-status]').forEach(el => {
+      const zet = (tekst, soort) => {
+        el.textContent = tekst;
+        el.className = `flash flash-${soort}`;
+      };
+      volg(el.dataset.jobStatus, {
+        onVoortgang: st => zet(voortgangTekst(st), 'info'),
+        onKlaar: st => {
+          const res = st.resultaat || {};
+          if (st.resultaat_url) {
+            zet('Klaar; de download start.', 'success');
+            window.location.href = st.resultaat_url;
+          } else {
+            zet(res.melding || 'Klaar.', res.aantal_fouten ? 'warning' : 'success');
+          }
+        },
+        onFout: st => zet(st.fout || st.error || 'Mislukt.', 'danger'),
+      });
+    });
+  }
+
+  global.JobStatus = { volg, initDeclaratief };
+  document.addEventListener('DOMContentLoaded', () => initDeclaratief());
+})(window);
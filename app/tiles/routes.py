@@ -0,0 +1,260 @@
+# app/tiles/routes.py
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, abort, request
+
+import app.models.database_beheer as db
+from app.gebruikers.auth_utils import login_required, effective_user_id
+from app.services.response_cache import (
+    CachedResponse, LokaleBackend, RedisBackend, ResponseCache
+)
+
+"""
+Mapbox Vector Tiles voor de kaartlagen.
+
+    /tiles/percelen/{z}/{x}/{y}.mvt?jaar=2025   percelen met normen van de
+                                                gebruiker, incl. gebruiks-%
+    /tiles/nv_gebieden/{z}/{x}/{y}.mvt          NV-gebieden (gedeeld)
+
+Tiles worden door PostGIS gebouwd (ST_AsMVT/ST_AsMVTGeom, EPSG:3857). De
+geometrie wordt vooraf in RD (28992) vereenvoudigd met een tolerantie van
+een halve pixel op dat zoomniveau (ST_SimplifyPreserveTopology), zodat een
+tile begrensd blijft ongeacht het aantal of de detaillering van de vlakken.
+Selectie gaat via de GiST-indexen op percelen.geom en nv_gebieden.geom.
+
+Tile-cache: zelfde backends als de response-cache (lokale LRU of Redis via
+TILE_CACHE_URL). Percelen-tiles hangen aan de versie van de gebruiker in
+response_cache_versies, dus schrijfacties maken ze ongeldig. NV-tiles hangen
+aan een vingerafdruk van nv_gebieden zelf (aantal, max(xmin), extent), die
+hooguit eens per NV_TILE_VERSIE_SECS wordt opgevraagd: de laag wordt buiten
+de app herladen, en daarna krijgen clients met een oude ETag binnen die tijd
+een nieuwe tile in plaats van een 304.
+"""
+
+logger = logging.getLogger(__name__)
+
+tiles_bp = Blueprint('tiles', __name__, url_prefix='/tiles')
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+TILE_CACHE_TTL = _env_int("TILE_CACHE_TTL_SECS", 24 * 3600)
+TILE_CACHE_URL = os.getenv("TILE_CACHE_URL", "").strip()
+NV_VERSIE_SECS = _env_int("NV_TILE_VERSIE_SECS", 300)
+
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MAX_ZOOM = 22
+
+# Halve kaartpixel (256 px-tiles) in meters op Nederlandse breedte
+_WEB_MERCATOR_BREEDTE = 2 * 20037508.342789244
+_COS_NL = math.cos(math.radians(52.2))
+
+
+def simplify_tolerantie(z: int) -> float:
+    """Tolerantie in RD-meters voor ST_SimplifyPreserveTopology op zoom z."""
+    return _WEB_MERCATOR_BREEDTE / (256 * 2 ** z) * _COS_NL * 0.5
+
+
+def _tile_marge(z: int) -> float:
+    """Buffer rond de tile (in meters) voor de bbox-selectie."""
+    return _WEB_MERCATOR_BREEDTE / 2 ** z * MVT_BUFFER / MVT_EXTENT
+
+
+def _maak_backend():
+    if TILE_CACHE_URL.startswith("redis://") or TILE_CACHE_URL.startswith("rediss://"):
+        try:
+            return RedisBackend(TILE_CACHE_URL, prefix="landbouwapp:tile:")
+        except Exception as e:
+            logger.warning("Tile-cache: Redis niet beschikbaar (%s); lokaal", e)
+    return LokaleBackend(
+        max_entries=_env_int("TILE_CACHE_MAX_ENTRIES", 4096),
+        max_bytes=_env_int("TILE_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+    )
+
+
+tile_cache = _maak_backend()
+
+
+# ---------------------------- SQL ----------------------------
+
+_BOUNDS_CTE = """
+    bounds AS (
+        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS env,
+               ST_Expand(ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s), 28992), %(marge)s) AS rd
+    )
+"""
+
+_PERCELEN_SQL = f"""
+    WITH {_BOUNDS_CTE},
+    mvt AS (
+        SELECT
+            ST_AsMVTGeom(
+                ST_Transform(ST_SimplifyPreserveTopology(p.geom, %(tol)s), 3857),
+                bounds.env, {MVT_EXTENT}, {MVT_BUFFER}, true
+            ) AS geom,
+            p.id                  AS perceel_id,
+            gn.id                 AS gebruiksnorm_id,
+            gn.bedrijf_id,
+            b.naam                AS bedrijf_naam,
+            p.perceelnaam,
+            ROUND(COALESCE(p.oppervlakte, 0)::numeric, 2)::float8 AS oppervlakte_ha,
+            p.nv_gebied,
+            COALESCE(t.aantal, 0) AS bemestingen_count,
+            -- zelfde percentages als api_map_percelen (oppervlakte valt weg)
+            CASE WHEN gn.stikstof_norm_kg_ha > 0 AND p.oppervlakte > 0
+                 THEN ROUND((COALESCE(t.werkzame_n_kg_ha, 0) / gn.stikstof_norm_kg_ha * 100)::numeric, 1)::float8
+                 ELSE 0 END AS usage_n_percent,
+            CASE WHEN gn.stikstof_dierlijk_kg_ha > 0 AND p.oppervlakte > 0
+                 THEN ROUND((COALESCE(t.n_dierlijk_kg_ha, 0) / gn.stikstof_dierlijk_kg_ha * 100)::numeric, 1)::float8
+                 ELSE 0 END AS usage_n_dier_percent,
+            CASE WHEN gn.fosfaat_norm_kg_ha > 0 AND p.oppervlakte > 0
+                 THEN ROUND((COALESCE(t.werkzame_p2o5_kg_ha, 0) / gn.fosfaat_norm_kg_ha * 100)::numeric, 1)::float8
+                 ELSE 0 END AS usage_p_percent
+        FROM gebruiksnormen gn
+        JOIN bedrijven b ON b.id = gn.bedrijf_id
+        JOIN percelen  p ON p.id = gn.perceel_id
+        LEFT JOIN LATERAL (
+            SELECT SUM(s.werkzame_n_kg_ha)    AS werkzame_n_kg_ha,
+                   SUM(s.n_dierlijk_kg_ha)    AS n_dierlijk_kg_ha,
+                   SUM(s.werkzame_p2o5_kg_ha) AS werkzame_p2o5_kg_ha,
+                   SUM(s.aantal)              AS aantal
+            FROM bemesting_samenvatting s
+            WHERE s.gebruiksnorm_id = gn.id
+        ) t ON true
+        CROSS JOIN bounds
+        WHERE gn.jaar = %(jaar)s
+          AND b.user_id = %(user_id)s
+          AND p.geom && bounds.rd
+    )
+    SELECT ST_AsMVT(mvt, 'percelen', {MVT_EXTENT}, 'geom') FROM mvt WHERE geom IS NOT NULL
+"""
+
+_NV_GEBIEDEN_SQL = f"""
+    WITH {_BOUNDS_CTE},
+    mvt AS (
+        SELECT
+            ST_AsMVTGeom(
+                ST_Transform(ST_SimplifyPreserveTopology(n.geom, %(tol)s), 3857),
+                bounds.env, {MVT_EXTENT}, {MVT_BUFFER}, true
+            ) AS geom,
+            n.id,
+            n.naam
+        FROM nv_gebieden n
+        CROSS JOIN bounds
+        WHERE n.geom && bounds.rd
+    )
+    SELECT ST_AsMVT(mvt, 'nv_gebieden', {MVT_EXTENT}, 'geom') FROM mvt WHERE geom IS NOT NULL
+"""
+
+
+_NV_VERSIE_SQL = """
+    SELECT count(*), COALESCE(max(xmin::text::bigint), 0), ST_Extent(geom)::text
+    FROM nv_gebieden
+"""
+
+_nv_versie = ("", 0.0)
+_nv_versie_lock = threading.Lock()
+
+
+def nv_versie() -> str:
+    """
+    Vingerafdruk van de inhoud van nv_gebieden (hooguit eens per
+    NV_VERSIE_SECS opgevraagd). Een herlaadactie schrijft nieuwe rijen en
+    verandert dus in elk geval max(xmin).
+    """
+    global _nv_versie
+    with _nv_versie_lock:
+        versie, gecontroleerd = _nv_versie
+        if versie and time.monotonic() - gecontroleerd < NV_VERSIE_SECS:
+            return versie
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(_NV_VERSIE_SQL)
+        versie = hashlib.sha1(repr(c.fetchone()).encode("utf-8")).hexdigest()[:16]
+        conn.rollback()
+    finally:
+        conn.close()
+    with _nv_versie_lock:
+        _nv_versie = (versie, time.monotonic())
+    return versie
+
+
+def _bouw_tile(sql: str, params: dict) -> bytes:
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(sql, params)
+        row = c.fetchone()
+        conn.rollback()
+        return bytes(row[0]) if row and row[0] is not None else b""
+    finally:
+        conn.close()
+
+
+# ---------------------------- Route ----------------------------
+
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
+
+
+def _tile_response(body: bytes, etag: str, status: int = 200) -> Response:
+    resp = Response(body, status=status, mimetype=MVT_MIMETYPE)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+@tiles_bp.route('/<layer>/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+@login_required
+def tile(layer, z, x, y):
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        abort(404)
+
+    params = {"z": z, "x": x, "y": y, "tol": simplify_tolerantie(z), "marge": _tile_marge(z)}
+
+    if layer == 'percelen':
+        user_id = effective_user_id()
+        jaar = request.args.get('jaar', type=int)
+        if not jaar:
+            return Response(b"jaar vereist", status=400, mimetype="text/plain")
+        gebruiker_versie, globale_versie = ResponseCache.versie(user_id)
+        key = f"percelen|{user_id}|{jaar}|{z}/{x}/{y}|{gebruiker_versie}.{globale_versie}"
+        sql = _PERCELEN_SQL
+        params.update(jaar=jaar, user_id=user_id)
+    elif layer == 'nv_gebieden':
+        key = f"nv_gebieden|{z}/{x}/{y}|{nv_versie()}"
+        sql = _NV_GEBIEDEN_SQL
+    else:
+        abort(404)
+
+    etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    if etag in request.if_none_match:
+        return _tile_response(b"", etag, status=304)
+
+    try:
+        hit = tile_cache.get(key)
+    except Exception as e:
+        logger.warning("Tile-cache lezen mislukt: %s", e)
+        hit = None
+    if hit is not None:
+        return _tile_response(hit.body, etag)
+
+    body = _bouw_tile(sql, params)
+    try:
+        tile_cache.set(key, CachedResponse(body, MVT_MIMETYPE, etag), TILE_CACHE_TTL)
+    except Exception as e:
+        logger.warning("Tile-cache opslaan mislukt: %s", e)
+    return _tile_response(body, etag)
@@ -0,0 +1,228 @@
+# app/universele_data/imports.py
+from __future__ import annotations
+
+import logging
+from io import BytesIO
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+import app.models.database_beheer as db
+from app.models.referentie_cache import bump_versie
+from app.services import bulk_import
+from app.services.bulk_import import INT, TEXT, Kolom
+from app.services.jobs import Job, Mislukt, enqueue, taak
+
+"""
+Spreadsheet-imports van de referentietabellen (universele_data).
+
+De routes lezen alleen het geüploade bestand en zetten een job
+'spreadsheet_import' in de jobqueue (services/jobs.py); inlezen, controleren
+en wegschrijven gebeurt hier, in een werker, zodat een groot RVO-bestand
+niet meer tegen de gunicorn-timeout aanloopt. De melding die vroeger als
+flash kwam staat in het resultaat van de job; de pagina pollt /jobs/<id>.
+
+Controleren en laden gaat kolomsgewijs via services/bulk_import.py (COPY
+naar een staging-tabel, één INSERT ... SELECT); IMPORTS beschrijft per
+tabel welke spreadsheetkolom in welke databasekolom komt.
+
+Een import wordt niet opnieuw geprobeerd (max_pogingen=1): behalve de
+gewassen (upsert op jaar/gewas) hebben de tabellen geen natuurlijke
+sleutel, een tweede poging zou rijen verdubbelen.
+"""
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SOORT = "spreadsheet_import"
+MAX_FOUTEN_IN_RESULTAAT = 50
+
+
+def lees_spreadsheet(bestandsnaam: str, data: bytes) -> pd.DataFrame:
+    """
+    Leest een Excel/ODS-bestand in als DataFrame.
+    Ondersteunt .xlsx, .xls en .ods.
+    Gooit een ValueError bij een niet-ondersteunde extensie.
+    Gooit de originele Exception bij leesfouten.
+    """
+    filename = (bestandsnaam or "").lower()
+    if filename.endswith('.ods'):
+        # Vereist: pip install odfpy
+        return pd.read_excel(BytesIO(data), engine="odf")
+    elif filename.endswith('.xlsx') or filename.endswith('.xls'):
+        return pd.read_excel(BytesIO(data))
+    else:
+        raise ValueError("Bestandstype niet ondersteund. Gebruik .xlsx, .xls of .ods.")
+
+
+def controleer_bestandsnaam(bestandsnaam: str) -> None:
+    """ValueError bij een niet-ondersteunde extensie (vóór het in de wachtrij zetten)."""
+    if not (bestandsnaam or "").lower().endswith(('.ods', '.xlsx', '.xls')):
+        raise ValueError("Bestandstype niet ondersteund. Gebruik .xlsx, .xls of .ods.")
+
+
+def to_int_safe(value, default=None):
+    try:
+        s = str(value).strip()
+        if s == "" or s.lower() == "nan":
+            return default
+        # eerst naar float -> dan int, om 2025.0 ook goed te pakken
+        return int(float(s))
+    except Exception:
+        return default
+
+
+def to_float_safe(value, default=None):
+    try:
+        s = str(value).strip().replace(",", ".")
+        if s == "" or s.lower() == "nan":
+            return default
+        return float(s)
+    except Exception:
+        return default
+
+
+# ---------------------------- Imports per tabel ----------------------------
+
+MESTSTOF_GEHALTES = ['n', 'p2o5', 'k2o',
+                     'b', 'cao', 'cu', 'co', 'cl', 'fe', 'mgo', 'mn', 'mo',
+                     'zn', 'na2o', 'se', 'sio2', 'so3']
+
+
+def _resultaat(n: int, fouten: List[Tuple[int, str]], melding: str) -> Dict[str, Any]:
+    return {
+        "geimporteerd": n,
+        "aantal_fouten": len(fouten),
+        "fouten": [list(f) for f in fouten[:MAX_FOUTEN_IN_RESULTAAT]],
+        "melding": melding,
+    }
+
+
+def _melding(spec: "SpreadsheetImport", n: int, fouten: List[Tuple[int, str]]) -> str:
+    meldingen = []
+    if n > 0:
+        meldingen.append(f"{spec.label.capitalize()} geïmporteerd ({n} rijen).")
+    if fouten:
+        detail = "; ".join([f"rij {r}: {msg}" for r, msg in fouten[:5]])
+        if len(fouten) > 5:
+            detail += f" (en nog {len(fouten) - 5} rijen met fouten)"
+        meldingen.append(f"Er zijn {len(fouten)} rijen overgeslagen vanwege fouten: {detail}")
+    if n == 0 and not fouten:
+        meldingen.append("Geen rijen gevonden om te importeren.")
+    return " ".join(meldingen)
+
+
+def importeer(spec: "SpreadsheetImport", df: pd.DataFrame, job: Optional[Job] = None) -> Dict[str, Any]:
+    """
+    Kolommen controleren en omzetten (services/bulk_import.py), dan in één
+    transactie via COPY laden. Afgekeurde rijen staan met hun Excel-rijnummer
+    in het resultaat; een databasefout laat de hele import mislukken.
+    """
+    conn = db.get_connection()
+    try:
+        if job is not None:
+            job.voortgang(0, len(df), "laden", direct=True)
+        res = bulk_import.importeer(conn, spec.tabel, df, spec.kolommen, spec.conflict)
+        bump_versie(conn, spec.tabel)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise Mislukt(f"Import {spec.label} mislukt: {e}") from e
+    finally:
+        conn.close()
+    return _resultaat(res.geladen, res.fouten, _melding(spec, res.geladen, res.fouten))
+
+
+class SpreadsheetImport(NamedTuple):
+    label: str
+    tabel: str
+    kolommen: List[Kolom]
+    conflict: Optional[List[str]] = None   # upsert-sleutel; None = alleen toevoegen
+
+    @property
+    def verplichte_kolommen(self) -> List[str]:
+        # Excel moet AL deze kolommen als header hebben (waarden mogen leeg zijn)
+        return [k.bron for k in self.kolommen]
+
+
+IMPORTS: Dict[str, SpreadsheetImport] = {
+    "gewassen": SpreadsheetImport(
+        "gewassen", "stikstof_gewassen_normen",
+        [
+            Kolom('Jaar', 'jaar', INT, verplicht=True),
+            Kolom('Gewas', 'gewas', TEXT, verplicht=True),
+            Kolom('Klei', 'n_klei'),
+            Kolom('Noordelijk, westelijk en centraal zand', 'n_noordwestcentraal_zand'),
+            Kolom('Zuidelijk zand', 'n_zuid_zand'),
+            Kolom('Löss', 'n_loss'),
+            Kolom('Veen', 'n_veen'),
+        ],
+        conflict=['jaar', 'gewas'],
+    ),
+    "fosfaatnormen": SpreadsheetImport(
+        "fosfaatnormen", "fosfaat_normen",
+        [
+            Kolom('Jaar', 'jaar', INT, verplicht=True),
+            Kolom('Type land', 'type_land', TEXT, verplicht=True),
+            Kolom('P-CaCl2 van', 'p_cacl2_van', standaard=0),
+            Kolom('P-CaCl2 tot', 'p_cacl2_tot', standaard=0),
+            # INTEGER-kolommen: afronden zoals Postgres dat deed bij de oude INSERT
+            Kolom('P-AL van', 'p_al_van', INT, standaard=0, afronden=True),
+            Kolom('P-AL tot', 'p_al_tot', INT, standaard=0, afronden=True),
+            Kolom('Omschrijving', 'norm_omschrijving', TEXT),
+            Kolom('Norm (kg/ha)', 'norm_kg', INT, standaard=0, afronden=True),
+        ],
+    ),
+    "werkingscoefficienten": SpreadsheetImport(
+        "werkingscoëfficiënten", "stikstof_werkingscoefficient_dierlijk",
+        [
+            Kolom('jaar', 'jaar', INT, verplicht=True),
+            Kolom('meststof', 'meststof', TEXT, verplicht=True),
+            Kolom('toepassing', 'toepassing', TEXT),
+            Kolom('werking', 'werking', standaard=0),
+        ],
+    ),
+    "meststoffen": SpreadsheetImport(
+        "meststoffen", "universal_fertilizers",
+        [
+            Kolom('meststof', 'meststof', TEXT, verplicht=True),
+            Kolom('toepassing', 'toepassing', TEXT, verplicht=True),
+            Kolom('leverancier', 'leverancier', TEXT),
+        ] + [Kolom(k, k, standaard=0) for k in MESTSTOF_GEHALTES],
+    ),
+}
+
+
+# ---------------------------- Job ----------------------------
+
+def start_import(soort: str, bestandsnaam: str, data: bytes, user_id: Optional[str]) -> int:
+    """Zet een spreadsheet-import in de wachtrij; ValueError bij een onbekend bestandstype."""
+    if soort not in IMPORTS:
+        raise ValueError(f"Onbekende import {soort!r}")
+    controleer_bestandsnaam(bestandsnaam)
+    return enqueue(SOORT, {"soort": soort, "bestandsnaam": bestandsnaam},
+                   user_id=user_id, invoer=data)
+
+
+@taak(SOORT, max_pogingen=1)
+def _import_taak(job: Job) -> Dict[str, Any]:
+    spec = IMPORTS.get(job.payload.get("soort"))
+    if spec is None:
+        raise Mislukt(f"Onbekende import {job.payload.get('soort')!r}")
+
+    job.voortgang(fase="inlezen", direct=True)
+    try:
+        df = lees_spreadsheet(job.payload.get("bestandsnaam") or "", job.invoer() or b"")
+    except Exception as e:
+        raise Mislukt(f"Fout bij inlezen bestand: {e}") from e
+
+    missing = [col for col in spec.verplichte_kolommen if col not in df.columns]
+    if missing:
+        raise Mislukt(f"Kolommen ontbreken in Excel: {', '.join(missing)}")
+
+    df = df.dropna(how="all")
+    resultaat = importeer(spec, df, job)
+    job.voortgang(len(df), len(df), "", direct=True)
+    logger.info("Spreadsheet-import %s: %s rijen, %s fouten",
+                job.payload.get("soort"), resultaat["geimporteerd"], resultaat["aantal_fouten"])
+    return resultaat
@@ -1,9 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, send_file, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, send_file, session, flash, jsonify
 import uuid
 import app.models.database_beheer as db
+from app.models.referentie_cache import bump_versie
+from app.gebruiksnormen.herberekening import herbereken_gebruiksnormen as herbereken_alle_gebruiksnormen
+from app.models.nv_classificatie import start_herclassificatie, herclassificatie_status
+from app.universele_data.imports import (
+    IMPORTS, start_import as start_spreadsheet_import, to_float_safe, to_int_safe
+)
 import os
-import pandas as pd
-from io import BytesIO
 
 universele_data_bp = Blueprint(
     'universele_data',
@@ -16,42 +20,25 @@ universele_data_bp = Blueprint(
 def is_admin():
     return session.get('is_admin', 0) == 1
 
-def read_uploaded_spreadsheet(upload_file):
-    """
-    Leest een geüpload Excel/ODS-bestand in als DataFrame.
-    Ondersteunt .xlsx, .xls en .ods.
-    Gooit een ValueError bij een niet-ondersteunde extensie.
-    Gooit de originele Exception bij leesfouten.
-    """
-    filename = (upload_file.filename or "").lower()
-    content = upload_file.read()
-
-    if filename.endswith('.ods'):
-        # Vereist: pip install odfpy
-        return pd.read_excel(BytesIO(content), engine="odf")
-    elif filename.endswith('.xlsx') or filename.endswith('.xls'):
-        return pd.read_excel(BytesIO(content))
-    else:
-        raise ValueError("Bestandstype niet ondersteund. Gebruik .xlsx, .xls of .ods.")
-    
-def to_int_safe(value, default=None):
-    try:
-        s = str(value).strip()
-        if s == "" or s.lower() == "nan":
-            return default
-        # eerst naar float -> dan int, om 2025.0 ook goed te pakken
-        return int(float(s))
-    except Exception:
-        return default
-
-def to_float_safe(value, default=None):
+def _start_spreadsheet_import(soort):
+    """Geüpload bestand als job in de wachtrij (imports.py); de pagina toont het resultaat."""
+    if not is_admin():
+        flash("Alleen admin mag importeren.", "danger")
+        return redirect(url_for('universele_data.universele_data'))
+
+    file = request.files.get('excel_file')
+    if not file or file.filename == '':
+        flash("Geen bestand gekozen.", "danger")
+        return redirect(url_for('universele_data.universele_data'))
+
     try:
-        s = str(value).strip().replace(",", ".")
-        if s == "" or s.lower() == "nan":
-            return default
-        return float(s)
-    except Exception:
-        return default
+        job_id = start_spreadsheet_import(soort, file.filename, file.read(), session.get('user_id'))
+    except ValueError as ve:
+        flash(f"Bestandstype fout: {ve}", "danger")
+        return redirect(url_for('universele_data.universele_data'))
+
+    flash(f"Import {IMPORTS[soort].label} gestart; het resultaat verschijnt hieronder.", "info")
+    return redirect(url_for('universele_data.universele_data', import_job=job_id))
 
 
 @universele_data_bp.before_request
@@ -151,6 +138,7 @@ def add_gewas():
                     to_float_safe(request.form.get('n_veen', 0) or 0, 0)
                 )
             )
+            bump_versie(conn, 'stikstof_gewassen_normen')
             conn.commit()
     finally:
         conn.close()
@@ -171,6 +159,7 @@ def delete_gewas(id):
                 'DELETE FROM stikstof_gewassen_normen WHERE id = %s',
                 (id,)
             )
+            bump_versie(conn, 'stikstof_gewassen_normen')
             conn.commit()
     finally:
         conn.close()
@@ -195,6 +184,7 @@ def delete_gewas_year():
                 'DELETE FROM stikstof_gewassen_normen WHERE jaar = %s',
                 (jaar,)
             )
+            bump_versie(conn, 'stikstof_gewassen_normen')
             conn.commit()
     finally:
         conn.close()
@@ -204,127 +194,8 @@ def delete_gewas_year():
 
 @universele_data_bp.route('/universele_data/gewassen_import_excel', methods=['POST'])
 def gewassen_import_excel():
-    if not is_admin():
-        flash("Alleen admin mag importeren.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    flash("Start import gewassen (route geraakt).", "info")
-    print("[DEBUG] gewassen_import_excel aangeroepen")
-
-    if 'excel_file' not in request.files:
-        flash("Geen bestand gekozen (key 'excel_file' niet in request.files).", "danger")
-        print("[DEBUG] request.files keys:", list(request.files.keys()))
-        return redirect(url_for('universele_data.universele_data'))
-
-    file = request.files['excel_file']
-    if not file or file.filename == '':
-        flash("Geen bestand gekozen (leeg bestand).", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    try:
-        df = read_uploaded_spreadsheet(file)
-    except ValueError as ve:
-        flash(f"Bestandstype fout: {ve}", "danger")
-        print("[DEBUG] ValueError bij inlezen:", ve)
-        return redirect(url_for('universele_data.universele_data'))
-    except Exception as e:
-        flash(f"Fout bij inlezen bestand: {e}", "danger")
-        print("[DEBUG] Exception bij inlezen:", e)
-        return redirect(url_for('universele_data.universele_data'))
-
-    flash(f"Excel gelezen: {len(df)} rijen, kolommen: {', '.join(df.columns)}", "info")
-    print("[DEBUG] df.shape:", df.shape)
-    print("[DEBUG] df.columns:", df.columns.tolist())
-    print("[DEBUG] eerste regels:")
-    print(df.head())
-
-    required_cols = [
-        'Jaar',
-        'Gewas',
-        'Klei',
-        'Noordelijk, westelijk en centraal zand',
-        'Zuidelijk zand',
-        'Löss',
-        'Veen'
-    ]
-    missing = [col for col in required_cols if col not in df.columns]
-    if missing:
-        msg = f"Kolommen ontbreken in Excel: {', '.join(missing)}"
-        flash(msg, "danger")
-        print("[DEBUG]", msg)
-        return redirect(url_for('universele_data.universele_data'))
-
-    df = df.dropna(how="all")
-
-    numeric_cols = ['Jaar', 'Klei', 'Noordelijk, westelijk en centraal zand',
-                    'Zuidelijk zand', 'Löss', 'Veen']
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return _start_spreadsheet_import('gewassen')
 
-    conn = db.get_connection()
-    success_count = 0
-    error_rows = []
-
-    try:
-        with conn.cursor() as c:
-            for row_idx, (_, row) in enumerate(df.iterrows(), start=2):
-                try:
-                    jaar = to_int_safe(row['Jaar'])
-                    gewas = (str(row['Gewas']) or "").strip()
-
-                    if jaar is None or gewas == "":
-                        msg = "Lege of ongeldige Jaar/Gewas"
-                        error_rows.append((row_idx, msg))
-                        print(f"[DEBUG] rij {row_idx}: {msg}")
-                        continue
-
-                    n_klei = to_float_safe(row['Klei'])
-                    n_nwcz = to_float_safe(row['Noordelijk, westelijk en centraal zand'])
-                    n_zz = to_float_safe(row['Zuidelijk zand'])
-                    n_loss = to_float_safe(row['Löss'])
-                    n_veen = to_float_safe(row['Veen'])
-
-                    c.execute(
-                        '''
-                        INSERT INTO stikstof_gewassen_normen
-                        (id, jaar, gewas, n_klei, n_noordwestcentraal_zand, n_zuid_zand, n_loss, n_veen)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        ''',
-                        (
-                            str(uuid.uuid4()),
-                            jaar,
-                            gewas,
-                            n_klei,
-                            n_nwcz,
-                            n_zz,
-                            n_loss,
-                            n_veen
-                        )
-                    )
-                    success_count += 1
-                except Exception as row_exc:
-                    error_rows.append((row_idx, str(row_exc)))
-                    print(f"[DEBUG] fout bij rij {row_idx}:", row_exc)
-
-        conn.commit()
-    finally:
-        conn.close()
-
-    if success_count > 0:
-        flash(f"{success_count} gewas-rij(en) succesvol geïmporteerd.", "success")
-        print(f"[DEBUG] {success_count} rijen succesvol geïmporteerd.")
-    if error_rows:
-        detail = "; ".join([f"rij {r}: {msg}" for r, msg in error_rows[:5]])
-        if len(error_rows) > 5:
-            detail += f" (en nog {len(error_rows) - 5} rijen met fouten)"
-        flash(f"Er zijn {len(error_rows)} rijen overgeslagen vanwege fouten: {detail}", "danger")
-        print("[DEBUG] fouten bij rijen:", error_rows)
-
-    if success_count == 0 and not error_rows:
-        flash("Geen rijen gevonden om te importeren.", "warning")
-        print("[DEBUG] Geen rijen gevonden om te importeren.")
-
-    return redirect(url_for('universele_data.universele_data'))
 
 @universele_data_bp.route('/universele_data/update_gewas', methods=['POST'])
 def update_gewas():
@@ -376,6 +247,7 @@ def update_gewas():
                     row_id
                 )
             )
+            bump_versie(conn, 'stikstof_gewassen_normen')
             conn.commit()
     finally:
         conn.close()
@@ -412,6 +284,7 @@ def add_fosfaat():
                     to_float_safe(request.form.get('norm_kg', 0) or 0, 0)
                 )
             )
+            bump_versie(conn, 'fosfaat_normen')
             conn.commit()
     finally:
         conn.close()
@@ -432,6 +305,7 @@ def delete_fosfaat(id):
                 'DELETE FROM fosfaat_normen WHERE id = %s',
                 (id,)
             )
+            bump_versie(conn, 'fosfaat_normen')
             conn.commit()
     finally:
         conn.close()
@@ -456,6 +330,7 @@ def delete_fosfaat_year():
                 'DELETE FROM fosfaat_normen WHERE jaar = %s',
                 (jaar,)
             )
+            bump_versie(conn, 'fosfaat_normen')
             conn.commit()
     finally:
         conn.close()
@@ -465,90 +340,8 @@ def delete_fosfaat_year():
 
 @universele_data_bp.route('/universele_data/fosfaatnorm_import_excel', methods=['POST'])
 def fosfaatnorm_import_excel():
-    if not is_admin():
-        flash("Alleen admin mag importeren.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    if 'excel_file' not in request.files:
-        flash("Geen bestand gekozen.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    file = request.files['excel_file']
-    if not file or file.filename == '':
-        flash("Geen bestand gekozen.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
+    return _start_spreadsheet_import('fosfaatnormen')
 
-    try:
-        df = read_uploaded_spreadsheet(file)
-    except ValueError as ve:
-        flash(str(ve), "danger")
-        return redirect(url_for('universele_data.universele_data'))
-    except Exception as e:
-        flash(f"Fout bij inlezen bestand: {e}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    required_cols = [
-        'Jaar',
-        'Type land',
-        'P-CaCl2 van',
-        'P-CaCl2 tot',
-        'P-AL van',
-        'P-AL tot',
-        'Omschrijving',
-        'Norm (kg/ha)'
-    ]
-    missing = [col for col in required_cols if col not in df.columns]
-    if missing:
-        flash(f"Kolommen ontbreken in Excel: {', '.join(missing)}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    df = df.dropna(how="all")
-
-    conn = db.get_connection()
-    last_excel_row = None
-    success_count = 0
-    try:
-        with conn.cursor() as c:
-            for row_idx, (_, row) in enumerate(df.iterrows(), start=2):
-                last_excel_row = row_idx
-
-                jaar = to_int_safe(row['Jaar'])
-                if jaar is None:
-                    continue
-
-                c.execute(
-                    '''
-                    INSERT INTO fosfaat_normen
-                    (id, jaar, type_land, p_cacl2_van, p_cacl2_tot, p_al_van, p_al_tot, norm_omschrijving, norm_kg)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ''',
-                    (
-                        str(uuid.uuid4()),
-                        jaar,
-                        row['Type land'],
-                        to_float_safe(row['P-CaCl2 van'], 0),
-                        to_float_safe(row['P-CaCl2 tot'], 0),
-                        to_float_safe(row['P-AL van'], 0),
-                        to_float_safe(row['P-AL tot'], 0),
-                        row['Omschrijving'],
-                        to_float_safe(row['Norm (kg/ha)'], 0)
-                    )
-                )
-                success_count += 1
-
-            conn.commit()
-    except Exception as e:
-        conn.rollback()
-        if last_excel_row is not None:
-            flash(f"Import fosfaatnormen mislukt bij Excel-rij {last_excel_row}: {e}", "danger")
-        else:
-            flash(f"Import fosfaatnormen mislukt: {e}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-    finally:
-        conn.close()
-
-    flash(f"Fosfaatnormen geïmporteerd ({success_count} rijen).", "success")
-    return redirect(url_for('universele_data.universele_data'))
 
 @universele_data_bp.route('/universele_data/update_fosfaat', methods=['POST'])
 def update_fosfaat():
@@ -603,6 +396,7 @@ def update_fosfaat():
                     row_id
                 )
             )
+            bump_versie(conn, 'fosfaat_normen')
             conn.commit()
     finally:
         conn.close()
@@ -647,6 +441,7 @@ def add_derogatie():
                     nv_gebied
                 )
             )
+            bump_versie(conn, 'derogatie_normen')
             conn.commit()
     finally:
         conn.close()
@@ -667,6 +462,7 @@ def delete_derogatie(id):
                 'DELETE FROM derogatie_normen WHERE id = %s',
                 (id,)
             )
+            bump_versie(conn, 'derogatie_normen')
             conn.commit()
     finally:
         conn.close()
@@ -691,6 +487,7 @@ def delete_derogatie_year():
                 'DELETE FROM derogatie_normen WHERE jaar = %s',
                 (jaar,)
             )
+            bump_versie(conn, 'derogatie_normen')
             conn.commit()
     finally:
         conn.close()
@@ -738,6 +535,7 @@ def update_derogatie():
                     row_id
                 )
             )
+            bump_versie(conn, 'derogatie_normen')
             conn.commit()
     finally:
         conn.close()
@@ -770,6 +568,7 @@ def add_werkingscoefficient():
                     to_float_safe(request.form.get('werking') or 0, 0)
                 )
             )
+            bump_versie(conn, 'stikstof_werkingscoefficient_dierlijk')
             conn.commit()
     finally:
         conn.close()
@@ -790,6 +589,7 @@ def delete_werkingscoefficient(id):
                 'DELETE FROM stikstof_werkingscoefficient_dierlijk WHERE id = %s',
                 (id,)
             )
+            bump_versie(conn, 'stikstof_werkingscoefficient_dierlijk')
             conn.commit()
     finally:
         conn.close()
@@ -814,6 +614,7 @@ def delete_werkingscoefficient_year():
                 'DELETE FROM stikstof_werkingscoefficient_dierlijk WHERE jaar = %s',
                 (jaar,)
             )
+            bump_versie(conn, 'stikstof_werkingscoefficient_dierlijk')
             conn.commit()
     finally:
         conn.close()
@@ -823,77 +624,8 @@ def delete_werkingscoefficient_year():
 
 @universele_data_bp.route('/universele_data/werkingscoefficient_dierlijk_import_excel', methods=['POST'])
 def werkingscoefficient_dierlijk_import_excel():
-    if not is_admin():
-        flash("Alleen admin mag importeren.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
+    return _start_spreadsheet_import('werkingscoefficienten')
 
-    if 'excel_file' not in request.files:
-        flash("Geen bestand gekozen.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    file = request.files['excel_file']
-    if not file or file.filename == '':
-        flash("Geen bestand gekozen.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    try:
-        df = read_uploaded_spreadsheet(file)
-    except ValueError as ve:
-        flash(str(ve), "danger")
-        return redirect(url_for('universele_data.universele_data'))
-    except Exception as e:
-        flash(f"Fout bij inlezen bestand: {e}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    required_cols = ['jaar', 'meststof', 'toepassing', 'werking']
-    missing = [col for col in required_cols if col not in df.columns]
-    if missing:
-        flash(f"Kolommen ontbreken in Excel: {', '.join(missing)}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    df = df.dropna(how="all")
-
-    conn = db.get_connection()
-    last_excel_row = None
-    success_count = 0
-    try:
-        with conn.cursor() as c:
-            for row_idx, (_, row) in enumerate(df.iterrows(), start=2):
-                last_excel_row = row_idx
-
-                jaar = to_int_safe(row['jaar'])
-                if jaar is None:
-                    continue
-
-                c.execute(
-                    '''
-                    INSERT INTO stikstof_werkingscoefficient_dierlijk
-                    (id, jaar, meststof, toepassing, werking)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ''',
-                    (
-                        str(uuid.uuid4()),
-                        jaar,
-                        row['meststof'],
-                        row['toepassing'],
-                        to_float_safe(row['werking'], 0)
-                    )
-                )
-                success_count += 1
-
-            conn.commit()
-    except Exception as e:
-        conn.rollback()
-        if last_excel_row is not None:
-            flash(f"Import werkingscoëfficiënten mislukt bij Excel-rij {last_excel_row}: {e}", "danger")
-        else:
-            flash(f"Import werkingscoëfficiënten mislukt: {e}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-    finally:
-        conn.close()
-
-    flash(f"Werkingscoëfficiënten geïmporteerd ({success_count} rijen).", "success")
-    return redirect(url_for('universele_data.universele_data'))
 
 @universele_data_bp.route('/universele_data/update_werkingscoefficient', methods=['POST'])
 def update_werkingscoefficient():
@@ -936,6 +668,7 @@ def update_werkingscoefficient():
                     row_id
                 )
             )
+            bump_versie(conn, 'stikstof_werkingscoefficient_dierlijk')
             conn.commit()
     finally:
         conn.close()
@@ -997,6 +730,7 @@ def add_universal_fertilizer():
                     to_float_safe(request.form.get('so3', 0) or 0, 0),
                 )
             )
+            bump_versie(conn, 'universal_fertilizers')
             conn.commit()
     finally:
         conn.close()
@@ -1017,6 +751,7 @@ def delete_universal_fertilizer(id):
                 'DELETE FROM universal_fertilizers WHERE id = %s',
                 (id,)
             )
+            bump_versie(conn, 'universal_fertilizers')
             conn.commit()
     finally:
         conn.close()
@@ -1026,102 +761,7 @@ def delete_universal_fertilizer(id):
 
 @universele_data_bp.route('/universele_data/universal_fertilizers_import_excel', methods=['POST'])
 def universal_fertilizers_import_excel():
-    if not is_admin():
-        flash("Alleen admin mag importeren.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    if 'excel_file' not in request.files:
-        flash("Geen bestand gekozen.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    file = request.files['excel_file']
-    if not file or file.filename == '':
-        flash("Geen bestand gekozen.", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    try:
-        df = read_uploaded_spreadsheet(file)
-    except ValueError as ve:
-        flash(str(ve), "danger")
-        return redirect(url_for('universele_data.universele_data'))
-    except Exception as e:
-        flash(f"Fout bij inlezen bestand: {e}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    # Excel moet AL deze kolommen als header hebben (waarden mogen leeg zijn)
-    required_cols = [
-        'meststof', 'toepassing', 'leverancier',
-        'n', 'p2o5', 'k2o',
-        'b', 'cao', 'cu', 'co', 'cl', 'fe', 'mgo', 'mn', 'mo',
-        'zn', 'na2o', 'se', 'sio2', 'so3'
-    ]
-    missing = [col for col in required_cols if col not in df.columns]
-    if missing:
-        flash(f"Kolommen ontbreken in Excel: {', '.join(missing)}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-
-    df = df.dropna(how="all")
-
-    conn = db.get_connection()
-    last_excel_row = None
-    success_count = 0
-    try:
-        with conn.cursor() as c:
-            for row_idx, (_, row) in enumerate(df.iterrows(), start=2):
-                last_excel_row = row_idx
-
-                c.execute(
-                    '''
-                    INSERT INTO universal_fertilizers
-                    (id, meststof, toepassing, leverancier,
-                     n, p2o5, k2o,
-                     b, cao, cu, co, cl, fe, mgo, mn, mo, zn, na2o, se, sio2, so3)
-                    VALUES
-                    (%s, %s, %s, %s,
-                     %s, %s, %s,
-                     %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ''',
-                    (
-                        str(uuid.uuid4()),
-                        str(row['meststof']),
-                        str(row['toepassing']),
-                        str(row['leverancier']) if not pd.isna(row['leverancier']) else None,
-
-                        to_float_safe(row.get('n', 0) or 0, 0),
-                        to_float_safe(row.get('p2o5', 0) or 0, 0),
-                        to_float_safe(row.get('k2o', 0) or 0, 0),
-
-                        to_float_safe(row.get('b', 0) or 0, 0),
-                        to_float_safe(row.get('cao', 0) or 0, 0),
-                        to_float_safe(row.get('cu', 0) or 0, 0),
-                        to_float_safe(row.get('co', 0) or 0, 0),
-                        to_float_safe(row.get('cl', 0) or 0, 0),
-                        to_float_safe(row.get('fe', 0) or 0, 0),
-                        to_float_safe(row.get('mgo', 0) or 0, 0),
-                        to_float_safe(row.get('mn', 0) or 0, 0),
-                        to_float_safe(row.get('mo', 0) or 0, 0),
-                        to_float_safe(row.get('zn', 0) or 0, 0),
-                        to_float_safe(row.get('na2o', 0) or 0, 0),
-                        to_float_safe(row.get('se', 0) or 0, 0),
-                        to_float_safe(row.get('sio2', 0) or 0, 0),
-                        to_float_safe(row.get('so3', 0) or 0, 0),
-                    )
-                )
-                success_count += 1
-
-            conn.commit()
-    except Exception as e:
-        conn.rollback()
-        if last_excel_row is not None:
-            flash(f"Import meststoffen mislukt bij Excel-rij {last_excel_row}: {e}", "danger")
-        else:
-            flash(f"Import meststoffen mislukt: {e}", "danger")
-        return redirect(url_for('universele_data.universele_data'))
-    finally:
-        conn.close()
-
-    flash(f"Meststoffen geïmporteerd ({success_count} rijen).", "success")
-    return redirect(url_for('universele_data.universele_data'))
+    return _start_spreadsheet_import('meststoffen')
 
 
 @universele_data_bp.route('/universele_data/update_universal_fertilizer', methods=['POST'])
@@ -1214,9 +854,56 @@ def update_universal_fertilizer():
                     row_id
                 )
             )
+            bump_versie(conn, 'universal_fertilizers')
             conn.commit()
     finally:
         conn.close()
 
     flash("Meststof bijgewerkt.", "success")
     return redirect(url_for('universele_data.universele_data'))
+
+
+# ---------- Gebruiksnormen herberekenen ----------
+@universele_data_bp.route('/universele_data/herbereken_gebruiksnormen', methods=['POST'])
+def herbereken_gebruiksnormen():
+    if not is_admin():
+        flash("Alleen admin mag herberekenen.", "danger")
+        return redirect(url_for('universele_data.universele_data'))
+
+    jaar = to_int_safe(request.form.get('jaar'))
+    dry_run = request.form.get('dry_run') == '1'
+    try:
+        resultaat = herbereken_alle_gebruiksnormen(
+            jaren=[jaar] if jaar else None,
+            dry_run=dry_run
+        )
+    except Exception as e:
+        flash(f"Herberekenen gebruiksnormen mislukt: {e}", "danger")
+        return redirect(url_for('universele_data.universele_data'))
+
+    flash(resultaat.samenvatting(), "success" if not dry_run else "info")
+    return redirect(url_for('universele_data.universele_data'))
+
+
+# ---------- NV-gebieden herclassificeren ----------
+@universele_data_bp.route('/universele_data/herclassificeer_nv', methods=['POST'])
+def herclassificeer_nv():
+    """Na het herladen van nv_gebieden: nv_gebied van alle percelen opnieuw zetten (jobqueue)."""
+    if not is_admin():
+        flash("Alleen admin mag herclassificeren.", "danger")
+        return redirect(url_for('universele_data.universele_data'))
+
+    job_id = start_herclassificatie()
+    if job_id is not None:
+        flash("NV-herclassificatie van alle percelen gestart.", "info")
+    else:
+        flash("NV-herclassificatie loopt al.", "warning")
+        job_id = herclassificatie_status().get("id")
+    return redirect(url_for('universele_data.universele_data', import_job=job_id))
+
+
+@universele_data_bp.route('/universele_data/herclassificeer_nv/status', methods=['GET'])
+def herclassificeer_nv_status():
+    if not is_admin():
+        return jsonify({"error": "Alleen admin"}), 403
+    return jsonify(herclassificatie_status())
@@ -0,0 +1,71 @@
+# app/worker.py
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import threading
+
+from app.services import jobs
+
+"""
+Jobwerker-proces voor de jobqueue (services/jobs.py), naast het web-proces
+in de Procfile:
+
+    python -m app.worker [--threads N] [--leeg]
+
+--threads   aantal werkerthreads (default JOBS_WORKER_THREADS, 4)
+--leeg      verwerk wat er klaarstaat en stop (bv. vanuit cron)
+
+Het importeren van `app` bouwt de Flask-app (init_db, blueprints), zodat
+handlers templates kunnen renderen. Het web-proces draait zelf geen jobs
+(JOBS_WERKERS default 0); zet JOBS_WERKERS daar alleen als er geen
+werkerproces is. Stopt netjes op SIGTERM/SIGINT; lopende jobs die niet binnen
+de stoptijd klaar zijn, pakt een volgende werker na JOBS_LOCK_TIMEOUT_SECS op.
+"""
+
+logger = logging.getLogger("app.worker")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.worker")
+    parser.add_argument("--threads", type=int, default=max(1, _env_int("JOBS_WORKER_THREADS", 4)))
+    parser.add_argument("--leeg", action="store_true", help="verwerk de wachtrij en stop")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.leeg:
+        jobs.stop_werkers()     # threads uit create_app: dit proces werkt alleen
+        jobs.start_werkers(0)   # wel de handlers laden
+        jobs.ruim_op()
+        n = 0
+        while jobs.verwerk_een(f"{os.getpid()}:leeg"):
+            n += 1
+        logger.info("%s jobs verwerkt", n)
+        return 0
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    actief = jobs.start_werkers(args.threads)
+    logger.info("Jobwerker gestart met %s threads", actief)
+    while not stop.wait(1):
+        pass
+
+    logger.info("Jobwerker stopt")
+    jobs.stop_werkers()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
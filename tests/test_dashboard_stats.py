@@ -0,0 +1,455 @@
+import math
+import os
+import uuid
+from datetime import date
+
+import pytest
+
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL niet gezet; deze test heeft een database nodig", allow_module_level=True)
+
+import app.models.database_beheer as db
+from app.dashboard.dashboard_stats import bereken_dashboard_stats
+
+"""
+bereken_dashboard_stats (GROUP BY in SQL) tegen de oorspronkelijke
+Python-aggregatie, op dezelfde rijen. Alles wordt binnen één transactie
+aangemaakt en na de test teruggedraaid; jaren 1901/1902 en uuid-sleutels
+raken geen bestaande gegevens.
+"""
+
+
+def _bereken_dashboard_stats_python(conn, user_id, jaar):
+    """
+    De oorspronkelijke Python-variant van bereken_dashboard_stats (alle normen
+    en bemestingen ophalen en in Python optellen), ongewijzigd als referentie.
+    """
+
+    def fetchall_dicts(cur):
+        """Zet cursor-resultaat om naar lijst met dicts (kolomnamen als keys)."""
+        rows = cur.fetchall()
+        cols = [desc[0] for desc in cur.description]
+        return [dict(zip(cols, r)) for r in rows]
+
+    cur = conn.cursor()
+
+    # Bedrijvenlijst voor deze gebruiker
+    cur.execute(
+        "SELECT id, naam FROM bedrijven WHERE user_id = %s ORDER BY naam",
+        (user_id,)
+    )
+    bedrijven = fetchall_dicts(cur)
+
+    # Beschikbare jaren uit gebruiksnormen
+    cur.execute(
+        """
+        SELECT DISTINCT gn.jaar 
+        FROM gebruiksnormen gn
+        JOIN bedrijven b ON b.id = gn.bedrijf_id
+        WHERE b.user_id = %s AND gn.jaar IS NOT NULL 
+        ORDER BY gn.jaar DESC
+        """,
+        (user_id,)
+    )
+    jaren = [row["jaar"] for row in fetchall_dicts(cur)]
+
+    def _empty():
+        return {
+            "bedrijven": bedrijven,
+            "jaren": jaren,
+            "totaal_stats": {
+                "stikstof_norm": 0,
+                "stikstof_dierlijk_norm": 0,
+                "fosfaat_norm": 0,
+                "stikstof_total": 0,
+                "stikstof_dierlijk_total": 0,
+                "fosfaat_total": 0,
+                "kalium_total": 0,
+            },
+            "bedrijf_stats": [],
+            "bemestingen_details": [],
+        }
+
+    if not jaar or not bedrijven:
+        return _empty()
+
+    # Normen (perceel x bedrijf) voor gekozen jaar
+    cur.execute(
+        """
+        SELECT 
+            gn.*,
+            p.perceelnaam,
+            p.oppervlakte,
+            b.naam AS bedrijf_naam,
+            sgn.gewas AS gewas_naam
+        FROM gebruiksnormen gn
+        JOIN percelen p ON p.id = gn.perceel_id
+        JOIN bedrijven b ON b.id = gn.bedrijf_id
+        LEFT JOIN stikstof_gewassen_normen sgn ON sgn.id = gn.gewas_id
+        WHERE b.user_id = %s AND gn.jaar = %s
+        ORDER BY b.naam, p.perceelnaam
+        """,
+        (user_id, jaar),
+    )
+    normen = fetchall_dicts(cur)
+
+    if not normen:
+        return _empty()
+
+    # Totaal normen per bedrijf
+    bedrijf_normen = {}
+    for norm in normen:
+        bedrijf_id = norm["bedrijf_id"]
+        d = bedrijf_normen.setdefault(
+            bedrijf_id,
+            {
+                "bedrijf_naam": norm["bedrijf_naam"],
+                "stikstof_norm": 0.0,
+                "stikstof_dierlijk_norm": 0.0,
+                "fosfaat_norm": 0.0,
+                "percelen_count": 0,
+                "oppervlakte_totaal": 0.0,
+            },
+        )
+        opp = float(norm["oppervlakte"] or 0.0)
+        d["stikstof_norm"]          += float(norm["stikstof_norm_kg_ha"] or 0.0) * opp
+        d["stikstof_dierlijk_norm"] += float(norm["stikstof_dierlijk_kg_ha"] or 0.0) * opp
+        d["fosfaat_norm"]           += float(norm["fosfaat_norm_kg_ha"] or 0.0) * opp
+        d["percelen_count"]         += 1
+        d["oppervlakte_totaal"]     += opp
+
+    # Alle bemestingen gekoppeld aan de geselecteerde gebruiksnormen
+    norm_ids = [str(n["id"]) for n in normen]
+    if not norm_ids:
+        return _empty()
+
+    placeholders = ",".join(["%s"] * len(norm_ids))
+
+    bemestingen_query = f"""
+        SELECT 
+            b.*,
+            gn.bedrijf_id AS norm_bedrijf_id,
+
+            p.perceelnaam,
+            p.oppervlakte,
+            p.calculated_area,
+            p.grondsoort,
+
+            bedrijf.naam AS bedrijf_naam,
+            uf.meststof AS meststof_naam,
+            uf.toepassing AS meststof_toepassing,
+            sgn.gewas AS gewas_naam,
+
+            gn.stikstof_norm_kg_ha,
+            gn.stikstof_dierlijk_kg_ha,
+            gn.fosfaat_norm_kg_ha
+        FROM bemestingen b
+        JOIN percelen p           ON p.id = b.perceel_id
+        JOIN gebruiksnormen gn    ON gn.id = b.gebruiksnorm_id
+        JOIN bedrijven bedrijf    ON bedrijf.id = b.bedrijf_id
+        LEFT JOIN universal_fertilizers uf ON uf.id = b.meststof_id
+        LEFT JOIN stikstof_gewassen_normen sgn ON sgn.id = gn.gewas_id
+        WHERE b.gebruiksnorm_id IN ({placeholders})
+        ORDER BY bedrijf.naam, b.datum DESC
+    """
+    cur.execute(bemestingen_query, norm_ids)
+    bemestingen = fetchall_dicts(cur)
+
+    # Werkelijke totalen per bedrijf, gegroepeerd op gn.bedrijf_id
+    bedrijf_werkelijk = {}
+    bemestingen_details = []
+
+    for bem in bemestingen:
+        bedrijf_id = bem.get("norm_bedrijf_id") or bem.get("bedrijf_id")
+        d = bedrijf_werkelijk.setdefault(
+            bedrijf_id,
+            {
+                "stikstof_total": 0.0,
+                "stikstof_dierlijk_total": 0.0,
+                "fosfaat_total": 0.0,
+                "kalium_total": 0.0,
+                "bemestingen_count": 0,
+            },
+        )
+
+        opp = float(bem.get("calculated_area") or bem.get("oppervlakte") or 1.0)
+
+        werkzame_n      = float(bem.get("werkzame_n_kg_ha") or 0.0) * opp
+        werkzame_n_dier = float(bem.get("n_dierlijk_kg_ha") or 0.0) * opp
+        werkzame_p2o5   = float(bem.get("werkzame_p2o5_kg_ha") or 0.0) * opp
+        k2o_total       = float(bem.get("k2o_kg_ha") or 0.0) * opp
+
+        d["stikstof_total"]          += werkzame_n
+        d["stikstof_dierlijk_total"] += werkzame_n_dier
+        d["fosfaat_total"]           += werkzame_p2o5
+        d["kalium_total"]            += k2o_total
+        d["bemestingen_count"]       += 1
+
+        bemestingen_details.append({
+            "datum": bem.get("datum"),
+            "bedrijf": bem.get("bedrijf_naam"),
+            "perceel": bem.get("perceelnaam"),
+            "gewas": bem.get("gewas_naam"),
+            "meststof": bem.get("meststof_naam"),
+            "oppervlakte": opp,
+            "toepassing": bem.get("meststof_toepassing", ""),
+            "werkzame_n": werkzame_n,
+            "werkzame_n_dierlijk": werkzame_n_dier,
+            "werkzame_p2o5": werkzame_p2o5,
+            "k2o_kg_ha": float(bem.get("k2o_kg_ha") or 0.0),
+            "k2o_total": k2o_total,
+            "n_kg_ha": float(bem.get("n_kg_ha") or 0.0),
+            "p2o5_kg_ha": float(bem.get("p2o5_kg_ha") or 0.0),
+        })
+
+    # Combineer normen en werkelijk per bedrijf
+    bedrijf_stats = []
+    totaal_stats = {
+        "stikstof_norm": 0.0,
+        "stikstof_dierlijk_norm": 0.0,
+        "fosfaat_norm": 0.0,
+        "stikstof_total": 0.0,
+        "stikstof_dierlijk_total": 0.0,
+        "fosfaat_total": 0.0,
+        "kalium_total": 0.0,
+    }
+
+    for bedrijf_id, ndata in bedrijf_normen.items():
+        wdata = bedrijf_werkelijk.get(
+            bedrijf_id,
+            {
+                "stikstof_total": 0.0,
+                "stikstof_dierlijk_total": 0.0,
+                "fosfaat_total": 0.0,
+                "kalium_total": 0.0,
+                "bemestingen_count": 0,
+            },
+        )
+
+        stikstof_pct = (
+            (wdata["stikstof_total"] / ndata["stikstof_norm"] * 100.0)
+            if ndata["stikstof_norm"] > 0
+            else 0.0
+        )
+        stikstof_dierlijk_pct = (
+            (wdata["stikstof_dierlijk_total"] / ndata["stikstof_dierlijk_norm"] * 100.0)
+            if ndata["stikstof_dierlijk_norm"] > 0
+            else 0.0
+        )
+        fosfaat_pct = (
+            (wdata["fosfaat_total"] / ndata["fosfaat_norm"] * 100.0)
+            if ndata["fosfaat_norm"] > 0
+            else 0.0
+        )
+
+        bedrijf_stats.append({
+            "bedrijf_id": bedrijf_id,
+            "bedrijf_naam": ndata["bedrijf_naam"],
+            "percelen_count": ndata["percelen_count"],
+            "oppervlakte_totaal": ndata["oppervlakte_totaal"],
+            "stikstof_norm": ndata["stikstof_norm"],
+            "stikstof_dierlijk_norm": ndata["stikstof_dierlijk_norm"],
+            "fosfaat_norm": ndata["fosfaat_norm"],
+            "stikstof_total": wdata["stikstof_total"],
+            "stikstof_dierlijk_total": wdata["stikstof_dierlijk_total"],
+            "fosfaat_total": wdata["fosfaat_total"],
+            "kalium_total": wdata["kalium_total"],
+            "stikstof_percentage": stikstof_pct,
+            "stikstof_dierlijk_percentage": stikstof_dierlijk_pct,
+            "fosfaat_percentage": fosfaat_pct,
+            "bemestingen_count": wdata["bemestingen_count"],
+        })
+
+        # Totalen
+        totaal_stats["stikstof_norm"]           += ndata["stikstof_norm"]
+        totaal_stats["stikstof_dierlijk_norm"]  += ndata["stikstof_dierlijk_norm"]
+        totaal_stats["fosfaat_norm"]            += ndata["fosfaat_norm"]
+        totaal_stats["stikstof_total"]          += wdata["stikstof_total"]
+        totaal_stats["stikstof_dierlijk_total"] += wdata["stikstof_dierlijk_total"]
+        totaal_stats["fosfaat_total"]           += wdata["fosfaat_total"]
+        totaal_stats["kalium_total"]            += wdata["kalium_total"]
+
+    return {
+        "bedrijven": bedrijven,
+        "jaren": jaren,
+        "totaal_stats": totaal_stats,
+        "bedrijf_stats": bedrijf_stats,
+        "bemestingen_details": bemestingen_details,
+    }
+
+
+def _gelijk(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(float(a or 0), float(b or 0), rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+def _verschillen(oud, nieuw):
+    """(pad, oud, nieuw) per afwijkende waarde; lijsten moeten even lang zijn."""
+    verschillen = []
+
+    def cmp(pad, a, b):
+        if isinstance(a, dict) and isinstance(b, dict):
+            for k in sorted(set(a) | set(b), key=str):
+                cmp(f"{pad}.{k}", a.get(k), b.get(k))
+        elif isinstance(a, list) and isinstance(b, list):
+            if len(a) != len(b):
+                verschillen.append((f"{pad}[len]", len(a), len(b)))
+                return
+            for i, (x, y) in enumerate(zip(a, b)):
+                cmp(f"{pad}[{i}]", x, y)
+        elif not _gelijk(a, b):
+            verschillen.append((pad, a, b))
+
+    cmp("stats", oud, nieuw)
+    return verschillen
+
+
+def _uid():
+    return str(uuid.uuid4())
+
+
+@pytest.fixture
+def conn():
+    conn = db.get_connection()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.fixture
+def gebruiker(conn):
+    """
+    Twee bedrijven met normen in 1901 (en één norm in 1902), een bedrijf
+    zonder normen, en bemestingen die de randgevallen raken:
+    - b.perceel_id anders dan het perceel van de norm (ook een perceel zonder
+      eigen norm en het perceel van een norm van het andere bedrijf);
+    - b.bedrijf_id anders dan het bedrijf van de norm;
+    - een b.perceel_id dat niet (meer) bestaat;
+    - calculated_area 0 of NULL en oppervlakte NULL;
+    - normen zonder bemestingen.
+    """
+    c = conn.cursor()
+    user_id = _uid()
+    c.execute(
+        "INSERT INTO users (id, username, password_hash) VALUES (%s, %s, %s)",
+        (user_id, f"test-dashboard-{user_id}", "x"),
+    )
+
+    bedrijf = {naam: _uid() for naam in ("Akker", "Boer", "Leeg")}
+    for naam, bedrijf_id in bedrijf.items():
+        c.execute(
+            "INSERT INTO bedrijven (id, naam, user_id) VALUES (%s, %s, %s)",
+            (bedrijf_id, naam, user_id),
+        )
+
+    # naam: (oppervlakte, calculated_area)
+    percelen = {
+        "P1": (2.5, 2.4),
+        "P2": (1.2, None),
+        "P3": (0.7, 0.0),
+        "P4": (None, None),
+        "P5": (3.3, 3.1),   # alleen gebruikt door een bemesting, geen eigen norm
+        "P6": (0.1, None),  # norm zonder bemestingen
+    }
+    perceel = {naam: _uid() for naam in percelen}
+    for naam, (opp, calc) in percelen.items():
+        c.execute(
+            "INSERT INTO percelen (id, perceelnaam, oppervlakte, calculated_area, user_id) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            (perceel[naam], naam, opp, calc, user_id),
+        )
+
+    gewas_id = _uid()
+    c.execute(
+        "INSERT INTO stikstof_gewassen_normen (id, jaar, gewas) VALUES (%s, %s, %s)",
+        (gewas_id, 1901, f"test-gewas-{gewas_id}"),
+    )
+
+    # naam: (jaar, bedrijf, perceel, stikstof, stikstof_dierlijk, fosfaat)
+    normen = {
+        "N1": (1901, "Akker", "P1", 185.0, 170.0, 105.0),
+        "N2": (1901, "Akker", "P2", 230.1, 170.0, 97.5),
+        "N3": (1901, "Boer", "P3", 112.3, 170.0, 0.1),
+        "N4": (1901, "Boer", "P4", 50.0, None, None),
+        "N5": (1902, "Akker", "P1", 185.0, 170.0, 105.0),
+        "N6": (1901, "Akker", "P6", 0.3, 0.7, 1.1),
+    }
+    norm = {naam: _uid() for naam in normen}
+    for naam, (jaar, b, p, n, n_dier, p2o5) in normen.items():
+        c.execute(
+            """
+            INSERT INTO gebruiksnormen (id, jaar, bedrijf_id, perceel_id, gewas_id,
+                stikstof_norm_kg_ha, stikstof_dierlijk_kg_ha, fosfaat_norm_kg_ha, derogatie, user_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 0, %s)
+            """,
+            (norm[naam], jaar, bedrijf[b], perceel[p], gewas_id, n, n_dier, p2o5, user_id),
+        )
+
+    # (norm, bedrijf, perceel, datum, werkzame_n, n_dierlijk, werkzame_p2o5, k2o)
+    bemestingen = [
+        ("N1", "Akker", "P1", date(1901, 3, 1), 40.1, 30.2, 12.3, 55.5),
+        ("N1", "Akker", "P1", date(1901, 4, 1), 0.1, 0.0, 0.3, 0.0),
+        ("N1", "Akker", "P5", date(1901, 5, 1), 25.0, 25.0, 9.9, 31.7),   # ander perceel
+        ("N3", "Akker", "P2", date(1901, 3, 15), 17.7, 0.0, 4.4, 12.0),   # ander bedrijf en perceel
+        ("N3", "Boer", "P3", date(1900, 11, 1), 33.3, 33.3, 11.1, 0.2),   # bemestingsjaar 1900
+        ("N4", "Boer", "P4", date(1901, 6, 1), 10.0, 5.0, 2.5, 7.5),
+        ("N4", "Boer", None, date(1901, 6, 2), 99.0, 99.0, 99.0, 99.0),   # perceel bestaat niet
+        ("N5", "Akker", "P1", date(1902, 3, 1), 60.0, 50.0, 20.0, 40.0),
+    ]
+    for n, b, p, datum, werkzame_n, n_dier, werkzame_p2o5, k2o in bemestingen:
+        c.execute(
+            """
+            INSERT INTO bemestingen (id, gebruiksnorm_id, bedrijf_id, perceel_id, meststof_id, datum,
+                hoeveelheid_kg_ha, n_kg_ha, p2o5_kg_ha, k2o_kg_ha,
+                werkzame_n_kg_ha, werkzame_p2o5_kg_ha, n_dierlijk_kg_ha)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (_uid(), norm[n], bedrijf[b], perceel[p] if p else _uid(), _uid(), datum,
+             10.0, werkzame_n, werkzame_p2o5, k2o, werkzame_n, werkzame_p2o5, n_dier),
+        )
+    return user_id
+
+
+@pytest.mark.parametrize("jaar", [1901, 1902, 1903])
+def test_zelfde_uitkomst_als_python_variant(conn, gebruiker, jaar):
+    oud = _bereken_dashboard_stats_python(conn, gebruiker, jaar)
+    nieuw = bereken_dashboard_stats(conn, gebruiker, jaar)
+
+    assert nieuw["bedrijven"] == oud["bedrijven"]
+    assert nieuw["jaren"] == oud["jaren"] == [1902, 1901]
+    assert _verschillen(oud["totaal_stats"], nieuw["totaal_stats"]) == []
+
+    # per bedrijf (de volgorde bij gelijke namen mag verschillen)
+    oud_per_bedrijf = {s["bedrijf_id"]: s for s in oud["bedrijf_stats"]}
+    nieuw_per_bedrijf = {s["bedrijf_id"]: s for s in nieuw["bedrijf_stats"]}
+    assert set(nieuw_per_bedrijf) == set(oud_per_bedrijf)
+    assert _verschillen(oud_per_bedrijf, nieuw_per_bedrijf) == []
+
+    def _sleutel(d):
+        return (d["datum"], d["bedrijf"] or "", d["perceel"] or "", d["werkzame_n"])
+
+    assert _verschillen(
+        sorted(oud["bemestingen_details"], key=_sleutel),
+        sorted(nieuw["bemestingen_details"], key=_sleutel),
+    ) == []
+    assert nieuw["percelen_bemest_count"] == len({d["perceel"] for d in oud["bemestingen_details"]})
+
+
+def test_randgevallen_tellen_zoals_voorheen(conn, gebruiker):
+    nieuw = bereken_dashboard_stats(conn, gebruiker, 1901)
+    per_naam = {s["bedrijf_naam"]: s for s in nieuw["bedrijf_stats"]}
+
+    # "Leeg" heeft geen normen; N2 en N6 van "Akker" hebben geen bemestingen
+    assert set(per_naam) == {"Akker", "Boer"}
+    assert per_naam["Akker"]["percelen_count"] == 3
+    assert per_naam["Akker"]["bemestingen_count"] == 3
+    # de bemesting op N3 door "Akker" telt bij "Boer" (bedrijf van de norm);
+    # die zonder bestaand perceel telt niet mee
+    assert per_naam["Boer"]["bemestingen_count"] == 3
+
+    # de bemesting op P5 rekent met de oppervlakte van P5 (calculated_area 3.1)
+    verwacht_akker_k2o = 55.5 * 2.4 + 0.0 * 2.4 + 31.7 * 3.1
+    assert math.isclose(per_naam["Akker"]["kalium_total"], verwacht_akker_k2o, rel_tol=1e-6)
@@ -0,0 +1,225 @@
+import math
+import os
+import random
+import struct
+
+import numpy as np
+import pytest
+
+from app.gebruiksnormen.fosfaat_index import FosfaatIndex, FosfaatKlasseIndex, _laad_fosfaat_index
+
+"""
+FosfaatIndex tegen de semantiek van de SQL-query die hij vervangt:
+
+    SELECT id FROM fosfaat_normen
+    WHERE jaar = %s AND LOWER(type_land) = %s
+      AND %s BETWEEN LEAST(p_cacl2_van, p_cacl2_tot) AND GREATEST(p_cacl2_van, p_cacl2_tot)
+      AND %s BETWEEN LEAST(p_al_van, p_al_tot)       AND GREATEST(p_al_van, p_al_tot)
+    ORDER BY p_cacl2_van, p_al_van
+    LIMIT 1
+
+_sql() hieronder is die query in Python: p_cacl2 is een REAL-kolom (float4,
+vergeleken als float8), beide grenzen inclusief, en bij gelijke
+(p_cacl2_van, p_al_van) wint de eerste rij. Met DATABASE_URL draait
+test_randpunten_tegen_postgres dezelfde query echt, op RIJEN.
+"""
+
+
+def _real(x):
+    return struct.unpack('f', struct.pack('f', float(x)))[0]
+
+
+def _sql(rows, jaar, type_land, p_cacl2, p_al):
+    if p_cacl2 is None or p_al is None or math.isnan(p_cacl2) or math.isnan(p_al):
+        return None
+    kandidaten = []
+    for volgnr, r in enumerate(rows):
+        if r[1] != jaar or (r[2] or '').lower() != type_land:
+            continue
+        c_van, c_tot = _real(r[3]), _real(r[4])
+        if not min(c_van, c_tot) <= p_cacl2 <= max(c_van, c_tot):
+            continue
+        if not min(r[5], r[6]) <= p_al <= max(r[5], r[6]):
+            continue
+        kandidaten.append(((c_van, r[5], volgnr), r))
+    return min(kandidaten, key=lambda k: k[0])[1][0] if kandidaten else None
+
+
+def _id(rij):
+    return rij[0] if rij else None
+
+
+def _randpunten(grenzen):
+    """Elke grens, de float-buren ervan, de middens en buiten het bereik."""
+    g = sorted(set(grenzen))
+    waarden = set(g)
+    for x in g:
+        waarden.add(float(np.nextafter(x, -np.inf)))
+        waarden.add(float(np.nextafter(x, np.inf)))
+    waarden.update((a + b) / 2 for a, b in zip(g, g[1:]))
+    waarden.update((g[0] - 1, g[-1] + 1))
+    return sorted(waarden)
+
+
+# (id, jaar, type_land, p_cacl2_van, p_cacl2_tot, p_al_van, p_al_tot, norm_kg)
+RIJEN = [
+    ("laag",      2025, "Grasland", 0.0, 0.8, 0, 27, 105),
+    ("midden",    2025, "Grasland", 0.8, 1.4, 27, 50, 97),
+    ("hoog",      2025, "Grasland", 1.4, 2.7, 50, 200, 90),
+    ("omgekeerd", 2025, "Grasland", 3.4, 2.7, 200, 50, 80),   # van > tot
+    ("bouw",      2025, "bouwland", 0.0, 2.0, 0, 100, 75),
+    ("ouder",     2024, "grasland", 0.0, 5.0, 0, 300, 60),
+]
+
+
+@pytest.fixture
+def index():
+    return FosfaatIndex(RIJEN)
+
+
+def test_grenzen_zijn_inclusief(index):
+    # Op 0.8/27 overlappen "laag" en "midden": de laagste p_cacl2_van wint
+    assert _id(index.zoek(2025, "grasland", 0.8, 27)) == _sql(RIJEN, 2025, "grasland", 0.8, 27) == "laag"
+    assert _id(index.zoek(2025, "grasland", 1.0, 27)) == "midden"
+    assert _id(index.zoek(2025, "grasland", 0.0, 0)) == "laag"
+
+
+def test_van_groter_dan_tot(index):
+    assert _id(index.zoek(2025, "grasland", 3.0, 120)) == _sql(RIJEN, 2025, "grasland", 3.0, 120) == "omgekeerd"
+    assert _id(index.zoek(2025, "grasland", 3.4, 200)) == "omgekeerd"
+
+
+def test_buiten_bereik_en_gaten(index):
+    assert index.zoek(2025, "grasland", -0.1, 10) is None
+    assert index.zoek(2025, "grasland", 3.5, 100) is None
+    assert index.zoek(2025, "grasland", 0.5, 201) is None
+    # p_cacl2 past bij "laag", p_al alleen bij "hoog": geen klasse
+    assert index.zoek(2025, "grasland", 0.5, 150) is None
+    assert index.zoek(2023, "grasland", 0.5, 10) is None
+    assert index.zoek(2025, "akkerbouw", 0.5, 10) is None
+
+
+def test_type_land_en_jaar_per_groep(index):
+    assert _id(index.zoek(2025, "bouwland", 1.0, 50)) == "bouw"
+    assert _id(index.zoek(2024, "grasland", 1.0, 50)) == "ouder"
+
+
+def test_real_kolom_zoals_postgres():
+    # 0.1 als REAL is 0.100000001490116...; de float8 0.1 ligt daar net onder
+    rijen = [("a", 2025, "grasland", 0.1, 0.5, 0, 10, 1)]
+    index = FosfaatKlasseIndex(rijen)
+    assert index.zoek(0.1, 5) is None
+    assert _sql(rijen, 2025, "grasland", 0.1, 5) is None
+    assert _id(index.zoek(_real(0.1), 5)) == "a"
+
+
+def test_gelijke_sleutel_eerste_rij_wint():
+    rijen = [
+        ("eerste", 2025, "grasland", 1.0, 2.0, 10, 20, 1),
+        ("tweede", 2025, "grasland", 1.0, 3.0, 10, 30, 2),
+        ("breder", 2025, "grasland", 0.5, 3.0, 5, 30, 3),
+    ]
+    index = FosfaatKlasseIndex(rijen)
+    assert _id(index.zoek(1.5, 15)) == _sql(rijen, 2025, "grasland", 1.5, 15) == "breder"
+    zonder_breder = rijen[:2]
+    index = FosfaatKlasseIndex(zonder_breder)
+    assert _id(index.zoek(1.5, 15)) == _sql(zonder_breder, 2025, "grasland", 1.5, 15) == "eerste"
+    assert _id(index.zoek(2.5, 25)) == "tweede"
+    # Volgorde omdraaien: nu wint "tweede" op het overlappende stuk
+    omgedraaid = zonder_breder[::-1]
+    assert _id(FosfaatKlasseIndex(omgedraaid).zoek(1.5, 15)) == "tweede"
+
+
+def test_zoek_many_gelijk_aan_zoek_en_nan(index):
+    groep = index.groepen[(2025, "grasland")]
+    pc = [0.8, 1.0, 3.0, -1.0, float("nan"), 0.5]
+    pa = [27, 27, 120, 10, 10, float("nan")]
+    res = groep.zoek_many(pc, pa).tolist()
+    assert res[4] == res[5] == -1
+    for i, (c, a) in enumerate(zip(pc, pa)):
+        verwacht = groep.zoek(c, a)
+        assert (groep.rows[res[i]] if res[i] >= 0 else None) == verwacht
+    assert index.zoek_many(2023, "grasland", pc, pa) == [None] * len(pc)
+
+
+def test_alle_randpunten_willekeurige_tabellen():
+    rnd = random.Random(20250101)
+    for _ in range(25):
+        rijen = []
+        for i in range(rnd.randint(1, 12)):
+            c = sorted(round(rnd.uniform(0, 4), rnd.choice((1, 2))) for _ in range(2))
+            a = sorted(rnd.randint(0, 60) for _ in range(2))
+            if rnd.random() < 0.2:
+                c, a = c[::-1], a[::-1]
+            if rijen and rnd.random() < 0.2:
+                # zelfde (p_cacl2_van, p_al_van) als een eerdere rij
+                vorige = rnd.choice(rijen)
+                c[0], a[0] = vorige[3], vorige[5]
+            rijen.append((f"r{i}", 2025, "grasland", c[0], c[1], a[0], a[1], i))
+        index = FosfaatIndex(rijen)
+        groep = index.groepen[(2025, "grasland")]
+        c_punten = _randpunten(groep.c_grenzen.tolist())
+        a_punten = _randpunten(groep.a_grenzen.tolist())
+        pc = [c for c in c_punten for _ in a_punten]
+        pa = [a for _ in c_punten for a in a_punten]
+        many = index.zoek_many(2025, "grasland", pc, pa)
+        for c, a, m in zip(pc, pa, many):
+            verwacht = _sql(rijen, 2025, "grasland", c, a)
+            assert _id(index.zoek(2025, "grasland", c, a)) == verwacht, (rijen, c, a)
+            assert _id(m) == verwacht
+
+
+SQL = """
+    SELECT id
+    FROM fosfaat_normen
+    WHERE jaar = %s
+      AND LOWER(type_land) = LOWER(%s)
+      AND %s BETWEEN LEAST(p_cacl2_van, p_cacl2_tot)
+                AND GREATEST(p_cacl2_van, p_cacl2_tot)
+      AND %s BETWEEN LEAST(p_al_van, p_al_tot)
+                AND GREATEST(p_al_van, p_al_tot)
+    ORDER BY p_cacl2_van, p_al_van
+    LIMIT 1
+"""
+
+
+@pytest.fixture
+def pg_cursor():
+    """
+    Cursor met een tijdelijke fosfaat_normen (zelfde kolommen) die de echte
+    tabel binnen deze sessie overschaduwt, gevuld met RIJEN. Alles wordt na
+    de test teruggedraaid.
+    """
+    if not os.environ.get("DATABASE_URL"):
+        pytest.skip("DATABASE_URL niet gezet; deze test heeft een database nodig")
+    import app.models.database_beheer as db
+
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute("CREATE TEMP TABLE fosfaat_normen (LIKE fosfaat_normen INCLUDING DEFAULTS) ON COMMIT DROP")
+        c.executemany(
+            """
+            INSERT INTO fosfaat_normen (id, jaar, type_land, p_cacl2_van, p_cacl2_tot, p_al_van, p_al_tot, norm_kg)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            RIJEN,
+        )
+        yield c
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def test_randpunten_tegen_postgres(pg_cursor):
+    index = _laad_fosfaat_index(pg_cursor)
+    assert sorted(index.groepen) == [(2024, "grasland"), (2025, "bouwland"), (2025, "grasland")]
+    for (jaar, type_land), groep in index.groepen.items():
+        c_punten = _randpunten(groep.c_grenzen.tolist())
+        a_punten = _randpunten(groep.a_grenzen.tolist())
+        for c in c_punten:
+            for a in a_punten:
+                pg_cursor.execute(SQL, (jaar, type_land, c, a))
+                verwacht = _id(pg_cursor.fetchone())
+                assert _id(index.zoek(jaar, type_land, c, a)) == verwacht, (jaar, type_land, c, a)
+                assert _sql(RIJEN, jaar, type_land, c, a) == verwacht, (jaar, type_land, c, a)